@@ -1,15 +1,38 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from datetime import timedelta
+from suv_tashish_crm import actors
 from suv_tashish_crm.models import Client
 
 
-def sidebar_debtors(request):
+CACHE_KEY = 'sidebar_debtors:{}'
+
+
+def _cache_key(business_id):
+    return CACHE_KEY.format(business_id if business_id is not None else 'all')
+
+
+def _request_business_id(request):
+    # admin/kuryer profilidan biznes; topilmasa — hamma mijozlar (eski xatti-harakat)
+    try:
+        return actors.get_actor(request).business_id
+    except Exception:
+        return None
+
+
+def compute_sidebar_debtors(business_id=None):
     # clients with debt > 0 and last_order older than 10 days
-    cutoff = timezone.now() - timedelta(days=10)
-    debtors_qs = Client.objects.filter(debt__gt=0, last_order__lt=cutoff).order_by('-debt')[:10]
+    now = timezone.now()
+    cutoff = now - timedelta(days=10)
+    debtors_qs = Client.objects.filter(debt__gt=0, last_order__lt=cutoff)
+    if business_id is not None:
+        debtors_qs = debtors_qs.filter(business_id=business_id)
+    debtors_qs = debtors_qs.only('id', 'full_name', 'phone', 'debt', 'last_order').order_by('-debt')[:10]
     debtors = []
     for c in debtors_qs:
-        days_overdue = (timezone.now() - c.last_order).days if c.last_order else None
+        days_overdue = (now - c.last_order).days if c.last_order else None
         debtors.append({
             'id': c.id,
             'name': c.full_name,
@@ -17,4 +40,27 @@ def sidebar_debtors(request):
             'debt': float(c.debt or 0),
             'days_overdue': days_overdue,
         })
-    return {'sidebar_debtors': debtors}
+    return debtors
+
+
+def get_sidebar_debtors(business_id=None):
+    """Biznes bo'yicha keshlangan top qarzdorlar (``SIDEBAR_DEBTORS_TTL`` sekund)."""
+    key = _cache_key(business_id)
+    debtors = cache.get(key)
+    if debtors is None:
+        debtors = compute_sidebar_debtors(business_id)
+        cache.set(key, debtors, getattr(settings, 'SIDEBAR_DEBTORS_TTL', 60))
+    return debtors
+
+
+def invalidate_sidebar_debtors(business_id=None):
+    """Client.debt / last_order o'zgarganda chaqiriladi (admin_panel.signals)."""
+    keys = [_cache_key(None)]
+    if business_id is not None:
+        keys.append(_cache_key(business_id))
+    cache.delete_many(keys)
+
+
+def sidebar_debtors(request):
+    # faqat template `sidebar_debtors` ga murojaat qilganda hisoblanadi
+    return {'sidebar_debtors': SimpleLazyObject(lambda: get_sidebar_debtors(_request_business_id(request)))}
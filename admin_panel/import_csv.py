@@ -3,13 +3,15 @@ import io
 import re
 import secrets
 import string
+import tempfile
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.http import FileResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_http_methods
 
+from suv_tashish_crm import table_reader
 from suv_tashish_crm.models import Client, Region
 
 User = get_user_model()
@@ -53,11 +55,14 @@ def import_clients_ui(request):
     if not f:
         return render(request, "admin/clients_import.html", {"error": "CSV fayl tanlanmadi."})
 
-    content = f.read().decode("utf-8", errors="ignore")
-    reader = csv.reader(io.StringIO(content))
-
-    out_rows = [["full_name", "bottles", "address", "phone", "username", "temp_password"]]
+    # kirish ham, chiqish ham oqim bilan: katta faylda xotira o'smasin
+    reader = table_reader.iter_csv_rows(f)
+    out = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    text_out = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text_out)
+    writer.writerow(["full_name", "bottles", "address", "phone", "username", "temp_password"])
 
+    regions = {}
     for row in reader:
         if not row or all(not (c or "").strip() for c in row):
             continue
@@ -79,8 +84,11 @@ def import_clients_ui(request):
 
         phone = _normalize_phone(phone_raw)
 
-        # Region: location bo‘yicha Region yaratamiz yoki topamiz
-        region_obj, _ = Region.objects.get_or_create(name=address)
+        # Region: location bo‘yicha Region yaratamiz yoki topamiz (fayl ichida bir marta)
+        region_obj = regions.get(address)
+        if region_obj is None:
+            region_obj, _ = Region.objects.get_or_create(name=address)
+            regions[address] = region_obj
 
         username = _gen_unique_username(_slug_base(full_name))
         temp_password = _gen_password(10)
@@ -98,11 +106,14 @@ def import_clients_ui(request):
             debt=0,
         )
 
-        out_rows.append([full_name, bottles, location, phone or "", username, temp_password])
-
-    out = io.StringIO()
-    csv.writer(out).writerows(out_rows)
-
-    resp = HttpResponse(out.getvalue(), content_type="text/csv; charset=utf-8")
-    resp["Content-Disposition"] = 'attachment; filename="clients_credentials.csv"'
-    return resp
+        writer.writerow([full_name, bottles, address, phone or "", username, temp_password])
+
+    text_out.flush()
+    text_out.detach()  # FileResponse bytes o'qiydi
+    out.seek(0)
+    return FileResponse(
+        out,
+        as_attachment=True,
+        filename="clients_credentials.csv",
+        content_type="text/csv; charset=utf-8",
+    )
@@ -1,154 +1,133 @@
 from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ImproperlyConfigured
 from django.conf import settings
 import os
-import csv
-import time
-try:
-    from geopy.geocoders import Nominatim
-    from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-except Exception:
-    Nominatim = None
-
-try:
-    import googlemaps
-    from googlemaps.exceptions import ApiError as GoogleApiError
-except Exception:
-    googlemaps = None
-    GoogleApiError = None
+
+from suv_tashish_crm.geocoding import Checkpoint, Geocoder, apply_region_coordinates, get_provider
+from suv_tashish_crm.models import Region
+from suv_tashish_crm.reference_data import load_volidam
+
+
+class Command(BaseCommand):
+    help = "Geocode Volidam.csv locations and write coordinates to clients of the matching regions"
 
     def add_arguments(self, parser):
         parser.add_argument('--csv-path', dest='csv_path', help='Path to CSV file', default=None)
         parser.add_argument('--limit', dest='limit', type=int, help='Limit number of rows to process', default=0)
-        parser.add_argument('--delay', dest='delay', type=float, help='Delay seconds between requests (Nominatim rate-limit)', default=1.0)
+        parser.add_argument('--delay', dest='delay', type=float, default=None,
+                            help='Minimum seconds between provider requests (default: provider rate limit)')
         parser.add_argument('--dry-run', dest='dry_run', action='store_true', help='Do not save updates, only print')
         parser.add_argument('--force', dest='force', action='store_true', help='Overwrite existing coordinates')
         parser.add_argument('--google-key', dest='google_key', help='Google Geocoding API key (optional). If provided, Google will be used.')
+        parser.add_argument('--provider', choices=['nominatim', 'google', 'fake'], default=None,
+                            help='Geocoding provider (default: google if a key is available, otherwise nominatim)')
+        parser.add_argument('--workers', type=int, default=None, help='Concurrent requests (capped by the provider)')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=200, help='Rows per geocode/update batch')
+        parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: data/geocode_csv.checkpoint.json)')
+        parser.add_argument('--resume', action='store_true', help='Continue from the checkpoint of the same CSV file')
 
     def handle(self, *args, **options):
-        if Nominatim is None:
-            raise CommandError('geopy is not installed. Please install with: pip install geopy')
-
         csv_path = options.get('csv_path') or os.path.join(getattr(settings, 'BASE_DIR', '.'), 'Volidam.csv')
         if not os.path.exists(csv_path):
             raise CommandError(f'CSV file not found: {csv_path}')
 
         limit = int(options.get('limit') or 0)
-        delay = float(options.get('delay') or 1.0)
+        delay = options.get('delay')
         dry_run = bool(options.get('dry_run'))
         force = bool(options.get('force'))
+        batch_size = max(1, int(options.get('batch_size') or 200))
+        verbose = int(options.get('verbosity') or 1) >= 2
 
-        # Choose provider: Google if key provided and googlemaps installed, otherwise Nominatim
-        google_key = options.get('google_key')
         # allow reading from environment or Django settings if not passed
-        if not google_key:
-            google_key = getattr(settings, 'GOOGLE_API_KEY', None) or os.environ.get('GOOGLE_API_KEY')
-
-        use_google = bool(google_key and googlemaps is not None)
-        if use_google:
-            self.stdout.write(self.style.NOTICE('Using Google Geocoding API'))
-            gmaps = googlemaps.Client(key=google_key)
-        else:
-            if Nominatim is None:
-                raise CommandError('geopy is not installed. Please install with: pip install geopy')
-            geolocator = Nominatim(user_agent='crm_geocoder_2025')
-
-        self.stdout.write(self.style.NOTICE(f'Geocoding CSV: {csv_path} (limit={limit or "all"}, delay={delay}s)'))
-
-        processed = 0
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            headers = next(reader, None)
-            for idx, row in enumerate(reader):
-                if limit and processed >= limit:
-                    break
+        google_key = (options.get('google_key') or getattr(settings, 'GOOGLE_API_KEY', None)
+                      or os.environ.get('GOOGLE_API_KEY'))
+        provider_name = options.get('provider') or ('google' if google_key else 'nominatim')
+        try:
+            provider = get_provider(provider_name, **({'key': google_key} if provider_name == 'google' else {}))
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        rate = (1.0 / delay) if delay else None
+        geocoder = Geocoder(provider, workers=options.get('workers'), rate=rate)
+
+        checkpoint = Checkpoint(options.get('checkpoint') or os.path.join(settings.BASE_DIR, 'data', 'geocode_csv.checkpoint.json'))
+        signature = Checkpoint.signature(csv_path)
+        start = checkpoint.load(signature) if options.get('resume') else 0
+
+        rows = load_volidam(csv_path).rows
+        end = min(len(rows), start + limit) if limit else len(rows)
+        self.stdout.write(self.style.NOTICE(
+            f'Geocoding CSV: {csv_path} with {provider.name} '
+            f'(rows {start + 1}-{end} of {len(rows)}, workers={geocoder.workers})'
+        ))
+
+        region_index = _RegionIndex(Region.objects.values_list('id', 'name'))
+        skipped = unmatched = updated = 0
+        assigned = set()  # force'siz: oldingi partiyada to'ldirilgan regionlar qayta yozilmaydi
+        for offset in range(start, end, batch_size):
+            batch = rows[offset:min(offset + batch_size, end)]
+            pairs = []
+            for r in batch:
                 # Expecting: name, bottle, location, phone
-                name = (row[0] if len(row) > 0 else '') or ''
-                location_text = (row[2] if len(row) > 2 else '') or ''
-                phone = (row[3] if len(row) > 3 else '') or ''
-
-                if not name or not location_text:
-                    self.stdout.write(self.style.WARNING(f'Skipping row {idx+1}: missing name or location'))
+                if not r['name'] or not r['location']:
+                    skipped += 1
                     continue
+                pairs.append((r['name'], r['location']))
+
+            coords = geocoder.geocode_many(loc for _, loc in pairs)
 
-                try:
-                    # Try geocoding; use Google if configured otherwise Nominatim
-                    geocode_result = None
-                    lat = None
-                    lon = None
-                    if use_google:
-                        try:
-                            res = gmaps.geocode(location_text)
-                            if res and len(res) > 0:
-                                loc = res[0]['geometry']['location']
-                                lat = float(loc.get('lat'))
-                                lon = float(loc.get('lng'))
-                            else:
-                                self.stdout.write(self.style.WARNING(f'No geocode for "{name}" -> "{location_text}" (Google)'))
-                                processed += 1
-                                time.sleep(delay)
-                                continue
-                        except Exception as e:
-                            self.stdout.write(self.style.ERROR(f'Google geocode error for "{location_text}": {e}'))
-                            processed += 1
-                            time.sleep(delay)
-                            continue
-                    else:
-                        # Nominatim with retry
-                        attempts = 0
-                        while attempts < 3:
-                            try:
-                                geocode_result = geolocator.geocode(location_text, timeout=10)
-                                break
-                            except GeocoderTimedOut:
-                                attempts += 1
-                                time.sleep(1)
-                            except GeocoderServiceError as e:
-                                self.stdout.write(self.style.ERROR(f'Geocoder service error: {e}'))
-                                break
-
-                        if not geocode_result:
-                            self.stdout.write(self.style.WARNING(f'No geocode for "{name}" -> "{location_text}"'))
-                            processed += 1
-                            time.sleep(delay)
-                            continue
-
-                        lat = geocode_result.latitude
-                        lon = geocode_result.longitude
-
-                    self.stdout.write(self.style.SUCCESS(f'Row {idx+1}: {name} -> {lat:.6f},{lon:.6f}'))
-
-                    # Find clients with matching region name
-                    region_objs = Region.objects.filter(name__iexact=name)
-                    if not region_objs.exists():
-                        # try partial match
-                        region_objs = Region.objects.filter(name__icontains=name)
-
-                    if not region_objs.exists():
+            by_region = {}
+            for name, loc in pairs:
+                ll = coords.get(loc)
+                if ll is None:
+                    if verbose:
+                        self.stdout.write(self.style.WARNING(f'No geocode for "{name}" -> "{loc}"'))
+                    continue
+                region_ids = region_index.match(name)
+                if not region_ids:
+                    unmatched += 1
+                    if verbose:
                         self.stdout.write(self.style.WARNING(f'No Region found for "{name}". Skipping client updates.'))
-                    else:
-                        for region in region_objs:
-                            clients = Client.objects.filter(region=region)
-                            if not clients.exists():
-                                self.stdout.write(self.style.WARNING(f'No Clients found for Region "{region.name}"'))
-                                continue
-                            for c in clients:
-                                cur_lat = getattr(c, 'location_lat', 0) or 0
-                                cur_lon = getattr(c, 'location_lon', 0) or 0
-                                if (cur_lat == 0 and cur_lon == 0) or force:
-                                    self.stdout.write(f'  -> Updating Client {c.id} ({c.full_name})')
-                                    if not dry_run:
-                                        c.location_lat = lat
-                                        c.location_lon = lon
-                                        c.save()
-                                else:
-                                    self.stdout.write(f'  -> Skipping Client {c.id} ({c.full_name}) (coords exist)')
-
-                    processed += 1
-                    time.sleep(delay)
-
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'Error processing row {idx+1}: {e}'))
-                    processed += 1
-                    time.sleep(delay)
-
-        self.stdout.write(self.style.NOTICE(f'Finished. Processed {processed} rows.'))
+                    continue
+                for rid in region_ids:
+                    # force: oxirgi qator yutadi; aks holda birinchisi (bo'sh koordinatani birinchi to'ldirgan)
+                    if force:
+                        by_region[rid] = ll
+                    elif rid not in assigned:
+                        by_region.setdefault(rid, ll)
+
+            if not force:
+                assigned.update(by_region)
+
+            updated += apply_region_coordinates(by_region, force=force, dry_run=dry_run)
+            done = offset + len(batch)
+            if not dry_run:
+                checkpoint.save(signature, done, updated=updated)
+            self.stdout.write(f'  rows {done}/{end}: {geocoder.stats.as_dict()}, clients updated={updated}')
+
+        if not dry_run and end >= len(rows):
+            checkpoint.clear()
+
+        verb = 'would update' if dry_run else 'updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished. {end - start} rows, {skipped} skipped (missing name/location), '
+            f'{unmatched} without region, {verb} {updated} clients. {geocoder.stats.as_dict()}'
+        ))
+
+
+class _RegionIndex:
+    """Region nomi bo'yicha: avval aniq (registrsiz) moslik, bo'lmasa qism-satr."""
+
+    def __init__(self, regions):
+        self.regions = [(rid, (name or '').lower()) for rid, name in regions]
+        self.exact = {}
+        for rid, name in self.regions:
+            self.exact.setdefault(name, []).append(rid)
+
+    def match(self, name):
+        key = (name or '').strip().lower()
+        if not key:
+            return []
+        if key in self.exact:
+            return self.exact[key]
+        return [rid for rid, n in self.regions if key in n]
@@ -1,14 +1,61 @@
-# admin_panel/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
-from django.contrib.auth.models import User
+
+from suv_tashish_crm import actors
+from suv_tashish_crm.models import Client
+
+from .context_processors import invalidate_sidebar_debtors
 from .models import AdminProfile
 
+# Eslatma: oldingi versiyada bu yerda ``User`` post_save -> ``create_admin_profile``
+# (har bir yangi userga AdminProfile) bor edi, lekin modul hech qayerda import
+# qilinmagani uchun (``AdminPanelConfig.ready`` yo'q edi) u hech qachon ishlamagan.
+# Modul endi ``ready()`` da ulanadi — qabul qiluvchini saqlab qolish uni birinchi marta
+# yoqib, har bir kuryer/mijoz useriga AdminProfile yaratgan bo'lardi. Shuning uchun olib
+# tashlandi; xulq baseline bilan bir xil.
+
+# sidebar qarzdorlar keshiga ta'sir qiladigan maydonlar
+WATCHED_FIELDS = ('debt', 'last_order', 'business_id')
+_SNAPSHOT_ATTR = '_sidebar_debtors_snapshot'
+
+
+def _snapshot(instance):
+    # __dict__ dan o'qiymiz: .only()/.defer() bilan yuklangan obyektda ortiqcha so'rov bo'lmasin
+    d = instance.__dict__
+    return tuple(d.get(f) for f in WATCHED_FIELDS)
+
+
+def _invalidate_on_commit(*business_ids):
+    def _run():
+        for business_id in set(business_ids):
+            invalidate_sidebar_debtors(business_id)
+    transaction.on_commit(_run)
+
+
+@receiver(post_init, sender=Client)
+def _client_post_init(sender, instance, **kwargs):
+    setattr(instance, _SNAPSHOT_ATTR, _snapshot(instance))
+
+
+@receiver(post_save, sender=Client)
+def _client_post_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not (set(update_fields) & {'debt', 'last_order', 'business'}):
+        return
+    before = getattr(instance, _SNAPSHOT_ATTR, None)
+    after = _snapshot(instance)
+    setattr(instance, _SNAPSHOT_ATTR, after)
+    if created or before != after:
+        _invalidate_on_commit(after[2], before[2] if before else None)
+
+
+@receiver(post_delete, sender=Client)
+def _client_post_delete(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.__dict__.get('business_id'))
+
 
-@receiver(post_save, sender=User)
-def create_admin_profile(sender, instance, created, **kwargs):
-    if created:
-        AdminProfile.objects.create(
-            user=instance,
-            full_name=instance.get_full_name() or instance.username
-        )
+@receiver(post_save, sender=AdminProfile)
+@receiver(post_delete, sender=AdminProfile)
+def _admin_profile_changed(sender, instance, **kwargs):
+    # actor keshidagi admin_profile_id / business_id eskirdi
+    actors.invalidate_on_commit(instance.__dict__.get('user_id'))
@@ -25,6 +25,7 @@ urlpatterns = [
     path("clients/", views.clients_list, name="clients_list"),            # ✅ list
     path("clients/add/", views.add_client, name="add_client"),
     path("clients/import/", import_clients_ui, name="clients_import"),
+    path("clients/map/", views.clients_map_api, name="clients_map_api"),
     # path("clients/export_excel/", views.export_admin_clients_excel, name="export_admin_clients_excel"),
     path("clients/<int:client_id>/edit/", views.edit_client, name="edit_client"),
     path("clients/<int:client_id>/delete/", views.delete_client, name="delete_client"),
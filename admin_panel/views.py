@@ -1,161 +1,47 @@
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Count, Sum, Q
-from suv_tashish_crm.models import Order, Client, Courier, Region, Admin
+from django.db.models.functions import TruncMonth
+from suv_tashish_crm.models import Order, Client, Courier, Region, Admin, DailyOrderStats
+from suv_tashish_crm.dashboard import get_dashboard_stats
+from suv_tashish_crm import actors, client_map, reference_data, table_reader
 from django.utils import timezone
 import random
 from decimal import Decimal
 import datetime
 import json
 import csv
+import logging
 import os
 import re
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 def admin_dashboard(request):
     # Auth guard temporarily disabled; re-enable when ready
-    today_orders = Order.objects.filter(created_at__date=timezone.localdate()).count()
-    active_couriers = Courier.objects.filter(is_active=True).count()
-    total_clients = Client.objects.count()
-    debtors = Client.objects.filter(debt__gt=0).count()
-
-    top_debtors_qs = Client.objects.filter(debt__gt=0).order_by('-debt')[:5]
-    # prefer CSV names for clients that have generic 'Mijoz ...' placeholders
-    static_regions = []
-    try:
-        static_regions = read_csv_data()
-    except Exception:
-        static_regions = []
-
-    def _normalize_to_998(raw_digits: str):
-        if not raw_digits:
-            return None
-        d = ''.join(ch for ch in raw_digits if ch.isdigit())
-        if len(d) < 9:
-            return None
-        last9 = d[-9:]
-        std = '998' + last9
-        if len(std) == 12:
-            return std
-        return None
-
-    csv_phone_map = {}
-    csv_phone_by_last6 = {}
-    for r in static_regions:
-        p = (r.get('phone') or '').strip()
-        norm = _normalize_to_998(p)
-        if norm:
-            csv_phone_map[norm] = r.get('name')
-        digits_only = ''.join(ch for ch in p if ch.isdigit())
-        if len(digits_only) >= 6:
-            csv_phone_by_last6[digits_only[-6:]] = r.get('name')
+    # barcha hisoblagichlar va grafik qatorlari bitta servisdan (guruhlangan so'rovlar)
+    stats = get_dashboard_stats(days=30, top=5)
 
+    top_debtors_qs = Client.objects.filter(debt__gt=0).select_related('region').order_by('-debt')[:5]
     top_debtors = []
     for c in top_debtors_qs:
         name = c.full_name or ''
-        # prefer CSV mapping when name is generic
+        # prefer CSV mapping when name is generic (registry: phone / last-6 index)
         use_name = name
         if (not name) or name.strip().lower().startswith('mijoz'):
-            norm = _normalize_to_998(c.phone or '')
-            if norm and norm in csv_phone_map:
-                use_name = csv_phone_map.get(norm)
-            else:
-                # try last-6 fallback
-                digits_only = ''.join(ch for ch in (c.phone or '') if ch.isdigit())
-                if len(digits_only) >= 6 and digits_only[-6:] in csv_phone_by_last6:
-                    use_name = csv_phone_by_last6.get(digits_only[-6:])
-
-        top_debtors.append({'id': c.id, 'full_name': use_name, 'region': getattr(c.region, 'name', None), 'debt': getattr(c, 'debt', 0)})
-    # Build simple stats for the chart: last 7 days and last 30 days
-    weekly_labels = []
-    weekly_counts = []
-    monthly_labels = []
-    monthly_counts = []
-    try:
-        today = timezone.localdate()
-        # last 7 days
-        for i in range(6, -1, -1):
-            day = today - datetime.timedelta(days=i)
-            weekly_labels.append(day.strftime('%a'))
-            weekly_counts.append(Order.objects.filter(created_at__date=day).count())
-
-        # last 30 days: labels are day numbers (e.g., '01', '02', ...)
-        for i in range(29, -1, -1):
-            day = today - datetime.timedelta(days=i)
-            monthly_labels.append(day.strftime('%d %b'))
-            monthly_counts.append(Order.objects.filter(created_at__date=day).count())
-    except Exception:
-        weekly_labels = ['Mon','Tue','Wed','Thu','Fri','Sat','Sun']
-        weekly_counts = [0,0,0,0,0,0,0]
-        monthly_labels = [f"{i+1}" for i in range(30)]
-        monthly_counts = [0] * 30
-
-    # Top clients by number of orders (for dashboard sidebar)
-    try:
-        top_clients_qs = (
-            Order.objects.values('client__id', 'client__full_name')
-            .annotate(orders_count=Count('id'))
-            .order_by('-orders_count')[:5]
-        )
-        top_clients = [{'id': t['client__id'], 'full_name': t.get('client__full_name') or '—', 'orders_count': t.get('orders_count', 0)} for t in top_clients_qs]
-    except Exception:
-        top_clients = []
-    # Top couriers by delivered orders (dynamic)
-    try:
-        top_couriers_qs = (
-            Order.objects.filter(status='done')
-            .values('courier__id', 'courier__full_name')
-            .annotate(delivered=Count('id'))
-            .order_by('-delivered')[:5]
-        )
-        top_couriers = [{'id': t.get('courier__id'), 'full_name': t.get('courier__full_name') or '—', 'delivered': t.get('delivered', 0)} for t in top_couriers_qs]
-    except Exception:
-        top_couriers = []
-
-    # Orders per region (dynamic)
-    try:
-        region_stats_qs = (
-            Order.objects.values('client__region__name')
-            .annotate(total_orders=Count('id'))
-            .order_by('-total_orders')[:10]
-        )
-        region_stats = [{'region': t.get('client__region__name') or '—', 'total_orders': t.get('total_orders', 0)} for t in region_stats_qs]
-    except Exception:
-        region_stats = []
-
-    # Pending orders count (orders awaiting delivery) and today's revenue
-    try:
-        pending_count = Order.objects.filter(status__in=['assigned', 'delivering']).count()
-    except Exception:
-        pending_count = 0
-
-    try:
-        today = timezone.localdate()
-    except Exception:
-        today = datetime.date.today()
-
-    try:
-        revenue_qs = Order.objects.filter(
-            Q(delivered_at__date=today) | (Q(status='done') & Q(created_at__date=today))
-        )
-        agg = revenue_qs.aggregate(total=Sum('payment_amount'))
-        today_total = agg.get('total') or 0
-        try:
-            # convert Decimal to int for display in UZS (fallback to 0)
-            today_revenue = int(today_total)
-        except Exception:
             try:
-                today_revenue = int(float(today_total))
+                use_name = reference_data.name_for_phone(c.phone) or name
             except Exception:
-                today_revenue = 0
-    except Exception:
-        today_revenue = 0
+                use_name = name
 
+        top_debtors.append({'id': c.id, 'full_name': use_name, 'region': getattr(c.region, 'name', None), 'debt': getattr(c, 'debt', 0)})
     # Recent orders for the small table on dashboard
     try:
         recent_qs = Order.objects.select_related('client').order_by('-created_at')[:8]
@@ -182,40 +68,29 @@ def admin_dashboard(request):
         recent_orders = []
 
     context = {
-        'today_orders': today_orders,
-        'active_couriers': active_couriers,
-        'total_clients': total_clients,
-        'debtors': debtors,
+        'today_orders': stats.today_orders,
+        'active_couriers': stats.active_couriers,
+        'total_clients': stats.total_clients,
+        'debtors': stats.debtors,
         'top_debtors': top_debtors,
-        'top_clients': top_clients,
-        'pending_count': pending_count,
-        'today_revenue': today_revenue,
+        'top_clients': stats.top_clients,
+        'pending_count': stats.pending_count,
+        'today_revenue': stats.today_revenue,
         'recent_orders': recent_orders,
-        'top_couriers': top_couriers,
-        'region_stats': region_stats,
-        'weekly_labels_json': json.dumps(weekly_labels, ensure_ascii=False),
-        'weekly_data_json': json.dumps(weekly_counts),
-        'monthly_labels_json': json.dumps(monthly_labels, ensure_ascii=False),
-        'monthly_data_json': json.dumps(monthly_counts),
+        'top_couriers': stats.top_couriers,
+        'region_stats': stats.region_stats,
+        'weekly_labels_json': json.dumps(stats.weekly_labels, ensure_ascii=False),
+        'weekly_data_json': json.dumps(stats.weekly_counts),
+        'monthly_labels_json': json.dumps(stats.monthly_labels, ensure_ascii=False),
+        'monthly_data_json': json.dumps(stats.monthly_counts),
     }
 
     return render(request, 'admin/admin_dashboard.html', context)
 
 
 def read_csv_data():
-    regions = []
-    csv_path = os.path.join(BASE_DIR, 'Volidam.csv')
-    with open(csv_path, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)  # Skip header
-        for row in reader:
-            regions.append({
-                'name': row[0],
-                'bottle': row[1],
-                'location': row[2],
-                'phone': row[3] if len(row) > 3 else ''
-            })
-    return regions
+    # parsed once and cached until Volidam.csv changes (suv_tashish_crm.reference_data)
+    return reference_data.volidam_rows()
 
 
 def regions_view(request):
@@ -372,72 +247,110 @@ def region_clients_api(request):
     """Return JSON list of clients for a given region name.
 
     Query param: ?name=<region name>
+    Optional ``bbox``/``zoom`` (yoki ``tile``) — ``clients_map_api`` kabi tile'lab, klasterlab.
     """
     name = request.GET.get('name') or request.POST.get('name')
     if not name:
         return JsonResponse({'status': 'error', 'message': 'Region name required.'}, status=400)
 
-    try:
-        clients_qs = Client.objects.filter(region__name=name)
-    except Exception:
-        clients_qs = Client.objects.none()
+    if request.GET.get('bbox') or request.GET.get('tile'):
+        return _client_map_response(request, client_map.MapFilter(region=name))
 
+    rows = Client.objects.filter(region__name=name).values(
+        'id', 'full_name', 'phone', 'location_lat', 'location_lon', 'note',
+    )
     clients = []
-    for c in clients_qs:
+    for c in rows:
         try:
-            lat = float(getattr(c, 'location_lat', 0) or 0)
-            lon = float(getattr(c, 'location_lon', 0) or 0)
+            lat = float(c['location_lat'] or 0)
+            lon = float(c['location_lon'] or 0)
         except Exception:
             lat = 0.0
             lon = 0.0
 
         clients.append({
-            'id': c.id,
-            'full_name': c.full_name,
-            'phone': c.phone,
+            'id': c['id'],
+            'full_name': c['full_name'],
+            'phone': c['phone'],
             'lat': lat,
             'lon': lon,
-            'note': c.note or '',
+            'note': c['note'] or '',
         })
 
     return JsonResponse({'status': 'ok', 'clients': clients})
 
 
 def clients_positions_api(request):
-    """Return JSON list of all clients with lat/lon for admin map display."""
-    try:
-        qs = Client.objects.all()
-    except Exception:
-        qs = Client.objects.none()
+    """Return JSON list of all clients with lat/lon for admin map display.
+
+    ``bbox``/``zoom`` (yoki ``tile``) berilsa — faqat ko'rinib turgan qism (``clients_map_api``).
+    """
+    if request.GET.get('bbox') or request.GET.get('tile'):
+        return _client_map_response(request, client_map.MapFilter(region=request.GET.get('region')))
+
+    rows = Client.objects.exclude(location_lat__isnull=True).exclude(location_lon__isnull=True).values_list(
+        'id', 'full_name', 'phone', 'location_lat', 'location_lon', 'region__name',
+    )
     items = []
-    for c in qs:
+    for cid, full_name, phone, lat, lon, region in rows:
         try:
-            lat = float(getattr(c, 'location_lat', 0) or 0)
-            lon = float(getattr(c, 'location_lon', 0) or 0)
+            lat = float(lat or 0)
+            lon = float(lon or 0)
         except Exception:
             lat = 0.0; lon = 0.0
         # skip clients without a meaningful location
         if lat == 0 and lon == 0:
             continue
-        items.append({'id': c.id, 'full_name': c.full_name, 'phone': c.phone, 'lat': lat, 'lon': lon, 'region': getattr(c.region, 'name', None)})
+        items.append({'id': cid, 'full_name': full_name, 'phone': phone, 'lat': lat, 'lon': lon, 'region': region})
     return JsonResponse({'status': 'ok', 'clients': items})
 
 
+def _client_map_response(request, flt):
+    tile = request.GET.get('tile')
+    try:
+        if tile:
+            parsed = client_map.parse_tile(tile)
+            data = client_map.merge(client_map.get_tiles([parsed], flt), parsed[0])
+        else:
+            data = client_map.viewport(
+                client_map.parse_bbox(request.GET.get('bbox')), int(request.GET.get('zoom', 12)), flt,
+            )
+    except ValueError as e:
+        message = str(e) if str(e).isupper() else 'BAD_PARAMS'
+        return JsonResponse({'status': 'error', 'message': message}, status=400)
+
+    response = JsonResponse({'status': 'ok', **data})
+    if tile:
+        # tile URL'i o'zgarmas — brauzer ham qisqa muddat keshlasin
+        response['Cache-Control'] = 'private, max-age=%d' % min(60, getattr(settings, 'CLIENT_MAP_TILE_TTL', 300))
+    return response
+
+
+def clients_map_api(request):
+    """Admin xaritasi: ``?bbox=west,south,east,north&zoom=12`` yoki ``?tile=z/x/y``.
+
+    Past zoom'da server tomonda klasterlangan (``clusters``), yuqori zoom'da alohida
+    nuqtalar (``clients``). Ixtiyoriy ``region`` — id yoki nom.
+    """
+    if not (request.GET.get('bbox') or request.GET.get('tile')):
+        return JsonResponse({'status': 'error', 'message': 'bbox or tile required.'}, status=400)
+    return _client_map_response(request, client_map.MapFilter(region=request.GET.get('region')))
+
+
 def clients_view(request):
     # Auth guard temporarily disabled; re-enable when ready
     # Provide dynamic client profiles to template
     try:
-        static_regions = read_csv_data()
+        static_map = reference_data.volidam().location_by_name
     except Exception:
-        static_regions = []
-    static_map = {r.get('name'): r.get('location') for r in static_regions}
-    clients_qs = Client.objects.select_related('region').all()
+        static_map = {}
+    clients_qs = Client.objects.select_related('region', 'latest_order').all()
     clients = []
     for c in clients_qs:
         address = ''
         if c.region:
             address = static_map.get(c.region.name) or getattr(c.region, 'name', '')
-        last_order = Order.objects.filter(client=c).order_by('-created_at').first()
+        last_order = c.latest_order
         last_order_date = ''
         if last_order and getattr(last_order, 'created_at', None):
             try:
@@ -591,8 +504,11 @@ def orders_view(request):
     except Exception:
         static_regions = []
 
-    # build a mapping from region name -> location (CSV 'location' column)
-    static_location_map = {r.get('name'): r.get('location') for r in static_regions}
+    # mapping from region name -> location (CSV 'location' column), prebuilt in the registry
+    try:
+        static_location_map = reference_data.volidam().location_by_name
+    except Exception:
+        static_location_map = {}
 
     orders = []
     for o in orders_qs:
@@ -711,7 +627,7 @@ def orders_view(request):
     )
 
     # Also provide all client profiles so the Orders page can show "all profiles"
-    clients_qs = Client.objects.select_related('region').all()
+    clients_qs = Client.objects.select_related('region', 'latest_order').all()
 
     profiles = []
     for c in clients_qs:
@@ -719,8 +635,8 @@ def orders_view(request):
         if c.region:
             address = static_location_map.get(c.region.name) or getattr(c.region, 'name', '')
 
-        # last order status
-        last_order = Order.objects.filter(client=c).order_by('-created_at').first()
+        # last order status (Client.latest_order — denormalized, N+1 yo'q)
+        last_order = c.latest_order
         if last_order:
             st = getattr(last_order, "status", "")
             if st == 'done':
@@ -880,8 +796,7 @@ def edit_client(request, client_id):
         return redirect('orders_view')
 
     # Prepare regions list with CSV 'location' as display text when available
-    static_regions = read_csv_data()
-    static_map = {r.get('name'): r.get('location') for r in static_regions}
+    static_map = reference_data.volidam().location_by_name
     regions_qs = Region.objects.order_by('name')
     regions_with_location = [(r.id, static_map.get(r.name) or r.name) for r in regions_qs]
     return render(request, 'admin/edit_client.html', {'client': client, 'regions_with_location': regions_with_location})
@@ -928,9 +843,9 @@ def add_courier(request):
     # Build region choices: prefer DB Regions, but append unique CSV locations for convenience
     # Build region choices: prefer CSV 'location' values first to avoid CSV-name pollution
     try:
-        static_regions = read_csv_data()
+        csv_locations = reference_data.csv_locations()
     except Exception:
-        static_regions = []
+        csv_locations = ()
     try:
         db_regions = list(Region.objects.order_by('name'))
     except Exception:
@@ -939,9 +854,8 @@ def add_courier(request):
     seen = set()
     region_choices = []
     # prefer CSV locations (these are actual hudud names in Volidam.csv)
-    for r in static_regions:
-        loc = (r.get('location') or '').strip()
-        if loc and loc not in seen:
+    for loc in csv_locations:
+        if loc not in seen:
             seen.add(loc)
             region_choices.append({'value': loc, 'label': loc})
     # then append DB regions that are not duplicates
@@ -994,9 +908,9 @@ def edit_courier(request, courier_id):
     except Exception:
         db_regions = []
     try:
-        static_regions = read_csv_data()
+        csv_locations = reference_data.csv_locations()
     except Exception:
-        static_regions = []
+        csv_locations = ()
 
     seen = set()
     region_choices = []
@@ -1005,9 +919,8 @@ def edit_courier(request, courier_id):
         if name and name not in seen:
             seen.add(name)
             region_choices.append({'value': str(r.id), 'label': name})
-    for r in static_regions:
-        loc = (r.get('location') or '').strip()
-        if loc and loc not in seen:
+    for loc in csv_locations:
+        if loc not in seen:
             seen.add(loc)
             region_choices.append({'value': loc, 'label': loc})
 
@@ -1040,22 +953,25 @@ def reports_view(request):
     except Exception:
         today = datetime.date.today()
 
+    # Hammasi DailyOrderStats rollupidan: har bir kun/oy uchun alohida so'rov o'rniga 2 ta GROUP BY
     # Weekly: last 7 days (labels and sums)
     weekly_labels = []
     weekly_data = []
     try:
+        week_start = today - datetime.timedelta(days=6)
+        by_day = {
+            r['date']: r
+            for r in DailyOrderStats.objects.filter(date__gte=week_start, date__lte=today)
+            .values('date')
+            .annotate(total=Sum('payment_total'), delivered=Sum('delivered_count'))
+            .order_by()
+        }
         for i in range(6, -1, -1):
             day = today - datetime.timedelta(days=i)
             weekly_labels.append(day.strftime('%a'))
-            # Sum payment_amount for orders delivered that day (prefer delivered_at, fallback to created_at)
-            qs = Order.objects.filter(
-                Q(delivered_at__date=day) | (Q(status='done') & Q(created_at__date=day))
-            )
-            total = qs.aggregate(total=Sum('payment_amount'))
-            val = total.get('total')
+            r = by_day.get(day) or {}
             # fallback to count of delivered orders if payment_amount not set
-            if not val:
-                val = qs.count()
+            val = r.get('total') or r.get('delivered') or 0
             try:
                 weekly_data.append(int(val))
             except Exception:
@@ -1068,18 +984,25 @@ def reports_view(request):
     monthly_labels = []
     monthly_data = []
     try:
+        months = []
         for i in range(11, -1, -1):
             ref = (today.replace(day=1) - datetime.timedelta(days=1)) - datetime.timedelta(days=30 * i)
-            year = ref.year
-            month = ref.month
+            months.append((ref.year, ref.month))
             monthly_labels.append(ref.strftime('%b'))
-            qs = Order.objects.filter(
-                Q(delivered_at__year=year, delivered_at__month=month) | (Q(status='done') & Q(created_at__year=year, created_at__month=month))
-            )
-            total = qs.aggregate(total=Sum('payment_amount'))
-            val = total.get('total')
-            if not val:
-                val = qs.count()
+        first_year, first_month = min(months)
+        by_month = {}
+        for r in (
+            DailyOrderStats.objects.filter(date__gte=datetime.date(first_year, first_month, 1))
+            .annotate(month=TruncMonth('date'))
+            .values('month')
+            .annotate(total=Sum('payment_total'), delivered=Sum('delivered_count'))
+            .order_by()
+        ):
+            m = r['month']
+            by_month[(m.year, m.month)] = r
+        for key in months:
+            r = by_month.get(key) or {}
+            val = r.get('total') or r.get('delivered') or 0
             try:
                 monthly_data.append(int(val))
             except Exception:
@@ -1092,9 +1015,9 @@ def reports_view(request):
     top_couriers = []
     try:
         qs = (
-            Order.objects.filter(status='done')
+            DailyOrderStats.objects.filter(done_count__gt=0)
             .values('courier__id', 'courier__full_name')
-            .annotate(delivered=Count('id'))
+            .annotate(delivered=Sum('done_count'))
             .order_by('-delivered')[:5]
         )
         max_delivered = 0
@@ -1124,9 +1047,9 @@ def courier_ranking_view(request):
     """Show courier ranking based on number of delivered orders."""
     try:
         qs = (
-            Order.objects.filter(status='done')
+            DailyOrderStats.objects.filter(done_count__gt=0)
             .values('courier__id', 'courier__full_name')
-            .annotate(delivered=Count('id'))
+            .annotate(delivered=Sum('done_count'))
             .order_by('-delivered')
         )
         ranking = []
@@ -1198,44 +1121,13 @@ def debtors_view(request):
     except Exception:
         clients_qs = Client.objects.filter(debt__gt=0).select_related('region')
     now = timezone.now()
-    # load static CSV mapping (phone -> csv name) to prefer CSV name when available
+    # CSV indexes (region name -> location, phone -> name) come prebuilt from the registry
     try:
-        static_regions = read_csv_data()
+        static_location_map = reference_data.volidam().location_by_name
     except Exception:
-        static_regions = []
-
-    # build mapping from CSV region name -> CSV location (address)
-    static_location_map = { r.get('name'): r.get('location') for r in static_regions }
-
-    def _normalize_to_998(raw_digits: str):
-        """Normalize any digits string to the form '998' + 9 local digits (12 digits total).
-        Returns the normalized digits (without '+') or None if not possible.
-        Strategy: take the last 9 digits as local number and prepend '998'.
-        """
-        if not raw_digits:
-            return None
-        d = ''.join(ch for ch in raw_digits if ch.isdigit())
-        if len(d) < 9:
-            return None
-        last9 = d[-9:]
-        std = '998' + last9
-        if len(std) == 12:
-            return std
-        return None
-
-    csv_phone_map = {}
-    for r in static_regions:
-        p = (r.get('phone') or '').strip()
-        norm = _normalize_to_998(p)
-        if norm:
-            csv_phone_map[norm] = r.get('name')
+        static_location_map = {}
 
-    # build a fallback mapping by last-6-digits to catch phones with different formatting
-    csv_phone_by_last6 = {}
-    for r in static_regions:
-        p = ''.join(ch for ch in (r.get('phone') or '') if ch.isdigit())
-        if len(p) >= 6:
-            csv_phone_by_last6[p[-6:]] = r.get('name')
+    _normalize_to_998 = reference_data.normalize_to_998
 
     # Prefer real couriers from DB; fallback to a small static list if none
     try:
@@ -1278,6 +1170,8 @@ def debtors_view(request):
             return True
         return False
 
+    # last order + its courier come from the denormalized Client fields (one query)
+    clients_qs = clients_qs.select_related('latest_order', 'last_courier')
     for c in clients_qs:
         # skip synthetic/static seeded clients so admin shows only real clients
         try:
@@ -1286,12 +1180,12 @@ def debtors_view(request):
         except Exception:
             # on unexpected error, skip this client to avoid showing bad data
             continue
-        last_order = Order.objects.filter(client=c).order_by('-created_at').first()
+        last_order = c.latest_order
         order_id = last_order.id if last_order else None
         # Determine courier info: prefer order.courier if present, otherwise pick a static courier
-        if last_order and last_order.courier:
-            courier_name = last_order.courier.full_name
-            courier_phone = getattr(last_order.courier, 'phone', '-')
+        if last_order and c.last_courier:
+            courier_name = c.last_courier.full_name
+            courier_phone = getattr(c.last_courier, 'phone', '-')
         else:
             # pick a courier deterministically by client id from the DB-derived list
             sc = couriers_list[c.id % len(couriers_list)]
@@ -1329,16 +1223,10 @@ def debtors_view(request):
             formatted_phone = digits or raw_phone
 
         # If CSV has a name for this phone, prefer it. Also try last-6-digits fallback.
-        csv_name = None
-        if norm and norm in csv_phone_map:
-            csv_name = csv_phone_map.get(norm)
-        else:
-            # try fallback by last-6-digits
-            digits_only = ''.join(ch for ch in raw_phone if ch.isdigit())
-            if len(digits_only) >= 6:
-                last6 = digits_only[-6:]
-                if last6 in csv_phone_by_last6:
-                    csv_name = csv_phone_by_last6.get(last6)
+        try:
+            csv_name = reference_data.name_for_phone(raw_phone)
+        except Exception:
+            csv_name = None
 
         # If we found a better name in CSV and client currently has a generic 'Mijoz N' name, update DB
         try:
@@ -1655,48 +1543,8 @@ from openpyxl import load_workbook
 import os
 
 def read_couriers_xlsx_locations():
-    # ✅ couriers.xlsx joyi:
-    xlsx_path = os.path.join(settings.BASE_DIR, "couriers.xlsx")
-    # agar "data" papkada bo‘lsa buni ishlat:
-    # xlsx_path = os.path.join(settings.BASE_DIR, "data", "couriers.xlsx")
-
-    print("XLSX PATH:", xlsx_path)  # ✅ debug
-    if not os.path.exists(xlsx_path):
-        print("❌ couriers.xlsx topilmadi!")
-        return []
-
-    wb = load_workbook(xlsx_path, data_only=True)
-    ws = wb.active
-
-    # headerlar
-    headers = []
-    for cell in ws[1]:
-        headers.append((str(cell.value).strip().lower() if cell.value else ""))
-
-    print("HEADERS:", headers)  # ✅ debug
-
-    candidates = ["hudud", "manzil", "location", "region", "address"]
-    col_idx = None
-    for i, h in enumerate(headers):
-        if any(k in h for k in candidates):
-            col_idx = i + 1
-            break
-
-    # agar header topilmasa -> 1-ustun deb olamiz
-    if col_idx is None:
-        col_idx = 1
-
-    seen = set()
-    locations = []
-    for r in range(2, ws.max_row + 1):
-        val = ws.cell(row=r, column=col_idx).value
-        loc = (str(val).strip() if val is not None else "")
-        if loc and loc not in seen:
-            seen.add(loc)
-            locations.append(loc)
-
-    print("LOC COUNT:", len(locations))  # ✅ debug
-    return locations
+    # ✅ couriers.xlsx bir marta o'qiladi, fayl o'zgarsa qayta (suv_tashish_crm.reference_data)
+    return list(reference_data.courier_locations())
 
 def edit_client(request, client_id):
     client = get_object_or_404(Client.objects.select_related("region"), pk=client_id)
@@ -1767,6 +1615,7 @@ def delete_client(request, client_id):
     messages.success(request, "Mijoz o‘chirildi.")
     return redirect("admin_panel:clients_list") 
 import re
+import uuid
 from openpyxl import load_workbook
 from django.shortcuts import redirect
 from django.contrib import messages
@@ -1789,8 +1638,8 @@ def admin_clients_upload_excel(request):
     if not _is_admin(request):
         return redirect("admin_panel:clients_list")
 
-    # Joriy admin biznesini aniqlash
-    my_business = _get_my_business(request.user)
+    # Joriy admin biznesini aniqlash (admin profili, bo'lmasa kuryer/mijoz — suv_tashish_crm.actors)
+    my_business = actors.resolve_user(request.user).business
     if not my_business:
         messages.error(request, "Sizga biznes biriktirilmagan! Admin panelda biznesni tekshiring.")
         return redirect("admin_panel:clients_list")
@@ -1801,57 +1650,80 @@ def admin_clients_upload_excel(request):
         return redirect("admin_panel:clients_list")
 
     try:
-        from openpyxl import load_workbook
-        wb = load_workbook(filename=f, data_only=True)
-        ws = wb.active
-        
+        # read_only: sheet oqim bilan o'qiladi, butun workbook xotiraga olinmaydi
+        rows = table_reader.iter_xlsx_rows(f)
+
         # Headerlarni tekshirish
         expected = ["full_name", "bottle_soni", "manzili", "phone"]
-        header = [str(ws.cell(row=1, column=i).value).strip().lower() for i in range(1, 5)]
+        first = next(rows, None) or ()
+        header = [str(first[i] if i < len(first) else None).strip().lower() for i in range(4)]
 
         if header != expected:
+            rows.close()
             messages.error(request, f"Excel sarlavhasi xato! Kerakli: {', '.join(expected)}")
             return redirect("admin_panel:clients_list")
 
         created, skipped = 0, 0
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row or not any(row): continue
-            
-            name = str(row[0]).strip() if row[0] else ""
-            phone_raw = row[3]
-            phone_norm = _norm_phone(phone_raw) # Telefonni formatlash
+        row_errors = []  # (qator raqami, xato) — foydalanuvchiga ko'rsatiladi
+        line_no = 1  # 1 — sarlavha
+        for batch in table_reader.batched(rows):
+            numbered = []
+            for row in batch:
+                line_no += 1
+                if row and any(row):
+                    numbered.append((line_no, row))
+            batch = [row for _, row in numbered]
+            # Faqat shu biznes ichida takrorlanishni tekshirish — partiya uchun bitta so'rov
+            phones = {_norm_phone(row[3] if len(row) > 3 else None) for row in batch}
+            existing = set(
+                Client.objects.filter(phone__in=[p for p in phones if p], business=my_business)
+                .values_list("phone", flat=True)
+            )
 
-            if not name:
-                skipped += 1
-                continue
+            for row_no, row in numbered:
+                name = str(row[0]).strip() if row[0] else ""
+                phone_raw = row[3] if len(row) > 3 else None
+                phone_norm = _norm_phone(phone_raw) # Telefonni formatlash
 
-            # Faqat shu biznes ichida takrorlanishni tekshirish
-            if phone_norm and Client.objects.filter(phone=phone_norm, business=my_business).exists():
-                skipped += 1
-                continue
+                if not name:
+                    skipped += 1
+                    continue
+
+                if phone_norm and phone_norm in existing:
+                    skipped += 1
+                    continue
 
-            try:
-                # Bottle sonini o'girish
                 try:
-                    b_val = int(float(row[1])) if row[1] not in (None, "") else 1
-                except:
-                    b_val = 1
-
-                # Client modeliga moslab saqlash
-                Client.objects.create(
-                    business=my_business,  # 👈 Multi-tenancy ulanishi
-                    full_name=name,
-                    phone=phone_norm if phone_norm else f"no_phone_{uuid.uuid4().hex[:6]}",
-                    note=str(row[2]).strip() if row[2] else "", # 'manzili' -> 'note'ga tushadi
-                    bottle_balance=b_val,
-                    must_change_password=True
-                )
-                created += 1
-            except Exception as e:
-                print(f"Row error: {e}") # Debug uchun
-                skipped += 1
+                    # Bottle sonini o'girish
+                    try:
+                        b_val = int(float(row[1])) if row[1] not in (None, "") else 1
+                    except:
+                        b_val = 1
+
+                    manzil = row[2] if len(row) > 2 else None
+                    # Client modeliga moslab saqlash (savepoint: yiqilgan qator keyingilarini buzmasin)
+                    with transaction.atomic():
+                        Client.objects.create(
+                            business=my_business,  # 👈 Multi-tenancy ulanishi
+                            full_name=name,
+                            phone=phone_norm if phone_norm else f"no_phone_{uuid.uuid4().hex[:6]}",
+                            note=str(manzil).strip() if manzil else "", # 'manzili' -> 'note'ga tushadi
+                            bottle_balance=b_val,
+                            must_change_password=True
+                        )
+                    if phone_norm:
+                        existing.add(phone_norm)
+                    created += 1
+                except Exception as e:
+                    logger.warning("clients excel upload: row %s failed: %s", row_no, e)
+                    row_errors.append((row_no, str(e)[:200]))
+                    skipped += 1
 
         messages.success(request, f"Muvaffaqiyatli: {created} ta mijoz. O'tkazildi: {skipped} ta.")
+        if row_errors:
+            shown = "; ".join(f"{n}-qator: {err}" for n, err in row_errors[:5])
+            more = f" (yana {len(row_errors) - 5} ta)" if len(row_errors) > 5 else ""
+            messages.warning(request, f"Xatolik bo'lgan qatorlar: {shown}{more}")
     except Exception as e:
         messages.error(request, f"Tizim xatosi: {str(e)}")
     
@@ -1,14 +1,12 @@
-import csv
-import io
-from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.db import transaction
 
-from openpyxl import load_workbook
-
+from suv_tashish_crm import client_map, table_reader
 from suv_tashish_crm.models import Client, Courier
 
 
@@ -37,44 +35,17 @@ def _ensure_group(name: str) -> Group:
     return g
 
 
-def _read_csv_bytes(data: bytes) -> List[Dict[str, str]]:
-    text = data.decode("utf-8-sig", errors="ignore")
-    f = io.StringIO(text)
-    reader = csv.DictReader(f)
-    rows = []
-    for r in reader:
-        rows.append({(k or "").strip().lower(): (v or "").strip() for k, v in r.items()})
-    return rows
-
-
-def _read_xlsx_bytes(data: bytes) -> List[Dict[str, str]]:
-    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
-    ws = wb.active
-    rows_iter = ws.iter_rows(values_only=True)
-    try:
-        header = next(rows_iter)
-    except StopIteration:
-        return []
-    header = [(str(h).strip().lower() if h is not None else "") for h in header]
-    out: List[Dict[str, str]] = []
-    for row in rows_iter:
-        d = {}
-        for i, key in enumerate(header):
-            if not key:
-                continue
-            val = row[i] if i < len(row) else None
-            d[key] = "" if val is None else str(val).strip()
-        out.append(d)
-    return out
-
-
-def read_table_upload(uploaded_file) -> Tuple[List[Dict[str, str]], str]:
-    name = (getattr(uploaded_file, "name", "") or "").lower()
-    data = uploaded_file.read()
-    if name.endswith(".csv"):
-        return _read_csv_bytes(data), "csv"
-    if name.endswith(".xlsx") or name.endswith(".xlsm") or name.endswith(".xltx"):
-        return _read_xlsx_bytes(data), "xlsx"
+def read_table_upload(uploaded_file) -> Tuple[Iterator[Dict[str, str]], str]:
+    """Qatorlarni generator sifatida qaytaradi — fayl butunlay xotiraga olinmaydi."""
+    kind = table_reader.table_kind(getattr(uploaded_file, "name", ""))
+    if kind == "csv":
+        return table_reader.iter_dict_rows(table_reader.iter_csv_rows(uploaded_file)), "csv"
+    if kind == "xlsx":
+        try:
+            rows = table_reader.iter_xlsx_rows(uploaded_file)
+        except Exception:
+            raise ValueError("BAD_XLSX_FILE")
+        return table_reader.iter_dict_rows(rows), "xlsx"
     raise ValueError("UNSUPPORTED_FILE_TYPE")
 
 
@@ -87,127 +58,259 @@ class ImportResult:
     errors: List[Dict]
 
 
-def import_clients(rows: List[Dict[str, str]], default_password: str, mode: str = "upsert") -> ImportResult:
-    client_group = _ensure_group("client")
-    errors: List[Dict] = []
-    created = updated = skipped = 0
+# bitta tranzaksiyada yoziladigan qatorlar soni
+IMPORT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class _Row:
+    idx: int
+    full_name: str
+    phone: str
+    email: str
+    address: str = ""
+    lat: str = ""
+    lon: str = ""
+
+
+@dataclass
+class _ChunkStats:
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    new_profiles: int = 0
+    errors: List[Dict] = field(default_factory=list)
+
+
+def _iter_chunks(rows: Iterable[Dict[str, str]], result: ImportResult, with_location: bool,
+                 size: int = IMPORT_CHUNK_SIZE) -> Iterator[List[_Row]]:
+    """Qatorlarni tekshiradi (bo'sh ism/telefon, fayl ichidagi dublikat) va
+    ``size`` tadan bo'lib beradi. ``rows`` generator bo'lishi mumkin."""
+    seen = set()
+    chunk: List[_Row] = []
+    for idx, r in enumerate(rows, start=2):  # 1 header
+        result.total += 1
+        full_name = (r.get("full_name") or r.get("name") or "").strip()
+        phone = _norm_phone(r.get("phone") or r.get("tel") or r.get("mobile") or "")
+        email = (r.get("email") or "").strip()
+
+        if not full_name or not phone:
+            result.skipped += 1
+            result.errors.append({"row": idx, "error": "MISSING_FULL_NAME_OR_PHONE"})
+            continue
+        if phone in seen:
+            result.skipped += 1
+            result.errors.append({"row": idx, "error": "DUPLICATE_PHONE_IN_FILE", "phone": phone})
+            continue
+        seen.add(phone)
+
+        row = _Row(idx=idx, full_name=full_name, phone=phone, email=email)
+        if with_location:
+            row.address = (r.get("address") or r.get("addr") or "").strip()
+            row.lat = r.get("lat") or r.get("location_lat") or ""
+            row.lon = r.get("lon") or r.get("location_lon") or ""
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _resolve_users(chunk: List[_Row], profiles: Dict[str, object], mode: str, group: Group,
+                   password_hash: str, stats: _ChunkStats) -> Dict[str, object]:
+    """phone -> User. Yangi userlar, email o'zgarishlari va guruh a'zoligi — bulk."""
+    phones = [r.phone for r in chunk]
+    users = {u.username: u for u in User.objects.filter(username__in=phones)}
+
+    resolved: Dict[str, object] = {}
+    new_users = []
+    email_updates = {}
+    for r in chunk:
+        user = users.get(r.phone)
+        profile = profiles.get(r.phone)
+        if user is None and mode == "upsert" and profile is not None and profile.user_id:
+            user = profile.user
+        if user is None:
+            user = User(username=r.phone, email=r.email or "", password=password_hash)
+            new_users.append(user)
+            stats.created += 1
+        else:
+            if r.email and user.email != r.email:
+                user.email = r.email
+                email_updates[user.pk] = user
+            stats.updated += 1
+        resolved[r.phone] = user
+
+    if new_users:
+        User.objects.bulk_create(new_users)
+        if any(u.pk is None for u in new_users):
+            # bulk insert pk qaytarmaydigan backend
+            ids = dict(User.objects.filter(username__in=[u.username for u in new_users]).values_list("username", "pk"))
+            for u in new_users:
+                u.pk = ids.get(u.username)
+    if email_updates:
+        User.objects.bulk_update(list(email_updates.values()), ["email"])
+
+    through = User.groups.through
+    user_ids = {u.pk for u in resolved.values()}
+    through.objects.bulk_create(
+        [through(user_id=uid, group_id=group.pk) for uid in user_ids],
+        ignore_conflicts=True,
+    )
+    return resolved
+
+
+def _notify_new_profiles(count: int, title: str, text: str) -> None:
+    """bulk_create ``post_save`` yubormaydi: har bir profil uchun alohida xabar o'rniga bitta xulosa."""
+    from suv_tashish_crm.models import Notification
+    from suv_tashish_crm.outbox import enqueue_telegram
+
+    try:
+        Notification.objects.create(title=title, message=text)
+        enqueue_telegram(text)
+    except Exception:
+        pass
+
+
+def _notify_new_clients(count: int) -> None:
+    _notify_new_profiles(count, 'Yangi mijozlar', f"👤 Importdan {count} ta yangi mijoz qo'shildi")
 
+
+def _notify_new_couriers(count: int) -> None:
+    _notify_new_profiles(count, 'Yangi kuryerlar', f"🚚 Importdan {count} ta yangi kuryer qo'shildi")
+
+
+def _write(rows: List[_Row], write_chunk, group, password_hash) -> _ChunkStats:
+    stats = _ChunkStats()
     with transaction.atomic():
-        seen = set()
-        for idx, r in enumerate(rows, start=2):  # 1 header
-            full_name = (r.get("full_name") or r.get("name") or "").strip()
-            phone = _norm_phone(r.get("phone") or r.get("tel") or r.get("mobile") or "")
-            email = (r.get("email") or "").strip()
-            address = (r.get("address") or r.get("addr") or "").strip()
-            lat = r.get("lat") or r.get("location_lat") or ""
-            lon = r.get("lon") or r.get("location_lon") or ""
-
-            if not full_name or not phone:
-                skipped += 1
-                errors.append({"row": idx, "error": "MISSING_FULL_NAME_OR_PHONE"})
-                continue
-            if phone in seen:
-                skipped += 1
-                errors.append({"row": idx, "error": "DUPLICATE_PHONE_IN_FILE", "phone": phone})
-                continue
-            seen.add(phone)
-
-            user = User.objects.filter(username=phone).first()
-            client = Client.objects.filter(phone=phone).first()
-
-            if user is None and mode == "upsert" and client and client.user:
-                user = client.user
-
-            if user is None:
-                user = User(username=phone, email=email or "")
-                user.set_password(default_password)
-                user.save()
-                user.groups.add(client_group)
-                created += 1
-            else:
-                # ensure group
-                user.groups.add(client_group)
-                # update email if provided
-                if email and user.email != email:
-                    user.email = email
-                    user.save(update_fields=["email"])
-                updated += 1
+        write_chunk(rows, group, password_hash, stats)
+    return stats
 
+
+def _write_chunk_or_rows(chunk: List[_Row], write_chunk, group, password_hash) -> List[_ChunkStats]:
+    """Partiyani bitta tranzaksiyada yozadi; yiqilsa (masalan IntegrityError) qatorma-qator
+    qayta urinadi — yaxshi qatorlar import bo'ladi, xatosi faqat yomon qatorlarga yoziladi."""
+    try:
+        return [_write(chunk, write_chunk, group, password_hash)]
+    except Exception as e:
+        if len(chunk) == 1:
+            stats = _ChunkStats(skipped=1)
+            stats.errors.append({"row": chunk[0].idx, "error": "ROW_FAILED", "phone": chunk[0].phone,
+                                 "detail": str(e)[:200]})
+            return [stats]
+    return [s for r in chunk for s in _write_chunk_or_rows([r], write_chunk, group, password_hash)]
+
+
+def _import_chunks(rows, default_password: Optional[str], mode: str, group_name: str, with_location: bool,
+                   write_chunk, password_hash: Optional[str] = None, on_chunk=None) -> Tuple[ImportResult, int]:
+    """``on_chunk(result)`` — har bir partiya commit bo'lgandan keyin (progress uchun)."""
+    group = _ensure_group(group_name)
+    if not password_hash:
+        password_hash = make_password(default_password)  # bir marta — har bir user uchun emas
+    result = ImportResult(total=0, created=0, updated=0, skipped=0, errors=[])
+    new_profiles = 0
+
+    for chunk in _iter_chunks(rows, result, with_location):
+        for stats in _write_chunk_or_rows(chunk, write_chunk, group, password_hash):
+            result.created += stats.created
+            result.updated += stats.updated
+            result.skipped += stats.skipped
+            result.errors.extend(stats.errors)
+            new_profiles += stats.new_profiles
+        if on_chunk is not None:
+            on_chunk(result)
+    return result, new_profiles
+
+
+def import_clients(rows: Iterable[Dict[str, str]], default_password: Optional[str] = None, mode: str = "upsert",
+                   password_hash: Optional[str] = None, on_chunk=None) -> ImportResult:
+    def write_chunk(chunk: List[_Row], group, password_hash, stats: _ChunkStats):
+        clients = {
+            c.phone: c
+            for c in Client.objects.filter(phone__in=[r.phone for r in chunk]).select_related("user")
+        }
+        users = _resolve_users(chunk, clients, mode, group, password_hash, stats)
+
+        to_create, to_update = [], []
+        for r in chunk:
+            user = users[r.phone]
+            client = clients.get(r.phone)
             if client is None:
-                client = Client(phone=phone, full_name=full_name, user=user)
+                client = Client(phone=r.phone, full_name=r.full_name, user=user)
+                to_create.append(client)
             else:
                 if mode == "create_only":
                     # already exists -> skip
-                    skipped += 1
+                    stats.skipped += 1
                     continue
                 client.user = user
-                client.full_name = full_name or client.full_name
+                client.full_name = r.full_name or client.full_name
+                to_update.append(client)
 
-            if address:
-                client.note = (client.note or "") + (("\n" if client.note else "") + f"Address: {address}")
+            if r.address:
+                client.note = (client.note or "") + (("\n" if client.note else "") + f"Address: {r.address}")
             # location
             try:
-                if lat:
-                    client.location_lat = float(str(lat).replace(",", "."))
-                if lon:
-                    client.location_lon = float(str(lon).replace(",", "."))
+                if r.lat:
+                    client.location_lat = float(str(r.lat).replace(",", "."))
+                if r.lon:
+                    client.location_lon = float(str(r.lon).replace(",", "."))
             except Exception:
-                errors.append({"row": idx, "error": "BAD_LAT_LON", "lat": lat, "lon": lon})
-
+                stats.errors.append({"row": r.idx, "error": "BAD_LAT_LON", "lat": r.lat, "lon": r.lon})
             client.must_change_password = True
-            client.save()
-    return ImportResult(total=len(rows), created=created, updated=updated, skipped=skipped, errors=errors)
-
-
-def import_couriers(rows: List[Dict[str, str]], default_password: str, mode: str = "upsert") -> ImportResult:
-    courier_group = _ensure_group("courier")
-    errors: List[Dict] = []
-    created = updated = skipped = 0
-
-    with transaction.atomic():
-        seen = set()
-        for idx, r in enumerate(rows, start=2):
-            full_name = (r.get("full_name") or r.get("name") or "").strip()
-            phone = _norm_phone(r.get("phone") or r.get("tel") or r.get("mobile") or "")
-            email = (r.get("email") or "").strip()
-
-            if not full_name or not phone:
-                skipped += 1
-                errors.append({"row": idx, "error": "MISSING_FULL_NAME_OR_PHONE"})
-                continue
-            if phone in seen:
-                skipped += 1
-                errors.append({"row": idx, "error": "DUPLICATE_PHONE_IN_FILE", "phone": phone})
-                continue
-            seen.add(phone)
-
-            user = User.objects.filter(username=phone).first()
-            courier = Courier.objects.filter(phone=phone).first()
-            if user is None and mode == "upsert" and courier and courier.user:
-                user = courier.user
-
-            if user is None:
-                user = User(username=phone, email=email or "")
-                user.set_password(default_password)
-                user.save()
-                user.groups.add(courier_group)
-                created += 1
-            else:
-                user.groups.add(courier_group)
-                if email and user.email != email:
-                    user.email = email
-                    user.save(update_fields=["email"])
-                updated += 1
 
+        if to_create:
+            Client.objects.bulk_create(to_create)
+        if to_update:
+            Client.objects.bulk_update(
+                to_update, ["user", "full_name", "note", "location_lat", "location_lon", "must_change_password"],
+            )
+        stats.new_profiles = len(to_create)
+
+    result, new_clients = _import_chunks(rows, default_password, mode, "client", True, write_chunk,
+                                         password_hash=password_hash, on_chunk=on_chunk)
+    if new_clients:
+        _notify_new_clients(new_clients)
+    if result.created or result.updated:
+        # bulk_create/bulk_update signal yubormaydi
+        client_map.invalidate()
+    return result
+
+
+def import_couriers(rows: Iterable[Dict[str, str]], default_password: Optional[str] = None, mode: str = "upsert",
+                    password_hash: Optional[str] = None, on_chunk=None) -> ImportResult:
+    def write_chunk(chunk: List[_Row], group, password_hash, stats: _ChunkStats):
+        couriers: Dict[str, Courier] = {}
+        # Courier.phone unique emas — eskidek birinchisini olamiz
+        for c in Courier.objects.filter(phone__in=[r.phone for r in chunk]).select_related("user").order_by("pk"):
+            couriers.setdefault(c.phone, c)
+        users = _resolve_users(chunk, couriers, mode, group, password_hash, stats)
+
+        to_create, to_update = [], []
+        for r in chunk:
+            user = users[r.phone]
+            courier = couriers.get(r.phone)
             if courier is None:
-                courier = Courier(phone=phone, full_name=full_name, user=user)
+                courier = Courier(phone=r.phone, full_name=r.full_name, user=user)
+                to_create.append(courier)
             else:
                 if mode == "create_only":
-                    skipped += 1
+                    stats.skipped += 1
                     continue
                 courier.user = user
-                courier.full_name = full_name or courier.full_name
-
+                courier.full_name = r.full_name or courier.full_name
+                to_update.append(courier)
             courier.must_change_password = True
-            courier.save()
-    return ImportResult(total=len(rows), created=created, updated=updated, skipped=skipped, errors=errors)
+
+        if to_create:
+            Courier.objects.bulk_create(to_create)
+        if to_update:
+            Courier.objects.bulk_update(to_update, ["user", "full_name", "must_change_password"])
+        stats.new_profiles = len(to_create)
+
+    result, new_couriers = _import_chunks(rows, default_password, mode, "courier", False, write_chunk,
+                                          password_hash=password_hash, on_chunk=on_chunk)
+    if new_couriers:
+        _notify_new_couriers(new_couriers)
+    return result
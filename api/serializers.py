@@ -1,5 +1,11 @@
 from rest_framework import serializers
 from suv_tashish_crm.models import Order
+from suv_tashish_crm.projection import Col, Computed, Projection
+
+def _total_display(amt):
+    # 1 250 000 UZS ko‘rinishida
+    return f"{int(amt or 0):,} UZS".replace(",", " ")
+
 
 class OrderSerializer(serializers.ModelSerializer):
     client_name = serializers.CharField(source='client.full_name', read_only=True)
@@ -7,12 +13,12 @@ class OrderSerializer(serializers.ModelSerializer):
     lat = serializers.FloatField(source='client.location_lat', read_only=True)
     lon = serializers.FloatField(source='client.location_lon', read_only=True)
 
+    bottle_count = serializers.IntegerField(source='bottles', read_only=True)
+
     total_display = serializers.SerializerMethodField()
 
     def get_total_display(self, obj):
-        amt = getattr(obj, "payment_amount", 0) or 0
-        # 1 250 000 UZS ko‘rinishida
-        return f"{int(amt):,} UZS".replace(",", " ")
+        return _total_display(getattr(obj, "payment_amount", 0))
 
     class Meta:
         model = Order
@@ -21,3 +27,21 @@ class OrderSerializer(serializers.ModelSerializer):
             'bottle_count', 'created_at', 'payment_amount',
             'lat', 'lon', 'total_display'
         ]
+
+
+# OrderSerializer bilan bir xil chiqish — ro'yxatlar uchun (values_list, instance'siz)
+ORDER_LIST_ROW = Projection({
+    'id': 'id',
+    'client_name': 'client__full_name',
+    'client_phone': 'client__phone',
+    'status': 'status',
+    'bottle_count': 'bottles',
+    'created_at': Col('created_at', convert=serializers.DateTimeField().to_representation),
+    'payment_amount': Col(
+        'payment_amount',
+        convert=serializers.DecimalField(max_digits=10, decimal_places=2).to_representation,
+    ),
+    'lat': Col('client__location_lat', convert=float),
+    'lon': Col('client__location_lon', convert=float),
+    'total_display': Computed(_total_display, ('payment_amount',)),
+})
@@ -0,0 +1,1210 @@
+import csv
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from api.serializers import ORDER_LIST_ROW, OrderSerializer
+from client_panel import serializers as client_serializers
+from suv_tashish_crm import (
+    actors, dispatch, geocoding, imports, jwt_claims, order_flow, outbox, pagination, positions, tracks,
+)
+from suv_tashish_crm.renderers import FastJSONRenderer
+from suv_tashish_crm.models import (
+    Business, Client, Courier, CourierTrack, DailyOrderStats, GeocodeCache, Order, OutboundMessage, Region,
+)
+
+
+class HotPathIndexTests(TestCase):
+    """Order/Client hot-path so'rovlari EXPLAIN bo'yicha kerakli indeksdan foydalanadimi.
+
+    SQLite va PostgreSQL'da ishlaydi; statistikalar uchun ANALYZE qilinadi, aks holda
+    planner bo'sh jadvalda indeksni tanlamasligi mumkin.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(42)
+        now = timezone.now()
+        cls.now = now
+        cls.businesses = Business.objects.bulk_create([Business(name=f"B{i}") for i in range(5)])
+        cls.couriers = Courier.objects.bulk_create([
+            Courier(full_name=f"K{i}", phone=f"99891{i:07d}", business=cls.businesses[i % 5]) for i in range(10)
+        ])
+        cls.clients = Client.objects.bulk_create([
+            Client(
+                full_name=f"C{i}",
+                phone=f"99890{i:07d}",
+                business=cls.businesses[i % 5],
+                debt=Decimal("15000") if i % 40 == 0 else Decimal("0"),
+                last_order=now - datetime.timedelta(days=365 if i % 50 == 0 else rnd.randint(0, 20)),
+            )
+            for i in range(400)
+        ])
+
+        statuses = ["done"] * 16 + ["canceled", "assigned", "delivering", "pending"]
+        orders = []
+        for _ in range(4000):
+            status = rnd.choice(statuses)
+            courier = None if status == "pending" else rnd.choice(cls.couriers)
+            orders.append(Order(
+                client=rnd.choice(cls.clients),
+                courier=courier,
+                business=rnd.choice(cls.businesses),
+                bottles=rnd.randint(1, 4),
+                status=status,
+                delivered_at=now - datetime.timedelta(hours=rnd.randint(0, 2000)) if status == "done" else None,
+            ))
+        Order.objects.bulk_create(orders, batch_size=500)
+        # created_at auto_now_add — yoyilgan vaqtlar uchun keyin yangilaymiz
+        for i, pk in enumerate(Order.objects.values_list("pk", flat=True)):
+            orders[i].pk = pk
+            orders[i].created_at = now - datetime.timedelta(hours=(i * 7) % 2400)
+        Order.objects.bulk_update(orders, ["created_at"], batch_size=500)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(f"ANALYZE {Order._meta.db_table}")
+                cursor.execute(f"ANALYZE {Client._meta.db_table}")
+            else:
+                cursor.execute("ANALYZE")
+
+    def setUp(self):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            self.skipTest("EXPLAIN format faqat SQLite/PostgreSQL uchun tekshiriladi")
+        if connection.vendor == "postgresql":
+            # kichik test jadvalida seq scan arzonroq ko'rinadi — planner indeks tanlovini tekshiramiz
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, qs, index_name):
+        plan = qs.explain()
+        self.assertIn(index_name, plan, msg=f"{index_name} ishlatilmadi:\n{plan}")
+
+    def test_business_created_at(self):
+        qs = Order.objects.filter(
+            business=self.businesses[0],
+            created_at__gte=self.now - datetime.timedelta(days=7),
+        )
+        self.assertUsesIndex(qs, "order_business_created_idx")
+
+    def test_courier_status_delivered_at(self):
+        qs = Order.objects.filter(courier=self.couriers[0], status="done").order_by("-delivered_at")
+        self.assertUsesIndex(qs, "order_courier_status_dlv_idx")
+
+    def test_status_in_progress(self):
+        qs = Order.objects.filter(status__in=["assigned", "delivering"])
+        self.assertUsesIndex(qs, "order_status_courier_idx")
+
+    def test_pending_unassigned_partial(self):
+        qs = Order.objects.filter(status="pending", courier__isnull=True).order_by("-created_at")[:50]
+        self.assertUsesIndex(qs, "order_pending_unassigned_idx")
+
+    def test_client_debtors(self):
+        self.assertUsesIndex(Client.objects.filter(debt__gt=0), "client_debt_idx")
+
+    def test_client_last_order(self):
+        qs = Client.objects.filter(last_order__lt=self.now - datetime.timedelta(days=180))
+        self.assertUsesIndex(qs, "client_last_order_idx")
+
+    def _keyset_page(self, qs, keyset):
+        page = qs.order_by(*keyset.order_by())[:51]
+        after = qs.order_by(*keyset.order_by()).filter(keyset.after([self.now, 10 ** 9]))[:51]
+        return page, after
+
+    def test_client_orders_keyset(self):
+        for qs in self._keyset_page(Order.objects.filter(client=self.clients[0]), pagination.BY_CREATED):
+            self.assertUsesIndex(qs, "order_client_created_idx")
+
+    def test_business_orders_keyset(self):
+        for qs in self._keyset_page(Order.objects.filter(business=self.businesses[0]), pagination.BY_CREATED):
+            self.assertUsesIndex(qs, "order_business_created_idx")
+
+    def test_courier_history_keyset(self):
+        qs = Order.objects.filter(courier=self.couriers[0], status="done")
+        for q in self._keyset_page(qs, pagination.BY_DELIVERED):
+            self.assertUsesIndex(q, "order_courier_status_dlv_idx")
+
+
+class OrderClaimStressTests(TransactionTestCase):
+    """Ko'p thread bir xil orderlarni bir vaqtda olishga urinadi: har biri aniq bitta g'olib,
+    bitta hodisa; qolganlar ``ALREADY_TAKEN`` (yoki ``CONFLICT``) oladi."""
+
+    THREADS = 12
+    ORDERS = 25
+
+    def setUp(self):
+        self.business = Business.objects.create(name="Stress")
+        self.couriers = Courier.objects.bulk_create([
+            Courier(full_name=f"S{i}", phone=f"99893{i:07d}", business=self.business) for i in range(self.THREADS)
+        ])
+        self.client_obj = Client.objects.create(full_name="Mijoz", phone="998930000000", business=self.business)
+        self.order_ids = [
+            Order.objects.create(client=self.client_obj, business=self.business, bottles=1).pk
+            for _ in range(self.ORDERS)
+        ]
+
+    def _race(self, fn):
+        """``fn(thread_index)`` ni ``THREADS`` ta threadda bir vaqtda ishga tushiradi."""
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            # shared-cache in-memory SQLite jadval qulfini kutmaydi ("table is locked")
+            self.skipTest("fayl SQLite (DB_TEST_NAME) yoki PostgreSQL kerak")
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker(i):
+            try:
+                barrier.wait()
+                fn(i)
+            except Exception as exc:  # pragma: no cover - xatoni asosiy threadga chiqaramiz
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_accept_has_single_winner(self):
+        results = []
+        lock = threading.Lock()
+
+        def claim_all(i):
+            ids = list(self.order_ids)
+            random.Random(i).shuffle(ids)
+            courier_id = self.couriers[i].pk
+            for oid in ids:
+                r = order_flow.accept(oid, courier_id)
+                with lock:
+                    results.append((oid, courier_id, r))
+
+        with mock.patch("suv_tashish_crm.events.publish") as publish:
+            self._race(claim_all)
+
+        winners = {}
+        for oid, courier_id, r in results:
+            if r.changed:
+                self.assertNotIn(oid, winners, "order ikki marta olindi")
+                winners[oid] = courier_id
+            else:
+                self.assertFalse(r.ok)
+                self.assertIn(r.reason, (order_flow.ALREADY_TAKEN, order_flow.CONFLICT))
+                self.assertEqual(r.http_status, 409)
+        self.assertEqual(set(winners), set(self.order_ids))
+
+        db = dict(Order.objects.filter(pk__in=self.order_ids, status="assigned").values_list("pk", "courier_id"))
+        self.assertEqual(db, winners)
+
+        # har bir order uchun bitta ``order.status`` hodisasi
+        status_events = [c.args[2]["order_id"] for c in publish.call_args_list if c.args[1] == "order.status"]
+        self.assertEqual(sorted(status_events), sorted(self.order_ids))
+
+        # rollup: yangilangan bucketlar DB bilan mos
+        stats = DailyOrderStats.objects.filter(business=self.business)
+        self.assertEqual(sum(stats.values_list("assigned_count", flat=True)), self.ORDERS)
+        self.assertEqual(sum(stats.values_list("pending_count", flat=True)), 0)
+
+    def test_concurrent_confirm_applies_once(self):
+        oid = self.order_ids[0]
+        courier_id = self.couriers[0].pk
+        self.assertTrue(order_flow.accept(oid, courier_id).changed)
+        results = []
+
+        def confirm(i):
+            results.append(order_flow.confirm(oid, courier_id, payment_type="cash", payment_amount=i))
+
+        self._race(confirm)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(sum(r.changed for r in results), 1)
+        self.assertEqual(Order.objects.get(pk=oid).status, "done")
+
+    def test_transition_rules(self):
+        oid = self.order_ids[0]
+        a, b = self.couriers[0].pk, self.couriers[1].pk
+        self.assertEqual(order_flow.start(oid, a).reason, order_flow.NOT_YOUR_ORDER)
+        self.assertTrue(order_flow.accept(oid, a).changed)
+        self.assertEqual(order_flow.accept(oid, b).reason, order_flow.ALREADY_TAKEN)
+        self.assertTrue(order_flow.accept(oid, a).ok)  # takroriy so'rov
+        self.assertEqual(order_flow.confirm(oid, b).http_status, 403)
+        self.assertTrue(order_flow.start(oid, a).changed)
+        self.assertTrue(order_flow.cancel(oid).changed)
+        r = order_flow.confirm(oid, a)
+        self.assertEqual((r.reason, r.detail), (order_flow.INVALID_STATUS, "INVALID_STATUS:canceled"))
+        self.assertEqual(order_flow.accept(10 ** 9, a).reason, order_flow.NOT_FOUND)
+
+    def test_save_after_transition_does_not_repeat_side_effects(self):
+        from suv_tashish_crm import client_summary, events, rollups
+
+        order = Order.objects.get(pk=self.order_ids[0])
+        with mock.patch.object(events, "order_event", wraps=events.order_event) as order_event:
+            self.assertTrue(order_flow.accept(order, self.couriers[0].pk).changed)
+            self.assertEqual(order.status, "assigned")
+            self.assertEqual(getattr(order, rollups._SNAPSHOT_ATTR), rollups._snapshot(order))
+            self.assertEqual(getattr(order, client_summary._SNAPSHOT_ATTR), client_summary._snapshot(order))
+            order.save()
+        self.assertEqual(order_event.call_count, 1)
+
+
+class KeysetPaginationTests(TestCase):
+    """Kursor bo'yicha oldinga/orqaga yurish: takror va tushib qolgan qatorlarsiz."""
+
+    @classmethod
+    def setUpTestData(cls):
+        business = Business.objects.create(name="B")
+        cls.client_obj = Client.objects.create(full_name="C", phone="998900000001", business=business)
+        cls.courier = Courier.objects.create(full_name="K", phone="998910000001", business=business)
+        now = timezone.now()
+        orders = Order.objects.bulk_create([
+            Order(client=cls.client_obj, courier=cls.courier, business=business, status="done",
+                  delivered_at=None if i % 4 == 0 else now - datetime.timedelta(minutes=i // 2))
+            for i in range(23)
+        ])
+        # bir xil created_at — tenglik holatida ``id`` ajratadi
+        for i, o in enumerate(orders):
+            o.created_at = now - datetime.timedelta(minutes=i // 3)
+        Order.objects.bulk_update(orders, ["created_at"])
+
+    def _walk(self, qs, keyset, page_size=5):
+        pages, cursor = [], None
+        while True:
+            page = pagination.paginate(qs, keyset, cursor, page_size)
+            pages.append(page)
+            if not page.next_cursor:
+                return pages
+            cursor = page.next_cursor
+
+    def _assert_walk(self, qs, keyset):
+        pages = self._walk(qs, keyset)
+        ids = [o.pk for p in pages for o in p.items]
+        expected = list(qs.order_by(*keyset.order_by()).values_list("pk", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertIsNone(pages[0].prev_cursor)
+        # orqaga: har bir sahifaning prev kursori oldingi sahifani qaytaradi
+        for before, page in zip(pages, pages[1:]):
+            back = pagination.paginate(qs, keyset, page.prev_cursor, 5)
+            self.assertEqual([o.pk for o in back.items], [o.pk for o in before.items])
+
+    def test_created_at_forward_and_back(self):
+        self._assert_walk(Order.objects.filter(client=self.client_obj), pagination.BY_CREATED)
+
+    def test_nullable_delivered_at(self):
+        qs = Order.objects.filter(courier=self.courier, status="done")
+        self._assert_walk(qs, pagination.BY_DELIVERED)
+        ids = [o.pk for p in self._walk(qs, pagination.BY_DELIVERED) for o in p.items]
+        self.assertIsNone(Order.objects.get(pk=ids[-1]).delivered_at)
+
+    def test_bad_cursor(self):
+        qs = Order.objects.all()
+        cursor = pagination.paginate(qs, pagination.BY_CREATED, None, 5).next_cursor
+        with self.assertRaises(pagination.InvalidCursor):
+            pagination.paginate(qs, pagination.BY_DELIVERED, cursor, 5)
+        with self.assertRaises(pagination.InvalidCursor):
+            pagination.paginate(qs, pagination.BY_CREATED, cursor[:-2] + "xx", 5)
+
+
+class ProjectionTests(TestCase):
+    """``values_list`` proyeksiyalari serializer bilan bir xil chiqish beradimi."""
+
+    @classmethod
+    def setUpTestData(cls):
+        business = Business.objects.create(name="B")
+        client = Client.objects.create(
+            full_name="C", phone="998900000001", business=business, location_lat=41.3, location_lon=69.2,
+        )
+        courier = Courier.objects.create(full_name="K", phone="998910000001", business=business)
+        Order.objects.bulk_create([
+            Order(client=client, courier=courier if i % 2 else None, business=business if i % 3 else None,
+                  bottles=i + 1, status="done" if i % 2 else "pending", note=f"n{i}",
+                  payment_amount=Decimal("1250000.5") if i % 2 else None, debt_change=Decimal(i),
+                  delivered_at=timezone.now() if i % 2 else None)
+            for i in range(9)
+        ])
+
+    def test_matches_serializers(self):
+        qs = Order.objects.select_related("client").order_by("-created_at", "-id")
+        self.assertEqual(ORDER_LIST_ROW.rows(qs), [dict(d) for d in OrderSerializer(qs, many=True).data])
+        expected = client_serializers.OrderSerializer(qs, many=True).data
+        self.assertEqual(
+            client_serializers.ORDER_ROW.rows(qs),
+            [dict(d, client=dict(d["client"]) if d["client"] else None) for d in expected],
+        )
+
+    def test_keyset_pages(self):
+        qs = Order.objects.all()
+        ids, cursor = [], None
+        while True:
+            page = ORDER_LIST_ROW.paginate(qs, pagination.BY_DELIVERED, cursor, 4)
+            ids += [row["id"] for row in page.items]
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(ids, list(qs.order_by(*pagination.BY_DELIVERED.order_by()).values_list("pk", flat=True)))
+
+    def test_renderer_matches_json_renderer(self):
+        qs = Order.objects.order_by("id")
+        data = {"results": ORDER_LIST_ROW.rows(qs), "at": timezone.now(), "d": Decimal("1.5"), "s": "o\u2028‘"}
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertNotIn("\u2028".encode(), fast)
+
+
+@override_settings(COURIER_POSITION_FLUSH_SECONDS=10 ** 6)
+class CourierTrackIngestTests(TestCase):
+    """Yaroqsiz ``order_id`` / noma'lum kuryer iz flush'ini to'xtatib qo'ymaydi."""
+
+    @classmethod
+    def setUpTestData(cls):
+        business = Business.objects.create(name="B")
+        cls.courier = Courier.objects.create(full_name="K", phone="998910000001", business=business)
+        client = Client.objects.create(full_name="C", phone="998900000001", business=business)
+        cls.order = Order.objects.create(client=client, courier=cls.courier, business=business, status="assigned")
+
+    def setUp(self):
+        cache.clear()
+        self.store = positions.LocMemPositionStore()
+        patcher = mock.patch.object(positions, "_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = timezone.now().timestamp()
+
+    def _track(self):
+        start = timezone.now() - datetime.timedelta(hours=1)
+        return tracks.load_track(self.courier.pk, start, timezone.now() + datetime.timedelta(minutes=1))
+
+    def test_bad_order_id_is_dropped_not_requeued(self):
+        fixes = [
+            {"lat": 41.3, "lon": 69.2, "ts": self.now - 30, "order_id": 2 ** 40},
+            {"lat": 41.3, "lon": 69.2, "ts": self.now - 20, "order_id": "abc"},
+            {"lat": 41.3, "lon": 69.2, "ts": self.now - 10, "order_id": self.order.pk},
+        ]
+        result = positions.record_positions(self.courier.pk, fixes, now=self.now)
+        self.assertEqual(result["accepted"], 3)
+        self.assertEqual(positions.flush_track(self.store), 3)
+        self.assertEqual([p[3] for p in self._track()], [None, None, self.order.pk])
+        self.assertEqual(self.store.pop_track(), [])
+
+    def test_unencodable_and_unknown_courier_points(self):
+        self.store.append_track([
+            positions.Position(self.courier.pk, 41.3, 69.2, self.now - 5, 2 ** 40),
+            positions.Position(self.courier.pk, float("nan"), 69.2, self.now - 4, None),
+            positions.Position(10 ** 6, 41.3, 69.2, self.now - 3, None),
+        ])
+        self.assertEqual(positions.flush_track(self.store), 1)
+        self.assertEqual(self.store.pop_track(), [])
+        self.assertEqual(len(self._track()), 1)
+        with self.assertRaises(positions.UnknownCourier):
+            positions.record_position(10 ** 6, 41.3, 69.2)
+
+    def test_flushes_append_chunks(self):
+        for i in range(3):
+            positions.record_positions(self.courier.pk, [{"lat": 41.3, "lon": 69.2, "ts": self.now - 10 + i}],
+                                       now=self.now)
+            positions.flush_track(self.store)
+        self.assertEqual(CourierTrack.objects.filter(courier=self.courier).count(), 3)
+        self.assertEqual(len(self._track()), 3)
+
+    def test_single_ping_rejects_invalid_coordinates(self):
+        for lat, lon in ((91, 69.2), (41.3, -181), (float("nan"), 69.2), (41.3, float("inf"))):
+            with self.assertRaises(positions.InvalidPosition):
+                positions.record_position(self.courier.pk, lat, lon)
+        self.assertIsNone(self.store.get(self.courier.pk))
+
+        user = get_user_model().objects.create_user("gps_courier", password="x")
+        Courier.objects.filter(pk=self.courier.pk).update(user=user)
+        self.client.force_login(user)
+        session = self.client.session
+        session["courier_id"] = self.courier.pk
+        session.save()
+        for url in ("/api/courier/update_position/", "/courier_panel/api/update_position/"):
+            for lat in ("nan", 95):
+                r = self.client.post(url, json.dumps({"lat": lat, "lon": 69.2}), content_type="application/json")
+                self.assertEqual(r.status_code, 400, url)
+                self.assertIn("INVALID_LAT_LON", r.content.decode())
+            r = self.client.post(url, json.dumps({"lat": 41.3, "lon": 69.2}), content_type="application/json")
+            self.assertEqual(r.status_code, 200, r.content)
+
+
+class OrderStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        business = Business.objects.create(name="SSE")
+        client = Client.objects.create(full_name="Mijoz", phone="998900000001", business=business)
+        cls.order = Order.objects.create(client=client, business=business, bottles=1)
+        User = get_user_model()
+        cls.admin = User.objects.create_user("sse_admin", password="x", is_staff=True)
+        cls.bare_courier = User.objects.create_user("sse_courier", password="x")
+        cls.bare_courier.groups.add(Group.objects.get_or_create(name="courier")[0])
+        cls.bare_client = User.objects.create_user("sse_client", password="x")
+
+    def _get(self, user):
+        self.client.force_login(user)
+        return self.client.get(f"/api/orders/{self.order.pk}/stream/")
+
+    def test_unlinked_profiles_are_rejected(self):
+        r = self._get(self.bare_courier)
+        self.assertEqual((r.status_code, r.json()["detail"]), (404, "COURIER_PROFILE_NOT_LINKED"))
+        # mijoz profili avtomatik bog'lanadi, lekin buyurtma uniki emas
+        self.assertEqual(self._get(self.bare_client).status_code, 404)
+
+    def test_stream_disabled_under_wsgi_by_default(self):
+        # test client — WSGI: SSE_ENABLED=auto bo'lsa oqim ochilmaydi, sahifa polling'da qoladi
+        self.assertEqual(self._get(self.admin).status_code, 204)
+        with override_settings(SSE_ENABLED="0"):
+            self.assertEqual(self._get(self.admin).status_code, 204)
+
+
+class ClientSummaryTests(TestCase):
+    def test_stale_client_save_keeps_summary(self):
+        client = Client.objects.create(full_name="Mijoz", phone="998900000002")
+        stale = Client.objects.get(pk=client.pk)
+        order = Order.objects.create(client=client, bottles=1)
+        stale.full_name = "Mijoz 2"
+        stale.save()
+        client.refresh_from_db()
+        self.assertEqual((client.orders_count, client.latest_order_id), (1, order.pk))
+        self.assertEqual(client.full_name, "Mijoz 2")
+
+    def test_explicit_update_fields_still_written(self):
+        client = Client.objects.create(full_name="Mijoz", phone="998900000003")
+        client.orders_count = 5
+        client.save(update_fields=["orders_count"])
+        client.refresh_from_db()
+        self.assertEqual(client.orders_count, 5)
+
+
+class ImportChunkRetryTests(TestCase):
+    def test_bad_row_does_not_fail_whole_chunk(self):
+        from api.import_utils import import_clients
+
+        # "+998901111112" nomli user boshqa mijozga bog'langan: yangi Client(user=...) OneToOne'ni buzadi
+        taken = get_user_model().objects.create_user("+998901111112", password="x")
+        Client.objects.create(full_name="Band", phone="+998909999999", user=taken)
+        rows = [
+            {"full_name": "Yaxshi", "phone": "+998901111111"},
+            {"full_name": "Yomon", "phone": "+998901111112"},
+            {"full_name": "Yaxshi 2", "phone": "+998901111113"},
+        ]
+        with mock.patch("suv_tashish_crm.outbox.enqueue_telegram") as enqueue:
+            result = import_clients(rows, default_password="x")
+        self.assertEqual([e["row"] for e in result.errors], [3])
+        self.assertEqual(result.errors[0]["error"], "ROW_FAILED")
+        self.assertEqual(Client.objects.filter(phone__in=["+998901111111", "+998901111113"]).count(), 2)
+        enqueue.assert_called_once()
+        self.assertIn("2 ta yangi mijoz", enqueue.call_args[0][0])
+
+    def test_courier_import_sends_summary(self):
+        from api.import_utils import import_couriers
+
+        with mock.patch("suv_tashish_crm.outbox.enqueue_telegram") as enqueue:
+            import_couriers([{"full_name": "K", "phone": "+998901111114"}], default_password="x")
+        enqueue.assert_called_once()
+        self.assertIn("1 ta yangi kuryer", enqueue.call_args[0][0])
+
+
+class ClientPanelCreateOrderTests(TestCase):
+    URL = "/client_panel/api/create_order/"
+
+    def setUp(self):
+        self.client_obj = Client.objects.create(full_name="Mijoz", phone="998900000004")
+        session = self.client.session
+        session["client_id"] = self.client_obj.pk
+        session.save()
+
+    @override_settings(TELEGRAM_BOT_TOKEN="t", TELEGRAM_CHAT_ID="1")
+    def test_order_and_notifications_commit_together(self):
+        from suv_tashish_crm.models import Notification, OutboundMessage
+
+        r = self.client.post(self.URL, {"bottles": "2", "note": "eshik oldida"})
+        self.assertEqual(r.json()["status"], "ok")
+        order = Order.objects.get(pk=r.json()["order_id"])
+        self.assertEqual(order.debt_change, Decimal(24000))
+        self.assertTrue(Notification.objects.filter(message__contains=f"#{order.pk}").exists())
+        self.assertTrue(OutboundMessage.objects.filter(text__contains=f"Order ID: {order.pk}").exists())
+
+    def test_outbox_failure_rolls_back_order(self):
+        from suv_tashish_crm.models import Notification
+
+        with mock.patch("suv_tashish_crm.outbox.notify_staff", side_effect=RuntimeError("outbox")):
+            r = self.client.post(self.URL, {"bottles": "1"})
+        self.assertEqual(r.json()["status"], "error")
+        self.assertFalse(Order.objects.filter(client=self.client_obj).exists())
+        self.assertFalse(Notification.objects.filter(title="Yangi buyurtma").exists())
+
+
+class GeocodingTests(TestCase):
+    def _geocoder(self, provider, **kwargs):
+        return geocoding.Geocoder(provider, backoff=0, **kwargs)
+
+    def test_normalized_addresses_are_looked_up_once(self):
+        provider = geocoding.FakeProvider()
+        addresses = ["Boysun, O‘zbekiston", "boysun  o'zbekiston.", "BOYSUN; Oʻzbekiston", "Sherobod"]
+        result = self._geocoder(provider).geocode_many(addresses)
+        self.assertEqual(len(provider.calls), 2)
+        self.assertEqual(set(result), set(addresses))
+        self.assertEqual(len({result[a] for a in addresses[:3]}), 1)
+
+    def test_second_run_uses_cache(self):
+        addresses = ["Boysun", "Sherobod", "Yo'q manzil"]
+        first = self._geocoder(geocoding.FakeProvider(fixtures={"Yo'q manzil": None})).geocode_many(addresses)
+        self.assertEqual(GeocodeCache.objects.count(), 3)
+
+        provider = geocoding.FakeProvider()
+        geocoder = self._geocoder(provider)
+        self.assertEqual(geocoder.geocode_many(addresses), first)
+        self.assertEqual(provider.calls, [])
+        self.assertEqual((geocoder.stats.cached, geocoder.stats.looked_up), (3, 0))
+
+    def test_failures_are_not_cached(self):
+        provider = geocoding.FakeProvider(fail=["Boysun"])
+        geocoder = self._geocoder(provider)
+        with self.assertLogs("suv_tashish_crm.geocoding", "WARNING"):
+            self.assertIsNone(geocoder.geocode_many(["Boysun", "Sherobod"])["Boysun"])
+        self.assertEqual(geocoder.stats.failed, 1)
+        self.assertFalse(GeocodeCache.objects.filter(key=geocoding.address_key("Boysun")).exists())
+
+        provider = geocoding.FakeProvider()
+        self.assertIsNotNone(self._geocoder(provider).geocode("Boysun"))
+        self.assertEqual(provider.calls, ["Boysun"])
+
+    def test_apply_region_coordinates_force(self):
+        region = Region.objects.create(name="Boysun")
+        empty = Client.objects.create(full_name="A", phone="998900000011", region=region)
+        zero = Client.objects.create(full_name="B", phone="998900000012", region=region,
+                                     location_lat=0, location_lon=0)
+        placed = Client.objects.create(full_name="C", phone="998900000013", region=region,
+                                       location_lat=38.1, location_lon=67.1)
+        coords = {region.pk: (38.2, 67.2)}
+
+        self.assertEqual(geocoding.apply_region_coordinates(coords, dry_run=True), 2)
+        self.assertEqual(geocoding.apply_region_coordinates(coords), 2)
+        for c in (empty, zero, placed):
+            c.refresh_from_db()
+        self.assertEqual([(c.location_lat, c.location_lon) for c in (empty, zero, placed)],
+                         [(38.2, 67.2), (38.2, 67.2), (38.1, 67.1)])
+
+        self.assertEqual(geocoding.apply_region_coordinates({region.pk: (38.3, 67.3)}, force=True), 3)
+        placed.refresh_from_db()
+        self.assertEqual((placed.location_lat, placed.location_lon), (38.3, 67.3))
+
+    def test_checkpoint_resume(self):
+        from django.core.management import call_command
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        tmp = tmp_dir.name
+        csv_path = os.path.join(tmp, "volidam.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("name\tbottle\tlocation\tphone\n")
+            f.write("Boysun\t1\tBoysun tumani\t901111111\n")
+            f.write("Sherobod\t1\tSherobod tumani\t902222222\n")
+            f.write("Denov\t1\tDenov tumani\t903333333\n")
+        checkpoint = geocoding.Checkpoint(os.path.join(tmp, "cp.json"))
+        signature = geocoding.Checkpoint.signature(csv_path)
+        self.assertEqual(checkpoint.load(signature), 0)
+        checkpoint.save(signature, 2)
+        self.assertEqual(checkpoint.load(signature), 2)
+        self.assertEqual(checkpoint.load(signature[:1] + [signature[1] + 1, signature[2]]), 0)
+
+        regions = {name: Region.objects.create(name=name) for name in ("Boysun", "Sherobod", "Denov")}
+        clients = {name: Client.objects.create(full_name=name, phone=f"99890000002{i}", region=r)
+                   for i, (name, r) in enumerate(regions.items())}
+        call_command("geocode_csv", csv_path=csv_path, provider="fake", resume=True, batch_size=1,
+                     checkpoint=checkpoint.path, stdout=io.StringIO())
+        for c in clients.values():
+            c.refresh_from_db()
+        # birinchi ikki qator checkpoint bo'yicha bajarilgan — faqat Denov yoziladi
+        self.assertIsNone(clients["Boysun"].location_lat)
+        self.assertIsNone(clients["Sherobod"].location_lat)
+        self.assertIsNotNone(clients["Denov"].location_lat)
+        # oxirigacha yetgach checkpoint o'chiriladi
+        self.assertFalse(os.path.exists(checkpoint.path))
+        self.assertEqual(GeocodeCache.objects.count(), 1)
+
+
+class DispatchScopeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.b1, cls.b2 = Business.objects.bulk_create([Business(name="D1"), Business(name="D2")])
+        cls.k1 = Courier.objects.create(full_name="K1", phone="998910000001", business=cls.b1, lat=41.30, lon=69.20)
+        cls.k2 = Courier.objects.create(full_name="K2", phone="998910000002", business=cls.b2, lat=41.30, lon=69.20)
+        cls.k0 = Courier.objects.create(full_name="K0", phone="998910000003", lat=41.50, lon=69.50)
+        cls.mijoz = Client.objects.create(full_name="M", phone="998900000031", location_lat=41.31, location_lon=69.21)
+        cls.admin = get_user_model().objects.create_user("dispatch_admin", password="x", is_staff=True)
+
+    def setUp(self):
+        dispatch.invalidate_index()
+        self.addCleanup(dispatch.invalidate_index)
+
+    def _order(self, business):
+        return Order.objects.create(client=self.mijoz, business=business, bottles=1)
+
+    def test_order_without_business_uses_unaffiliated_couriers_only(self):
+        ids = [c.courier_id for c in dispatch.nearest_couriers(self._order(None), k=5)]
+        self.assertEqual(ids, [self.k0.pk])
+
+    def test_assign_pending_keeps_tenants_apart(self):
+        o1, o2, o0 = self._order(self.b1), self._order(self.b2), self._order(None)
+        assigned = dict(dispatch.assign_pending(all_businesses=True))
+        self.assertEqual({oid: c.courier_id for oid, c in assigned.items()},
+                         {o1.pk: self.k1.pk, o2.pk: self.k2.pk, o0.pk: self.k0.pk})
+
+    def test_nearest_couriers_view_rejects_bad_params(self):
+        self.client.force_login(self.admin)
+        o = self._order(self.b1)
+        url = f"/api/admin/orders/{o.pk}/nearest_couriers/"
+        for query in ("k=nan", "k=inf", "k=abc", "max_km=nan", "max_km=inf", "max_km=-1"):
+            self.assertEqual(self.client.get(f"{url}?{query}").status_code, 400, query)
+        r = self.client.get(f"{url}?k=2&max_km=50")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([c["courier_id"] for c in r.json()["results"]], [self.k1.pk])
+
+    def test_deliveries_eta_requires_business(self):
+        from admin_panel.models import AdminProfile
+
+        cache.clear()
+        self.client.force_login(self.admin)
+        r = self.client.get("/api/admin/deliveries/eta/")
+        self.assertEqual(r.status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AdminProfile.objects.create(user=self.admin, business=self.b1, full_name="A")
+        self.assertEqual(self.client.get("/api/admin/deliveries/eta/").status_code, 200)
+
+
+class AdminOrderDoneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = Business.objects.create(name="Done")
+        cls.courier = Courier.objects.create(full_name="K", phone="998910000011", business=cls.business)
+        cls.mijoz = Client.objects.create(full_name="M", phone="998900000041", business=cls.business)
+        cls.admin = get_user_model().objects.create_user("done_admin", password="x", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _order(self, status, courier=None):
+        return Order.objects.create(client=self.mijoz, business=self.business, bottles=1,
+                                    status=status, courier=courier)
+
+    def test_done_goes_through_order_flow(self):
+        o = self._order("assigned", self.courier)
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.patch(f"/api/admin/orders/{o.pk}/done/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual((r.json()["status"], r.json()["changed"]), ("done", True))
+        o.refresh_from_db()
+        self.assertEqual(o.status, "done")
+        self.assertIsNotNone(o.delivered_at)
+        stats = DailyOrderStats.objects.filter(business=self.business)
+        self.assertEqual(sum(stats.values_list("done_count", flat=True)), 1)
+
+        r = self.client.patch(f"/api/admin/orders/{o.pk}/done/")
+        self.assertEqual((r.status_code, r.json()["changed"]), (200, False))
+
+    def test_done_rejects_invalid_status(self):
+        for st in ("pending", "canceled"):
+            o = self._order(st)
+            r = self.client.patch(f"/api/admin/orders/{o.pk}/done/")
+            self.assertEqual(r.status_code, 409)
+            o.refresh_from_db()
+            self.assertEqual(o.status, st)
+
+
+class RollupClientRegionTests(TestCase):
+    def test_region_change_moves_client_buckets(self):
+        business = Business.objects.create(name="R")
+        r1, r2 = Region.objects.create(name="R1"), Region.objects.create(name="R2")
+        mijoz = Client.objects.create(full_name="M", phone="998900000051", business=business, region=r1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(client=mijoz, business=business, bottles=2)
+            Order.objects.create(client=mijoz, business=business, bottles=3)
+
+        def by_region():
+            return dict(DailyOrderStats.objects.filter(business=business).values_list("region_id", "orders_count"))
+
+        self.assertEqual(by_region(), {r1.pk: 2})
+        mijoz.region = r2
+        with self.captureOnCommitCallbacks(execute=True):
+            mijoz.save()
+        self.assertEqual(by_region(), {r2.pk: 2})
+
+        # region tegmagan update_fields — qayta hisoblanmaydi
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Client.objects.get(pk=mijoz.pk).save(update_fields=["full_name"])
+        self.assertEqual(callbacks, [])
+
+    def test_bucket_is_unique_with_null_dimensions(self):
+        from django.db import IntegrityError, transaction
+
+        day = timezone.localdate()
+        DailyOrderStats.objects.create(date=day, orders_count=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyOrderStats.objects.create(date=day, orders_count=1)
+
+    def test_recompute_bucket_retries_when_a_parallel_writer_created_it(self):
+        from django.db import IntegrityError
+
+        from suv_tashish_crm import rollups
+
+        business = Business.objects.create(name="R")
+        mijoz = Client.objects.create(full_name="M", phone="998900000052", business=business)
+        order = Order.objects.create(client=mijoz, business=business, bottles=2)
+        DailyOrderStats.objects.all().delete()
+        key = (business.pk, timezone.localtime(order.created_at).date(), None, None)
+        real_create = DailyOrderStats.objects.create
+        calls = []
+
+        def racing_create(**kwargs):
+            # birinchi urinishda parallel jarayon bucketni bizdan oldin yaratgan bo'ladi
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise IntegrityError("UNIQUE constraint failed: index 'dailystats_bucket_uniq'")
+            return real_create(**kwargs)
+
+        with mock.patch.object(DailyOrderStats.objects, "create", side_effect=racing_create):
+            rollups.recompute_bucket(key)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            list(DailyOrderStats.objects.filter(business=business).values_list("orders_count", flat=True)), [1]
+        )
+
+        with mock.patch.object(DailyOrderStats.objects, "create", side_effect=IntegrityError("dup")):
+            DailyOrderStats.objects.all().delete()
+            with self.assertRaises(IntegrityError):
+                rollups.recompute_bucket(key)
+
+
+class ClientMapCacheTests(TestCase):
+    def test_tile_ttl_is_short_on_per_process_cache(self):
+        from suv_tashish_crm import client_map
+
+        with override_settings(CLIENT_MAP_TILE_TTL=300, CLIENT_MAP_LOCAL_TILE_TTL=15):
+            self.assertEqual(client_map._tile_ttl(), 15)
+        with override_settings(CLIENT_MAP_TILE_TTL=300, CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+        }):
+            self.assertEqual(client_map._tile_ttl(), 300)
+
+
+class ImportJobTests(TestCase):
+    CSV = "full_name,phone\nAli,+998901234501\nVali,+998901234502\n,+998901234503\n"
+
+    def setUp(self):
+        from django.core.files.storage import FileSystemStorage
+        from suv_tashish_crm.models import ImportJob
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        storage = FileSystemStorage(location=tmp.name)
+        for name in ("file", "error_report"):
+            patcher = mock.patch.object(ImportJob._meta.get_field(name), "storage", storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.events = []
+        patcher = mock.patch.object(imports, "_publish", lambda job_id, **f: self.events.append(f))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _submit(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return imports.submit("clients", SimpleUploadedFile("mijozlar.csv", self.CSV.encode()), "parol123")
+
+    def test_claim_and_reclaim_stale(self):
+        from suv_tashish_crm.models import ImportJob
+
+        job = self._submit()
+        self.assertEqual(job.total_rows, 3)
+        claimed = imports.claim_next()
+        self.assertEqual((claimed.pk, claimed.status), (job.pk, "running"))
+        self.assertIsNone(imports.claim_next())
+
+        ImportJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - imports.STALE_CLAIM * 2)
+        reclaimed = imports.claim_next()
+        self.assertEqual(reclaimed.pk, job.pk)
+        self.assertNotEqual(reclaimed.claim, claimed.claim)
+
+    def test_run_job_counters_and_error_report(self):
+        self._submit()
+        with mock.patch("suv_tashish_crm.outbox.enqueue_telegram"):
+            job = imports.run_job(imports.claim_next())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_rows, job.created, job.skipped, job.error_count),
+                         ("done", 3, 2, 1, 1))
+        self.assertEqual(job.password_hash, "")
+        with job.error_report.open("rb") as f:
+            report = list(csv.DictReader(io.StringIO(f.read().decode("utf-8"))))
+        self.assertEqual([(r["row"], r["error"]) for r in report], [("4", "MISSING_FULL_NAME_OR_PHONE")])
+
+        progress = [e for e in self.events if e.get("status") == "running" and e.get("processed_rows")]
+        self.assertEqual(progress[-1]["processed_rows"], 3)
+        self.assertEqual((self.events[-1]["status"], self.events[-1]["percent"]), ("done", 100))
+
+    def test_lost_claim_does_not_overwrite(self):
+        from suv_tashish_crm.models import ImportJob
+
+        self._submit()
+        job = imports.claim_next()
+        # boshqa worker eskirgan claim'ni oldi
+        ImportJob.objects.filter(pk=job.pk).update(claim="other")
+        with mock.patch("suv_tashish_crm.outbox.enqueue_telegram"), \
+                self.assertLogs("suv_tashish_crm.imports", "WARNING"):
+            imports.run_job(job)
+        row = ImportJob.objects.get(pk=job.pk)
+        self.assertEqual((row.status, row.claim, row.processed_rows), ("running", "other", 0))
+        self.assertFalse(any(e.get("status") == "done" for e in self.events))
+
+
+class AdminClientsExcelUploadTests(TestCase):
+    def test_failed_rows_are_logged_and_reported(self):
+        from admin_panel.models import AdminProfile
+        from django.contrib.messages import get_messages
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from openpyxl import Workbook
+
+        business, other = Business.objects.bulk_create([Business(name="X1"), Business(name="X2")])
+        user = get_user_model().objects.create_user("excel_admin", password="x", is_staff=True)
+        AdminProfile.objects.create(user=user, business=business, full_name="Admin")
+        # telefon boshqa biznesda band: Client.phone global unique — create yiqiladi
+        Client.objects.create(full_name="Band", phone="+998901234599", business=other)
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(["full_name", "bottle_soni", "manzili", "phone"])
+        ws.append(["Ali", 2, "Boysun", "901234598"])
+        ws.append(["Vali", 1, "Denov", "901234599"])
+        buf = io.BytesIO()
+        wb.save(buf)
+
+        self.client.force_login(user)
+        session = self.client.session
+        session["admin_id"] = user.pk
+        session.save()
+        with self.assertLogs("admin_panel.views", "WARNING") as logs:
+            r = self.client.post("/admin_panel/clients/upload-excel/", {
+                "excel_file": SimpleUploadedFile("mijozlar.xlsx", buf.getvalue()),
+            })
+        self.assertEqual(r.status_code, 302)
+        self.assertIn("row 3 failed", logs.output[0])
+        self.assertTrue(Client.objects.filter(phone="+998901234598", business=business).exists())
+        texts = [str(m) for m in get_messages(r.wsgi_request)]
+        self.assertTrue(any("Muvaffaqiyatli: 1" in t for t in texts), texts)
+        self.assertTrue(any(t.startswith("Xatolik bo'lgan qatorlar: 3-qator") for t in texts), texts)
+
+
+class ActorCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.business = Business.objects.create(name="A")
+        self.user = User.objects.create_user("actor_a")
+        self.other = User.objects.create_user("actor_b")
+        self.group = Group.objects.get_or_create(name="courier")[0]
+        self.sent = []
+
+        def on_changed(sender, user_ids, **kwargs):
+            self.sent.append(set(user_ids))
+
+        actors.actor_changed.connect(on_changed, weak=False)
+        self.addCleanup(actors.actor_changed.disconnect, on_changed)
+
+    def _fresh(self, user):
+        # so'rovdagi memo'siz yangi obyekt — faqat kesh ishlaydi
+        return get_user_model().objects.get(pk=user.pk)
+
+    def _prime(self, *users):
+        for u in users:
+            actors.resolve_user(self._fresh(u))
+            self.assertIsNotNone(cache.get(actors.CACHE_KEY.format(u.pk)))
+
+    def _assert_invalidated(self, change, *users):
+        self._prime(*users)
+        self.sent.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            # signal faqat commit'dan keyin
+            self.assertEqual(self.sent, [])
+        self.assertEqual(self.sent, [{u.pk for u in users}])
+        for u in users:
+            self.assertIsNone(cache.get(actors.CACHE_KEY.format(u.pk)))
+
+    def test_cache_hit_makes_no_queries(self):
+        user = self._fresh(self.user)
+        with self.assertNumQueries(3):
+            first = actors.resolve_user(user)
+        user = self._fresh(self.user)
+        with self.assertNumQueries(0):
+            actor = actors.resolve_user(user)
+            self.assertIs(actors.resolve_user(user), actor)
+        self.assertEqual((actor.role, actor.courier_id), (first.role, first.courier_id))
+
+    def test_group_changes_from_both_sides(self):
+        self._assert_invalidated(lambda: self.user.groups.add(self.group), self.user)
+        self.assertEqual(actors.resolve_user(self._fresh(self.user)).role, "COURIER")
+        self._assert_invalidated(lambda: self.group.user_set.add(self.other), self.other)
+        self._assert_invalidated(lambda: self.group.user_set.remove(self.other), self.other)
+        self._assert_invalidated(lambda: self.user.groups.clear(), self.user)
+        self.assertEqual(actors.resolve_user(self._fresh(self.user)).role, "CLIENT")
+
+    def test_group_clear_invalidates_all_members(self):
+        self.group.user_set.add(self.user, self.other)
+        self._assert_invalidated(lambda: self.group.user_set.clear(), self.user, self.other)
+
+    def test_staff_flags(self):
+        def promote():
+            self.user.is_staff = True
+            self.user.save()
+
+        self._assert_invalidated(promote, self.user)
+        self.assertEqual(actors.resolve_user(self._fresh(self.user)).role, "ADMIN")
+
+        def demote():
+            u = self._fresh(self.user)
+            u.is_superuser = False
+            u.is_staff = False
+            u.save(update_fields=["is_staff"])
+
+        self._assert_invalidated(demote, self.user)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self._fresh(self.user).save()
+            self._fresh(self.user).save(update_fields=["first_name"])
+        self.assertEqual(callbacks, [])
+
+    def test_profile_user_and_business_changes(self):
+        other_business = Business.objects.create(name="B")
+        with self.captureOnCommitCallbacks(execute=True):
+            courier = Courier.objects.create(full_name="K", phone="998910000031", user=self.user,
+                                             business=self.business)
+            mijoz = Client.objects.create(full_name="M", phone="998910000032", user=self.other,
+                                          business=self.business)
+        self.assertEqual(actors.resolve_user(self._fresh(self.user)).courier_id, courier.pk)
+
+        def move_courier():
+            c = Courier.objects.get(pk=courier.pk)
+            c.user = self.other
+            c.save()
+
+        self._assert_invalidated(move_courier, self.user, self.other)
+
+        def rebusiness_client():
+            m = Client.objects.get(pk=mijoz.pk)
+            m.business = other_business
+            m.save(update_fields=["business"])
+
+        self._assert_invalidated(rebusiness_client, self.other)
+        self.assertEqual(actors.resolve_user(self._fresh(self.other)).business_id, self.business.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Client.objects.get(pk=mijoz.pk).save(update_fields=["full_name"])
+            Courier.objects.get(pk=courier.pk).save()
+        self.assertEqual(callbacks, [])
+
+
+class JwtClaimsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name="JWT")
+        self.user = get_user_model().objects.create_user("jwt_user", password="parol123")
+
+    def _login(self):
+        r = self.client.post("/api/auth/jwt/login/", {"username": "jwt_user", "password": "parol123"})
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.json()
+
+    def _me(self, access):
+        return self.client.get("/api/auth/me/", HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def _assert_stale_then_refreshed(self, tokens, change, role):
+        self.assertEqual(self._me(tokens["access"]).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        r = self._me(tokens["access"])
+        self.assertEqual(r.status_code, 401)
+        self.assertEqual(r.json()["detail"], "TOKEN_CLAIMS_STALE")
+
+        r = self.client.post("/api/auth/jwt/refresh/", {"refresh": tokens["refresh"]})
+        self.assertEqual(r.status_code, 200, r.content)
+        access = r.json()["access"]
+        self.assertEqual(AccessToken(access)["role"], role)
+        r = self._me(access)
+        self.assertEqual((r.status_code, r.json()["role"]), (200, role))
+
+    def test_login_token_carries_claims(self):
+        courier = Courier.objects.create(full_name="K", phone="998910000021", business=self.business,
+                                         user=self.user)
+        token = AccessToken(self._login()["access"])
+        self.assertEqual(
+            {name: token[name] for name in jwt_claims.CLAIM_NAMES},
+            {"cv": jwt_claims.CLAIMS_VERSION, "tv": jwt_claims.token_version(self.user.pk), "role": "COURIER",
+             "business_id": self.business.pk, "courier_id": courier.pk, "client_id": None},
+        )
+
+    def test_group_change_revokes_token(self):
+        tokens = self._login()
+        group = Group.objects.get_or_create(name="courier")[0]
+        self._assert_stale_then_refreshed(tokens, lambda: self.user.groups.add(group), "COURIER")
+
+    def test_is_staff_change_revokes_token(self):
+        tokens = self._login()
+
+        def promote():
+            self.user.is_staff = True
+            self.user.save(update_fields=["is_staff"])
+
+        self._assert_stale_then_refreshed(tokens, promote, "ADMIN")
+
+    def test_courier_user_change_revokes_token(self):
+        tokens = self._login()
+        courier = Courier.objects.create(full_name="K", phone="998910000022", business=self.business)
+
+        def link():
+            courier.user = self.user
+            courier.save()
+
+        self._assert_stale_then_refreshed(tokens, link, "COURIER")
+
+    def test_token_without_claims_uses_actor_resolution(self):
+        access = str(RefreshToken.for_user(self.user).access_token)
+        self.assertNotIn("cv", AccessToken(access).payload)
+        with mock.patch.object(actors, "_load_profile", wraps=actors._load_profile) as load:
+            r = self._me(access)
+        self.assertEqual((r.status_code, r.json()["role"]), (200, "CLIENT"))
+        load.assert_called_once_with(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(Group.objects.get_or_create(name="courier")[0])
+        # claim'siz token eskirmaydi — rol har safar actors orqali aniqlanadi
+        r = self._me(access)
+        self.assertEqual((r.status_code, r.json()["role"]), (200, "COURIER"))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        # chat limiti har testda yangidan; alohida testi pastda
+        patcher = mock.patch.object(outbox, "_limiter", outbox.RateLimiter(per_chat_interval=0, global_per_second=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _msg(self, chat_id="100", text="salom", **kwargs):
+        return OutboundMessage.objects.create(chat_id=chat_id, text=text, **kwargs)
+
+    def test_claim_is_exclusive_and_stale_claims_are_taken_over(self):
+        a, b = self._msg(), self._msg()
+        first = outbox.claim_batch()
+        self.assertEqual([m.pk for m in first], [a.pk, b.pk])
+        self.assertEqual(outbox.claim_batch(), [])
+
+        OutboundMessage.objects.filter(pk=a.pk).update(locked_at=timezone.now() - outbox.STALE_CLAIM * 2)
+        second = outbox.claim_batch()
+        self.assertEqual([m.pk for m in second], [a.pk])
+        self.assertNotEqual(second[0].claim, first[0].claim)
+
+    def test_finish_does_not_overwrite_a_reclaimed_message(self):
+        m = self._msg()
+
+        def sender(chat_id, text):
+            # yuborish cho'zildi, boshqa worker eskirgan claim'ni qayta oldi
+            OutboundMessage.objects.filter(pk=m.pk).update(claim="other", locked_at=timezone.now())
+
+        stats = outbox.process_batch(sender=sender)
+        self.assertEqual(stats["sent"], 0)
+        m.refresh_from_db()
+        self.assertEqual((m.status, m.claim), ("sending", "other"))
+
+    def test_messages_to_one_chat_are_coalesced(self):
+        for i in range(3):
+            self._msg(chat_id="100", text=f"a{i}")
+        self._msg(chat_id="200", text="b")
+        self._msg(chat_id="300", text="x" * 3000)
+        self._msg(chat_id="300", text="y" * 3000)
+        sender = mock.Mock()
+
+        stats = outbox.process_batch(sender=sender)
+        self.assertEqual(stats["sent"], 6)
+        self.assertEqual(
+            [c.args for c in sender.call_args_list],
+            [("100", "a0\n\na1\n\na2"), ("200", "b"), ("300", "x" * 3000), ("300", "y" * 3000)],
+        )
+        self.assertFalse(OutboundMessage.objects.exclude(status="sent").exists())
+
+    def test_transient_error_is_retried_with_backoff(self):
+        m = self._msg()
+        before = timezone.now()
+        stats = outbox.process_batch(sender=mock.Mock(side_effect=outbox.SendError("502: bad gateway")))
+        self.assertEqual(stats["retry"], 1)
+        m.refresh_from_db()
+        self.assertEqual((m.status, m.claim, m.attempts, m.last_error), ("pending", "", 1, "502: bad gateway"))
+        self.assertGreaterEqual(m.next_attempt_at, before + datetime.timedelta(seconds=4))
+        self.assertLessEqual(m.next_attempt_at, timezone.now() + datetime.timedelta(seconds=6))
+        # vaqti kelmagan xabar qayta olinmaydi
+        self.assertEqual(outbox.claim_batch(), [])
+
+        OutboundMessage.objects.filter(pk=m.pk).update(next_attempt_at=timezone.now())
+        outbox.process_batch(sender=mock.Mock(side_effect=outbox.SendError("429: slow down", retry_after=30)))
+        m.refresh_from_db()
+        self.assertEqual(m.attempts, 2)
+        self.assertGreater(m.next_attempt_at, timezone.now() + datetime.timedelta(seconds=25))
+
+    def test_permanent_error_and_exhausted_attempts_dead_letter(self):
+        m = self._msg(chat_id="100")
+        with self.assertLogs("suv_tashish_crm.outbox", "WARNING"):
+            stats = outbox.process_batch(
+                sender=mock.Mock(side_effect=outbox.SendError("403: blocked", permanent=True)),
+            )
+        self.assertEqual(stats["dead"], 1)
+        m.refresh_from_db()
+        self.assertEqual((m.status, m.attempts), ("dead", 1))
+
+        m2 = self._msg(chat_id="200", attempts=7)
+        with override_settings(OUTBOX_MAX_ATTEMPTS=8), self.assertLogs("suv_tashish_crm.outbox", "WARNING"):
+            outbox.process_batch(sender=mock.Mock(side_effect=outbox.SendError("502: bad gateway")))
+        m2.refresh_from_db()
+        self.assertEqual((m2.status, m2.attempts), ("dead", 8))
+
+    def test_unexpected_sender_crash_counts_as_attempt(self):
+        m = self._msg()
+        sender = mock.Mock(side_effect=RuntimeError("boom"))
+        with override_settings(OUTBOX_MAX_ATTEMPTS=2), self.assertLogs("suv_tashish_crm.outbox", "ERROR"):
+            self.assertEqual(outbox.process_batch(sender=sender)["retry"], 1)
+            m.refresh_from_db()
+            self.assertEqual((m.status, m.attempts), ("pending", 1))
+            self.assertIn("boom", m.last_error)
+
+            OutboundMessage.objects.filter(pk=m.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.process_batch(sender=sender)["dead"], 1)
+        m.refresh_from_db()
+        self.assertEqual((m.status, m.attempts), ("dead", 2))
+
+    def test_rate_limiter_defers_without_counting_an_attempt(self):
+        limiter = outbox.RateLimiter(per_chat_interval=60, global_per_second=0)
+        self.assertEqual(limiter.reserve("100"), 0)
+        self.assertGreater(limiter.reserve("100"), 55)
+        self.assertEqual(limiter.reserve("200"), 0)
+
+        m = self._msg(chat_id="100")
+        sender = mock.Mock()
+        with mock.patch.object(outbox, "_limiter", limiter):
+            stats = outbox.process_batch(sender=sender)
+        self.assertEqual(stats["deferred"], 1)
+        sender.assert_not_called()
+        m.refresh_from_db()
+        self.assertEqual((m.status, m.claim, m.attempts), ("pending", "", 0))
+        self.assertGreater(m.next_attempt_at, timezone.now() + datetime.timedelta(seconds=55))
@@ -9,12 +9,20 @@ from .views_admin_bootstrap import (
     AdminBootstrapComplete,
 )
 from .views_auth_extra import change_password_view
-from .views_import import admin_import_clients_view, admin_import_couriers_view
+from .views_import import (
+    admin_import_clients_view,
+    admin_import_couriers_view,
+    admin_import_jobs_view,
+    admin_import_job_view,
+    admin_import_job_errors_view,
+    admin_import_job_stream_view,
+)
 from .views import (
     check_status, me_view,
 
     # ADMIN
-    admin_dashboard_view, admin_orders_view, admin_order_done_view,
+    admin_dashboard_view, admin_orders_view, admin_order_done_view, admin_order_cancel_view,
+    admin_order_nearest_couriers_view, admin_order_auto_assign_view,
     admin_couriers_view, admin_courier_toggle_view,
     admin_debtors_view, admin_debtor_paid_view,
     admin_profile_view, admin_notifications_view, admin_notification_seen_view,
@@ -24,7 +32,8 @@ from .views import (
     courier_today_orders_view,
     courier_position_view,
     courier_update_position_view,
-    courier_accept_order_view,
+    courier_update_positions_view,
+    courier_accept_order_view, courier_route_view,
     courier_confirm_delivery_view,
     courier_history_view,
 
@@ -40,6 +49,8 @@ from .views import (
     api_contact_admin,
     api_create_order,
     client_order_track_view,
+    order_route_view, admin_deliveries_eta_view,
+    order_stream_view,
     client_update_location_view,
     courier_start_delivery_view,
     admin_recovery_start_view,
@@ -60,6 +71,9 @@ urlpatterns = [
     path("admin/dashboard/", admin_dashboard_view, name="admin_dashboard"),
     path("admin/orders/", admin_orders_view, name="admin_orders"),
     path("admin/orders/<int:pk>/done/", admin_order_done_view, name="admin_order_done"),
+    path("admin/orders/<int:pk>/cancel/", admin_order_cancel_view, name="admin_order_cancel"),
+    path("admin/orders/<int:pk>/nearest_couriers/", admin_order_nearest_couriers_view, name="admin_order_nearest_couriers"),
+    path("admin/orders/<int:pk>/auto_assign/", admin_order_auto_assign_view, name="admin_order_auto_assign"),
     path("admin/couriers/", admin_couriers_view, name="admin_couriers"),
     path("admin/couriers/<int:pk>/toggle/", admin_courier_toggle_view, name="admin_courier_toggle"),
     path("admin/debtors/", admin_debtors_view, name="admin_debtors"),
@@ -71,13 +85,19 @@ urlpatterns = [
     # ADMIN IMPORT (CSV/XLSX)
     path("admin/import/clients/", admin_import_clients_view, name="admin_import_clients"),
     path("admin/import/couriers/", admin_import_couriers_view, name="admin_import_couriers"),
+    path("admin/import/jobs/", admin_import_jobs_view, name="admin_import_jobs"),
+    path("admin/import/jobs/<int:pk>/", admin_import_job_view, name="admin_import_job"),
+    path("admin/import/jobs/<int:pk>/errors/", admin_import_job_errors_view, name="admin_import_job_errors"),
+    path("admin/import/jobs/<int:pk>/stream/", admin_import_job_stream_view, name="admin_import_job_stream"),
 
 
     # COURIER
     path("courier/metrics/", courier_metrics_view, name="courier_metrics"),
     path("courier/today_orders/", courier_today_orders_view, name="courier_today_orders"),
+    path("courier/route/", courier_route_view, name="courier_route"),
     path("courier/position/", courier_position_view, name="courier_position"),
     path("courier/update_position/", courier_update_position_view, name="courier_update_position"),
+    path("courier/update_positions/", courier_update_positions_view, name="courier_update_positions"),
     path("courier/accept_order/", courier_accept_order_view, name="courier_accept_order"),
     path("courier/confirm_delivery/", courier_confirm_delivery_view, name="courier_confirm_delivery"),
     path("courier/history/", courier_history_view, name="courier_history"),
@@ -105,6 +125,9 @@ urlpatterns = [
     path("auth/admin/complete/", AdminBootstrapComplete.as_view()),
     # api/urls.py
     path("courier/order/<int:pk>/track/", courier_order_track_view, name="courier_order_track"),
+    path("orders/<int:pk>/route/", order_route_view, name="order_route"),
+    path("admin/deliveries/eta/", admin_deliveries_eta_view, name="admin_deliveries_eta"),
+    path("orders/<int:pk>/stream/", order_stream_view, name="order_stream"),
     path("admin/couriers/create/", admin_courier_create_view, name="admin_courier_create"),
 
 ]
\ No newline at end of file
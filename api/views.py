@@ -26,8 +26,17 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from suv_tashish_crm.models import Order, Courier, Client, Notification, Region
+from suv_tashish_crm.dashboard import get_dashboard_stats
+from suv_tashish_crm.positions import (
+    InvalidPosition, UnknownCourier, live_latlon, live_latlon_many, record_position, record_positions,
+)
+from suv_tashish_crm.tracks import order_route
+from suv_tashish_crm.events import order_channel, position_channel, sse_response
+from suv_tashish_crm import actors, dispatch, geo, order_flow, pagination, routing
+from suv_tashish_crm.projection import Col, Computed, Projection, isoformat
+from suv_tashish_crm.renderers import FastJsonResponse
 from admin_panel.models import AdminProfile
-from .serializers import OrderSerializer
+from .serializers import ORDER_LIST_ROW, OrderSerializer
 
 User = get_user_model()
 
@@ -69,17 +78,8 @@ def _to_int_amount(value, default: int = 0) -> int:
 
 # ================= ROLE =================
 def get_role(user) -> str:
-    if not user or not user.is_authenticated:
-        return "CLIENT"
-    
-    groups = set(user.groups.values_list("name", flat=True))
-    if "admin" in groups or user.is_superuser or user.is_staff:
-        return "ADMIN"
-    
-    if "courier" in groups or Courier.objects.filter(user=user).exists():
-        return "COURIER"
-    
-    return "CLIENT"
+    # guruhlar va profil keshlangan (suv_tashish_crm.actors), so'rov ichida bir marta
+    return actors.resolve_user(user).role
 
 def _require_admin(request):
     if get_role(request.user) != "ADMIN":
@@ -297,10 +297,18 @@ def admin_recovery_set_credentials_view(request):
 class CourierOrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    # OrderSerializer shakli, lekin values_list orqali (serializer har qator uchun chaqirilmaydi)
+    pagination_class = pagination.KeysetPagination
+    keyset = pagination.BY_CREATED
+    projection = ORDER_LIST_ROW
 
     def get_queryset(self):
         return Order.objects.all().order_by("-created_at")
 
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(page)
+
 
 class UpdateOrderStatusView(generics.UpdateAPIView):
     queryset = Order.objects.all()
@@ -309,8 +317,18 @@ class UpdateOrderStatusView(generics.UpdateAPIView):
 
     def patch(self, request, *args, **kwargs):
         order = self.get_object()
-        order.status = "done"
-        order.save(update_fields=["status"])
+        # admin — istalgan order, kuryer — faqat o'ziniki (order_flow.confirm)
+        role = get_role(request.user)
+        courier_id = None
+        if role == "COURIER":
+            courier_id = _courier_id_linked(request.user)
+            if not courier_id:
+                return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
+        elif role != "ADMIN":
+            return Response({"detail": "FORBIDDEN"}, status=403)
+        result = order_flow.confirm(order, courier_id)
+        if not result.ok:
+            return _transition_error(result)
         return Response({"message": "Buyurtma yakunlandi!"}, status=status.HTTP_200_OK)
 
 
@@ -324,24 +342,8 @@ def admin_dashboard_view(request):
     my_business = _get_my_business(request.user)
     if not my_business:
         return Response({"detail": "Siz hech qanday biznesga biriktirilmagansiz!"}, status=403)
-    today = timezone.localdate()
-
-    today_orders = Order.objects.filter(business=my_business, created_at__date=today).count()
-    pending_count = Order.objects.filter(
-        business=my_business, 
-        status__in=["assigned", "delivering"]
-    ).count()
-
-    active = Courier.objects.filter(business=my_business, is_active=True).count()
-    total = Courier.objects.filter(business=my_business).count()
-
-    revenue_qs = Order.objects.filter(
-            business=my_business,  # 👈 FILTR
-            status="done",
-            created_at__date=today
-    )
-    agg = revenue_qs.aggregate(total=Sum("payment_amount"))
-    today_revenue = _to_int_amount(agg.get("total"), 0)
+    # umumiy dashboard servisi (HTML dashboard va kuryer paneli bilan bir xil hisob)
+    stats = get_dashboard_stats(business=my_business, days=7, include_tops=False)
 
     recent = Order.objects.filter(business=my_business).select_related("client").order_by("-created_at")[:8]
     recent_orders = []
@@ -358,14 +360,31 @@ def admin_dashboard_view(request):
 
     return Response({
         "business_name": my_business.name,
-        "today_orders": today_orders,
-        "pending_count": pending_count,
-        "active_couriers": {"active": active, "total": total},
-        "today_revenue": today_revenue,
+        "today_orders": stats.today_orders,
+        "pending_count": stats.pending_count,
+        "active_couriers": {"active": stats.active_couriers, "total": stats.total_couriers},
+        "today_revenue": stats.today_revenue,
         "recent_orders": recent_orders,
     })
 
 
+# ro'yxat qatorlari: values_list + kompilyatsiya qilingan mapper (suv_tashish_crm.projection)
+ADMIN_ORDER_ROW = Projection({
+    "id": "id",
+    "order_label": Col("id", convert=lambda pk: f"ORDER-{pk}"),
+    "client_name": Col("client__full_name", default="Mijoz"),
+    "client_phone": Col("client__phone", default=""),
+    "courier_name": Col("courier__full_name", default=""),
+    "status": Col("status", default=""),
+    "bottle_count": "bottles",
+    "amount": Col("payment_amount", convert=_to_int_amount, default=0),
+    "amount_display": Computed(lambda v: f"{_to_int_amount(v, 0)} UZS", ("payment_amount",)),
+    "payment_type": Col("payment_type", convert=str.strip, default=""),
+    "address": Col("note", convert=str.strip, default=""),
+    "created_at": Col("created_at", convert=isoformat),
+})
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def admin_orders_view(request):
@@ -376,7 +395,7 @@ def admin_orders_view(request):
     q = (request.GET.get("q") or "").strip()
     st = (request.GET.get("status") or "").strip().lower()
 
-    qs = Order.objects.filter(business=my_business).select_related("client", "courier").order_by("-created_at")
+    qs = Order.objects.filter(business=my_business)
 
     if st:
         qs = qs.filter(status=st)
@@ -388,30 +407,12 @@ def admin_orders_view(request):
             Q(id__icontains=q)
         )
 
-    items = []
-    for o in qs[:200]:
-        client_name = getattr(o.client, "full_name", "Mijoz") if o.client else "Mijoz"
-        phone = getattr(o.client, "phone", "") if o.client else ""
-        courier_name = getattr(o.courier, "full_name", "") if o.courier else ""
-
-        amount = _to_int_amount(getattr(o, "payment_amount", 0), 0)
-
-        items.append({
-            "id": o.id,
-            "order_label": f"ORDER-{o.id}",
-            "client_name": client_name,
-            "client_phone": phone,
-            "courier_name": courier_name,
-            "status": getattr(o, "status", "") or "",
-            "bottle_count": getattr(o, "bottle_count", 0),
-            "amount": amount,
-            "amount_display": f"{amount} UZS",
-            "payment_type": (getattr(o, "payment_type", "") or "").strip(),
-            "address": (getattr(o, "client_note", "") or "").strip(),
-            "created_at": o.created_at.isoformat() if getattr(o, "created_at", None) else None,
-        })
+    try:
+        page = ADMIN_ORDER_ROW.paginate_request(request, qs, pagination.BY_CREATED, default_page_size=200)
+    except pagination.InvalidCursor:
+        return Response({"detail": "BAD_CURSOR"}, status=400)
 
-    return Response({"results": items})
+    return Response({"results": page.items, **page.as_dict()})
 
 
 @api_view(["PATCH"])
@@ -421,10 +422,91 @@ def admin_order_done_view(request, pk: int):
     if forbidden:
         return forbidden
 
-    o = get_object_or_404(Order, pk=pk)
-    o.status = "done"
-    o.save(update_fields=["status"])
-    return Response({"ok": True, "id": o.id, "status": o.status})
+    # shartli UPDATE (order_flow): delivered_at, yig'malar va hodisa bilan
+    result = order_flow.confirm(pk)
+    if not result.ok:
+        return _transition_error(result)
+    return Response({"ok": True, "id": result.order_id, "status": result.status, "changed": result.changed})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def admin_order_cancel_view(request, pk: int):
+    forbidden = _require_admin(request)
+    if forbidden:
+        return forbidden
+
+    result = order_flow.cancel(pk)
+    if not result.ok:
+        return _transition_error(result)
+    return Response({"ok": True, "id": result.order_id, "status": result.status, "changed": result.changed})
+
+
+def _max_km_param(request):
+    """``max_km``: musbat chekli son yoki yo'q. Noto'g'ri (``nan``/``inf``/<=0) — ``False``."""
+    raw = request.query_params.get("max_km", request.data.get("max_km") if hasattr(request.data, "get") else None)
+    if raw in (None, ""):
+        return None
+    try:
+        value = float(raw)
+    except (TypeError, ValueError):
+        return False
+    return value if math.isfinite(value) and value > 0 else False
+
+
+def _candidates_payload(candidates):
+    names = dict(
+        Courier.objects.filter(id__in=[c.courier_id for c in candidates]).values_list("id", "full_name")
+    )
+    return [{**c.as_dict(), "full_name": names.get(c.courier_id)} for c in candidates]
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def admin_order_nearest_couriers_view(request, pk: int):
+    forbidden = _require_admin(request)
+    if forbidden:
+        return forbidden
+
+    o = get_object_or_404(Order.objects.select_related("client"), pk=pk)
+    try:
+        k = max(1, min(int(request.query_params.get("k", 5)), 50))
+    except (TypeError, ValueError):
+        return Response({"detail": "INVALID_PARAMS"}, status=400)
+    max_km = _max_km_param(request)
+    if max_km is False:
+        return Response({"detail": "INVALID_PARAMS"}, status=400)
+    lat, lon = dispatch.order_point(o)
+    if lat is None:
+        return Response({"detail": "ORDER_LOCATION_REQUIRED"}, status=400)
+    candidates = dispatch.nearest_couriers(o, k=k, max_km=max_km)
+    return Response({
+        "order_id": o.id,
+        "lat": lat,
+        "lon": lon,
+        "results": _candidates_payload(candidates),
+    })
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def admin_order_auto_assign_view(request, pk: int):
+    forbidden = _require_admin(request)
+    if forbidden:
+        return forbidden
+
+    o = get_object_or_404(Order.objects.select_related("client"), pk=pk)
+    if o.status != "pending" or o.courier_id:
+        return Response({"detail": "ORDER_NOT_PENDING"}, status=409)
+    max_km = _max_km_param(request)
+    if max_km is False:
+        return Response({"detail": "INVALID_PARAMS"}, status=400)
+    if dispatch.order_point(o)[0] is None:
+        return Response({"detail": "ORDER_LOCATION_REQUIRED"}, status=400)
+    cand = dispatch.auto_assign(o, max_km=max_km)
+    if cand is None:
+        return Response({"detail": "NO_COURIER_AVAILABLE"}, status=409)
+    return Response({"ok": True, "id": o.id, "status": o.status, "courier": _candidates_payload([cand])[0]})
 
 
 @api_view(["GET"])
@@ -550,12 +632,15 @@ def admin_notifications_view(request):
     if forbidden:
         return forbidden
 
-    base_qs = Notification.objects.all().order_by("-created_at")
+    base_qs = Notification.objects.all()
     unseen = base_qs.filter(seen=False).count()
-    qs = base_qs[:50]
+    try:
+        page = pagination.paginate_request(request, base_qs, pagination.BY_CREATED, default_page_size=50)
+    except pagination.InvalidCursor:
+        return Response({"detail": "BAD_CURSOR"}, status=400)
 
     items = []
-    for n in qs:
+    for n in page.items:
         items.append({
             "id": n.id,
             "title": (getattr(n, "title", "") or "Notification"),
@@ -564,7 +649,7 @@ def admin_notifications_view(request):
             "created_at": n.created_at.isoformat() if getattr(n, "created_at", None) else None,
         })
 
-    return Response({"unseen_count": unseen, "results": items})
+    return Response({"unseen_count": unseen, "results": items, **page.as_dict()})
 
 
 @api_view(["PATCH"])
@@ -584,12 +669,40 @@ def admin_notification_seen_view(request, pk: int):
 def _get_courier_linked(user):
     if not user or not getattr(user, "is_authenticated", False):
         return None
-    return Courier.objects.filter(user=user).first()
+    return actors.resolve_user(user).courier
+
+
+def _transition_error(result):
+    # order_flow natijasi: 404 NOT_FOUND, 403 NOT_YOUR_ORDER, 409 ALREADY_TAKEN / INVALID_STATUS:<status> / CONFLICT
+    return Response(
+        {"detail": result.detail, "order_id": result.order_id, "order_status": result.status},
+        status=result.http_status,
+    )
+
+
+def _courier_id_linked(user):
+    # faqat id kerak bo'lsa: JWT claim'idan (yoki actor keshidan), Courier yuklanmaydi
+    if not user or not getattr(user, "is_authenticated", False):
+        return None
+    return actors.resolve_user(user).courier_id
 
 
 
 from django.db.models import Q
 
+TODAY_ORDER_ROW = Projection({
+    "id": "id",
+    "client": Col("client__full_name", default="Mijoz"),
+    "phone": Col("client__phone", default=""),
+    "status": "status",
+    "bottles": "bottles",
+    "payment_type": Col("payment_type", default=""),
+    "payment_amount": Col("payment_amount", convert=int, default=0),
+})
+# marshrut uchun (javobga kirmaydi): kuryer va dispatch.resolve_point ustunlari
+_TODAY_ROUTE_SOURCES = ("courier_id", "lat", "lon", "client__location_lat", "client__location_lon")
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def courier_today_orders_view(request):
@@ -603,7 +716,7 @@ def courier_today_orders_view(request):
 
     today = timezone.localdate()
 
-    qs = Order.objects.select_related("client").filter(
+    qs = Order.objects.filter(
         created_at__date=today
     ).filter(
         Q(courier=courier) | Q(courier__isnull=True, status="pending")
@@ -611,19 +724,46 @@ def courier_today_orders_view(request):
 
     grouped = {k: [] for k in ORDER_STATUSES}
 
-    for o in qs:
-        item = {
-            "id": o.id,
-            "client": o.client.full_name if o.client else "Mijoz",
-            "phone": o.client.phone if o.client else "",
-            "status": o.status,
-            "bottles": o.bottles,
-            "payment_type": o.payment_type or "",
-            "payment_amount": int(o.payment_amount or 0),
-        }
-        grouped[item["status"]].append(item)
+    rows = list(TODAY_ORDER_ROW.query(qs, *_TODAY_ROUTE_SOURCES))
+    n = len(TODAY_ORDER_ROW.sources)
+    items = [TODAY_ORDER_ROW.row(r) for r in rows]
+    # assigned/delivering — marshrut tartibida (kuryerning joriy pozitsiyasidan)
+    plan = routing.plan_points(
+        [
+            (item["id"], *dispatch.resolve_point(*r[n + 1:]))
+            for item, r in zip(items, rows)
+            if r[n] == courier.id and item["status"] in routing.ROUTE_STATUSES
+        ],
+        start=live_latlon(courier),
+    )
+    seq = plan.sequence()
+    eta = {s.order_id: s.eta_seconds for s in plan.stops}
+
+    for item in items:
+        if item["id"] in seq:
+            item["route_seq"] = seq[item["id"]]
+            item["eta_seconds"] = eta.get(item["id"])
+        grouped.setdefault(item["status"], []).append(item)
+
+    for status_key in routing.ROUTE_STATUSES:
+        grouped[status_key].sort(key=lambda i: i.get("route_seq", len(seq) + 1))
+
+    return Response({"status": "ok", "data": grouped, "route": plan.as_dict()})
 
-    return Response({"status": "ok", "data": grouped})
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def courier_route_view(request):
+    """Kuryerning barcha assigned/delivering buyurtmalari uchun tashrif tartibi va ETA."""
+    forbidden = _require_courier(request)
+    if forbidden:
+        return forbidden
+
+    courier = _get_courier_linked(request.user)
+    if not courier:
+        return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
+
+    return Response({"status": "ok", "data": routing.courier_route(courier).as_dict()})
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -636,9 +776,10 @@ def courier_position_view(request):
     if not courier:
         return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
 
+    lat, lon = live_latlon(courier)
     return Response({"status": "ok", "data": {
-        "lat": getattr(courier, "lat", None),
-        "lon": getattr(courier, "lon", None),
+        "lat": lat,
+        "lon": lon,
     }})
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view, permission_classes
@@ -667,19 +808,10 @@ def courier_order_track_view(request, pk: int):
         c_lat = getattr(cl, "location_lat", None) if cl else None
         c_lon = getattr(cl, "location_lon", None) if cl else None
 
-    # courier coords (courier profilidan)
-    k_lat = getattr(courier, "lat", None)
-    k_lon = getattr(courier, "lon", None)
+    # courier coords (live store, bo'lmasa courier profilidan)
+    k_lat, k_lon = live_latlon(courier)
 
-    distance_km = None
-    eta_seconds = None
-    if c_lat is not None and c_lon is not None and k_lat is not None and k_lon is not None:
-        try:
-            distance_km = _haversine_km(float(c_lat), float(c_lon), float(k_lat), float(k_lon))
-            eta_seconds = _eta_from_distance(distance_km, speed_kmh=25.0)
-        except Exception:
-            distance_km = None
-            eta_seconds = None
+    distance_km, eta_seconds = _track_distance(c_lat, c_lon, k_lat, k_lon)
 
     return Response({
         "status": "ok",
@@ -707,18 +839,52 @@ def courier_update_position_view(request):
     if forbidden:
         return forbidden
 
-    courier = Courier.objects.filter(user=request.user).first()
-    if not courier:
+    courier_id = _courier_id_linked(request.user)
+    if not courier_id:
         return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
 
     try:
-        courier.lat = float(request.data.get("lat"))
-        courier.lon = float(request.data.get("lon"))
-        courier.save(update_fields=["lat", "lon"])
-        return Response({"status": "ok"})
+        lat = float(request.data.get("lat"))
+        lon = float(request.data.get("lon"))
     except (TypeError, ValueError):
         return Response({"detail": "INVALID_LAT_LON"}, status=400)
 
+    # har bir ping uchun UPDATE emas: store'ga yoziladi, Courier.lat/lon batch bilan yangilanadi
+    try:
+        record_position(courier_id, lat, lon, order_id=request.data.get("order_id"))
+    except InvalidPosition:
+        return Response({"detail": "INVALID_LAT_LON"}, status=400)
+    except UnknownCourier:
+        return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
+    return Response({"status": "ok"})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def courier_update_positions_view(request):
+    """Offline buferlangan nuqtalar paketi.
+
+    Body: ``{"fixes": [{"lat", "lon", "ts", "order_id"}, ...]}`` (yoki to'g'ridan-to'g'ri ro'yxat).
+    Javobdagi ``high_water`` — server qabul qilgan oxirgi ``ts``; ilova undan keyingilarini yuboradi.
+    """
+    forbidden = _require_courier(request)
+    if forbidden:
+        return forbidden
+
+    courier_id = _courier_id_linked(request.user)
+    if not courier_id:
+        return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
+
+    fixes = request.data if isinstance(request.data, list) else request.data.get("fixes")
+    if not isinstance(fixes, list):
+        return Response({"detail": "FIXES_REQUIRED"}, status=400)
+
+    try:
+        result = record_positions(courier_id, fixes)
+    except UnknownCourier:
+        return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
+    return Response({"status": "ok", **result})
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def courier_accept_order_view(request):
@@ -726,19 +892,19 @@ def courier_accept_order_view(request):
     if forbidden:
         return forbidden
 
-    courier = _get_courier_linked(request.user)
-    if not courier:
+    courier_id = _courier_id_linked(request.user)
+    if not courier_id:
         return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
 
     oid = request.data.get("order_id")
     if not oid:
         return Response({"detail": "ORDER_ID_REQUIRED"}, status=400)
 
-    o = get_object_or_404(Order, pk=oid)
-    o.courier = courier
-    o.status = "assigned"
-    o.save(update_fields=["courier", "status"])
-    return Response({"status": "ok", "order_id": o.id})
+    # shartli UPDATE: faqat hali pending va kuryersiz bo'lsa (ikki kuryer bir vaqtda olsa — bittasi yutadi)
+    result = order_flow.accept(oid, courier_id)
+    if not result.ok:
+        return _transition_error(result)
+    return Response({"status": "ok", "order_id": result.order_id})
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -747,23 +913,19 @@ def courier_start_delivery_view(request):
     if forbidden:
         return forbidden
 
-    courier = _get_courier_linked(request.user)
-    if not courier:
+    courier_id = _courier_id_linked(request.user)
+    if not courier_id:
         return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
 
     oid = request.data.get("order_id")
     if not oid:
         return Response({"detail": "ORDER_ID_REQUIRED"}, status=400)
 
-    o = get_object_or_404(Order, pk=oid, courier=courier)
-
-    # faqat assigned bo‘lsa delivering ga o‘tkazamiz
-    if o.status not in ("assigned", "delivering"):
-        return Response({"detail": f"INVALID_STATUS:{o.status}"}, status=400)
-
-    o.status = "delivering"
-    o.save(update_fields=["status"])
-    return Response({"status": "ok", "order_id": o.id, "order_status": o.status})
+    # faqat assigned bo‘lsa delivering ga o‘tkazamiz (delivering bo'lsa — o'zgarishsiz ok)
+    result = order_flow.start(oid, courier_id)
+    if not result.ok:
+        return _transition_error(result)
+    return Response({"status": "ok", "order_id": result.order_id, "order_status": result.status})
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def courier_confirm_delivery_view(request):
@@ -771,23 +933,37 @@ def courier_confirm_delivery_view(request):
     if forbidden:
         return forbidden
 
-    courier = _get_courier_linked(request.user)
-    if not courier:
+    courier_id = _courier_id_linked(request.user)
+    if not courier_id:
         return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
 
     oid = request.data.get("order_id")
     if not oid:
         return Response({"detail": "ORDER_ID_REQUIRED"}, status=400)
 
-    o = get_object_or_404(Order, pk=oid, courier=courier)
+    result = order_flow.confirm(
+        oid,
+        courier_id,
+        payment_type=(request.data.get("payment_type") or "").strip(),
+        payment_amount=_to_int_amount(request.data.get("payment_amount") or 0, 0),
+    )
+    if not result.ok:
+        return _transition_error(result)
+    return Response({"status": "ok", "order_id": result.order_id})
+
+
+def _history_date(delivered_at, created_at):
+    dt = delivered_at or created_at
+    return dt.strftime("%Y-%m-%d %H:%M") if dt else None
 
-    o.payment_type = (request.data.get("payment_type") or "").strip()
-    o.payment_amount = _to_int_amount(request.data.get("payment_amount") or 0, 0)
-    o.status = "done"
-    o.delivered_at = timezone.now()
-    o.save(update_fields=["payment_amount", "payment_type", "status", "delivered_at"])
 
-    return Response({"status": "ok", "order_id": o.id})
+COURIER_HISTORY_ROW = Projection({
+    "order_id": "id",
+    "client": Col("client__full_name", default="Mijoz"),
+    "amount": Col("payment_amount", convert=_to_int_amount, default=0),
+    "payment_type": Col("payment_type", default=""),
+    "date": Computed(_history_date, ("delivered_at", "created_at")),
+})
 
 
 @api_view(["GET"])
@@ -797,27 +973,20 @@ def courier_history_view(request):
     if forbidden:
         return forbidden
 
-    courier = _get_courier_linked(request.user)
-    if not courier:
+    courier_id = _courier_id_linked(request.user)
+    if not courier_id:
         return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
 
-    qs = Order.objects.select_related("client").filter(
-        courier=courier,
+    qs = Order.objects.filter(
+        courier_id=courier_id,
         status="done"
-    ).order_by("-delivered_at")[:500]
-
-    data = []
-    for o in qs:
-        dt = getattr(o, "delivered_at", None) or getattr(o, "created_at", None)
-        data.append({
-            "order_id": o.id,
-            "client": getattr(o.client, "full_name", "Mijoz") if o.client else "Mijoz",
-            "amount": _to_int_amount(getattr(o, "payment_amount", 0), 0),
-            "payment_type": (getattr(o, "payment_type", "") or ""),
-            "date": dt.strftime("%Y-%m-%d %H:%M") if dt else None,
-        })
+    )
+    try:
+        page = COURIER_HISTORY_ROW.paginate_request(request, qs, pagination.BY_DELIVERED, default_page_size=500)
+    except pagination.InvalidCursor:
+        return Response({"detail": "BAD_CURSOR"}, status=400)
 
-    return Response({"status": "ok", "data": data})
+    return Response({"status": "ok", "data": page.items, **page.as_dict()})
 
 
 # ================= CLIENT (DRF TOKEN) =================
@@ -832,9 +1001,11 @@ def _get_client_linked(user):
         return None
 
     # 1) userga bog‘langan Client bormi?
-    c = Client.objects.filter(user=user).first()
+    c = actors.resolve_user(user).client
     if c:
         return c
+    # quyida bog'lanadi/yaratiladi — actor keshi yangilansin
+    actors.forget(user)
 
     # 2) username phone bo‘lsa, phone orqali topamiz
     phone_guess = (getattr(user, "username", "") or "").strip()
@@ -912,7 +1083,7 @@ def client_metrics_view(request):
     return Response({
         "bottle_balance": _to_int_amount(getattr(c, "bottle_balance", 0), 0),
         "debt": _to_int_amount(getattr(c, "debt", 0), 0),
-        "recent_orders_count": Order.objects.filter(client=c).count(),
+        "recent_orders_count": c.orders_count,
     })
 
 
@@ -923,22 +1094,23 @@ def client_recent_orders_view(request):
     if forbidden:
         return forbidden
 
-    c = _get_client_linked(request.user)
-    if not c:
+    client_id = _client_id_linked(request.user)
+    if not client_id:
         return Response({"detail": "CLIENT_PROFILE_NOT_LINKED"}, status=404)
 
-    qs = Order.objects.select_related("courier").filter(client=c).order_by("-created_at")[:10]
+    qs = Order.objects.select_related("courier").filter(client_id=client_id).order_by("-created_at")[:10]
 
     items = []
     for o in qs:
         courier = None
         if o.courier:
+            k_lat, k_lon = live_latlon(o.courier)
             courier = {
                 "id": o.courier.id,
                 "full_name": o.courier.full_name,
                 "phone": o.courier.phone,
-                "lat": getattr(o.courier, "lat", None),
-                "lon": getattr(o.courier, "lon", None),
+                "lat": k_lat,
+                "lon": k_lon,
             }
 
         items.append({
@@ -952,15 +1124,33 @@ def client_recent_orders_view(request):
     return Response(items)
 
 
+def _client_id_linked(user):
+    # faqat id kerak bo'lsa: JWT claim'idan; bog'lanmagan bo'lsa — _get_client_linked
+    if not user or not getattr(user, "is_authenticated", False):
+        return None
+    client_id = actors.resolve_user(user).client_id
+    if client_id:
+        return client_id
+    c = _get_client_linked(user)
+    return c.id if c else None
+
+
 # ================= CLIENT PANEL (SESSION JSON) =================
 # Bu endpointlar TOKEN emas, SESSION bilan ishlaydi.
 # Ular client_panel html/js uchun qulay.
 
 def _session_client(request):
-    cid = request.session.get("client_id")
-    if not cid:
-        return None
-    return Client.objects.filter(id=cid).first()
+    return actors.session_client(request)
+
+
+CLIENT_ORDER_ROW = Projection({
+    "id": "id",
+    "created_at": Col("created_at", convert=isoformat, default=""),
+    "status": Col("status", default=""),
+    "bottles": "bottles",
+    "note": Col("note", default=""),
+    "amount": Col("debt_change", convert=int, default=0),
+})
 
 
 @csrf_exempt
@@ -969,18 +1159,13 @@ def api_client_orders(request):
     if not client:
         return JsonResponse({"status": "error", "message": "Not authenticated"}, status=403)
 
-    qs = Order.objects.filter(client=client).order_by("-created_at")[:100]
-    items = []
-    for o in qs:
-        items.append({
-            "id": o.id,
-            "created_at": o.created_at.isoformat() if getattr(o, "created_at", None) else "",
-            "status": getattr(o, "status", ""),
-            "bottles": getattr(o, "bottle_count", 0),
-            "note": getattr(o, "client_note", "") or "",
-            "amount": int(getattr(o, "debt_change", 0) or 0),
-        })
-    return JsonResponse({"status": "ok", "data": items})
+    try:
+        page = CLIENT_ORDER_ROW.paginate_request(
+            request, Order.objects.filter(client=client), pagination.BY_CREATED, default_page_size=100
+        )
+    except pagination.InvalidCursor:
+        return JsonResponse({"status": "error", "message": "BAD_CURSOR"}, status=400)
+    return FastJsonResponse({"status": "ok", "data": page.items, **page.as_dict()})
 
 
 @csrf_exempt
@@ -1169,32 +1354,14 @@ from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-import math
-
-import math
-
-def _haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371  # Yer radiusi (km)
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-
-    a = math.sin(dphi / 2) ** 2 + \
-        math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
 
-    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
-
-def estimate_eta_minutes(km: float) -> int:
-    AVG_SPEED_KMH = 30  # shahar ichida
-    return max(3, int((km / AVG_SPEED_KMH) * 60))
-def _eta_from_distance(distance_km: float, speed_kmh: float = 25.0) -> int:
-    # return seconds
-    if not distance_km or distance_km <= 0:
-        return 0
-    hours = distance_km / max(speed_kmh, 1.0)
-    return int(hours * 3600)
+def _track_distance(c_lat, c_lon, k_lat, k_lon):
+    """Client va kuryer orasidagi (distance_km, eta_seconds); koordinata yo'q bo'lsa (None, None)."""
+    km, eta, ok = geo.distance_eta(c_lat, c_lon, k_lat, k_lon)
+    if not ok[0]:
+        return None, None
+    return float(km[0]), int(eta[0])
 
 def _fmt_eta(seconds: int) -> str:
     if seconds <= 0: return ""
@@ -1222,19 +1389,10 @@ def client_order_track_view(request, pk: int):
         c_lat = getattr(c, "location_lat", None)
         c_lon = getattr(c, "location_lon", None)
 
-    # courier coords
-    k_lat = getattr(o.courier, "lat", None) if o.courier else None
-    k_lon = getattr(o.courier, "lon", None) if o.courier else None
+    # courier coords (live store, bo'lmasa profildan)
+    k_lat, k_lon = live_latlon(o.courier)
 
-    distance_km = None
-    eta_seconds = None
-    if c_lat is not None and c_lon is not None and k_lat is not None and k_lon is not None:
-        try:
-            distance_km = _haversine_km(float(c_lat), float(c_lon), float(k_lat), float(k_lon))
-            eta_seconds = _eta_from_distance(distance_km, speed_kmh=25.0)
-        except Exception:
-            distance_km = None
-            eta_seconds = None
+    distance_km, eta_seconds = _track_distance(c_lat, c_lon, k_lat, k_lon)
 
     courier = None
     if o.courier:
@@ -1242,8 +1400,8 @@ def client_order_track_view(request, pk: int):
             "id": o.courier.id,
             "full_name": getattr(o.courier, "full_name", None),
             "phone": getattr(o.courier, "phone", None),
-            "lat": getattr(o.courier, "lat", None),
-            "lon": getattr(o.courier, "lon", None),
+            "lat": k_lat,
+            "lon": k_lon,
         }
 
     return Response({
@@ -1257,6 +1415,173 @@ def client_order_track_view(request, pk: int):
         "distance_km": round(distance_km, 2) if distance_km is not None else None,
         "distance_text": (f"{distance_km:.1f} km" if distance_km is not None else ""),
     })
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def admin_deliveries_eta_view(request):
+    """Barcha faol (assigned/delivering) yetkazishlar uchun masofa va ETA — bitta so'rovda.
+
+    Har bir buyurtma uchun alohida ``.../track/`` so'rovi o'rniga: pozitsiyalar store'dan
+    bitta ``get_many`` bilan olinadi, masofalar numpy bilan birdaniga hisoblanadi.
+    Query: ``status`` (assigned|delivering), ``courier_id``.
+    """
+    forbidden = _require_admin(request)
+    if forbidden:
+        return forbidden
+    my_business = _get_my_business(request.user)
+    if not my_business:
+        return Response({"detail": "Siz hech qanday biznesga biriktirilmagansiz!"}, status=403)
+
+    statuses = dispatch.ACTIVE_STATUSES
+    st = (request.GET.get("status") or "").strip().lower()
+    if st in statuses:
+        statuses = (st,)
+    qs = (
+        Order.objects.filter(business=my_business, status__in=statuses, courier__isnull=False)
+        .select_related("client", "courier")
+        .order_by("id")
+    )
+    courier_id = request.GET.get("courier_id")
+    if courier_id:
+        qs = qs.filter(courier_id=_to_int_amount(courier_id, 0))
+    orders = list(qs[:1000])
+
+    live = live_latlon_many({o.courier_id: o.courier for o in orders}.values())
+    points = [dispatch.order_point(o) for o in orders]
+    km, eta, ok = geo.distance_eta(
+        [p[0] for p in points], [p[1] for p in points],
+        [live[o.courier_id][0] for o in orders], [live[o.courier_id][1] for o in orders],
+    )
+
+    items = []
+    for i, o in enumerate(orders):
+        k_lat, k_lon = live[o.courier_id]
+        distance_km = float(km[i]) if ok[i] else None
+        eta_seconds = int(eta[i]) if ok[i] else None
+        items.append({
+            "order_id": o.id,
+            "order_status": o.status,
+            "client": {
+                "id": o.client_id,
+                "full_name": getattr(o.client, "full_name", None),
+                "lat": points[i][0],
+                "lon": points[i][1],
+            },
+            "courier": {
+                "id": o.courier_id,
+                "full_name": getattr(o.courier, "full_name", None),
+                "phone": getattr(o.courier, "phone", None),
+                "lat": k_lat,
+                "lon": k_lon,
+            },
+            "eta_seconds": eta_seconds,
+            "eta_text": _fmt_eta(eta_seconds or 0),
+            "distance_km": round(distance_km, 2) if distance_km is not None else None,
+            "distance_text": (f"{distance_km:.1f} km" if distance_km is not None else ""),
+        })
+
+    return Response({"status": "ok", "count": len(items), "results": items})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def order_route_view(request, pk: int):
+    """Buyurtma bo'yicha kuryer yo'li (soddalashtirilgan polyline).
+
+    Query: ``tolerance`` (metr, default 10), ``max_points`` (default 500).
+    Admin — istalgan order, kuryer — o'ziniki, client — o'ziniki.
+    """
+    role = get_role(request.user)
+    qs = Order.objects.all()
+    if role == "COURIER":
+        courier_id = _courier_id_linked(request.user)
+        if not courier_id:
+            return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
+        qs = qs.filter(courier_id=courier_id)
+    elif role == "CLIENT":
+        client_id = _client_id_linked(request.user)
+        if not client_id:
+            return Response({"detail": "CLIENT_PROFILE_NOT_LINKED"}, status=404)
+        qs = qs.filter(client_id=client_id)
+    o = get_object_or_404(qs, pk=pk)
+
+    try:
+        tolerance = max(float(request.query_params.get("tolerance", 10)), 0.0)
+        max_points = max(int(request.query_params.get("max_points", 500)), 2)
+    except (TypeError, ValueError):
+        return Response({"detail": "INVALID_PARAMS"}, status=400)
+
+    data = order_route(o, tolerance_m=tolerance, max_points=min(max_points, 5000))
+    return Response({"status": "ok", **data})
+
+
+def _sse_user(request):
+    """EventSource header yubora olmaydi: session, ``Authorization`` yoki ``?token=`` (JWT)."""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user
+    raw = request.GET.get("token")
+    if not raw:
+        header = request.META.get("HTTP_AUTHORIZATION", "")
+        if header.startswith("Bearer "):
+            raw = header.split(" ", 1)[1].strip()
+    if not raw:
+        return None
+    from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+    from suv_tashish_crm.jwt_claims import ClaimsJWTAuthentication
+    auth = ClaimsJWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def order_stream_view(request, pk: int):
+    """SSE: buyurtma statusi va unga biriktirilgan kuryer pozitsiyasi.
+
+    ``client_order_track_view`` ni polling qilish o'rniga. Kuryer almashsa
+    yangi kuryerning ``position`` kanaliga avtomatik o'tadi.
+    """
+    user = _sse_user(request)
+    if user is None:
+        return JsonResponse({"detail": "AUTH_REQUIRED"}, status=401)
+
+    role = get_role(user)
+    qs = Order.objects.all()
+    if role == "COURIER":
+        courier_id = _courier_id_linked(user)
+        if not courier_id:
+            return JsonResponse({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=404)
+        qs = qs.filter(courier_id=courier_id)
+    elif role == "CLIENT":
+        client_id = _client_id_linked(user)
+        if not client_id:
+            return JsonResponse({"detail": "CLIENT_PROFILE_NOT_LINKED"}, status=404)
+        qs = qs.filter(client_id=client_id)
+    elif role != "ADMIN":
+        return JsonResponse({"detail": "FORBIDDEN"}, status=403)
+    o = qs.filter(pk=pk).only("id", "courier_id").first()
+    if o is None:
+        return JsonResponse({"detail": "NOT_FOUND"}, status=404)
+
+    channels = [order_channel(o.id)]
+    if o.courier_id:
+        channels.append(position_channel(o.courier_id))
+
+    def _follow(sub, event):
+        cid = (event.get("data") or {}).get("courier_id")
+        if event.get("type", "").startswith("order.") and cid:
+            sub.add(position_channel(cid))
+
+    async def _follow_async(sub, event):
+        cid = (event.get("data") or {}).get("courier_id")
+        if event.get("type", "").startswith("order.") and cid:
+            await sub.add(position_channel(cid))
+
+    return sse_response(request, channels, on_event=_follow_async, on_event_sync=_follow)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def client_update_location_view(request):
@@ -1308,8 +1633,8 @@ def courier_metrics_view(request):
     if forbidden:
         return forbidden
 
-    courier = _get_courier_linked(request.user)
-    if not courier:
+    courier_id = _courier_id_linked(request.user)
+    if not courier_id:
         return Response({"detail": "COURIER_PROFILE_NOT_LINKED"}, status=status.HTTP_404_NOT_FOUND)
 
     return Response({"ok": True})
@@ -1439,15 +1764,7 @@ def client_create_order_view(request):
     return Response({"ok": True, "order_id": o.id}, status=status.HTTP_201_CREATED)
 
 def _get_my_business(user):
-    # 1. Agar Admin bo'lsa
-    if hasattr(user, 'admin_panel_profile') and user.admin_panel_profile.business:
-        return user.admin_panel_profile.business
-    # 2. Agar Kuryer bo'lsa
-    if hasattr(user, 'courier_profile') and user.courier_profile.business:
-        return user.courier_profile.business
-    # 3. Agar Klient bo'lsa
-    # (Klient modelida related_name='client_profile' bo'lsa yoki shunga o'xshash)
-    # ...
-    return None
+    # admin profili, bo'lmasa kuryer, bo'lmasa mijoz biznesi (suv_tashish_crm.actors)
+    return actors.resolve_user(user).business
 
 
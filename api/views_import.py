@@ -1,11 +1,15 @@
+from django.http import FileResponse, JsonResponse
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 
-from .views import get_role
-from .import_utils import read_table_upload, import_clients, import_couriers
+from suv_tashish_crm import imports, pagination
+from suv_tashish_crm.events import import_channel, sse_response
+from suv_tashish_crm.models import ImportJob
+
+from .views import _sse_user, get_role
 
 
 def _require_admin(request):
@@ -14,10 +18,8 @@ def _require_admin(request):
     return None
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-@parser_classes([MultiPartParser, FormParser])
-def admin_import_clients_view(request):
+def _submit(request, kind):
+    """Faylni saqlab fon importini navbatga qo'yadi — javob darhol (202)."""
     forbidden = _require_admin(request)
     if forbidden:
         return forbidden
@@ -35,52 +37,82 @@ def admin_import_clients_view(request):
         mode = "upsert"
 
     try:
-        rows, filetype = read_table_upload(f)
+        job = imports.submit(kind, f, default_password=default_password, mode=mode, user=request.user)
     except ValueError as e:
         return Response({"detail": str(e)}, status=400)
 
-    res = import_clients(rows, default_password=default_password, mode=mode)
     return Response({
-        "filetype": filetype,
-        "total": res.total,
-        "created": res.created,
-        "updated": res.updated,
-        "skipped": res.skipped,
-        "errors": res.errors,
-    })
+        "job_id": job.pk,
+        "status": job.status,
+        "filetype": job.file_type,
+        "total_rows": job.total_rows,
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser, FormParser])
+def admin_import_clients_view(request):
+    return _submit(request, "clients")
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser])
 def admin_import_couriers_view(request):
+    return _submit(request, "couriers")
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def admin_import_jobs_view(request):
     forbidden = _require_admin(request)
     if forbidden:
         return forbidden
+    try:
+        page = pagination.paginate_request(request, ImportJob.objects.all(), pagination.BY_ID, default_page_size=50)
+    except pagination.InvalidCursor:
+        return Response({"detail": "BAD_CURSOR"}, status=400)
+    return Response({"results": [imports.job_status(j) for j in page.items], **page.as_dict()})
 
-    f = request.FILES.get("file")
-    if not f:
-        return Response({"detail": "NO_FILE"}, status=400)
 
-    default_password = (request.data.get("default_password") or "").strip()
-    if not default_password:
-        return Response({"detail": "NO_DEFAULT_PASSWORD"}, status=400)
-
-    mode = (request.data.get("mode") or "upsert").strip().lower()
-    if mode not in ("upsert", "create_only"):
-        mode = "upsert"
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def admin_import_job_view(request, pk: int):
+    forbidden = _require_admin(request)
+    if forbidden:
+        return forbidden
+    job = ImportJob.objects.filter(pk=pk).first()
+    if job is None:
+        return Response({"detail": "NOT_FOUND"}, status=404)
+    return Response(imports.job_status(job))
 
-    try:
-        rows, filetype = read_table_upload(f)
-    except ValueError as e:
-        return Response({"detail": str(e)}, status=400)
 
-    res = import_couriers(rows, default_password=default_password, mode=mode)
-    return Response({
-        "filetype": filetype,
-        "total": res.total,
-        "created": res.created,
-        "updated": res.updated,
-        "skipped": res.skipped,
-        "errors": res.errors,
-    })
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def admin_import_job_errors_view(request, pk: int):
+    """Qator xatolari hisobotini CSV sifatida yuklab berish."""
+    forbidden = _require_admin(request)
+    if forbidden:
+        return forbidden
+    job = ImportJob.objects.filter(pk=pk).only("id", "error_report").first()
+    if job is None or not job.error_report:
+        return Response({"detail": "NOT_FOUND"}, status=404)
+    return FileResponse(
+        job.error_report.open("rb"),
+        as_attachment=True,
+        filename=f"import_{job.pk}_errors.csv",
+        content_type="text/csv; charset=utf-8",
+    )
+
+
+def admin_import_job_stream_view(request, pk: int):
+    """SSE: ``import.progress`` hodisalari (polling o'rniga)."""
+    user = _sse_user(request)
+    if user is None:
+        return JsonResponse({"detail": "AUTH_REQUIRED"}, status=401)
+    if get_role(user) != "ADMIN":
+        return JsonResponse({"detail": "FORBIDDEN"}, status=403)
+    if not ImportJob.objects.filter(pk=pk).exists():
+        return JsonResponse({"detail": "NOT_FOUND"}, status=404)
+    return sse_response(request, [import_channel(pk)])
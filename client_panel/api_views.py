@@ -2,7 +2,8 @@ from rest_framework import viewsets, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from suv_tashish_crm.models import Order
-from .serializers import OrderSerializer
+from suv_tashish_crm.pagination import BY_CREATED, KeysetPagination
+from .serializers import ORDER_ROW, OrderSerializer
 from rest_framework.views import APIView
 from rest_framework import status
 from .models import PushToken
@@ -38,6 +39,11 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     """Read-only API for client orders. Requires authentication."""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset = BY_CREATED
+    page_size = 100
+    # ro'yxatlar OrderSerializer shaklida, lekin values_list orqali (serializer har qator uchun emas)
+    projection = ORDER_ROW
 
     def get_queryset(self):
         # For API usage, client should authenticate and we expect a query param ?client_id=...
@@ -47,6 +53,10 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
             qs = qs.filter(client_id=client_id)
         return qs
 
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(page)
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def my(self, request):
         """Shortcut to get orders for the provided client_id parameter."""
@@ -54,5 +64,4 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
         if not client_id:
             return Response({'detail': 'client_id required as query param'}, status=400)
         qs = self.get_queryset().filter(client_id=client_id)
-        serializer = self.get_serializer(qs, many=True)
-        return Response(serializer.data)
+        return self.get_paginated_response(self.paginate_queryset(qs))
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from suv_tashish_crm.models import Order, Client
+from suv_tashish_crm.projection import Col, Computed, Projection
 
 
 class ClientBriefSerializer(serializers.ModelSerializer):
@@ -10,6 +11,8 @@ class ClientBriefSerializer(serializers.ModelSerializer):
 
 class OrderSerializer(serializers.ModelSerializer):
     client = ClientBriefSerializer(read_only=True)
+    bottle_count = serializers.IntegerField(source='bottles', read_only=True)
+    client_note = serializers.CharField(source='note', read_only=True)
 
     class Meta:
         model = Order
@@ -17,6 +20,28 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'delivered_at')
 
 
+def _client_brief(pk, full_name, phone, customer_id):
+    if pk is None:
+        return None
+    return {'id': pk, 'full_name': full_name, 'phone': phone, 'customer_id': customer_id}
+
+
+_datetime = serializers.DateTimeField().to_representation
+
+# OrderSerializer bilan bir xil chiqish — ro'yxatlar uchun (values_list, instance'siz)
+ORDER_ROW = Projection({
+    'id': 'id',
+    'client': Computed(_client_brief, ('client_id', 'client__full_name', 'client__phone', 'client__customer_id')),
+    'courier_id': 'courier_id',
+    'created_at': Col('created_at', convert=_datetime),
+    'delivered_at': Col('delivered_at', convert=_datetime),
+    'status': 'status',
+    'bottle_count': 'bottles',
+    'debt_change': Col('debt_change', convert=serializers.DecimalField(max_digits=10, decimal_places=2).to_representation),
+    'client_note': 'note',
+})
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
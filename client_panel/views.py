@@ -1,5 +1,9 @@
 from django.shortcuts import render, redirect
+from django.db import transaction
 from django.http import HttpResponse, JsonResponse
+from suv_tashish_crm import actors, pagination
+from suv_tashish_crm.projection import Col, Projection, isoformat
+from suv_tashish_crm.renderers import FastJsonResponse
 from suv_tashish_crm.models import Client, Notification
 from django.views.decorators.csrf import csrf_exempt
 import json
@@ -41,7 +45,7 @@ def dashboard(request):
     client = None
     if request.session.get('client_id'):
         try:
-            client = Client.objects.filter(id=request.session.get('client_id')).first()
+            client = actors.session_client(request)
         except Exception:
             client = None
     # Ensure session reflects current client name/phone (keeps sidebar consistent)
@@ -99,7 +103,7 @@ def contract_view(request):
     client = None
     if request.session.get('client_id'):
         try:
-            client = Client.objects.filter(id=request.session.get('client_id')).first()
+            client = actors.session_client(request)
         except Exception:
             client = None
 
@@ -125,7 +129,7 @@ def orders_view(request):
     if not request.session.get('client_id'):
         return redirect('/login/')
 
-    client = Client.objects.filter(id=request.session.get('client_id')).first()
+    client = actors.session_client(request)
     orders = []
 
     if client:
@@ -145,29 +149,37 @@ def orders_view(request):
     return render(request, 'client/orders.html', {'client': client, 'orders': orders})
 
 
+# mijoz buyurtmalari ro'yxati: values_list + kompilyatsiya qilingan mapper (suv_tashish_crm.projection)
+CLIENT_ORDER_ROW = Projection({
+    'id': 'id',
+    'created_at': Col('created_at', convert=isoformat, default=''),
+    'status': 'status',
+    'bottles': 'bottles',
+    'note': Col('note', default=''),
+    'amount': Col('debt_change', convert=int, default=0),
+})
+
+
 def api_client_orders(request):
     """Return JSON list of orders for the logged-in client."""
     if not request.session.get('client_id'):
         return JsonResponse({'status': 'error', 'message': 'Not authenticated'}, status=403)
-    client = Client.objects.filter(id=request.session.get('client_id')).first()
+    client = actors.session_client(request)
     if not client:
         return JsonResponse({'status': 'error', 'message': 'Client not found'}, status=404)
     items = []
+    page = None
     try:
         from suv_tashish_crm.models import Order
-        qs = Order.objects.filter(client=client).order_by('-created_at')[:100]
-        for o in qs:
-            items.append({
-                'id': o.id,
-                'created_at': o.created_at.isoformat() if getattr(o, 'created_at', None) else '',
-                'status': o.status,
-                'bottles': o.bottle_count,
-                'note': getattr(o, 'client_note', ''),
-                'amount': int(o.debt_change) if getattr(o, 'debt_change', None) is not None else 0,
-            })
+        page = CLIENT_ORDER_ROW.paginate_request(
+            request, Order.objects.filter(client=client), pagination.BY_CREATED, default_page_size=100
+        )
+        items = page.items
+    except pagination.InvalidCursor:
+        return JsonResponse({'status': 'error', 'message': 'BAD_CURSOR'}, status=400)
     except Exception:
         items = []
-    return JsonResponse({'status': 'ok', 'data': items})
+    return FastJsonResponse({'status': 'ok', 'data': items, **(page.as_dict() if page else {})})
 
 
 def profile_view(request):
@@ -176,7 +188,7 @@ def profile_view(request):
     if not request.session.get('client_id'):
         return redirect('/login/')
     try:
-        client = Client.objects.filter(id=request.session.get('client_id')).first()
+        client = actors.session_client(request)
     except Exception:
         client = None
     # keep session values in sync with actual client record
@@ -188,9 +200,8 @@ def profile_view(request):
         pass
     # load static regions from CSV to allow selection in profile address field
     try:
-        from admin_panel.views import read_csv_data
-        static_regions = read_csv_data()
-        regions = [r.get('name') for r in static_regions if r.get('name')]
+        from suv_tashish_crm import reference_data
+        regions = [r['name'] for r in reference_data.volidam().rows if r['name']]
     except Exception:
         regions = []
 
@@ -203,7 +214,7 @@ def api_update_profile(request):
         return JsonResponse({'status': 'error', 'message': 'POST required'})
     if not request.session.get('client_id'):
         return JsonResponse({'status': 'error', 'message': 'Not authenticated'})
-    client = Client.objects.filter(id=request.session.get('client_id')).first()
+    client = actors.session_client(request)
     if not client:
         return JsonResponse({'status': 'error', 'message': 'Client not found'})
     # accept JSON or form
@@ -247,28 +258,17 @@ def api_update_profile(request):
         if region_obj is None:
             # try to find in CSV; if not present, append new region to Volidam.csv
             try:
-                import os, csv
-                try:
-                    from admin_panel.views import BASE_DIR, read_csv_data
-                except Exception:
-                    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                    read_csv_data = None
-                csv_path = os.path.join(BASE_DIR, 'Volidam.csv')
-                found_in_csv = False
-                if os.path.exists(csv_path):
-                    with open(csv_path, 'r', encoding='utf-8') as f:
-                        reader = csv.reader(f)
-                        next(reader, None)
-                        for row in reader:
-                            name = row[0] if len(row) > 0 else ''
-                            if name and name.strip() == address.strip():
-                                found_in_csv = True
-                                break
+                import csv
+                from suv_tashish_crm import reference_data
+                csv_path = reference_data.volidam_path()
+                # registry keeps the CSV names indexed — no re-read of the whole file
+                found_in_csv = address.strip() in reference_data.volidam().names
                 if not found_in_csv:
                     # append new region row (name, bottle, location, phone)
                     with open(csv_path, 'a', encoding='utf-8', newline='') as f:
                         writer = csv.writer(f)
                         writer.writerow([address.strip(), '', '', ''])
+                    reference_data.invalidate()
             except Exception:
                 pass
             # create Region record in DB
@@ -391,7 +391,7 @@ def api_create_order(request):
     # so mobile/web users don't get blocked when session cookies are lost.
     client = None
     if request.session.get('client_id'):
-        client = Client.objects.filter(id=request.session.get('client_id')).first()
+        client = actors.session_client(request)
     if not client:
         # try to find client by phone/name provided in the POST/JSON body
         phone = (data.get('phone') or data.get('client_phone') or '')
@@ -451,34 +451,8 @@ def api_create_order(request):
         except Exception:
             existing = None
 
-            o = Order.objects.create(
-            client=client,
-            bottles=bottle_count,
-            note=note,
-            status='pending',
-            courier=None,
-            lat=float(lat) if lat else None,
-            lon=float(lon) if lon else None,
-        )
-
-        # compute monetary amount server-side: 1 bottle = 12_000 UZS
-        try:
-            unit_price = 12000
-            amount = bottle_count * unit_price
-            o.debt_change = Decimal(amount)
-            o.save()
-        except Exception:
-            pass
-        # if client sent location, save it to client profile for courier use
-        try:
-            if lat and lon:
-                client.location_lat = float(lat)
-                client.location_lon = float(lon)
-                client.save()
-        except Exception:
-            pass
-
-        # accept optional client name/phone/region updates from the order form
+        # accept optional client name/phone/region/location updates from the order form
+        # (order tranzaksiyasidan oldin: profil xatosi buyurtmani bekor qilmasin)
         try:
             name = data.get('name') or data.get('first_name')
             phone = data.get('phone')
@@ -500,103 +474,71 @@ def api_create_order(request):
                         updated = True
                 except Exception:
                     pass
+            # if client sent location, save it to client profile for courier use
+            try:
+                if lat and lon:
+                    client.location_lat = float(lat)
+                    client.location_lon = float(lon)
+                    updated = True
+            except Exception:
+                pass
             if updated:
-                client.save()
+                with transaction.atomic():
+                    client.save()
                 # reflect name/phone in session so sidebar shows them
                 try:
                     request.session['client_name'] = client.first_name or ''
                     request.session['client_phone'] = client.phone or ''
                 except Exception:
                     pass
-            # save lat/lon after potential profile changes
-            try:
-                if lat and lon:
-                    client.location_lat = float(lat)
-                    client.location_lon = float(lon)
-                    client.save()
-            except Exception:
-                pass
         except Exception:
-            pass
-        # notify admin
-        try:
-            # include client's name/phone from profile in the notification
-            cn = client.first_name or client.full_name or ''
-            cp = client.phone or ''
-            try:
-                amt = int(o.debt_change)
-            except Exception:
-                amt = o.bottle_count * 12000
-            # include client's note (if any) in admin notification
-            note_text = (o.client_note or '').strip()
-            msg = f'Client {client.id} ({cn} {cp}) buyurtma berdi #{o.id} — {o.bottle_count} ta — {amt} UZS'
+            client.refresh_from_db()
+
+        # compute monetary amount server-side: 1 bottle = 12_000 UZS
+        amount = bottle_count * 12000
+        cname = client.first_name or client.full_name or ''
+        cphone = client.phone or ''
+        creg = client.region.name if getattr(client, 'region', None) else ''
+        note_text = (note or '').strip()
+
+        # order, admin bildirishnomasi va outbox yozuvi bitta tranzaksiyada: biri yiqilsa
+        # hammasi bekor bo'ladi (order'siz xabar ham, xabarsiz order ham qolmaydi)
+        with transaction.atomic():
+            o = Order.objects.create(
+                client=client,
+                bottles=bottle_count,
+                note=note,
+                status='pending',
+                courier=None,
+                lat=float(lat) if lat else None,
+                lon=float(lon) if lon else None,
+                debt_change=Decimal(amount),
+            )
+
+            # notify admin — include client's name/phone and note (if any)
+            msg = f'Client {client.id} ({cname} {cphone}) buyurtma berdi #{o.id} — {bottle_count} ta — {amount} UZS'
             if note_text:
                 msg = msg + f" — Note: {note_text}"
             Notification.objects.create(title='Yangi buyurtma', message=msg)
-        except Exception:
-            pass
-        # Send Telegram notifications to admin channel and active couriers
-        try:
-            from suv_tashish_crm.telegram import send_telegram
-            # build message
-            when = ''
-            try:
-                from django.utils import timezone
-                when = timezone.localtime().strftime('%Y-%m-%d %H:%M:%S')
-            except Exception:
-                when = ''
-            cname = client.first_name or client.full_name or ''
-            cphone = client.phone or ''
-            creg = client.region.name if getattr(client, 'region', None) else ''
-            try:
-                amt = int(o.debt_change)
-            except Exception:
-                amt = o.bottle_count * 12000
-            # include client note in telegram message when present
-            note_text = (o.client_note or '').strip()
+
+            # Send Telegram notifications to admin channel and active couriers
+            from suv_tashish_crm.outbox import notify_staff
+            when = timezone.localtime().strftime('%Y-%m-%d %H:%M:%S')
             text = (
                 f"📦 Yangi buyurtma\n"
                 f"Time: {when}\n"
                 f"Client: {cname}\n"
                 f"Phone: {cphone}\n"
                 f"Region: {creg}\n"
-                f"Bottles: {o.bottle_count}\n"
-                f"Amount: {amt} UZS\n"
+                f"Bottles: {bottle_count}\n"
+                f"Amount: {amount} UZS\n"
                 f"Order ID: {o.id}\n"
             )
             if note_text:
                 text += f"Note: {note_text}\n"
-            
-            # send to main channel (uses settings.TELEGRAM_CHAT_ID)
-            try:
-                send_telegram(text)
-            except Exception:
-                pass
-            # send direct message to active couriers who have telegram_id set
-            try:
-                from suv_tashish_crm.models import Courier, Admin
-                couriers = Courier.objects.filter(is_active=True)
-                for cur in couriers:
-                    if getattr(cur, 'telegram_id', None):
-                        try:
-                            send_telegram(text, chat_id=cur.telegram_id)
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-            # also try to message any admin users with telegram_id
-            try:
-                from suv_tashish_crm.models import Admin
-                for adm in Admin.objects.all():
-                    if getattr(adm, 'telegram_id', None):
-                        try:
-                            send_telegram(text, chat_id=adm.telegram_id)
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-        except Exception:
-            pass
+            # main channel + active couriers + admins with telegram_id — one outbox insert,
+            # committed together with the order; delivery happens in the outbox workers
+            notify_staff(text, main_chat=True, couriers=True, admins=True)
         return JsonResponse({'status': 'ok', 'order_id': o.id})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)})
@@ -608,7 +550,7 @@ def contact_admin(request):
         return redirect('/login/')
     client = None
     try:
-        client = Client.objects.filter(id=request.session.get('client_id')).first()
+        client = actors.session_client(request)
     except Exception:
         client = None
     # mark last visited view so sidebar can highlight using session
@@ -665,7 +607,7 @@ def api_contact_admin(request):
         return JsonResponse({'status': 'error', 'message': 'POST required'})
     if not request.session.get('client_id'):
         return JsonResponse({'status': 'error', 'message': 'Not authenticated'})
-    client = Client.objects.filter(id=request.session.get('client_id')).first()
+    client = actors.session_client(request)
     if not client:
         return JsonResponse({'status': 'error', 'message': 'Client not found'})
     msg = request.POST.get('message') or request.POST.get('text') or ''
@@ -16,6 +16,8 @@ urlpatterns = [
     path('api/position/<int:courier_id>/', views.api_get_position_for_id, name='courier_api_get_position_for_id'),
     path('api/metrics/', views.api_metrics, name='courier_api_metrics'),
     path('api/update_position/', views.api_update_position, name='courier_api_update_position'),
+    path('api/update_positions/', views.api_update_positions, name='courier_api_update_positions'),
+    path('api/stream/', views.api_stream, name='courier_api_stream'),
 
     # Dev helper to set session courier_id for simulation/testing
     path('dev/set_session/<int:courier_id>/', views.dev_set_session, name='courier_dev_set_session'),
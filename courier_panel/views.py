@@ -3,15 +3,20 @@ from django.utils import timezone
 from datetime import timedelta
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
-from suv_tashish_crm.models import Courier, Order, Client
+from suv_tashish_crm import actors, order_flow, pagination
+from suv_tashish_crm.projection import Col, Computed, Projection
+from suv_tashish_crm.renderers import FastJsonResponse
+from suv_tashish_crm.models import Courier, Order, Client, DailyOrderStats
+from django.db.models import Sum
+from suv_tashish_crm.dashboard import get_dashboard_stats, top_clients_by_orders
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from .utils import append_client_to_csv
-
-
-# Simple in-memory store for courier positions (development only)
-COURIER_POSITIONS = {}
+from suv_tashish_crm.positions import (
+    InvalidPosition, UnknownCourier, get_position_store, record_position, record_positions,
+)
+from suv_tashish_crm.events import business_channel, courier_channel, position_channel, sse_enabled, sse_response
 
 # Static data removed
 
@@ -19,40 +24,16 @@ COURIER_POSITIONS = {}
 
 def dashboard(request):
     # Auth guard temporarily disabled; allow access during development
-    courier_id = request.session.get('courier_id')
-    courier = None
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
-
-    # Today's orders assigned to this courier
-    today = timezone.localdate()
-    todays_orders_qs = Order.objects.filter(courier=courier, created_at__date=today)
-    todays_count = todays_orders_qs.count()
+    courier = actors.session_courier(request)
 
-    # Delivered count
-    delivered_count = Order.objects.filter(courier=courier, status='done').count()
-
-    # Weekly deliveries (last 7 days) - counts per day
-    deliveries_by_day = []
-    labels = []
-    for i in range(6, -1, -1):
-        day = timezone.localdate() - timedelta(days=i)
-        count = Order.objects.filter(courier=courier, created_at__date=day).count()
-        labels.append(day.strftime('%a'))
-        deliveries_by_day.append(count)
+    # Today's / delivered / weekly counts for this courier (shared dashboard service)
+    stats = get_dashboard_stats(courier=courier, days=7, include_tops=False)
 
     # Recent orders for this courier
     recent_orders = Order.objects.filter(courier=courier).order_by('-created_at')[:10]
     # Top clients by orders (global) - useful for courier sidebar
     try:
-        top_clients = (
-            Order.objects.values('client__id', 'client__full_name')
-            .annotate(orders_count=Count('id'))
-            .order_by('-orders_count')[:5]
-        )
+        top_clients = top_clients_by_orders(top=5)
     except Exception:
         top_clients = []
 
@@ -95,27 +76,23 @@ def dashboard(request):
 
     context = {
         'courier': courier,
-        'todays_count': todays_count,
-        'delivered_count': delivered_count,
+        'todays_count': stats.today_orders,
+        'delivered_count': stats.delivered_count,
         'debtors': debtors,
         'inactive_clients': inactive_clients,
-        'weekly_labels_json': json.dumps(labels, ensure_ascii=False),
-        'weekly_data_json': json.dumps(deliveries_by_day),
+        'weekly_labels_json': json.dumps(stats.weekly_labels, ensure_ascii=False),
+        'weekly_data_json': json.dumps(stats.weekly_counts),
         'recent_orders': recent_orders,
         'top_clients': top_clients,
+        # SSE faqat ASGI ostida (yoki SSE_ENABLED=1); aks holda sahifa polling qiladi
+        'sse_enabled': sse_enabled(request),
     }
     return render(request, 'courier/courier_dashboard.html', context)
 
 
 def api_metrics(request):
     """Return simple courier metrics (todays_count, delivered_count) for polling updates."""
-    courier_id = request.session.get('courier_id')
-    courier = None
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
+    courier = actors.session_courier(request)
     today = timezone.localdate()
     todays_count = Order.objects.filter(courier=courier, created_at__date=today).count()
     # total delivered (all-time) for this courier
@@ -124,13 +101,7 @@ def api_metrics(request):
 
 
 def api_today_orders(request):
-    courier_id = request.session.get('courier_id')
-    courier = None
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
+    courier = actors.session_courier(request)
 
     today = timezone.localdate()
     
@@ -166,63 +137,60 @@ def api_today_orders(request):
 
 
 def api_weekly_stats(request):
-    courier_id = request.session.get('courier_id')
-    courier = None
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
+    courier = actors.session_courier(request)
 
     labels = []
     counts = []
     revenue = []
+    today = timezone.localdate()
+    # DailyOrderStats rollupidan: 7 ta kun uchun bitta so'rov
+    by_day = {
+        r['date']: r
+        for r in DailyOrderStats.objects.filter(courier=courier, date__gte=today - timedelta(days=6), date__lte=today)
+        .values('date')
+        .annotate(n=Sum('orders_count'), debt=Sum('debt_total'))
+        .order_by()
+    }
     for i in range(6, -1, -1):
-        day = timezone.localdate() - timedelta(days=i)
-        qs = Order.objects.filter(courier=courier, created_at__date=day)
+        day = today - timedelta(days=i)
+        r = by_day.get(day) or {}
         labels.append(day.strftime('%a'))
-        counts.append(qs.count())
+        counts.append(r.get('n') or 0)
         # use debt_change as proxy for revenue if available
-        total = sum([float(o.debt_change or 0.0) for o in qs])
-        revenue.append(total)
+        revenue.append(float(r.get('debt') or 0.0))
 
     return JsonResponse({'status': 'ok', 'labels': labels, 'counts': counts, 'revenue': revenue})
 
 
-def api_history(request):
-    courier_id = request.session.get('courier_id')
-    courier = None
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
+def _display_date(delivered_at, created_at):
+    # prefer delivered_at for display date when available
+    dt = delivered_at or created_at
+    return dt.isoformat() if dt else None
 
-    qs = Order.objects.filter(courier=courier).order_by('-created_at')[:100]
-    items = []
-    for o in qs:
-        # prefer delivered_at for display date when available
-        display_date = (o.delivered_at or o.created_at)
-        # normalize payment info
-        p_type = getattr(o, 'payment_type', None) or ''
-        p_amount = None
-        try:
-            if getattr(o, 'payment_amount', None) is not None:
-                p_amount = float(o.payment_amount)
-        except Exception:
-            p_amount = None
 
-        items.append({
-            'id': o.id,
-            'date': display_date.isoformat() if display_date else None,
-            'status': o.status,
-            'client': o.client.full_name if o.client else None,
-            'phone': o.client.phone if o.client else None,
-            'debt_change': float(o.debt_change or 0.0),
-            'payment_type': p_type,
-            'payment_amount': p_amount,
-        })
-    return JsonResponse({'status': 'ok', 'data': items})
+# kuryer tarixi: values_list + kompilyatsiya qilingan mapper (suv_tashish_crm.projection)
+HISTORY_ROW = Projection({
+    'id': 'id',
+    'date': Computed(_display_date, ('delivered_at', 'created_at')),
+    'status': 'status',
+    'client': 'client__full_name',
+    'phone': 'client__phone',
+    'debt_change': Col('debt_change', convert=float, default=0.0),
+    'payment_type': Col('payment_type', default=''),
+    'payment_amount': Col('payment_amount', convert=float),
+})
+
+
+def api_history(request):
+    courier = actors.session_courier(request)
+
+    try:
+        page = HISTORY_ROW.paginate_request(
+            request, Order.objects.filter(courier=courier), pagination.BY_CREATED, default_page_size=100,
+        )
+    except pagination.InvalidCursor:
+        return JsonResponse({'status': 'error', 'message': 'BAD_CURSOR'}, status=400)
+    return FastJsonResponse({'status': 'ok', 'data': page.items, **page.as_dict()})
 
 
 def api_debtors(request):
@@ -243,7 +211,11 @@ def api_debtors(request):
 
 def api_inactive_clients(request):
     cutoff = timezone.now() - timedelta(days=10)
-    qs = Client.objects.filter(last_order__lt=cutoff).order_by('-last_order')[:200]
+    qs = (
+        Client.objects.filter(last_order__lt=cutoff)
+        .only('id', 'full_name', 'phone', 'last_order', 'orders_count')
+        .order_by('-last_order')[:200]
+    )
     items = []
     for c in qs:
         items.append({
@@ -251,7 +223,7 @@ def api_inactive_clients(request):
             'full_name': c.full_name,
             'phone': c.phone,
             'last_order': c.last_order.isoformat() if c.last_order else None,
-            'total_orders': Order.objects.filter(client=c).count(),
+            'total_orders': c.orders_count,
         })
     # Static inactive clients removed
 
@@ -292,12 +264,7 @@ def api_create_order_by_courier(request):
         return JsonResponse({'status': 'error', 'message': 'POST required'}, status=400)
 
     courier_id = request.session.get('courier_id')
-    courier = None
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Exception:
-            courier = None
+    courier = actors.session_courier(request)
 
     # parse payload
     data = {}
@@ -413,34 +380,29 @@ def api_accept_order(request):
     if not courier_id:
         return JsonResponse({'status': 'error', 'message': 'Not authenticated (no courier_id in session)'}, status=401)
 
-    try:
-        courier = Courier.objects.get(pk=courier_id)
-    except Courier.DoesNotExist:
+    courier = actors.session_courier(request)
+    if courier is None:
         # cleanup broken session
         request.session.pop('courier_id', None)
         request.session.pop('courier_name', None)
         request.session.pop('courier_phone', None)
         return JsonResponse({'status': 'error', 'message': 'courier not found in DB'}, status=401)
 
-    # 3) get order
-    try:
-        order = Order.objects.select_for_update().get(pk=order_id)
-    except Order.DoesNotExist:
-        return JsonResponse({'status': 'error', 'message': 'order not found'}, status=404)
-
-    # 4) rules
-    if order.status != 'pending':
-        return JsonResponse({'status': 'error', 'message': f'order not pending (status={order.status})'}, status=400)
-
-    if order.courier_id is not None:
-        return JsonResponse({'status': 'error', 'message': 'order already assigned'}, status=409)
-
-    # 5) accept
-    order.courier = courier
-    order.status = 'assigned'
-    order.save(update_fields=['courier', 'status'])
+    # 3) accept: bitta shartli UPDATE (status='pending' AND courier_id IS NULL) —
+    # select_for_update SQLite'da ishlamasdi; ikki kuryer bir vaqtda bossa bittasi yutadi
+    result = order_flow.accept(order_id, courier.id)
+    if not result.ok:
+        messages = {
+            order_flow.NOT_FOUND: 'order not found',
+            order_flow.ALREADY_TAKEN: 'order already assigned',
+            order_flow.INVALID_STATUS: f'order not pending (status={result.status})',
+        }
+        return JsonResponse(
+            {'status': 'error', 'message': messages.get(result.reason, 'order changed, try again')},
+            status=result.http_status,
+        )
 
-    return JsonResponse({'status': 'ok', 'order_id': order.id, 'courier_id': courier.id})
+    return JsonResponse({'status': 'ok', 'order_id': result.order_id, 'courier_id': courier.id})
 @csrf_exempt
 def api_confirm_delivery(request):
     """Courier confirms that an assigned/delivering order was delivered.
@@ -463,9 +425,8 @@ def api_confirm_delivery(request):
     if not courier_id:
         return JsonResponse({'status': 'error', 'message': 'no courier in session'}, status=400)
 
-    try:
-        courier = Courier.objects.get(pk=courier_id)
-    except Courier.DoesNotExist:
+    courier = actors.session_courier(request)
+    if courier is None:
         # Clear invalid courier_id from session and inform caller how to set it
         try:
             request.session.pop('courier_id', None)
@@ -475,19 +436,6 @@ def api_confirm_delivery(request):
             pass
         return JsonResponse({'status': 'error', 'message': "courier not found; set a valid courier session via /courier_panel/dev/login_as/<id> or /courier_panel/dev/set_session/<id>"}, status=404)
 
-    try:
-        order = Order.objects.get(pk=order_id)
-    except Order.DoesNotExist:
-        return JsonResponse({'status': 'error', 'message': 'order not found'}, status=404)
-
-    # only assigned courier can confirm delivery
-    if order.courier_id != courier.id:
-        return JsonResponse({'status': 'error', 'message': 'not assigned to this courier'}, status=403)
-
-    # allowed states to confirm
-    if order.status == 'done':
-        return JsonResponse({'status': 'ok', 'message': 'already confirmed', 'order_id': order.id})
-
     # process optional payment info
     payment_type = payload.get('payment_type')
     payment_amount = payload.get('payment_amount')
@@ -503,19 +451,26 @@ def api_confirm_delivery(request):
     except Exception:
         amt = None
 
-    # mark delivered and record payment info on the order
-    try:
-        order.status = 'done'
-        order.delivered_at = timezone.now()
-        # store payment info on the order if provided
-        try:
-            if payment_type:
-                order.payment_type = str(payment_type)
-            if amt is not None:
-                order.payment_amount = amt
-        except Exception:
-            pass
+    # mark delivered and record payment info on the order: shartli UPDATE — faqat shu kuryerning
+    # assigned/delivering orderi; ikki marta bosilsa ikkinchisi "already confirmed" (qarz qayta yozilmaydi)
+    result = order_flow.confirm(
+        order_id,
+        courier.id,
+        payment_type=str(payment_type) if payment_type else None,
+        payment_amount=amt,
+    )
+    if not result.ok:
+        if result.reason == order_flow.NOT_FOUND:
+            return JsonResponse({'status': 'error', 'message': 'order not found'}, status=404)
+        if result.reason == order_flow.NOT_YOUR_ORDER:
+            return JsonResponse({'status': 'error', 'message': 'not assigned to this courier'}, status=403)
+        return JsonResponse({'status': 'error', 'message': f'order cannot be confirmed (status={result.status})'},
+                            status=result.http_status)
+    if not result.changed:
+        return JsonResponse({'status': 'ok', 'message': 'already confirmed', 'order_id': result.order_id})
+    order = result.order
 
+    try:
         # if a payment_type indicates debt, increase client.debt; for cash/click, decrease debt
         try:
             client = order.client
@@ -570,8 +525,6 @@ def api_confirm_delivery(request):
                             pass
         except Exception:
             pass
-
-        order.save()
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
@@ -586,36 +539,17 @@ def api_confirm_delivery(request):
 
     # send telegram to admins about delivery
     try:
-        from suv_tashish_crm.telegram import send_telegram
+        from suv_tashish_crm.outbox import notify_staff
         text = f"✅ Buyurtma yetkazildi\nOrder ID: #{order.id}\nCourier: {courier.full_name if courier else ''}\nTime: {timezone.localtime().strftime('%Y-%m-%d %H:%M:%S')}"
-        try:
-            send_telegram(text)
-        except Exception:
-            pass
-        # also message admins with telegram_id
-        try:
-            from suv_tashish_crm.models import Admin
-            for adm in Admin.objects.all():
-                if getattr(adm, 'telegram_id', None):
-                    try:
-                        send_telegram(text, chat_id=adm.telegram_id)
-                    except Exception:
-                        pass
-        except Exception:
-            pass
+        # main channel + admins with telegram_id (bitta outbox insert)
+        notify_staff(text, main_chat=True, admins=True)
     except Exception:
         pass
 
     return JsonResponse({'status': 'ok', 'order_id': order.id})
 
 def new_orders_page(request):
-    courier = None
-    courier_id = request.session.get('courier_id')
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
+    courier = actors.session_courier(request)
 
     new_orders = []
     qs = Order.objects.filter(status='pending').select_related('client').order_by('-created_at')[:50]
@@ -653,13 +587,7 @@ def new_orders_page(request):
 
 def history_page(request):
     """Render a dedicated History page. Currently shows static example rows."""
-    courier = None
-    courier_id = request.session.get('courier_id')
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
+    courier = actors.session_courier(request)
     # build rows from DB: include orders assigned/delivering/done for this courier
     try:
         qs = Order.objects.filter(courier=courier).exclude(status='pending').order_by('-delivered_at', '-created_at', '-created_at')[:200]
@@ -711,26 +639,43 @@ def history_page(request):
     return render(request, 'courier/history.html', context)
 
 
+def api_stream(request):
+    """SSE: kuryer buyurtmalari, biznesdagi yangi buyurtmalar va o'z pozitsiyasi.
+
+    Dashboard ``today_orders``/``new_orders``/``position`` ni har 8-10 sekundda so'rash
+    o'rniga shu oqimni tinglaydi va faqat hodisa kelganda yangilaydi.
+    """
+    courier_id = request.session.get('courier_id')
+    if not courier_id:
+        return JsonResponse({'status': 'error', 'message': 'no courier in session'}, status=400)
+    business_id = Courier.objects.filter(pk=courier_id).values_list('business_id', flat=True).first()
+    return sse_response(request, [
+        courier_channel(courier_id),
+        business_channel(business_id),
+        position_channel(courier_id),
+    ])
+
+
 def api_get_position(request):
     courier_id = request.session.get('courier_id')
     if not courier_id:
         return JsonResponse({'status': 'error', 'message': 'no courier in session'}, status=400)
-    pos = COURIER_POSITIONS.get(courier_id)
+    pos = get_position_store().get(courier_id)
     if not pos:
         return JsonResponse({'status': 'ok', 'data': None})
-    return JsonResponse({'status': 'ok', 'data': pos})
+    return JsonResponse({'status': 'ok', 'data': pos.as_dict()})
 
 
 def api_get_position_for_id(request, courier_id):
-    """Return last-known position for given courier id (development in-memory store).
+    """Return last-known position for given courier id (shared position store).
 
     This allows admin or other viewers to query courier positions by id.
     """
     try:
-        pos = COURIER_POSITIONS.get(int(courier_id))
+        pos = get_position_store().get(int(courier_id))
     except Exception:
         pos = None
-    return JsonResponse({'status': 'ok', 'data': pos})
+    return JsonResponse({'status': 'ok', 'data': pos.as_dict() if pos else None})
 
 
 @csrf_exempt
@@ -750,10 +695,40 @@ def api_update_position(request):
     if not courier_id:
         return JsonResponse({'status': 'error', 'message': 'no courier in session'}, status=400)
 
-    COURIER_POSITIONS[courier_id] = {'lat': lat, 'lon': lon, 'order_id': order_id, 'ts': timezone.now().isoformat()}
+    try:
+        record_position(courier_id, lat, lon, order_id=order_id)
+    except InvalidPosition:
+        return JsonResponse({'status': 'error', 'message': 'INVALID_LAT_LON'}, status=400)
+    except UnknownCourier:
+        # eskirgan session (kuryer o'chirilgan)
+        return JsonResponse({'status': 'error', 'message': 'courier not found'}, status=404)
     return JsonResponse({'status': 'ok'})
 
 
+@csrf_exempt
+def api_update_positions(request):
+    # Accepts JSON: { fixes: [{lat, lon, ts, order_id}, ...] } — offline buffered batch
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST required')
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+        fixes = payload if isinstance(payload, list) else payload.get('fixes')
+        if not isinstance(fixes, list):
+            raise ValueError('fixes')
+    except Exception:
+        return HttpResponseBadRequest('invalid json')
+
+    courier_id = request.session.get('courier_id')
+    if not courier_id:
+        return JsonResponse({'status': 'error', 'message': 'no courier in session'}, status=400)
+
+    try:
+        result = record_positions(courier_id, fixes)
+    except UnknownCourier:
+        return JsonResponse({'status': 'error', 'message': 'courier not found'}, status=404)
+    return JsonResponse({'status': 'ok', **result})
+
+
 def dev_set_session(request, courier_id):
     """DEV only: set a courier_id in the session to allow simulator to operate.
 
@@ -802,13 +777,7 @@ def dev_login_as(request, courier_id):
 
 def contact_admin(request):
     """Simple contact admin page for couriers (dev)."""
-    courier = None
-    courier_id = request.session.get('courier_id')
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
+    courier = actors.session_courier(request)
     # mark last visited view so sidebar can highlight using session
     try:
         request.session['last_view'] = 'contact_admin'
@@ -842,13 +811,7 @@ def profile_view(request):
     The courier is determined by `request.session['courier_id']`. On POST we update
     `full_name` and `phone` fields and redirect back to profile or dashboard.
     """
-    courier = None
-    courier_id = request.session.get('courier_id')
-    if courier_id:
-        try:
-            courier = Courier.objects.get(pk=courier_id)
-        except Courier.DoesNotExist:
-            courier = None
+    courier = actors.session_courier(request)
 
     if request.method == 'POST':
         # simple form fields: full_name, phone, is_active
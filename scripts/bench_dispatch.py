@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nearest-courier lookup (``suv_tashish_crm.dispatch``).
+
+Usage:
+    python3 scripts/bench_dispatch.py --couriers 1000 --orders 10000 --k 3
+
+Synthetic points around Tashkent (no database access). Measures:
+ - naive: pure-Python haversine over every courier for each order (k smallest)
+ - index build: ``CourierIndex`` (cKDTree over unit-sphere xyz)
+ - indexed: one vectorized ``CourierIndex.query`` for all orders
+ - indexed, single: ``CourierIndex.nearest`` per order (the API path)
+and checks that the indexed and naive results agree.
+"""
+import argparse
+import heapq
+import math
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "suv_tashish_crm.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+
+from suv_tashish_crm.dispatch import CourierIndex  # noqa: E402
+
+CENTER = (41.3111, 69.2797)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """``geo.haversine_km`` formulasi, bitta juftlik uchun sof Python'da (eski yo'l)."""
+    r = 6371.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+def naive(couriers, orders, k):
+    out = []
+    for olat, olon in orders:
+        out.append(heapq.nsmallest(k, ((haversine_km(olat, olon, clat, clon), cid)
+                                       for cid, clat, clon in couriers)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--couriers", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--spread", type=float, default=0.15, help="degrees around the city centre")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    c_lat = CENTER[0] + rng.uniform(-args.spread, args.spread, args.couriers)
+    c_lon = CENTER[1] + rng.uniform(-args.spread, args.spread, args.couriers)
+    o_lat = CENTER[0] + rng.uniform(-args.spread, args.spread, args.orders)
+    o_lon = CENTER[1] + rng.uniform(-args.spread, args.spread, args.orders)
+    ids = np.arange(1, args.couriers + 1)
+
+    print(f"{args.couriers} couriers, {args.orders} orders, k={args.k}")
+
+    couriers = list(zip(ids.tolist(), c_lat.tolist(), c_lon.tolist()))
+    orders = list(zip(o_lat.tolist(), o_lon.tolist()))
+    t = time.perf_counter()
+    expected = naive(couriers, orders, args.k)
+    t_naive = time.perf_counter() - t
+    print(f"  naive (pure Python):      {t_naive * 1000:9.1f} ms  ({t_naive / args.orders * 1e6:8.1f} us/order)")
+
+    CourierIndex(ids[:10], c_lat[:10], c_lon[:10])  # scipy import — o'lchovdan tashqarida
+    t = time.perf_counter()
+    index = CourierIndex(ids, c_lat, c_lon)
+    t_build = time.perf_counter() - t
+    print(f"  index build:              {t_build * 1000:9.1f} ms")
+
+    t = time.perf_counter()
+    rows, km = index.query(o_lat, o_lon, k=args.k)
+    t_batch = time.perf_counter() - t
+    print(f"  indexed (one batch):      {t_batch * 1000:9.1f} ms  ({t_batch / args.orders * 1e6:8.1f} us/order)"
+          f"  x{t_naive / t_batch:.0f}")
+
+    sample = min(args.orders, 2000)
+    t = time.perf_counter()
+    for i in range(sample):
+        index.nearest(o_lat[i], o_lon[i], k=args.k)
+    t_single = (time.perf_counter() - t) / sample
+    print(f"  indexed (per order):      {t_single * 1e6:9.1f} us/order  x{t_naive / args.orders / t_single:.0f}")
+
+    mismatches = 0
+    for i, exp in enumerate(expected):
+        got = index.ids[rows[i]].tolist()
+        if got != [cid for _, cid in exp] and not np.allclose(km[i], [d for d, _ in exp], atol=1e-6):
+            mismatches += 1
+    print(f"  result mismatches vs naive: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request cost of ``language_context`` before/after the catalog cache.
+
+Usage:
+    python3 scripts/bench_language_context.py --n 20000
+
+Measures three cases for every language:
+ - legacy: open + json.load of locale/<lang>.json on each call (old implementation)
+ - cached, T untouched: page never reads translations
+ - cached, T used: page reads a few keys (``T.x`` lookups in the template)
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "suv_tashish_crm.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from suv_tashish_crm.context_processors import language_context  # noqa: E402
+from suv_tashish_crm.translations import LANGUAGES, LOCALE_DIR  # noqa: E402
+
+
+class FakeRequest:
+    def __init__(self, lang):
+        self.session = {"lang": lang}
+
+
+def legacy_language_context(request):
+    """Old implementation, kept here only for comparison."""
+    lang = request.session.get("lang", "uz_lat")
+    if lang not in LANGUAGES:
+        lang = "uz_lat"
+    try:
+        with open(os.path.join(LOCALE_DIR, f"{lang}.json"), "r", encoding="utf-8") as f:
+            translations = json.load(f)
+    except Exception:
+        translations = {}
+    return {"T": translations, "current_lang": lang}
+
+
+def touch(ctx, keys):
+    T = ctx["T"]
+    for k in keys:
+        T.get(k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'lang':8} {'legacy':>12} {'lazy/unused':>12} {'lazy/used':>12}   (us per request)")
+    for lang in LANGUAGES:
+        req = FakeRequest(lang)
+        with open(os.path.join(LOCALE_DIR, f"{lang}.json"), encoding="utf-8") as f:
+            keys = list(json.load(f))[:5]
+        language_context(req)["T"].get("x")  # warm-up
+
+        legacy = timeit.timeit(lambda: touch(legacy_language_context(req), keys), number=args.n)
+        unused = timeit.timeit(lambda: language_context(req), number=args.n)
+        used = timeit.timeit(lambda: touch(language_context(req), keys), number=args.n)
+        print(f"{lang:8} {legacy / args.n * 1e6:12.2f} {unused / args.n * 1e6:12.2f} {used / args.n * 1e6:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
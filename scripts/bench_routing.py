@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: courier route planning (``suv_tashish_crm.routing``).
+
+Usage:
+    python3 scripts/bench_routing.py --stops 100 --runs 20
+
+Random stops around Tashkent plus a courier start position (no database access).
+Reports solve time and route length for: creation order (old behaviour),
+nearest-neighbour only, nearest-neighbour + 2-opt.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "suv_tashish_crm.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+
+from suv_tashish_crm import routing  # noqa: E402
+
+CENTER = (41.3111, 69.2797)
+
+
+def path_km(dist, tour):
+    return float(dist[tour[:-1], tour[1:]].sum())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stops", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--spread", type=float, default=0.15, help="degrees around the city centre")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    totals = {"created order": [], "nearest-neighbour": [], "nn + 2-opt": []}
+    times = []
+    for _ in range(args.runs):
+        lat = CENTER[0] + rng.uniform(-args.spread, args.spread, args.stops + 1)
+        lon = CENTER[1] + rng.uniform(-args.spread, args.spread, args.stops + 1)
+        dist = routing.distance_matrix(lat, lon)  # 0 — kuryer
+
+        t = time.perf_counter()
+        idx = routing.solve(lat[1:], lon[1:], start=(lat[0], lon[0]))
+        times.append(time.perf_counter() - t)
+
+        totals["created order"].append(path_km(dist, np.arange(args.stops + 1)))
+        totals["nearest-neighbour"].append(path_km(dist, routing.nearest_neighbour(dist, 0)))
+        totals["nn + 2-opt"].append(path_km(dist, np.concatenate([[0], idx + 1])))
+
+    times_ms = np.array(times) * 1000
+    print(f"{args.stops} stops, {args.runs} runs")
+    print(f"  solve (nn + 2-opt): median {np.median(times_ms):.1f} ms, max {times_ms.max():.1f} ms")
+    for name, values in totals.items():
+        print(f"  {name:<20} {np.mean(values):8.1f} km")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark: list endpoint serialization (``suv_tashish_crm.projection`` + ``renderers``).
+
+Usage:
+    python3 scripts/bench_serialization.py --rows 1000 10000 --runs 5
+
+Creates a throwaway SQLite database (``DB_NAME``, default: a temp file), seeds
+orders and compares, for each row count:
+ - admin orders: model instances + hand-built dicts (old ``admin_orders_view``)
+   vs ``api.views.ADMIN_ORDER_ROW`` (values_list + compiled mapper);
+ - order list: DRF ``OrderSerializer(many=True)`` vs ``api.serializers.ORDER_LIST_ROW``;
+each followed by ``JSONRenderer`` (old) / ``FastJSONRenderer`` (new).
+Reports median CPU time (``time.process_time``) and peak Python allocations
+(``tracemalloc``) and checks that both paths render the same JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "suv_tashish_crm.settings")
+os.environ.setdefault("DB_NAME", os.path.join(tempfile.mkdtemp(), "bench.sqlite3"))
+os.environ.setdefault("OUTBOX_WORKERS", "0")
+os.environ.setdefault("IMPORT_WORKERS", "0")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.serializers import ORDER_LIST_ROW, OrderSerializer  # noqa: E402
+from api.views import ADMIN_ORDER_ROW, _to_int_amount  # noqa: E402
+from suv_tashish_crm import renderers  # noqa: E402
+from suv_tashish_crm.models import Business, Client, Courier, Order  # noqa: E402
+
+
+def seed(n):
+    business = Business.objects.create(name="Bench")
+    clients = Client.objects.bulk_create([
+        Client(full_name=f"Mijoz {i}", phone=f"99890{i:07d}", business=business,
+               location_lat=41.3 + i * 1e-4, location_lon=69.2 + i * 1e-4)
+        for i in range(200)
+    ])
+    couriers = Courier.objects.bulk_create([
+        Courier(full_name=f"Kuryer {i}", phone=f"99891{i:07d}", business=business) for i in range(20)
+    ])
+    statuses = ["pending", "assigned", "delivering", "done"]
+    Order.objects.bulk_create([
+        Order(client=clients[i % 200], courier=couriers[i % 20] if i % 4 else None, business=business,
+              bottles=1 + i % 5, status=statuses[i % 4], note=f"  manzil {i} ",
+              payment_type="cash" if i % 3 else "", payment_amount=Decimal(15000 + i) if i % 2 else None)
+        for i in range(n)
+    ], batch_size=1000)
+    return business
+
+
+def old_admin_rows(qs):
+    """``admin_orders_view`` oldingi ko'rinishi (instance + getattr)."""
+    items = []
+    for o in qs.select_related("client", "courier"):
+        client_name = getattr(o.client, "full_name", "Mijoz") if o.client else "Mijoz"
+        phone = getattr(o.client, "phone", "") if o.client else ""
+        courier_name = getattr(o.courier, "full_name", "") if o.courier else ""
+        amount = _to_int_amount(getattr(o, "payment_amount", 0), 0)
+        items.append({
+            "id": o.id,
+            "order_label": f"ORDER-{o.id}",
+            "client_name": client_name,
+            "client_phone": phone,
+            "courier_name": courier_name,
+            "status": getattr(o, "status", "") or "",
+            "bottle_count": o.bottles,
+            "amount": amount,
+            "amount_display": f"{amount} UZS",
+            "payment_type": (getattr(o, "payment_type", "") or "").strip(),
+            "address": (getattr(o, "note", "") or "").strip(),
+            "created_at": o.created_at.isoformat() if getattr(o, "created_at", None) else None,
+        })
+    return items
+
+
+def measure(fn, runs):
+    fn()  # isitish (so'rov keshlari, import)
+    times = []
+    for _ in range(runs):
+        t = time.process_time()
+        fn()
+        times.append(time.process_time() - t)
+    tracemalloc.start()
+    out = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak, out
+
+
+def compare(title, old, new, runs):
+    t_old, m_old, out_old = measure(old, runs)
+    t_new, m_new, out_new = measure(new, runs)
+    same = json.loads(out_old) == json.loads(out_new)
+    print(f"  {title}")
+    print(f"    old: {t_old * 1000:8.1f} ms CPU  {m_old / 2 ** 20:7.2f} MiB peak")
+    print(f"    new: {t_new * 1000:8.1f} ms CPU  {m_new / 2 ** 20:7.2f} MiB peak"
+          f"   ({t_old / t_new:4.1f}x CPU, {m_old / max(m_new, 1):4.1f}x memory, same output: {same})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    seed(max(args.rows))
+    print(f"orjson: {'yes' if renderers.orjson is not None else 'no (stdlib json fallback)'}")
+    old_renderer, new_renderer = JSONRenderer(), renderers.FastJSONRenderer()
+
+    for n in args.rows:
+        qs = Order.objects.order_by("-created_at", "-id")[:n]
+        print(f"{n} rows")
+        compare(
+            "admin orders (instances + getattr -> values_list projection)",
+            lambda: old_renderer.render({"results": old_admin_rows(qs)}),
+            lambda: new_renderer.render({"results": ADMIN_ORDER_ROW.rows(qs)}),
+            args.runs,
+        )
+        compare(
+            "order list (OrderSerializer -> ORDER_LIST_ROW)",
+            lambda: old_renderer.render(OrderSerializer(qs.select_related("client"), many=True).data),
+            lambda: new_renderer.render(ORDER_LIST_ROW.rows(qs)),
+            args.runs,
+        )
+        data = {"results": ADMIN_ORDER_ROW.rows(qs)}
+        compare(
+            "render only (JSONRenderer -> FastJSONRenderer)",
+            lambda: old_renderer.render(data),
+            lambda: new_renderer.render(data),
+            args.runs,
+        )
+
+
+if __name__ == "__main__":
+    main()
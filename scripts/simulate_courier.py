@@ -8,6 +8,9 @@ Usage:
 This script will:
  - call GET /courier_panel/dev/set_session/<courier_id>/ to get a session with courier_id
  - post position updates to /courier_panel/api/update_position/ every <interval> seconds
+   (or, with --batch N, buffer N timestamped fixes and send them to
+   /courier_panel/api/update_positions/ in one request, replaying anything
+   the server has not acknowledged via its high_water mark)
 
 Adjust SERVER variable if your dev server runs elsewhere.
 """
@@ -37,6 +40,24 @@ def generate_circle_path(center, radius_m=2000, steps=60):
     return path
 
 
+def run_batched(sess, base, path, args):
+    update_url = f"{base}/courier_panel/api/update_positions/"
+    pending = []
+    for idx, (lat, lon) in enumerate(path, start=1):
+        pending.append({'lat': lat, 'lon': lon, 'ts': time.time(), 'order_id': None})
+        if len(pending) >= args.batch or idx == len(path):
+            try:
+                rr = sess.post(update_url, json={'fixes': pending}, timeout=10)
+                data = rr.json()
+                hw = float(data.get('high_water') or 0)
+                # server tasdiqlaganlarini tashlaymiz, qolganlari keyingi paketda qayta yuboriladi
+                pending = [f for f in pending if f['ts'] > hw]
+                print(f'[{idx}/{len(path)}] batch -> {rr.status_code} accepted={data.get("accepted")} high_water={hw:.3f}')
+            except Exception as e:
+                print('post error (kept in buffer)', e)
+        time.sleep(args.interval)
+
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument('--courier', type=int, required=True, help='Courier id to simulate (must exist)')
@@ -44,6 +65,7 @@ def main():
     p.add_argument('--interval', type=float, default=2.0, help='Seconds between updates')
     p.add_argument('--radius', type=int, default=2000, help='Radius in meters for circular path')
     p.add_argument('--server', default=SERVER, help='Server base URL')
+    p.add_argument('--batch', type=int, default=0, help='Buffer N fixes per request (bulk endpoint)')
     args = p.parse_args()
 
     sess = requests.Session()
@@ -61,6 +83,11 @@ def main():
     path = generate_circle_path(DEFAULT_PATH_CENTER, radius_m=args.radius, steps=args.steps)
     print(f'Starting simulation for courier {args.courier}: {len(path)} steps, interval {args.interval}s')
 
+    if args.batch > 0:
+        run_batched(sess, base, path, args)
+        print('Simulation finished.')
+        return
+
     update_url = f"{base}/courier_panel/api/update_position/"
     for idx, (lat, lon) in enumerate(path, start=1):
         payload = {'lat': lat, 'lon': lon, 'order_id': None}
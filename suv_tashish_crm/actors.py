@@ -0,0 +1,312 @@
+"""
+So'rovchi (actor) — rol, biznes va bog'langan Courier/Client — bir marta aniqlanadi.
+
+Oldin har bir DRF endpoint ``api.views.get_role`` ni chaqirardi (``user.groups``
+so'rovi, ko'pincha yana ``Courier.objects.filter(user=user).exists()``), keyin view
+o'sha profilni ``_get_courier_linked`` / ``_get_client_linked`` bilan qayta so'rardi.
+Sessiyali panellar esa ``session['courier_id']`` / ``session['client_id']`` bo'yicha
+har safar alohida ``get``/``filter`` qilardi.
+
+Endi:
+- ``resolve_user(user)`` — guruhlar, profil id'lari va biznes id'si ``ACTOR_CACHE_TTL``
+  sekund keshda (``actor:<user_id>``), natija ``User`` obyektining o'zida ham saqlanadi —
+  bitta so'rov ichida (DRF ``request.user``) qayta hisoblanmaydi;
+- ``Actor.courier`` / ``.client`` / ``.business`` — kerak bo'lganda pk bo'yicha bitta so'rov;
+- ``is_staff``/``is_superuser`` har doim joriy ``User`` qatoridan olinadi (keshdan emas);
+- guruh a'zoligi (``m2m_changed``), ``is_staff``/``is_superuser`` yoki profil
+  (Courier/Client/AdminProfile) ``user``/``business`` o'zgarsa — kesh o'chiriladi va
+  commit'dan keyin ``actor_changed`` signali yuboriladi (``jwt_claims`` token versiyasini oshiradi);
+- ``ActorMiddleware`` — ``request.actor`` (lazy) va sessiyali panellar uchun
+  ``session_courier(request)`` / ``session_client(request)`` (so'rov ichida memo).
+
+JWT autentifikatsiyasi DRF view ichida bo'ladi (middleware'dan keyin), shuning uchun
+API kodi ``get_actor(request)`` yoki ``resolve_user(request.user)`` ni ishlatadi.
+"""
+from dataclasses import dataclass, field
+from typing import FrozenSet, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+from django.utils.functional import SimpleLazyObject
+
+from .models import Business, Client, Courier
+
+CACHE_KEY = "actor:{}"
+_USER_ATTR = "_suv_actor"
+_SESSION_ATTR = "_suv_session_actors"
+
+ANONYMOUS_ROLE = "CLIENT"
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "ACTOR_CACHE_TTL", 60))
+
+
+_MISSING = object()
+
+
+@dataclass
+class Actor:
+    user_id: Optional[int]
+    role: str
+    groups: FrozenSet[str] = frozenset()
+    courier_id: Optional[int] = None
+    client_id: Optional[int] = None
+    admin_profile_id: Optional[int] = None
+    business_id: Optional[int] = None
+    # so'rov ichidagi memo (keshga yozilmaydi)
+    _objects: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "ADMIN"
+
+    @property
+    def is_courier(self) -> bool:
+        return self.role == "COURIER"
+
+    def _load(self, name, model, pk):
+        obj = self._objects.get(name, _MISSING)
+        if obj is _MISSING:
+            obj = model.objects.filter(pk=pk).first() if pk else None
+            self._objects[name] = obj
+        return obj
+
+    @property
+    def courier(self) -> Optional[Courier]:
+        return self._load("courier", Courier, self.courier_id)
+
+    @property
+    def client(self) -> Optional[Client]:
+        return self._load("client", Client, self.client_id)
+
+    @property
+    def business(self) -> Optional[Business]:
+        return self._load("business", Business, self.business_id)
+
+
+ANONYMOUS = Actor(user_id=None, role=ANONYMOUS_ROLE)
+
+
+def _load_profile(user_id: int) -> dict:
+    """Kesh uchun ma'lumot (faqat id'lar): 3 ta so'rov, keyin ``ACTOR_CACHE_TTL`` davomida 0."""
+    User = get_user_model()
+    groups = list(User.groups.through.objects.filter(user_id=user_id).values_list("group__name", flat=True))
+    row = User.objects.filter(pk=user_id).values(
+        "suv_courier_profile__id", "suv_courier_profile__business_id",
+        "admin_profile__id", "admin_profile__business_id",
+    ).first() or {}
+    client = Client.objects.filter(user_id=user_id).values("id", "business_id").first() or {}
+    return {
+        "groups": sorted(groups),
+        "courier_id": row.get("suv_courier_profile__id"),
+        "courier_business_id": row.get("suv_courier_profile__business_id"),
+        "admin_profile_id": row.get("admin_profile__id"),
+        "admin_business_id": row.get("admin_profile__business_id"),
+        "client_id": client.get("id"),
+        "client_business_id": client.get("business_id"),
+    }
+
+
+def _build(user, data: dict) -> Actor:
+    groups = frozenset(data["groups"])
+    # ``api.views.get_role`` bilan bir xil qoida
+    if "admin" in groups or user.is_superuser or user.is_staff:
+        role = "ADMIN"
+    elif "courier" in groups or data["courier_id"]:
+        role = "COURIER"
+    else:
+        role = "CLIENT"
+    # ``_get_my_business`` tartibi: admin profili, kuryer, mijoz
+    business_id = data["admin_business_id"] or data["courier_business_id"] or data["client_business_id"]
+    return Actor(
+        user_id=user.pk,
+        role=role,
+        groups=groups,
+        courier_id=data["courier_id"],
+        client_id=data["client_id"],
+        admin_profile_id=data["admin_profile_id"],
+        business_id=business_id,
+    )
+
+
+def resolve_user(user) -> Actor:
+    if user is None or not getattr(user, "is_authenticated", False):
+        return ANONYMOUS
+    actor = getattr(user, _USER_ATTR, None)
+    if actor is not None:
+        return actor
+    key = CACHE_KEY.format(user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = _load_profile(user.pk)
+        cache.set(key, data, _ttl())
+    actor = _build(user, data)
+    setattr(user, _USER_ATTR, actor)
+    return actor
+
+
+def remember(user, actor: Actor) -> None:
+    """Tashqaridan aniqlangan actor'ni (masalan JWT claim'laridan) ``User`` obyektiga yozadi."""
+    setattr(user, _USER_ATTR, actor)
+
+
+def get_actor(request) -> Actor:
+    """DRF ``Request`` ham, oddiy ``HttpRequest`` ham bo'ladi."""
+    return resolve_user(getattr(request, "user", None))
+
+
+def invalidate_user(user_id) -> None:
+    if user_id:
+        cache.delete(CACHE_KEY.format(user_id))
+
+
+def forget(user) -> None:
+    """Joriy so'rovdagi ``User`` obyektidan memo'ni olib tashlaydi va keshni o'chiradi."""
+    if user is not None:
+        user.__dict__.pop(_USER_ATTR, None)
+        invalidate_user(getattr(user, "pk", None))
+
+
+# kwargs: user_ids (set) — roli/profili/biznesi o'zgargan foydalanuvchilar
+actor_changed = Signal()
+
+
+def invalidate_on_commit(*user_ids) -> None:
+    ids = {u for u in user_ids if u}
+    if not ids:
+        return
+
+    def _run():
+        cache.delete_many([CACHE_KEY.format(u) for u in ids])
+        actor_changed.send(sender=Actor, user_ids=ids)
+
+    transaction.on_commit(_run)
+
+
+# ---------------- sessiyali panellar ----------------
+def _session_memo(request) -> dict:
+    memo = getattr(request, _SESSION_ATTR, None)
+    if memo is None:
+        memo = {}
+        setattr(request, _SESSION_ATTR, memo)
+    return memo
+
+
+def _session_object(request, session_key: str, model):
+    pk = request.session.get(session_key)
+    if not pk:
+        return None
+    memo = _session_memo(request)
+    hit = memo.get(session_key)
+    if hit is not None and hit[0] == pk:
+        return hit[1]
+    try:
+        obj = model.objects.filter(pk=pk).first()
+    except (TypeError, ValueError):
+        obj = None
+    memo[session_key] = (pk, obj)
+    return obj
+
+
+def session_courier(request) -> Optional[Courier]:
+    """``session['courier_id']`` dagi kuryer (so'rov ichida bir marta o'qiladi)."""
+    return _session_object(request, "courier_id", Courier)
+
+
+def session_client(request) -> Optional[Client]:
+    """``session['client_id']`` dagi mijoz (so'rov ichida bir marta o'qiladi)."""
+    return _session_object(request, "client_id", Client)
+
+
+class ActorMiddleware:
+    """``request.actor`` — birinchi murojaatda aniqlanadi (AuthenticationMiddleware'dan keyin)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.actor = SimpleLazyObject(lambda: get_actor(request))
+        return self.get_response(request)
+
+
+# ---------------- keshni eskirtirish ----------------
+_User = get_user_model()
+
+
+@receiver(m2m_changed, sender=_User.groups.through)
+def _groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear", "pre_clear"):
+        return
+    if not reverse:
+        if action == "pre_clear":
+            return  # post_clear yetarli
+        forget(instance)
+        invalidate_on_commit(instance.pk)
+    elif pk_set:
+        invalidate_on_commit(*pk_set)
+    elif action == "pre_clear":
+        # guruhdan hamma a'zolar chiqarilmoqda: ro'yxat hali bor
+        invalidate_on_commit(*instance.user_set.values_list("pk", flat=True))
+
+
+_ROLE_FLAGS_ATTR = "_actor_role_flags"
+
+
+@receiver(post_init, sender=_User)
+def _user_post_init(sender, instance, **kwargs):
+    d = instance.__dict__
+    setattr(instance, _ROLE_FLAGS_ATTR, (d.get("is_staff"), d.get("is_superuser")))
+
+
+@receiver(post_save, sender=_User)
+def _user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and not (set(update_fields) & {"is_staff", "is_superuser"}):
+        return
+    before = getattr(instance, _ROLE_FLAGS_ATTR, None)
+    after = (instance.is_staff, instance.is_superuser)
+    setattr(instance, _ROLE_FLAGS_ATTR, after)
+    if before != after:
+        forget(instance)
+        invalidate_on_commit(instance.pk)
+
+
+_PREV_ATTR = "_actor_prev_link"
+
+
+def _link(instance) -> tuple:
+    d = instance.__dict__
+    return d.get("user_id"), d.get("business_id")
+
+
+@receiver(post_init, sender=Courier)
+@receiver(post_init, sender=Client)
+def _profile_post_init(sender, instance, **kwargs):
+    # profil boshqa userga o'tkazilsa — eski userning keshi ham o'chsin
+    setattr(instance, _PREV_ATTR, _link(instance))
+
+
+@receiver(post_save, sender=Courier)
+@receiver(post_save, sender=Client)
+def _profile_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not (set(update_fields) & {"user", "business"}):
+        return
+    before = getattr(instance, _PREV_ATTR, (None, None))
+    after = _link(instance)
+    setattr(instance, _PREV_ATTR, after)
+    if created or before != after:
+        invalidate_on_commit(after[0], before[0])
+
+
+@receiver(post_delete, sender=Courier)
+@receiver(post_delete, sender=Client)
+def _profile_deleted(sender, instance, **kwargs):
+    invalidate_on_commit(instance.__dict__.get("user_id"))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Admin as SiteAdmin, Courier, Client, Region, Notification, Order, BottleHistory, DebtHistory
+from .models import Admin as SiteAdmin, Courier, Client, Region, Notification, Order, BottleHistory, DebtHistory, OutboundMessage, ImportJob, GeocodeCache
 
 # Customize admin site header
 admin.site.site_header = "Suv Tashish CRM Admin"
@@ -40,6 +40,53 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('title', 'message')
 
 
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'channel', 'chat_id', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'channel')
+    search_fields = ('chat_id', 'text', 'last_error')
+    actions = ['requeue']
+
+    @admin.action(description="Qayta navbatga qo'yish")
+    def requeue(self, request, queryset):
+        from django.utils import timezone
+        n = queryset.exclude(status='sent').update(status='pending', claim='', next_attempt_at=timezone.now())
+        self.message_user(request, f"{n} ta xabar qayta navbatga qo'yildi")
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'original_name', 'status', 'progress', 'created', 'updated', 'skipped',
+                    'error_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('original_name', 'last_error')
+    exclude = ('password_hash', 'claim')
+    readonly_fields = ('processed_rows', 'total_rows', 'created', 'updated', 'skipped', 'error_count',
+                       'error_report', 'last_error', 'locked_at', 'started_at', 'finished_at')
+    actions = ['requeue']
+
+    @admin.display(description="Progress")
+    def progress(self, obj):
+        if obj.total_rows:
+            return f"{obj.processed_rows}/{obj.total_rows}"
+        return obj.processed_rows
+
+    @admin.action(description="Qayta navbatga qo'yish")
+    def requeue(self, request, queryset):
+        from suv_tashish_crm.imports import wake
+        n = queryset.filter(status='failed').update(status='queued', claim='')
+        if n:
+            wake()
+        self.message_user(request, f"{n} ta import qayta navbatga qo'yildi")
+
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ('address', 'lat', 'lon', 'provider', 'created_at')
+    list_filter = ('provider',)
+    search_fields = ('address',)
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'client', 'courier', 'status', 'bottle_count', 'created_at', 'delivered_at')
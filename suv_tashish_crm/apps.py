@@ -8,4 +8,11 @@ class SuvTashishCrmConfig(AppConfig):
     def ready(self):
         # Signal handlerlar ro‘yxatdan o‘tishi uchun import qilamiz
         import suv_tashish_crm.signals       # telegram + courier auto-link (signals.py ichida ham bor)
-        import suv_tashish_crm.user_signals  # user -> courier auto-link
\ No newline at end of file
+        import suv_tashish_crm.user_signals  # user -> courier auto-link
+        import suv_tashish_crm.rollups       # Order -> DailyOrderStats
+        import suv_tashish_crm.client_summary  # Order -> Client.latest_order/orders_count
+        import suv_tashish_crm.events        # Order -> SSE hodisalar
+        import suv_tashish_crm.dispatch      # Order -> eng yaqin kuryerga avto-biriktirish
+        import suv_tashish_crm.client_map    # Client -> admin xaritasi tile keshi
+        import suv_tashish_crm.actors        # groups/profil -> actor keshi
+        import suv_tashish_crm.jwt_claims    # actor o'zgarsa -> JWT token versiyasi
@@ -0,0 +1,292 @@
+"""
+Admin xaritasi uchun mijozlar: viewport (bbox) + zoom bo'yicha, tile'larga bo'lingan.
+
+``clients_positions_api`` oldin bazadagi hamma mijozni bitta JSON'da qaytarardi
+(o'n minglab marker — server ham, brauzer ham qiynalardi). Endi:
+
+- so'rov oralig'i slippy-map tile'lariga (z/x/y, Web Mercator, 256px) bo'linadi;
+- har bir tile ``location_lat/location_lon`` indeksi bo'yicha bbox filtri bilan olinadi;
+- ``CLIENT_MAP_CLUSTER_MAX_ZOOM`` dan past zoom'da (yoki tile'da nuqta juda ko'p bo'lsa)
+  nuqtalar tile ichidagi ``GRID x GRID`` to'rga yig'iladi (numpy): katakda bittadan
+  ko'p bo'lsa — klaster (soni, o'rtacha nuqta, chegarasi), bitta bo'lsa — oddiy nuqta;
+- tile natijasi keshda ``client_map:<versiya>:<filtr>:z:x:y`` kaliti bilan
+  ``CLIENT_MAP_TILE_TTL`` sekund turadi; xaritani surganda faqat yangi tile'lar hisoblanadi.
+
+Mijoz koordinatasi/nomi/regioni o'zgarganda versiya oshiriladi (signal). ``bulk_create`` /
+``QuerySet.update()`` signal yubormaydi — bunday joylarda ``invalidate()`` ni qo'lda chaqiring.
+
+Versiya kaliti keshda turadi: bir nechta worker jarayonida umumiy kesh (Redis/Memcached)
+kerak. ``locmem`` (default, ``CACHES`` sozlanmagan) har bir jarayonniki — boshqa
+worker'dagi ``invalidate()`` ko'rinmaydi, shuning uchun u yerda tile TTL
+``CLIENT_MAP_LOCAL_TILE_TTL`` gacha qisqartiriladi (eskirgan xarita shuncha sekund).
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Client
+
+MAX_ZOOM = 20
+# tile ichidagi klaster to'ri: 256px / 8 = 32px katak
+GRID = 8
+# bitta so'rovda ko'pi bilan shuncha tile (katta ekran ~ 8x5 tile)
+MAX_TILES = 96
+# Web Mercator chegarasi
+MAX_LAT = 85.05112878
+
+VERSION_KEY = "client_map:version"
+
+# xaritadagi ko'rinishga ta'sir qiladigan maydonlar
+WATCHED_FIELDS = ("location_lat", "location_lon", "full_name", "phone", "region_id", "business_id")
+_WATCHED_UPDATE_FIELDS = {"location_lat", "location_lon", "full_name", "phone", "region", "business"}
+_SNAPSHOT_ATTR = "_client_map_snapshot"
+
+Tile = Tuple[int, int, int]
+
+
+def _conf(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------------- tile matematikasi ----------------
+def _lon_to_x(lon, n):
+    return (np.asarray(lon, dtype=float) + 180.0) / 360.0 * n
+
+
+def _lat_to_y(lat, n):
+    lat = np.radians(np.clip(np.asarray(lat, dtype=float), -MAX_LAT, MAX_LAT))
+    return (1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0 * n
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """``(south, west, north, east)`` gradusda."""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def tiles_for_bbox(west: float, south: float, east: float, north: float, z: int) -> List[Tile]:
+    n = 2 ** z
+    x0 = int(np.clip(np.floor(_lon_to_x(west, n)), 0, n - 1))
+    x1 = int(np.clip(np.floor(_lon_to_x(east, n)), 0, n - 1))
+    y0 = int(np.clip(np.floor(_lat_to_y(north, n)), 0, n - 1))
+    y1 = int(np.clip(np.floor(_lat_to_y(south, n)), 0, n - 1))
+    return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def parse_bbox(raw: str) -> Tuple[float, float, float, float]:
+    """``west,south,east,north`` (Leaflet ``toBBoxString()``). Xato — ``ValueError``."""
+    parts = [float(p) for p in (raw or "").split(",")]
+    if len(parts) != 4 or not all(math.isfinite(p) for p in parts):
+        raise ValueError("BAD_BBOX")
+    west, south, east, north = parts
+    if west > east or south > north:
+        raise ValueError("BAD_BBOX")
+    return max(west, -180.0), max(south, -MAX_LAT), min(east, 180.0), min(north, MAX_LAT)
+
+
+def parse_tile(raw: str) -> Tile:
+    """``z/x/y``. Xato — ``ValueError``."""
+    z, x, y = (int(p) for p in (raw or "").split("/"))
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError("BAD_TILE")
+    return z, x, y
+
+
+# ---------------- filtr va kesh ----------------
+class MapFilter:
+    """Tile kaliti va queryset uchun filtrlar (region — id yoki nom)."""
+
+    def __init__(self, region: Optional[str] = None, business_id: Optional[int] = None):
+        self.region = (region or "").strip()
+        self.business_id = business_id
+
+    def key(self) -> str:
+        return f"r={self.region}|b={self.business_id if self.business_id is not None else ''}"
+
+    def apply(self, qs):
+        if self.region:
+            qs = qs.filter(region_id=int(self.region)) if self.region.isdigit() else qs.filter(region__name=self.region)
+        if self.business_id is not None:
+            qs = qs.filter(business_id=self.business_id)
+        return qs
+
+
+def _version() -> int:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY) or 1
+    return version
+
+
+def _tile_ttl() -> int:
+    ttl = int(_conf("CLIENT_MAP_TILE_TTL", 300))
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        # jarayonlararo invalidatsiya yo'q — eskirish oynasini qisqa tutamiz
+        ttl = min(ttl, int(_conf("CLIENT_MAP_LOCAL_TILE_TTL", 15)))
+    return ttl
+
+
+def invalidate() -> None:
+    """Hamma tile'larni eskirgan deb belgilaydi (versiyani oshiradi)."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def _tile_key(version: int, flt: MapFilter, tile: Tile) -> str:
+    return "client_map:%s:%s:%d:%d:%d" % (version, flt.key(), *tile)
+
+
+# ---------------- tile hisoblash ----------------
+def _point_rows(ids: Iterable[int]) -> List[Dict]:
+    rows = (
+        Client.objects.filter(pk__in=list(ids))
+        .values("id", "full_name", "phone", "location_lat", "location_lon", "region__name")
+        .order_by("id")
+    )
+    return [
+        {
+            "id": r["id"],
+            "full_name": r["full_name"],
+            "phone": r["phone"],
+            "lat": r["location_lat"],
+            "lon": r["location_lon"],
+            "region": r["region__name"],
+        }
+        for r in rows
+    ]
+
+
+def build_tile(tile: Tile, flt: MapFilter) -> Dict:
+    z, x, y = tile
+    south, west, north, east = tile_bounds(z, x, y)
+    qs = flt.apply(Client.objects.filter(
+        location_lat__gte=south, location_lat__lt=north,
+        location_lon__gte=west, location_lon__lt=east,
+    )).exclude(Q(location_lat=0) & Q(location_lon=0))
+
+    raw = list(qs.values_list("id", "location_lat", "location_lon"))
+    cluster_max_zoom = int(_conf("CLIENT_MAP_CLUSTER_MAX_ZOOM", 14))
+    max_points = int(_conf("CLIENT_MAP_MAX_POINTS_PER_TILE", 500))
+    if not raw:
+        return {"tile": f"{z}/{x}/{y}", "count": 0, "clusters": [], "clients": []}
+    if z > cluster_max_zoom and len(raw) <= max_points:
+        return {"tile": f"{z}/{x}/{y}", "count": len(raw), "clusters": [],
+                "clients": _point_rows(r[0] for r in raw)}
+
+    data = np.asarray(raw, dtype=float)
+    ids, lat, lon = data[:, 0].astype(np.int64), data[:, 1], data[:, 2]
+    n = 2 ** z
+    cx = np.clip(((_lon_to_x(lon, n) - x) * GRID).astype(np.int64), 0, GRID - 1)
+    cy = np.clip(((_lat_to_y(lat, n) - y) * GRID).astype(np.int64), 0, GRID - 1)
+    cells, inverse, counts = np.unique(cy * GRID + cx, return_inverse=True, return_counts=True)
+
+    k = len(cells)
+    mean_lat = np.bincount(inverse, weights=lat, minlength=k) / counts
+    mean_lon = np.bincount(inverse, weights=lon, minlength=k) / counts
+    lo_lat = np.full(k, np.inf)
+    hi_lat = np.full(k, -np.inf)
+    lo_lon = np.full(k, np.inf)
+    hi_lon = np.full(k, -np.inf)
+    np.minimum.at(lo_lat, inverse, lat)
+    np.maximum.at(hi_lat, inverse, lat)
+    np.minimum.at(lo_lon, inverse, lon)
+    np.maximum.at(hi_lon, inverse, lon)
+
+    clusters = [
+        {
+            "lat": round(float(mean_lat[i]), 6),
+            "lon": round(float(mean_lon[i]), 6),
+            "count": int(counts[i]),
+            "bounds": [float(lo_lat[i]), float(lo_lon[i]), float(hi_lat[i]), float(hi_lon[i])],
+        }
+        for i in np.flatnonzero(counts > 1)
+    ]
+    singles = ids[np.isin(inverse, np.flatnonzero(counts == 1))]
+    return {"tile": f"{z}/{x}/{y}", "count": len(raw), "clusters": clusters,
+            "clients": _point_rows(singles.tolist())}
+
+
+def get_tiles(tiles: List[Tile], flt: MapFilter) -> List[Dict]:
+    """Keshdan (``get_many``), yo'qlarini hisoblab ``set_many`` bilan yozadi."""
+    version = _version()
+    keys = {tile: _tile_key(version, flt, tile) for tile in tiles}
+    cached = cache.get_many(list(keys.values()))
+    out, missing = [], {}
+    for tile in tiles:
+        payload = cached.get(keys[tile])
+        if payload is None:
+            payload = build_tile(tile, flt)
+            missing[keys[tile]] = payload
+        out.append(payload)
+    if missing:
+        cache.set_many(missing, _tile_ttl())
+    return out
+
+
+def viewport(bbox: Tuple[float, float, float, float], zoom: int, flt: MapFilter) -> Dict:
+    """bbox (``west, south, east, north``) ni qoplaydigan tile'lar birlashmasi."""
+    zoom = max(0, min(int(zoom), MAX_ZOOM))
+    tiles = tiles_for_bbox(*bbox, zoom)
+    if len(tiles) > MAX_TILES:
+        raise ValueError("BBOX_TOO_LARGE")
+    return merge(get_tiles(tiles, flt), zoom)
+
+
+def merge(payloads: List[Dict], zoom: int) -> Dict:
+    clusters, clients = [], []
+    for p in payloads:
+        clusters.extend(p["clusters"])
+        clients.extend(p["clients"])
+    return {
+        "zoom": zoom,
+        "tiles": [p["tile"] for p in payloads],
+        "count": sum(p["count"] for p in payloads),
+        "clustered": bool(clusters),
+        "clusters": clusters,
+        "clients": clients,
+    }
+
+
+# ---------------- keshni eskirtirish ----------------
+def _snapshot(instance) -> tuple:
+    # __dict__ dan o'qiymiz: .only()/.defer() bilan yuklangan obyektda ortiqcha so'rov bo'lmasin
+    d = instance.__dict__
+    return tuple(d.get(f) for f in WATCHED_FIELDS)
+
+
+@receiver(post_init, sender=Client)
+def _client_post_init(sender, instance, **kwargs):
+    setattr(instance, _SNAPSHOT_ATTR, _snapshot(instance))
+
+
+@receiver(post_save, sender=Client)
+def _client_post_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not (set(update_fields) & _WATCHED_UPDATE_FIELDS):
+        return
+    before = getattr(instance, _SNAPSHOT_ATTR, None)
+    after = _snapshot(instance)
+    setattr(instance, _SNAPSHOT_ATTR, after)
+    if created or before != after:
+        transaction.on_commit(invalidate)
+
+
+@receiver(post_delete, sender=Client)
+def _client_post_delete(sender, instance, **kwargs):
+    transaction.on_commit(invalidate)
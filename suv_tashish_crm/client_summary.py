@@ -0,0 +1,111 @@
+"""
+Client.latest_order / last_courier / orders_count ni yangilab turish.
+
+Admin ro'yxatlari (clients, orders, debtors) va kuryer API'si oldin har bir mijoz
+uchun ``Order.objects.filter(client=c)...first()`` / ``.count()`` qilardi (N+1).
+Endi bu qiymatlar Client qatorida saqlanadi va Order saqlanganda/o'chirilganda
+o'sha tranzaksiya ichida yangilanadi:
+
+- yangi order — bitta ``UPDATE`` (``orders_count + 1``, latest_order, last_courier);
+- kuryer/mijoz o'zgarishi yoki o'chirish — mijoz(lar) uchun qayta hisoblash.
+
+``Client.save()`` bu maydonlarni yozmaydi (``Client.SUMMARY_FIELDS``) — eski nusxa
+saqlansa ham hisoblagich buzilmaydi; ularni faqat shu modul ``UPDATE`` bilan yangilaydi.
+
+``QuerySet.update()`` / ``bulk_create()`` signal yubormaydi — bunday joylarda
+``refresh_clients()`` ni qo'lda chaqiring. To'liq tuzatish:
+``manage.py rebuild_client_summary``.
+"""
+from typing import Iterable
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Client, Order
+
+_SNAPSHOT_ATTR = "_client_summary_snapshot"
+
+
+def _snapshot(instance) -> tuple:
+    # __dict__ dan o'qiymiz: .only()/.defer() bilan yuklangan obyektda ortiqcha so'rov bo'lmasin
+    d = instance.__dict__
+    # status kerak emas: o'quvchilar latest_order ni select_related bilan oladi
+    return d.get("client_id"), d.get("courier_id")
+
+
+def _summary_expressions(order_model):
+    """Korrelyatsiyalangan subquery'lar: bitta ``UPDATE`` ichida hamma mijozlar uchun."""
+    latest = order_model.objects.filter(client_id=OuterRef("pk")).order_by("-created_at", "-id")
+    count = (
+        order_model.objects.filter(client_id=OuterRef("pk"))
+        .order_by().values("client_id").annotate(n=Count("id")).values("n")
+    )
+    return {
+        "latest_order_id": Subquery(latest.values("id")[:1]),
+        "last_courier_id": Subquery(latest.values("courier_id")[:1]),
+        "orders_count": Coalesce(Subquery(count, output_field=IntegerField()), Value(0)),
+    }
+
+
+def refresh_clients(client_ids: Iterable) -> int:
+    """Berilgan mijozlar uchun qiymatlarni Order jadvalidan qayta hisoblaydi."""
+    ids = {int(c) for c in client_ids if c}
+    if not ids:
+        return 0
+    return Client.objects.filter(pk__in=ids).update(**_summary_expressions(Order))
+
+
+def order_courier_changed(order) -> int:
+    """Kuryer o'zgardi — faqat shu order mijozning so'nggisi bo'lsa ``last_courier`` yangilanadi."""
+    return Client.objects.filter(pk=order.client_id, latest_order_id=order.pk).update(
+        last_courier_id=order.courier_id,
+    )
+
+
+def rebuild(client_model=None, order_model=None) -> int:
+    """Hamma mijozlar (migratsiya va ``rebuild_client_summary`` uchun)."""
+    client_model = client_model or Client
+    order_model = order_model or Order
+    return client_model.objects.update(**_summary_expressions(order_model))
+
+
+def remember(order: Order) -> None:
+    """Orderning joriy mijoz/summa holatini eslab qoladi (``QuerySet.update()`` dan keyin)."""
+    setattr(order, _SNAPSHOT_ATTR, _snapshot(order))
+
+
+@receiver(post_init, sender=Order)
+def _remember_order_client(sender, instance, **kwargs):
+    remember(instance)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, _SNAPSHOT_ATTR, None)
+    after = _snapshot(instance)
+    setattr(instance, _SNAPSHOT_ATTR, after)
+
+    if created:
+        # yangi order odatda eng so'nggisi — qayta hisoblashsiz bitta UPDATE
+        if instance.client_id:
+            Client.objects.filter(pk=instance.client_id).update(
+                orders_count=F("orders_count") + 1,
+                latest_order_id=instance.pk,
+                last_courier_id=instance.courier_id,
+            )
+        return
+    if before == after:
+        return
+    if before and before[0] != after[0]:
+        refresh_clients([before[0], after[0]])
+    elif before and before[1] != after[1]:
+        order_courier_changed(instance)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    refresh_clients([instance.client_id])
@@ -1,32 +1,35 @@
+LANG_OPTIONS = (
+    ('uz_lat', 'Uzbek - Latin'),
+    ('uz_cyrl', 'Uzbek - Кирил'),
+    ('ru', 'Русский'),
+    ('en', 'English'),
+)
+
+
 def language_context(request):
     """Provide translations dict `T`, current language code `current_lang`, and language options.
 
     Languages supported: 'uz_lat', 'uz_cyrl', 'ru', 'en'.
+    Catalogs come from the in-process cache in `suv_tashish_crm.translations`; `T` and
+    `current_lang` are lazy, so a page that never uses them does not touch the session.
     """
-    import os, json
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    locale_dir = os.path.join(BASE_DIR, 'locale')
-    lang = request.session.get('lang', 'uz_lat')
-    # clamp to known values
-    if lang not in ('uz_lat', 'uz_cyrl', 'ru', 'en'):
-        lang = 'uz_lat'
-    filename = os.path.join(locale_dir, f"{lang}.json")
-    translations = {}
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            translations = json.load(f)
-    except Exception:
-        translations = {}
-    # expose small mapping and current lang
+    from django.utils.functional import SimpleLazyObject
+    from .translations import LazyCatalog, normalize_language
+
+    resolved = []
+
+    def _lang():
+        if not resolved:
+            try:
+                resolved.append(normalize_language(request.session.get('lang', 'uz_lat')))
+            except Exception:
+                resolved.append('uz_lat')
+        return resolved[0]
+
     return {
-        'T': translations,
-        'current_lang': lang,
-        'LANG_OPTIONS': [
-            ('uz_lat', 'Uzbek - Latin'),
-            ('uz_cyrl', 'Uzbek - Кирил'),
-            ('ru', 'Русский'),
-            ('en', 'English'),
-        ],
+        'T': LazyCatalog(_lang),
+        'current_lang': SimpleLazyObject(_lang),
+        'LANG_OPTIONS': LANG_OPTIONS,
     }
 
 
@@ -0,0 +1,209 @@
+"""
+Dashboard statistikasi — admin panel, API va kuryer paneli uchun umumiy servis.
+
+Oldin har bir dashboard kunlik grafik uchun har bir kunga alohida
+``Order.objects.filter(created_at__date=day).count()`` yuborardi (7 + 30 ta so'rov).
+Bu yerda hamma kunlik qatorlar bitta guruhlangan so'rov bilan olinadi, bo'sh kunlar
+esa Pythonda 0 bilan to'ldiriladi.
+
+Vaqt kesimidagi ko'rsatkichlar (kunlik qatorlar, statuslar, tushum, top kuryerlar,
+hududlar) xom ``Order`` emas, ``DailyOrderStats`` rollupidan o'qiladi — jadval
+kattalashgani sari so'rov narxi kunlar soniga bog'liq bo'lib qoladi.
+"""
+import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Client, Courier, DailyOrderStats, Order
+
+
+def _to_int(value, default: int = 0) -> int:
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except Exception:
+        try:
+            return int(float(value))
+        except Exception:
+            return default
+
+
+@dataclass
+class DashboardStats:
+    today: datetime.date
+    today_orders: int = 0
+    pending_count: int = 0
+    delivered_count: int = 0
+    today_revenue: int = 0
+    active_couriers: int = 0
+    total_couriers: int = 0
+    total_clients: int = 0
+    debtors: int = 0
+
+    # kunlik qatorlar (eng eski kun birinchi)
+    days: List[datetime.date] = field(default_factory=list)
+    daily_counts: List[int] = field(default_factory=list)
+    daily_revenue: List[int] = field(default_factory=list)
+
+    top_clients: List[Dict] = field(default_factory=list)
+    top_couriers: List[Dict] = field(default_factory=list)
+    region_stats: List[Dict] = field(default_factory=list)
+
+    def _tail(self, values: List, n: int) -> List:
+        return list(values[-n:]) if n else []
+
+    @property
+    def weekly_days(self) -> List[datetime.date]:
+        return self._tail(self.days, 7)
+
+    @property
+    def weekly_labels(self) -> List[str]:
+        return [d.strftime('%a') for d in self.weekly_days]
+
+    @property
+    def weekly_counts(self) -> List[int]:
+        return self._tail(self.daily_counts, 7)
+
+    @property
+    def weekly_revenue(self) -> List[int]:
+        return self._tail(self.daily_revenue, 7)
+
+    @property
+    def monthly_labels(self) -> List[str]:
+        return [d.strftime('%d %b') for d in self._tail(self.days, 30)]
+
+    @property
+    def monthly_counts(self) -> List[int]:
+        return self._tail(self.daily_counts, 30)
+
+
+# "filtrlanmasin" belgisi: None esa "IS NULL" degani (masalan sessiyasiz kuryer)
+ANY = object()
+
+
+def _scoped_orders(business=ANY, courier=ANY):
+    qs = Order.objects.all()
+    if business is not ANY:
+        qs = qs.filter(business=business)
+    if courier is not ANY:
+        qs = qs.filter(courier=courier)
+    return qs
+
+
+def _scoped_rollup(business=ANY, courier=ANY):
+    qs = DailyOrderStats.objects.all()
+    if business is not ANY:
+        qs = qs.filter(business=business)
+    if courier is not ANY:
+        qs = qs.filter(courier=courier)
+    return qs
+
+
+def top_clients_by_orders(qs=None, top: int = 5) -> List[Dict]:
+    qs = Order.objects.all() if qs is None else qs
+    return [
+        {'id': t['client__id'], 'full_name': t.get('client__full_name') or '—', 'orders_count': t.get('orders_count', 0)}
+        for t in qs.values('client__id', 'client__full_name')
+        .annotate(orders_count=Count('id'))
+        .order_by('-orders_count')[:top]
+    ]
+
+
+def _fill_days(by_day: Dict, start: datetime.date, end: datetime.date):
+    days, counts, revenue = [], [], []
+    day = start
+    while day <= end:
+        r = by_day.get(day) or {}
+        days.append(day)
+        counts.append(r.get('n') or 0)
+        revenue.append(_to_int(r.get('revenue'), 0))
+        day += datetime.timedelta(days=1)
+    return days, counts, revenue
+
+
+def daily_stats_series(qs, start: datetime.date, end: datetime.date):
+    """``start``..``end`` kunlik qatorlari (bo'sh kunlar 0): ``qs`` — ``DailyOrderStats`` queryset.
+
+    Soni — shu kuni yaratilgan buyurtmalar, summasi — shu kuni yetkazilganlar to'lovi.
+    """
+    rows = (
+        qs.filter(date__gte=start, date__lte=end)
+        .values('date')
+        .annotate(n=Sum('orders_count'), revenue=Sum('payment_total'))
+        .order_by()
+    )
+    return _fill_days({r['date']: r for r in rows}, start, end)
+
+
+def top_couriers_from_rollup(qs=None, top: int = 5) -> List[Dict]:
+    qs = DailyOrderStats.objects.all() if qs is None else qs
+    return [
+        {'id': t.get('courier__id'), 'full_name': t.get('courier__full_name') or '—', 'delivered': t.get('delivered', 0)}
+        for t in qs.filter(done_count__gt=0)
+        .values('courier__id', 'courier__full_name')
+        .annotate(delivered=Sum('done_count'))
+        .order_by('-delivered')[:top]
+    ]
+
+
+def orders_by_region_from_rollup(qs=None, top: int = 10) -> List[Dict]:
+    qs = DailyOrderStats.objects.all() if qs is None else qs
+    return [
+        {'region': t.get('region__name') or '—', 'total_orders': t.get('total_orders', 0)}
+        for t in qs.values('region__name')
+        .annotate(total_orders=Sum('orders_count'))
+        .order_by('-total_orders')[:top]
+    ]
+
+
+def get_dashboard_stats(business=ANY, courier=ANY, days: int = 30, top: int = 5,
+                        include_tops: bool = True, today: Optional[datetime.date] = None) -> DashboardStats:
+    """Dashboard uchun barcha ko'rsatkichlarni minimal so'rovlar bilan hisoblaydi.
+
+    ``business`` berilsa — faqat shu biznes, ``courier`` berilsa — faqat shu kuryer
+    buyurtmalari hisobga olinadi (``None`` — biriktirilmaganlar).
+    """
+    today = today or timezone.localdate()
+    stats = DashboardStats(today=today)
+    rollup = _scoped_rollup(business=business, courier=courier)
+
+    # 1) kunlik qatorlar — rollupdan bitta GROUP BY
+    start = today - datetime.timedelta(days=max(days, 1) - 1)
+    stats.days, stats.daily_counts, stats.daily_revenue = daily_stats_series(rollup, start, today)
+    stats.today_orders = stats.daily_counts[-1] if stats.daily_counts else 0
+
+    # 2) holatlar va bugungi tushum — bitta aggregate
+    agg = rollup.aggregate(
+        assigned=Sum('assigned_count'),
+        delivering=Sum('delivering_count'),
+        delivered=Sum('done_count'),
+        revenue=Sum('payment_total', filter=Q(date=today)),
+    )
+    stats.pending_count = (agg.get('assigned') or 0) + (agg.get('delivering') or 0)
+    stats.delivered_count = agg.get('delivered') or 0
+    stats.today_revenue = _to_int(agg.get('revenue'), 0)
+
+    if courier is ANY:
+        couriers = Courier.objects.all()
+        clients = Client.objects.all()
+        if business is not ANY:
+            couriers = couriers.filter(business=business)
+            clients = clients.filter(business=business)
+        c_agg = couriers.aggregate(total=Count('id'), active=Count('id', filter=Q(is_active=True)))
+        stats.total_couriers = c_agg.get('total') or 0
+        stats.active_couriers = c_agg.get('active') or 0
+        cl_agg = clients.aggregate(total=Count('id'), debtors=Count('id', filter=Q(debt__gt=0)))
+        stats.total_clients = cl_agg.get('total') or 0
+        stats.debtors = cl_agg.get('debtors') or 0
+
+    if include_tops:
+        # mijozlar kesimi rollupda yo'q — Order bo'yicha
+        stats.top_clients = top_clients_by_orders(_scoped_orders(business=business, courier=courier), top)
+        stats.top_couriers = top_couriers_from_rollup(rollup, top)
+        stats.region_stats = orders_by_region_from_rollup(rollup, 10)
+
+    return stats
@@ -0,0 +1,309 @@
+"""
+Buyurtmaga eng yaqin kuryerni topish (dispatch).
+
+Oldin tayinlash "kim birinchi" edi: kuryerlar pending buyurtmalarni so'rab,
+``courier_accept_order_view`` ni chaqirardi — masofa hisobga olinmasdi.
+
+Bu modul faol kuryerlarning so'nggi pozitsiyalari (``positions`` store, bo'lmasa
+``Courier.lat/lon``) bo'yicha xotirada KD-tree (scipy ``cKDTree``, birlik sferadagi
+3D nuqtalar — eng yaqin qo'shnilar katta doira masofasi bo'yicha aniq) quradi va
+``DISPATCH_INDEX_TTL`` sekund ushlab turadi. Masofalar numpy haversine bilan
+vektorlashtirilgan holda hisoblanadi; bir nechta buyurtma bitta ``query`` bilan.
+
+- ``nearest_couriers(order, k)`` — k ta eng yaqin bo'sh kuryer;
+- ``auto_assign(order)`` — eng yaqiniga biriktiradi (``order_flow.accept`` — poyga bo'lmasin);
+- ``assign_pending()`` — navbatdagi pending buyurtmalarni ommaviy taqsimlash;
+- ``DISPATCH_AUTO_ASSIGN=1`` bo'lsa yangi buyurtma commit'dan keyin avtomatik biriktiriladi.
+
+"Bo'sh" — ``assigned``/``delivering`` buyurtmalari ``DISPATCH_MAX_ACTIVE_ORDERS`` dan kam.
+Indeks har doim bitta biznes bo'yicha: ``business_id=None`` — biznesga bog'lanmagan
+kuryerlar (boshqa tenantlarning kuryerlari hech qachon aralashmaydi).
+"""
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import geo, order_flow
+from .models import Client, Courier, Order
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("assigned", "delivering")
+
+
+def _conf(name, default):
+    return getattr(settings, name, default)
+
+
+@dataclass(frozen=True)
+class Candidate:
+    courier_id: int
+    distance_km: float
+    eta_seconds: int
+    active_orders: int
+
+    def as_dict(self) -> Dict:
+        d = asdict(self)
+        d["distance_km"] = round(self.distance_km, 3)
+        return d
+
+
+class CourierIndex:
+    """Kuryer pozitsiyalari ustida KD-tree. ``load`` — faol buyurtmalar soni (o'zgaruvchan)."""
+
+    def __init__(self, courier_ids, lats, lons, load=None, capacity: Optional[int] = None):
+        from scipy.spatial import cKDTree
+
+        lat = np.asarray(lats, dtype=float)
+        lon = np.asarray(lons, dtype=float)
+        ids = np.asarray(courier_ids, dtype=np.int64)
+        load = np.zeros(len(ids), dtype=np.int64) if load is None else np.asarray(load, dtype=np.int64)
+        mask = geo.valid_points(lat, lon)
+
+        self.ids = ids[mask]
+        self.lat = lat[mask]
+        self.lon = lon[mask]
+        self.load = load[mask].copy()
+        self.capacity = capacity
+        self.built_at = time.monotonic()
+        self._row = {int(cid): i for i, cid in enumerate(self.ids)}
+        self.tree = cKDTree(geo.to_unit_xyz(self.lat, self.lon)) if len(self.ids) else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def available(self) -> np.ndarray:
+        if self.capacity is None:
+            return np.ones(len(self.ids), dtype=bool)
+        return self.load < self.capacity
+
+    def query(self, lats, lons, k: int = 5, max_km: Optional[float] = None,
+              only_available: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """Har bir nuqta uchun k ta eng yaqin kuryer: ``(rows, km)`` — shakli ``(m, k)``.
+
+        Topilmagan joylarda ``rows == -1`` va ``km == inf``. ``rows`` — indeks qatorlari
+        (``self.ids[rows]`` — courier id).
+        """
+        lat = np.atleast_1d(np.asarray(lats, dtype=float))
+        lon = np.atleast_1d(np.asarray(lons, dtype=float))
+        m, n = len(lat), len(self.ids)
+        rows = np.full((m, k), -1, dtype=np.int64)
+        km = np.full((m, k), np.inf)
+        if not n or not m or k <= 0:
+            return rows, km
+
+        avail = self.available() if only_available else np.ones(n, dtype=bool)
+        # band kuryerlar ham qo'shni bo'lib chiqishi mumkin — shuncha ko'proq so'raymiz
+        kk = min(n, k + int(n - avail.sum()))
+        bound = geo.km_to_chord(max_km) if max_km else np.inf
+        _, idx = self.tree.query(geo.to_unit_xyz(lat, lon), k=kk, distance_upper_bound=bound)
+        idx = np.asarray(idx).reshape(m, kk)
+
+        found = idx < n
+        safe = np.where(found, idx, 0)
+        dist = geo.haversine_km(lat[:, None], lon[:, None], self.lat[safe], self.lon[safe])
+        dist = np.where(found & avail[safe], dist, np.inf)
+
+        order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+        top_km = np.take_along_axis(dist, order, axis=1)
+        top_rows = np.take_along_axis(safe, order, axis=1)
+        ok = np.isfinite(top_km)
+        w = top_km.shape[1]
+        rows[:, :w] = np.where(ok, top_rows, -1)
+        km[:, :w] = top_km
+        return rows, km
+
+    def candidates(self, rows: np.ndarray, km: np.ndarray) -> List[Candidate]:
+        return [
+            Candidate(int(self.ids[r]), float(d), geo.eta_seconds(float(d)), int(self.load[r]))
+            for r, d in zip(rows, km) if r >= 0
+        ]
+
+    def nearest(self, lat, lon, k: int = 5, max_km: Optional[float] = None) -> List[Candidate]:
+        rows, km = self.query([lat], [lon], k=k, max_km=max_km)
+        return self.candidates(rows[0], km[0])
+
+    def take(self, courier_id) -> None:
+        """Biriktirilgandan keyin: indeks qayta qurilguncha yuklamani hisobga olish."""
+        i = self._row.get(int(courier_id))
+        if i is not None:
+            self.load[i] += 1
+
+
+# ---------------- indeksni qurish va keshlash ----------------
+def build_index(business_id=None) -> CourierIndex:
+    """``business_id`` kuryerlari; ``None`` — biznessiz kuryerlar (hamma tenant emas)."""
+    qs = Courier.objects.filter(is_active=True, business_id=business_id)
+    rows = list(qs.values_list("id", "lat", "lon"))
+    ids = [r[0] for r in rows]
+
+    live = {}
+    try:
+        from .positions import get_position_store
+        live = get_position_store().get_many(ids)
+    except Exception:
+        logger.exception("dispatch: position store unavailable, using Courier.lat/lon")
+    max_age = float(_conf("DISPATCH_POSITION_MAX_AGE", 900))
+    now = time.time()
+
+    lats, lons = [], []
+    for cid, lat, lon in rows:
+        pos = live.get(cid)
+        if pos is not None and now - pos.ts <= max_age:
+            lat, lon = pos.lat, pos.lon
+        lats.append(lat)
+        lons.append(lon)
+
+    load = dict(
+        Order.objects.filter(status__in=ACTIVE_STATUSES, courier_id__in=ids)
+        .order_by().values("courier_id").annotate(n=Count("id")).values_list("courier_id", "n")
+    )
+    capacity = _conf("DISPATCH_MAX_ACTIVE_ORDERS", 3) or None
+    return CourierIndex(ids, geo.as_array(lats), geo.as_array(lons),
+                        load=[load.get(cid, 0) for cid in ids], capacity=capacity)
+
+
+_indexes: Dict[object, CourierIndex] = {}
+_lock = threading.Lock()
+
+
+def get_index(business_id=None) -> CourierIndex:
+    ttl = float(_conf("DISPATCH_INDEX_TTL", 15))
+    index = _indexes.get(business_id)
+    if index is not None and time.monotonic() - index.built_at < ttl:
+        return index
+    with _lock:
+        index = _indexes.get(business_id)
+        if index is None or time.monotonic() - index.built_at >= ttl:
+            index = build_index(business_id)
+            _indexes[business_id] = index
+        return index
+
+
+def invalidate_index() -> None:
+    with _lock:
+        _indexes.clear()
+
+
+# ---------------- buyurtmalar ----------------
+def resolve_point(lat, lon, client_lat=None, client_lon=None) -> Tuple[Optional[float], Optional[float]]:
+    """``order_point`` ustunlar bo'yicha (``values_list`` qatorlari uchun, so'rovsiz)."""
+    if geo.is_valid_point(lat, lon):
+        return float(lat), float(lon)
+    if geo.is_valid_point(client_lat, client_lon):
+        return float(client_lat), float(client_lon)
+    return None, None
+
+
+def order_point(order) -> Tuple[Optional[float], Optional[float]]:
+    """Buyurtma manzili: ``Order.lat/lon``, bo'lmasa mijozning ``location_lat/lon``."""
+    if geo.is_valid_point(order.lat, order.lon):
+        return float(order.lat), float(order.lon)
+    if order.client_id:
+        if Order.client.is_cached(order):
+            row = (order.client.location_lat, order.client.location_lon)
+        else:
+            row = Client.objects.filter(pk=order.client_id).values_list("location_lat", "location_lon").first()
+        if row and geo.is_valid_point(row[0], row[1]):
+            return float(row[0]), float(row[1])
+    return None, None
+
+
+def nearest_couriers(order, k: int = 5, max_km: Optional[float] = None) -> List[Candidate]:
+    lat, lon = order_point(order)
+    if lat is None:
+        return []
+    return get_index(order.business_id).nearest(lat, lon, k=k, max_km=max_km)
+
+
+def assign(order, courier_id) -> bool:
+    """Buyurtma hali pending va kuryersiz bo'lsa biriktiradi.
+
+    ``order_flow.accept`` — shartli UPDATE: ikki dispatcher (yoki kuryer ``accept`` bilan)
+    bir vaqtda biriktira olmaydi; yig'malar va hodisa shu yerda yangilanadi.
+    """
+    return order_flow.accept(order, courier_id).changed
+
+
+def auto_assign(order, max_km: Optional[float] = None) -> Optional[Candidate]:
+    if order.status != "pending" or order.courier_id:
+        return None
+    cands = nearest_couriers(order, k=1, max_km=max_km)
+    if not cands:
+        return None
+    cand = cands[0]
+    if assign(order, cand.courier_id):
+        get_index(order.business_id).take(cand.courier_id)
+        return cand
+    return None  # buyurtmani boshqasi oldi
+
+
+def assign_pending(business_id=None, limit: int = 500, max_km: Optional[float] = None,
+                   all_businesses: bool = False) -> List[Tuple[int, Candidate]]:
+    """Pending buyurtmalarni (eskisi birinchi) eng yaqin bo'sh kuryerlarga taqsimlaydi.
+
+    ``business_id=None`` — biznessiz buyurtmalar; ``all_businesses=True`` — hamma
+    bizneslar, har biri faqat o'z kuryerlari bilan.
+    """
+    qs = Order.objects.filter(status="pending", courier__isnull=True).select_related("client")
+    if not all_businesses:
+        qs = qs.filter(business_id=business_id)
+    groups: Dict[object, Tuple[list, list]] = {}
+    for o in qs.order_by("created_at", "id")[:limit]:
+        lat, lon = order_point(o)
+        if lat is not None:
+            orders, points = groups.setdefault(o.business_id, ([], []))
+            orders.append(o)
+            points.append((lat, lon))
+
+    assigned = []
+    for bid, (orders, points) in groups.items():
+        assigned += _assign_group(get_index(bid), orders, points, max_km)
+    return assigned
+
+
+def _assign_group(index: CourierIndex, orders, points, max_km) -> List[Tuple[int, Candidate]]:
+    k = int(_conf("DISPATCH_CANDIDATES", 3))
+    pts = np.asarray(points, dtype=float)
+    rows, km = index.query(pts[:, 0], pts[:, 1], k=k, max_km=max_km)
+    avail = index.available()
+
+    assigned = []
+    for o, cand_rows, cand_km in zip(orders, rows, km):
+        for r, d in zip(cand_rows, cand_km):
+            if r < 0:
+                break
+            if not avail[r]:
+                continue  # shu partiyada to'lib qoldi
+            cid = int(index.ids[r])
+            if assign(o, cid):
+                index.take(cid)
+                avail = index.available()
+                assigned.append((o.pk, Candidate(cid, float(d), geo.eta_seconds(float(d)), int(index.load[r]))))
+            break
+    return assigned
+
+
+@receiver(post_save, sender=Order)
+def auto_dispatch_new_order(sender, instance, created, raw=False, **kwargs):
+    if raw or not created or not _conf("DISPATCH_AUTO_ASSIGN", False):
+        return
+    if instance.status != "pending" or instance.courier_id:
+        return
+
+    def _run():
+        try:
+            auto_assign(instance)
+        except Exception:
+            logger.exception("auto dispatch failed for order %s", instance.pk)
+
+    transaction.on_commit(_run)
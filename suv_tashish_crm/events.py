@@ -0,0 +1,442 @@
+"""
+Real-time hodisalar (server push): buyurtma statuslari, yangi buyurtmalar va
+kuryer pozitsiyalari SSE orqali uzatiladi — dashboardlar har 8-10 sekundda
+to'liq so'rovlarni qayta yubormasin.
+
+Kanallar:
+- ``order:<id>``            — shu buyurtma statusi / kuryeri o'zgardi
+- ``courier:<id>``          — kuryerga tegishli buyurtmalar o'zgardi
+- ``business:<id>:orders``  — biznesda yangi/o'zgargan buyurtma (``None`` — biznessiz)
+- ``position:<courier_id>`` — kuryer yangi nuqta yubordi
+- ``import:<job_id>``       — fon importi progressi (``suv_tashish_crm.imports``)
+
+Broker (``settings.EVENTS_BROKER``):
+- ``inprocess`` — bitta jarayon ichida asyncio navbatlar (single-node, default);
+- ``channels``  — Django Channels layer (masalan Redis) orqali, bir nechta worker/server uchun.
+
+Obunachilar — ASGI ostidagi async generatorlar: har bir ochiq ulanish bitta
+coroutine + ``asyncio.Queue``, thread emas, shuning uchun minglab bo'sh ulanish arzon.
+WSGI (masalan ``runserver``) ostida ``inprocess`` broker oddiy generator bilan ishlaydi —
+u holda har bir ulanish worker thread'ini band qiladi, faqat dev uchun.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+# sekin obunachi xotirani to'ldirmasin: navbat to'lsa eng eski hodisa tashlanadi
+QUEUE_SIZE = 256
+# bitta hodisa bir nechta kanal orqali kelishi mumkin — oxirgi id'lar bo'yicha takrorni tashlaymiz
+SEEN_SIZE = 64
+
+
+def _first_time(seen: deque, event: Dict) -> bool:
+    eid = event.get("id")
+    if eid is None:
+        return True
+    if eid in seen:
+        return False
+    seen.append(eid)
+    return True
+
+
+def order_channel(order_id) -> str:
+    return f"order:{order_id}"
+
+
+def courier_channel(courier_id) -> str:
+    return f"courier:{courier_id}"
+
+
+def business_channel(business_id) -> str:
+    return f"business:{business_id}:orders"
+
+
+def position_channel(courier_id) -> str:
+    return f"position:{courier_id}"
+
+
+def import_channel(job_id) -> str:
+    return f"import:{job_id}"
+
+
+class Subscription:
+    """Bitta ulanish: kanallar to'plami + navbat. Kanallarni keyin ham qo'shish mumkin."""
+
+    def __init__(self, broker: "BaseBroker", channels: Iterable[str]):
+        self.broker = broker
+        self.channels: Set[str] = set()
+        self.queue: Optional[asyncio.Queue] = None
+        self._initial = set(channels)
+        self._seen: deque = deque(maxlen=SEEN_SIZE)
+
+    async def __aenter__(self):
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+        await self.add(*self._initial)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.broker._unsubscribe(self, set(self.channels))
+        self.channels.clear()
+
+    async def add(self, *channels: str) -> None:
+        new = set(channels) - self.channels
+        if new:
+            self.channels |= new
+            await self.broker._subscribe(self, new)
+
+    async def remove(self, *channels: str) -> None:
+        old = set(channels) & self.channels
+        if old:
+            self.channels -= old
+            await self.broker._unsubscribe(self, old)
+
+    def deliver(self, event: Dict) -> None:
+        """Istalgan thread'dan chaqirilishi mumkin."""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: Dict) -> None:
+        if not _first_time(self._seen, event):
+            return
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[Dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ThreadSubscription:
+    """WSGI uchun sinxron variant (faqat ``InProcessBroker``)."""
+
+    def __init__(self, broker: "InProcessBroker", channels: Iterable[str]):
+        self.broker = broker
+        self.channels: Set[str] = set(channels)
+        self.queue: "queue.Queue[Dict]" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._seen: deque = deque(maxlen=SEEN_SIZE)
+        self._seen_lock = threading.Lock()
+
+    def __enter__(self):
+        self.broker._add(self, self.channels)
+        return self
+
+    def __exit__(self, *exc):
+        self.broker._discard(self, self.channels)
+
+    def add(self, *channels: str) -> None:
+        new = set(channels) - self.channels
+        if new:
+            self.channels |= new
+            self.broker._add(self, new)
+
+    def remove(self, *channels: str) -> None:
+        old = set(channels) & self.channels
+        if old:
+            self.channels -= old
+            self.broker._discard(self, old)
+
+    def deliver(self, event: Dict) -> None:
+        with self._seen_lock:
+            if not _first_time(self._seen, event):
+                return
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Optional[Dict]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class BaseBroker:
+    def publish(self, channel: str, event: Dict) -> None:
+        raise NotImplementedError
+
+    def subscribe_sync(self, *channels: str) -> ThreadSubscription:
+        raise ImproperlyConfigured(f"{type(self).__name__} WSGI (sinxron) obunani qo'llamaydi — ASGI ishlating")
+
+    async def _subscribe(self, sub: Subscription, channels: Set[str]) -> None:
+        raise NotImplementedError
+
+    async def _unsubscribe(self, sub: Subscription, channels: Set[str]) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, *channels: str) -> Subscription:
+        return Subscription(self, channels)
+
+
+class InProcessBroker(BaseBroker):
+    def __init__(self, **kwargs):
+        self._subs: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, event: Dict) -> None:
+        with self._lock:
+            targets = list(self._subs.get(channel, ()))
+        for sub in targets:
+            try:
+                sub.deliver(event)
+            except RuntimeError:
+                # event loop yopilgan — ulanish tugagan
+                pass
+
+    def _add(self, sub, channels):
+        with self._lock:
+            for ch in channels:
+                self._subs[ch].add(sub)
+
+    def _discard(self, sub, channels):
+        with self._lock:
+            for ch in channels:
+                subs = self._subs.get(ch)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subs[ch]
+
+    async def _subscribe(self, sub, channels):
+        self._add(sub, channels)
+
+    async def _unsubscribe(self, sub, channels):
+        self._discard(sub, channels)
+
+    def subscribe_sync(self, *channels: str) -> ThreadSubscription:
+        return ThreadSubscription(self, channels)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({s for subs in self._subs.values() for s in subs})
+
+
+class ChannelsBroker(BaseBroker):
+    """Channels layer orqali: har bir ulanish o'z kanalini ochadi va guruhlarga qo'shiladi."""
+
+    def __init__(self, alias: str = "default", **kwargs):
+        try:
+            from channels.layers import get_channel_layer
+        except ImportError:
+            raise ImproperlyConfigured("EVENTS_BROKER='channels' uchun `channels` paketi o'rnatilmagan")
+        self.layer = get_channel_layer(alias)
+        if self.layer is None:
+            raise ImproperlyConfigured("CHANNEL_LAYERS sozlanmagan")
+        self._readers: Dict[int, asyncio.Task] = {}
+
+    @staticmethod
+    def _group(channel: str) -> str:
+        # guruh nomida ':' ruxsat etilmaydi
+        return "suv." + channel.replace(":", ".")
+
+    def publish(self, channel: str, event: Dict) -> None:
+        from asgiref.sync import async_to_sync
+        try:
+            async_to_sync(self.layer.group_send)(self._group(channel), {"type": "suv.event", "event": event})
+        except Exception:
+            logger.exception("channels publish failed: %s", channel)
+
+    async def _subscribe(self, sub, channels):
+        if not hasattr(sub, "layer_channel"):
+            sub.layer_channel = await self.layer.new_channel()
+            self._readers[id(sub)] = asyncio.ensure_future(self._read(sub))
+        for ch in channels:
+            await self.layer.group_add(self._group(ch), sub.layer_channel)
+
+    async def _read(self, sub):
+        while True:
+            msg = await self.layer.receive(sub.layer_channel)
+            sub._put(msg.get("event") or {})
+
+    async def _unsubscribe(self, sub, channels):
+        if not hasattr(sub, "layer_channel"):
+            return
+        for ch in channels:
+            await self.layer.group_discard(self._group(ch), sub.layer_channel)
+        if not sub.channels:
+            task = self._readers.pop(id(sub), None)
+            if task:
+                task.cancel()
+
+
+BACKENDS = {
+    "inprocess": InProcessBroker,
+    "channels": ChannelsBroker,
+}
+
+_broker: Optional[BaseBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> BaseBroker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                name = getattr(settings, "EVENTS_BROKER", "inprocess") or "inprocess"
+                cls = BACKENDS.get(name)
+                if cls is None:
+                    raise ImproperlyConfigured(f"Noma'lum EVENTS_BROKER: {name!r}")
+                _broker = cls(**getattr(settings, "EVENTS_BROKER_OPTIONS", {}))
+    return _broker
+
+
+def publish(channels: Iterable[str], event_type: str, data: Dict) -> None:
+    event = {"id": uuid.uuid4().hex, "type": event_type, "data": data, "ts": time.time()}
+    try:
+        broker = get_broker()
+        for ch in set(channels):
+            broker.publish(ch, event)
+    except Exception:
+        logger.exception("event publish failed: %s", event_type)
+
+
+def publish_position(pos) -> None:
+    publish([position_channel(pos.courier_id)], "position", {"courier_id": pos.courier_id, **pos.as_dict()})
+
+
+# ---------------- Order hodisalari ----------------
+def remember(order) -> None:
+    """Orderning joriy status/kuryerini eslab qoladi — ``QuerySet.update()`` dan keyin
+    ``order_event`` qo'lda chaqirilgan bo'lsa, keyingi ``save()`` hodisani takrorlamaydi."""
+    d = order.__dict__
+    order._event_state = (d.get("status"), d.get("courier_id"))
+
+
+@receiver(post_init, sender=Order)
+def _remember_status(sender, instance, **kwargs):
+    remember(instance)
+
+
+@receiver(post_save, sender=Order)
+def order_changed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, "_event_state", (None, None))
+    after = (instance.status, instance.courier_id)
+    instance._event_state = after
+    if not created and before == after:
+        return
+    order_event(instance, created=created, previous_status=before[0], previous_courier_id=before[1])
+
+
+def order_event(order, created: bool = False, previous_status=None, previous_courier_id=None) -> None:
+    """Order o'zgarishini commit'dan keyin tegishli kanallarga yuboradi.
+
+    ``QuerySet.update()`` bilan o'zgartirilgan joylar buni qo'lda chaqirishi mumkin.
+    """
+    data = {
+        "order_id": order.pk,
+        "status": order.status,
+        "previous_status": previous_status,
+        "courier_id": order.courier_id,
+        "business_id": order.business_id,
+        "client_id": order.client_id,
+    }
+    channels = {order_channel(order.pk), business_channel(order.business_id)}
+    for cid in {order.courier_id, previous_courier_id}:
+        if cid:
+            channels.add(courier_channel(cid))
+    event_type = "order.created" if created else "order.status"
+    transaction.on_commit(lambda: publish(channels, event_type, data))
+
+
+# ---------------- SSE ----------------
+def sse_format(event: Dict) -> str:
+    head = f"id: {event['id']}\n" if event.get("id") else ""
+    return f"{head}event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def sse_stream(sub: Subscription, on_event=None) -> AsyncIterator[str]:
+    """Obuna hodisalarini SSE matni sifatida beradi; jim paytda heartbeat izohi yuboriladi.
+
+    ``on_event(sub, event)`` — ixtiyoriy coroutine, masalan order kuryeri almashsa
+    yangi ``position:<id>`` kanaliga o'tish uchun.
+    """
+    heartbeat = float(getattr(settings, "SSE_HEARTBEAT_SECONDS", 15))
+    async with sub:
+        yield "retry: 3000\n\n"
+        while True:
+            event = await sub.get(timeout=heartbeat)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            if on_event is not None:
+                await on_event(sub, event)
+            yield sse_format(event)
+
+
+def sse_stream_sync(sub: ThreadSubscription, on_event=None):
+    """``sse_stream`` ning WSGI varianti (``on_event`` — oddiy funksiya)."""
+    heartbeat = float(getattr(settings, "SSE_HEARTBEAT_SECONDS", 15))
+    with sub:
+        yield "retry: 3000\n\n"
+        while True:
+            event = sub.get(timeout=heartbeat)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            if on_event is not None:
+                on_event(sub, event)
+            yield sse_format(event)
+
+
+def is_async_request(request) -> bool:
+    from django.core.handlers.asgi import ASGIRequest
+    return isinstance(request, ASGIRequest)
+
+
+def sse_enabled(request) -> bool:
+    """``SSE_ENABLED``: ``auto`` (default) — faqat ASGI, ``1``/``true`` — har doim, boshqasi — o'chiq."""
+    mode = str(getattr(settings, "SSE_ENABLED", "auto")).strip().lower()
+    if mode == "auto":
+        return is_async_request(request)
+    return mode in ("1", "true", "yes", "on")
+
+
+def sse_response(request, channels: Iterable[str], on_event=None, on_event_sync=None):
+    """ASGI bo'lsa async generator, WSGI bo'lsa thread'li generator bilan SSE javobi.
+
+    SSE o'chiq bo'lsa (``sse_enabled``) 204 — ``EventSource`` qayta ulanmaydi,
+    mijoz polling'da qoladi.
+    """
+    from django.http import HttpResponse, StreamingHttpResponse
+
+    if not sse_enabled(request):
+        return HttpResponse(status=204)
+    broker = get_broker()
+    if is_async_request(request):
+        content = sse_stream(broker.subscribe(*channels), on_event=on_event)
+    else:
+        content = sse_stream_sync(broker.subscribe_sync(*channels), on_event=on_event_sync)
+    response = StreamingHttpResponse(content, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx buferlamasin
+    return response
@@ -0,0 +1,82 @@
+"""
+Geografik hisoblar (numpy bilan vektorlashtirilgan).
+
+Masofa va ETA massivlar ustida bir martada (broadcasting) hisoblanadi — dispatch,
+marshrut, tracking va admin xaritalari uchun; bitta juftlik ham shu funksiyalardan o'tadi.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+# shahar ichidagi o'rtacha tezlik (ETA uchun default)
+AVG_SPEED_KMH = 25.0
+
+
+def as_array(values) -> np.ndarray:
+    """``None`` -> ``nan`` (Decimal/str ham qabul qilinadi)."""
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=float)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Ikki nuqta (yoki nuqtalar massivlari) orasidagi masofa, km.
+
+    Argumentlar skalyar yoki numpy broadcasting qoidalariga mos massivlar bo'lishi mumkin,
+    masalan ``haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])`` —
+    to'liq masofalar matritsasi.
+    """
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlon = np.radians(lon2) - np.radians(lon1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def to_unit_xyz(lat, lon) -> np.ndarray:
+    """(lat, lon) -> birlik sferadagi (x, y, z). Evklid (chord) masofasi katta doira
+    masofasiga monoton, shuning uchun KD-tree'dagi eng yaqin qo'shnilar aniq bo'ladi."""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def km_to_chord(km: float) -> float:
+    return 2.0 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2.0)
+
+
+def valid_points(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Koordinatasi bor va chegarada bo'lgan nuqtalar maskasi (0,0 — "yo'q" deb olinadi)."""
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    ok &= (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    ok &= ~((lat == 0) & (lon == 0))
+    return ok
+
+
+def is_valid_point(lat, lon) -> bool:
+    """``valid_points`` ning bitta nuqta uchun varianti."""
+    if lat is None or lon is None:
+        return False
+    return bool(valid_points(np.float64(lat), np.float64(lon)))
+
+
+def eta_seconds(km, speed_kmh: float = AVG_SPEED_KMH):
+    """Masofa -> ETA (sekund, butun). 0/manfiy/yo'q masofa -> 0.
+
+    Skalyar berilsa ``int``, massiv berilsa ``int64`` massiv qaytaradi.
+    """
+    km_arr = np.asarray(km, dtype=float)
+    hours = np.where(np.isfinite(km_arr) & (km_arr > 0), km_arr, 0.0) / max(speed_kmh, 1.0)
+    out = (hours * 3600).astype(np.int64)
+    return int(out) if out.ndim == 0 else out
+
+
+def distance_eta(lat1, lon1, lat2, lon2, speed_kmh: float = AVG_SPEED_KMH):
+    """Juftliklar bo'yicha ``(km, eta_seconds, ok)`` massivlari.
+
+    Koordinatasi yo'q (``None``/``nan``/0,0) juftliklarda ``ok == False``, ``km`` — ``nan``.
+    """
+    lat1, lon1, lat2, lon2 = (as_array(np.atleast_1d(np.asarray(v, dtype=object)))
+                              for v in (lat1, lon1, lat2, lon2))
+    ok = valid_points(lat1, lon1) & valid_points(lat2, lon2)
+    km = np.where(ok, haversine_km(lat1, lon1, lat2, lon2), np.nan)
+    return km, eta_seconds(km, speed_kmh), ok
@@ -0,0 +1,372 @@
+"""
+Manzillarni koordinataga aylantirish (geocoding) uchun umumiy qatlam.
+
+Oldin ``geocode_csv`` har bir qatorni ketma-ket so'rab, har biridan keyin
+``time.sleep(delay)`` qilardi, bir xil manzilni qayta-qayta so'rardi va har bir
+mijozni ``c.save()`` bilan alohida yozardi. Endi:
+
+- ``GeocodeCache`` jadvali — normallashtirilgan manzil kaliti bo'yicha doimiy kesh
+  (topilmagan manzillar ham yoziladi);
+- ``Geocoder.geocode_many()`` manzillarni avval normallashtirib takrorlarini
+  olib tashlaydi, keshdan oladi, qolganini provayderga yuboradi;
+- provayder abstraksiyasi: har birida ruxsat etilgan parallellik va so'rov tezligi;
+  tezlik ``TokenBucket`` bilan cheklanadi, parallel so'rovlar — cheklangan thread pool;
+- ``apply_region_coordinates()`` — mijoz koordinatalarini ``CASE WHEN`` bilan bulk UPDATE;
+- ``Checkpoint`` — uzoq ishni to'xtagan joyidan davom ettirish uchun.
+
+Testlar/dev uchun tarmoqsiz ``FakeProvider`` bor (``--provider fake``).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Case, FloatField, Q, Value, When
+
+from . import client_map
+from .models import Client, GeocodeCache
+
+logger = logging.getLogger(__name__)
+
+LatLon = Tuple[float, float]
+
+# IN (...) ro'yxati va CASE uzunligi uchun
+DB_CHUNK = 500
+
+_APOSTROPHES = re.compile(r"[‘’ʻʼ`´]")
+_PUNCT = re.compile(r"[\s,;.]+")
+
+
+def normalize_address(text) -> str:
+    """Kesh kaliti uchun: registr, bo'shliqlar, tinish belgilari va o‘/o'/oʻ farqlari yo'qoladi."""
+    s = unicodedata.normalize("NFKC", str(text or "")).casefold()
+    s = _APOSTROPHES.sub("'", s)
+    return _PUNCT.sub(" ", s).strip()
+
+
+def address_key(text) -> str:
+    return hashlib.sha1(normalize_address(text).encode("utf-8")).hexdigest()
+
+
+# ---------------- tezlik cheklovi ----------------
+class TokenBucket:
+    """Sekundiga ``rate`` ta, ``capacity`` tagacha portlash (burst). ``rate <= 0`` — cheklovsiz."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+# ---------------- provayderlar ----------------
+class ProviderError(Exception):
+    """``retry=True`` — vaqtinchalik xato (timeout, 5xx), qayta urinish mumkin."""
+
+    def __init__(self, message: str = "", retry: bool = True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class GeocodingProvider:
+    name = ""
+    # bir vaqtda nechta so'rov yuborish mumkin va sekundiga nechta
+    concurrency = 1
+    rate = 1.0
+
+    def geocode(self, query: str) -> Optional[LatLon]:
+        """Topilsa ``(lat, lon)``, topilmasa ``None``; tarmoq xatosida ``ProviderError``."""
+        raise NotImplementedError
+
+
+class NominatimProvider(GeocodingProvider):
+    """OpenStreetMap Nominatim: foydalanish qoidasi — ketma-ket, sekundiga 1 ta so'rov."""
+    name = "nominatim"
+    concurrency = 1
+    rate = 1.0
+
+    def __init__(self, user_agent: str = "crm_geocoder_2025", timeout: float = 10):
+        try:
+            from geopy.geocoders import Nominatim
+            from geopy import exc
+        except Exception:
+            raise ImproperlyConfigured("geopy is not installed. Please install with: pip install geopy")
+        self._exc = exc
+        self._client = Nominatim(user_agent=user_agent)
+        self.timeout = timeout
+
+    def geocode(self, query):
+        try:
+            res = self._client.geocode(query, timeout=self.timeout)
+        except (self._exc.GeocoderTimedOut, self._exc.GeocoderUnavailable) as e:
+            raise ProviderError(str(e))
+        except self._exc.GeocoderServiceError as e:
+            raise ProviderError(str(e), retry=False)
+        if not res:
+            return None
+        return float(res.latitude), float(res.longitude)
+
+
+class GoogleProvider(GeocodingProvider):
+    name = "google"
+    concurrency = 8
+    rate = 40.0
+
+    def __init__(self, key: str):
+        try:
+            import googlemaps
+            from googlemaps import exceptions
+        except Exception:
+            raise ImproperlyConfigured("googlemaps is not installed. Please install with: pip install googlemaps")
+        if not key:
+            raise ImproperlyConfigured("Google Geocoding API key is required")
+        self._exc = exceptions
+        self._client = googlemaps.Client(key=key)
+
+    def geocode(self, query):
+        try:
+            res = self._client.geocode(query)
+        except (self._exc.Timeout, self._exc.TransportError, self._exc.HTTPError) as e:
+            raise ProviderError(str(e))
+        except self._exc.ApiError as e:
+            raise ProviderError(str(e), retry=False)
+        if not res:
+            return None
+        loc = res[0]["geometry"]["location"]
+        return float(loc["lat"]), float(loc["lng"])
+
+
+class FakeProvider(GeocodingProvider):
+    """Tarmoqsiz provayder (test/dev). ``fixtures`` — manzil -> ``(lat, lon)`` yoki ``None``;
+    qolganlari uchun Toshkent atrofida manzildan aniqlanadigan (deterministik) nuqta."""
+    name = "fake"
+
+    def __init__(self, fixtures: Optional[Dict[str, Optional[LatLon]]] = None, latency: float = 0.0,
+                 concurrency: int = 8, rate: float = 0.0, fail: Iterable[str] = ()):
+        self.fixtures = {normalize_address(k): v for k, v in (fixtures or {}).items()}
+        self.latency = latency
+        self.concurrency = concurrency
+        self.rate = rate
+        self.fail = {normalize_address(a) for a in fail}
+        self.calls: List[str] = []
+        self._lock = threading.Lock()
+
+    def geocode(self, query):
+        with self._lock:
+            self.calls.append(query)
+        if self.latency:
+            time.sleep(self.latency)
+        norm = normalize_address(query)
+        if norm in self.fail:
+            raise ProviderError("fake failure", retry=False)
+        if norm in self.fixtures:
+            return self.fixtures[norm]
+        h = hashlib.sha1(norm.encode("utf-8")).digest()
+        return 41.20 + h[0] / 255 * 0.2, 69.15 + h[1] / 255 * 0.25
+
+
+PROVIDERS = {
+    "nominatim": NominatimProvider,
+    "google": GoogleProvider,
+    "fake": FakeProvider,
+}
+
+
+def get_provider(name: str, **options) -> GeocodingProvider:
+    cls = PROVIDERS.get(name)
+    if cls is None:
+        raise ImproperlyConfigured(f"Noma'lum geocoding provayder: {name!r}")
+    return cls(**options)
+
+
+# ---------------- geocoder ----------------
+@dataclass
+class GeocodeStats:
+    unique: int = 0
+    cached: int = 0
+    looked_up: int = 0
+    found: int = 0
+    not_found: int = 0
+    failed: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class Geocoder:
+    """Kesh + takrorlarni olib tashlash + tezlik cheklovi + thread pool."""
+
+    def __init__(self, provider: GeocodingProvider, workers: Optional[int] = None, rate: Optional[float] = None,
+                 retries: int = 3, backoff: float = 1.0, use_cache: bool = True, flush_every: int = 100):
+        self.provider = provider
+        limit = max(1, int(getattr(provider, "concurrency", 1) or 1))
+        self.workers = max(1, min(int(workers or limit), limit))
+        self.bucket = TokenBucket(provider.rate if rate is None else rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.use_cache = use_cache
+        self.flush_every = flush_every
+        self.stats = GeocodeStats()
+
+    def _lookup(self, query: str) -> Optional[LatLon]:
+        for attempt in range(self.retries):
+            self.bucket.acquire()
+            try:
+                return self.provider.geocode(query)
+            except ProviderError as e:
+                if not e.retry or attempt == self.retries - 1:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
+        return None
+
+    def _cached(self, keys: List[str]) -> Dict[str, Optional[LatLon]]:
+        out: Dict[str, Optional[LatLon]] = {}
+        for i in range(0, len(keys), DB_CHUNK):
+            for key, lat, lon in GeocodeCache.objects.filter(key__in=keys[i:i + DB_CHUNK]).values_list("key", "lat", "lon"):
+                out[key] = (lat, lon) if lat is not None and lon is not None else None
+        return out
+
+    def _store(self, pending: List[GeocodeCache]) -> None:
+        if pending and self.use_cache:
+            GeocodeCache.objects.bulk_create(pending, ignore_conflicts=True)
+        pending.clear()
+
+    def geocode_many(self, addresses: Iterable[str]) -> Dict[str, Optional[LatLon]]:
+        """``{manzil: (lat, lon) | None}`` — berilgan har bir (bo'sh bo'lmagan) manzil uchun.
+
+        DB'ga faqat chaqiruvchi thread yozadi; worker thread'lar faqat provayderni chaqiradi.
+        """
+        by_key: Dict[str, List[str]] = {}
+        for a in addresses:
+            if a and normalize_address(a):
+                by_key.setdefault(address_key(a), []).append(a)
+        self.stats.unique += len(by_key)
+
+        resolved = self._cached(list(by_key)) if self.use_cache else {}
+        self.stats.cached += len(resolved)
+        misses = [k for k in by_key if k not in resolved]
+
+        pending: List[GeocodeCache] = []
+        if misses:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="geocode") as pool:
+                futures = {pool.submit(self._lookup, by_key[k][0]): k for k in misses}
+                for fut in as_completed(futures):
+                    key = futures[fut]
+                    query = by_key[key][0]
+                    self.stats.looked_up += 1
+                    try:
+                        ll = fut.result()
+                    except Exception as e:
+                        # keshga yozilmaydi — keyingi safar qayta urinib ko'riladi
+                        self.stats.failed += 1
+                        logger.warning("geocode failed for %r: %s", query, e)
+                        resolved[key] = None
+                        continue
+                    resolved[key] = ll
+                    if ll is None:
+                        self.stats.not_found += 1
+                    else:
+                        self.stats.found += 1
+                    pending.append(GeocodeCache(
+                        key=key, address=normalize_address(query), provider=self.provider.name,
+                        lat=ll[0] if ll else None, lon=ll[1] if ll else None,
+                    ))
+                    if len(pending) >= self.flush_every:
+                        self._store(pending)
+        self._store(pending)
+
+        return {a: resolved.get(k) for k, originals in by_key.items() for a in originals}
+
+    def geocode(self, address: str) -> Optional[LatLon]:
+        return self.geocode_many([address]).get(address)
+
+
+# ---------------- mijozlarga yozish ----------------
+def apply_region_coordinates(coords: Dict[int, LatLon], force: bool = False, dry_run: bool = False) -> int:
+    """Region bo'yicha mijozlar koordinatasini bitta ``UPDATE ... CASE`` bilan yozadi.
+
+    ``force=False`` bo'lsa faqat koordinatasi yo'q (``NULL``/0) mijozlar yangilanadi.
+    Qaytaradi: yangilangan (``dry_run`` da — yangilanadigan) mijozlar soni.
+    """
+    total = 0
+    items = [(rid, ll) for rid, ll in coords.items() if ll]
+    for i in range(0, len(items), DB_CHUNK):
+        part = items[i:i + DB_CHUNK]
+        qs = Client.objects.filter(region_id__in=[rid for rid, _ in part])
+        if not force:
+            qs = qs.filter(
+                Q(location_lat__isnull=True) | Q(location_lat=0),
+                Q(location_lon__isnull=True) | Q(location_lon=0),
+            )
+        if dry_run:
+            total += qs.count()
+            continue
+        total += qs.update(
+            location_lat=Case(*[When(region_id=rid, then=Value(ll[0])) for rid, ll in part], output_field=FloatField()),
+            location_lon=Case(*[When(region_id=rid, then=Value(ll[1])) for rid, ll in part], output_field=FloatField()),
+        )
+    if total and not dry_run:
+        client_map.invalidate()
+    return total
+
+
+# ---------------- checkpoint ----------------
+class Checkpoint:
+    """JSON fayl: qaysi kirish fayli (imzo) va nechanchi qatorgacha bajarilgan."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def signature(source_path: str) -> List:
+        st = os.stat(source_path)
+        return [os.path.abspath(source_path), st.st_size, int(st.st_mtime)]
+
+    def load(self, signature: List) -> int:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if data.get("signature") != signature:
+            return 0
+        return int(data.get("offset") or 0)
+
+    def save(self, signature: List, offset: int, **extra) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"signature": signature, "offset": offset, **extra}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
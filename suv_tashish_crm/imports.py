@@ -0,0 +1,291 @@
+"""
+Fon rejimidagi mijoz/kuryer importlari (``ImportJob``).
+
+Oldin ``/api/admin/import/...`` faylni HTTP so'rov ichida import qilardi — katta
+fayl gunicorn timeout'iga urilardi va SQLite'da yozish qulfini uzoq ushlab turardi.
+
+Endi:
+- ``submit()`` faylni ``IMPORT_FILES_DIR`` ga saqlaydi va ``ImportJob`` yaratadi
+  (parol faqat hash ko'rinishida), javob darhol qaytadi;
+- worker (jarayon ichidagi thread'lar — ``IMPORT_WORKERS``, yoki ``manage.py run_imports``)
+  navbatdan job oladi (claim) va ``api.import_utils`` orqali partiyalab import qiladi —
+  har bir partiya alohida qisqa tranzaksiya;
+- har bir partiyadan keyin hisoblagichlar ``ImportJob`` qatoriga yoziladi va
+  ``import:<id>`` kanaliga ``import.progress`` hodisasi yuboriladi (SSE);
+- qator xatolari CSV hisobotga (``error_report``) yoziladi, xotirada yig'ilmaydi.
+"""
+import csv
+import io
+import logging
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import table_reader
+from .events import import_channel, publish
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+# 'running' holatida shuncha vaqt yangilanmagan job (worker o'lgan) qayta olinadi
+STALE_CLAIM = timedelta(minutes=10)
+
+REPORT_FIELDS = ["row", "error", "phone", "detail"]
+
+
+def _conf(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------------- navbatga qo'yish ----------------
+def submit(kind: str, uploaded_file, default_password: str, mode: str = "upsert", user=None) -> ImportJob:
+    """Faylni saqlab ``ImportJob`` yaratadi. Qo'llanmaydigan fayl turi — ``ValueError``."""
+    if kind not in dict(ImportJob.KIND_CHOICES):
+        raise ValueError("UNSUPPORTED_IMPORT_KIND")
+    file_type = table_reader.table_kind(getattr(uploaded_file, "name", ""))
+    if file_type is None:
+        raise ValueError("UNSUPPORTED_FILE_TYPE")
+
+    job = ImportJob(
+        kind=kind,
+        mode=mode if mode in ("upsert", "create_only") else "upsert",
+        file_type=file_type,
+        original_name=(getattr(uploaded_file, "name", "") or "")[:255],
+        password_hash=make_password(default_password),
+        created_by=user if getattr(user, "is_authenticated", False) else None,
+    )
+    job.file.save(f"{uuid.uuid4().hex}.{file_type}", uploaded_file, save=False)
+    job.total_rows = estimate_rows(job)
+    job.save()
+    transaction.on_commit(wake)
+    return job
+
+
+def estimate_rows(job: ImportJob) -> Optional[int]:
+    """Progress foizi uchun taxminiy qatorlar soni (header'siz)."""
+    try:
+        with job.file.open("rb") as f:
+            if job.file_type == "csv":
+                lines, last = 0, b"\n"
+                for chunk in f.chunks():
+                    lines += chunk.count(b"\n")
+                    last = chunk[-1:] or last
+                lines += last != b"\n"
+                return max(lines - 1, 0)
+            from openpyxl import load_workbook
+            wb = load_workbook(f, read_only=True)
+            try:
+                max_row = wb.active.max_row
+            finally:
+                wb.close()
+            return max(max_row - 1, 0) if max_row else None
+    except Exception:
+        return None
+
+
+def job_status(job: ImportJob) -> Dict:
+    total = job.total_rows
+    percent = None
+    if job.status == "done":
+        percent = 100
+    elif total:
+        percent = min(99, int(job.processed_rows * 100 / total))
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "mode": job.mode,
+        "status": job.status,
+        "filetype": job.file_type,
+        "file_name": job.original_name,
+        "total_rows": total,
+        "processed_rows": job.processed_rows,
+        "percent": percent,
+        "created": job.created,
+        "updated": job.updated,
+        "skipped": job.skipped,
+        "error_count": job.error_count,
+        "has_error_report": bool(job.error_report),
+        "last_error": job.last_error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# ---------------- worker ----------------
+def claim_next() -> Optional[ImportJob]:
+    """Navbatdagi (yoki tashlab ketilgan) job'ni shartli UPDATE bilan egallaydi."""
+    now = timezone.now()
+    due = Q(status="queued") | Q(status="running", locked_at__lt=now - STALE_CLAIM)
+    for pk in ImportJob.objects.filter(due).order_by("id").values_list("id", flat=True)[:5]:
+        token = uuid.uuid4().hex
+        n = ImportJob.objects.filter(due, pk=pk).update(
+            status="running", claim=token, locked_at=now, started_at=now, last_error="",
+        )
+        if n:
+            return ImportJob.objects.get(pk=pk)
+    return None
+
+
+class _ErrorReport:
+    """Qator xatolarini vaqtinchalik faylga yozadi; oxirida ``error_report`` ga saqlanadi."""
+
+    def __init__(self):
+        self._raw = tempfile.TemporaryFile()
+        self._text = io.TextIOWrapper(self._raw, encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._text, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+        self._writer.writeheader()
+        self.count = 0
+
+    def drain(self, errors: List[Dict]) -> None:
+        for e in errors:
+            detail = e.get("detail") or ", ".join(
+                f"{k}={v}" for k, v in e.items() if k not in REPORT_FIELDS
+            )
+            self._writer.writerow({**e, "detail": detail})
+        self.count += len(errors)
+        errors.clear()
+
+    def save_to(self, job: ImportJob) -> None:
+        self._text.flush()
+        if self.count:
+            self._raw.seek(0)
+            job.error_report.save(f"import_{job.pk}_errors.csv", File(self._raw), save=False)
+
+    def close(self) -> None:
+        try:
+            self._text.close()
+        except Exception:
+            pass
+
+
+class ClaimLost(Exception):
+    """Job boshqa worker'ga o'tib ketgan (heartbeat kechikdi, ``STALE_CLAIM``)."""
+
+
+def _publish(job_id: int, **fields) -> None:
+    publish([import_channel(job_id)], "import.progress", {"job_id": job_id, **fields})
+
+
+def run_job(job: ImportJob) -> ImportJob:
+    from api.import_utils import import_clients, import_couriers
+
+    importer = import_clients if job.kind == "clients" else import_couriers
+    report = _ErrorReport()
+    mine = ImportJob.objects.filter(pk=job.pk, claim=job.claim)
+    _publish(job.pk, status="running", processed_rows=0, total_rows=job.total_rows)
+
+    def on_chunk(result):
+        report.drain(result.errors)
+        counters = {
+            "processed_rows": result.total,
+            "created": result.created,
+            "updated": result.updated,
+            "skipped": result.skipped,
+            "error_count": report.count,
+        }
+        # locked_at — heartbeat: ishlayotgan job boshqa worker'ga o'tib ketmasin
+        if not mine.update(locked_at=timezone.now(), **counters):
+            raise ClaimLost(job.pk)
+        _publish(job.pk, status="running", total_rows=job.total_rows, **counters)
+
+    try:
+        with job.file.open("rb") as f:
+            if job.file_type == "csv":
+                raw = table_reader.iter_csv_rows(f)
+            else:
+                raw = table_reader.iter_xlsx_rows(f)
+            result = importer(
+                table_reader.iter_dict_rows(raw), mode=job.mode,
+                password_hash=job.password_hash, on_chunk=on_chunk,
+            )
+        report.drain(result.errors)
+        report.save_to(job)
+        job.status = "done"
+        job.processed_rows = result.total
+        job.created, job.updated, job.skipped = result.created, result.updated, result.skipped
+    except ClaimLost:
+        logger.warning("import job %s was reclaimed by another worker, stopping", job.pk)
+        return job
+    except Exception as e:
+        logger.exception("import job %s failed", job.pk)
+        report.save_to(job)
+        job.status = "failed"
+        job.last_error = f"{type(e).__name__}: {e}"[:1000]
+        job.refresh_from_db(fields=["processed_rows", "created", "updated", "skipped"])
+    finally:
+        report.close()
+
+    job.error_count = report.count
+    job.finished_at = timezone.now()
+    if job.status == "done":
+        job.password_hash = ""  # failed job qayta navbatga qo'yilishi mumkin
+    # yakuniy yozuv ham faqat claim hali bizniki bo'lsa (heartbeat kabi)
+    n = mine.update(
+        status=job.status, processed_rows=job.processed_rows, created=job.created, updated=job.updated,
+        skipped=job.skipped, error_count=job.error_count, error_report=job.error_report.name or "",
+        last_error=job.last_error, finished_at=job.finished_at, password_hash=job.password_hash,
+    )
+    if not n:
+        logger.warning("import job %s was reclaimed by another worker, result discarded", job.pk)
+        if job.error_report:
+            job.error_report.delete(save=False)
+        return job
+    final = job_status(job)
+    for key in ("created_at", "started_at", "finished_at"):
+        final.pop(key)  # broker JSON/msgpack'ga datetime bermaymiz
+    _publish(job.pk, **final)
+    return job
+
+
+def drain(max_jobs: int = 10) -> int:
+    """Navbatdagi job'larni ketma-ket bajaradi. Qaytaradi: bajarilganlar soni."""
+    done = 0
+    while done < max_jobs:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
+
+
+# ---------------- jarayon ichidagi worker ----------------
+_wake_event = threading.Event()
+_workers: List[threading.Thread] = []
+_workers_lock = threading.Lock()
+
+
+def _worker_loop():
+    poll = float(_conf("IMPORT_POLL_SECONDS", 5))
+    while True:
+        _wake_event.wait(poll)
+        _wake_event.clear()
+        try:
+            drain()
+        except Exception:
+            logger.exception("import worker error")
+        finally:
+            close_old_connections()
+
+
+def wake() -> None:
+    """Commit'dan keyin chaqiriladi: worker'lar ishga tushmagan bo'lsa — ishga tushiradi."""
+    n = int(_conf("IMPORT_WORKERS", 1))
+    if n > 0 and not _workers:
+        with _workers_lock:
+            if not _workers:
+                for i in range(n):
+                    t = threading.Thread(target=_worker_loop, name=f"import-{i}", daemon=True)
+                    t.start()
+                    _workers.append(t)
+    _wake_event.set()
@@ -0,0 +1,163 @@
+"""
+O'zi yetarli JWT: rol, biznes va profil id'lari token ichida.
+
+Oddiy ``SIMPLE_JWT`` token'ida faqat ``user_id`` bor edi — har bir API chaqiruvi
+rol va bog'langan Courier/Client'ni bazadan (yoki ``actors`` keshidan) qayta aniqlardi.
+Endi ``/api/auth/jwt/login/`` beradigan token'larda:
+
+    cv           — claim sxemasi versiyasi (``CLAIMS_VERSION``);
+    tv           — foydalanuvchi token versiyasi (``UserTokenVersion.version``);
+    role         — ADMIN / COURIER / CLIENT;
+    business_id, courier_id, client_id.
+
+``ClaimsJWTAuthentication`` claim'lardan ``actors.Actor`` yasab ``request.user`` ga
+yozadi — ``get_role``, ``_get_courier_linked`` va boshqalar qo'shimcha so'rov qilmaydi
+(faqat ``tv`` tekshiruvi: kesh, ``JWT_TOKEN_VERSION_TTL`` sekund).
+
+Rol/profil/biznes o'zgarsa (``actors.actor_changed``) token versiyasi oshadi: eski
+access token 401 oladi, ``/api/auth/jwt/refresh/`` esa yangi claim'lar bilan access beradi.
+``cv`` boshqacha (yoki umuman yo'q) token'lar — eski yo'l (``actors.resolve_user``).
+"""
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import actors
+from .models import UserTokenVersion
+
+CLAIMS_VERSION = 1
+CLAIM_NAMES = ("cv", "tv", "role", "business_id", "courier_id", "client_id")
+
+VERSION_KEY = "jwt_tv:{}"
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "JWT_TOKEN_VERSION_TTL", 30))
+
+
+# ---------------- token versiyasi ----------------
+def token_version(user_id) -> int:
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = (
+            UserTokenVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first() or 0
+        )
+        cache.set(key, version, _ttl())
+    return version
+
+
+def bump(user_ids: Iterable[int]) -> None:
+    """Foydalanuvchilarning hozirgi claim'li token'larini eskirtiradi."""
+    User = get_user_model()
+    ids = {u for u in user_ids if u}
+    for user_id in ids:
+        if UserTokenVersion.objects.filter(user_id=user_id).update(version=F("version") + 1):
+            continue
+        if not User.objects.filter(pk=user_id).exists():
+            continue
+        try:
+            with transaction.atomic():
+                UserTokenVersion.objects.create(user_id=user_id, version=1)
+        except IntegrityError:
+            # parallel so'rov qatorni yaratib ulgurdi
+            UserTokenVersion.objects.filter(user_id=user_id).update(version=F("version") + 1)
+    # boshqa jarayonlar ``JWT_TOKEN_VERSION_TTL`` ichida yangi versiyani ko'radi
+    cache.delete_many([VERSION_KEY.format(u) for u in ids])
+
+
+@receiver(actors.actor_changed)
+def _actor_changed(sender, user_ids, **kwargs):
+    bump(user_ids)
+
+
+# ---------------- claim'lar ----------------
+def claims_for(user) -> dict:
+    actors.forget(user)
+    actor = actors.resolve_user(user)
+    return {
+        "cv": CLAIMS_VERSION,
+        "tv": token_version(user.pk),
+        "role": actor.role,
+        "business_id": actor.business_id,
+        "courier_id": actor.courier_id,
+        "client_id": actor.client_id,
+    }
+
+
+def set_claims(token, claims: dict) -> None:
+    for name in CLAIM_NAMES:
+        token[name] = claims.get(name)
+
+
+def actor_from_token(user, token) -> Optional[actors.Actor]:
+    """Joriy sxemadagi token uchun ``Actor``; eski token — ``None`` (odatdagi yo'l).
+
+    ``tv`` eskirgan bo'lsa ``InvalidToken`` (401) — ilova refresh qiladi.
+    """
+    if token.get("cv") != CLAIMS_VERSION:
+        return None
+    if token.get("tv") != token_version(user.pk):
+        raise InvalidToken({"detail": "TOKEN_CLAIMS_STALE", "code": "token_claims_stale"})
+    return actors.Actor(
+        user_id=user.pk,
+        role=token.get("role") or actors.ANONYMOUS_ROLE,
+        courier_id=token.get("courier_id"),
+        client_id=token.get("client_id"),
+        business_id=token.get("business_id"),
+    )
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh (va undan olingan access) token'lar claim'lar bilan."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_claims(token, claims_for(user))
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return access
+        if self.get("cv") == CLAIMS_VERSION and self.get("tv") == token_version(user_id):
+            return access
+        # rol/profil o'zgargan (yoki eski token): claim'larni yangilaymiz
+        user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None:
+            claims = claims_for(user)
+            set_claims(access, claims)
+            set_claims(self, claims)  # ROTATE_REFRESH_TOKENS bo'lsa yangi refresh'ga ham
+        return access
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` + claim'lardan ``actors.Actor`` (rol/profil uchun so'rovsiz)."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        actor = actor_from_token(user, validated_token)
+        if actor is not None:
+            actors.remember(user, actor)
+        return user
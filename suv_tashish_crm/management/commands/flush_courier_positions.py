@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from suv_tashish_crm.positions import flush_positions
+
+
+class Command(BaseCommand):
+    help = "Write buffered courier live positions to Courier.lat/lon"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="har COURIER_POSITION_FLUSH_SECONDS da takrorlash")
+
+    def handle(self, *args, **options):
+        if not options.get("loop"):
+            n = flush_positions()
+            self.stdout.write(self.style.SUCCESS(f"Done. Flushed: {n}"))
+            return
+
+        interval = float(getattr(settings, "COURIER_POSITION_FLUSH_SECONDS", 30))
+        self.stdout.write(f"Flushing every {interval:g}s (Ctrl+C to stop)")
+        try:
+            while True:
+                n = flush_positions()
+                if n:
+                    self.stdout.write(f"Flushed: {n}")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Stopped"))
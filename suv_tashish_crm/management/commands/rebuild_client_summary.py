@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from suv_tashish_crm.client_summary import _summary_expressions, rebuild, refresh_clients
+from suv_tashish_crm.models import Client, Order
+
+
+class Command(BaseCommand):
+    help = "Repair Client.latest_order / last_courier / orders_count from raw orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--client", type=int, action="append", help="faqat shu mijoz(lar) (takrorlash mumkin)")
+        parser.add_argument("--check", action="store_true", help="faqat mos kelmaydigan mijozlar sonini ko'rsatish")
+
+    def handle(self, *args, **options):
+        if options.get("check"):
+            exprs = _summary_expressions(Order)
+            fields = tuple(exprs)
+            expected = {f"exp_{k}": v for k, v in exprs.items()}
+            rows = Client.objects.annotate(**expected).values_list(*fields, *expected).iterator()
+            # NULL taqqoslash SQL'da noqulay — Python'da solishtiramiz
+            drift = sum(1 for row in rows if row[:len(fields)] != row[len(fields):])
+            self.stdout.write(f"Clients out of sync: {drift}")
+            return
+
+        if options.get("client"):
+            n = refresh_clients(options["client"])
+        else:
+            n = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Done. {n} clients updated"))
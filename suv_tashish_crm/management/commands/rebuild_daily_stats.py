@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from suv_tashish_crm.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailyOrderStats rollup from raw orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="YYYY-MM-DD: faqat shu kundan boshlab qayta hisoblash")
+        parser.add_argument("--days", type=int, help="oxirgi N kunni qayta hisoblash")
+
+    def handle(self, *args, **options):
+        since = None
+        if options.get("since"):
+            try:
+                since = datetime.date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError("--since YYYY-MM-DD formatida bo'lishi kerak")
+        elif options.get("days"):
+            since = timezone.localdate() - datetime.timedelta(days=options["days"] - 1)
+
+        written = rebuild(since=since)
+        scope = f"since {since}" if since else "all days"
+        self.stdout.write(self.style.SUCCESS(f"Done. {written} rollup rows written ({scope})"))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from suv_tashish_crm.imports import drain
+
+
+class Command(BaseCommand):
+    help = "Process queued background import jobs (ImportJob)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="navbatni bir marta bo'shatib chiqish")
+
+    def handle(self, *args, **options):
+        if options.get("once"):
+            n = drain(max_jobs=1000)
+            self.stdout.write(self.style.SUCCESS(f"Done. {n} job(s)"))
+            return
+
+        interval = float(getattr(settings, "IMPORT_POLL_SECONDS", 5))
+        self.stdout.write(f"Polling every {interval:g}s (Ctrl+C to stop)")
+        try:
+            while True:
+                n = drain()
+                if n:
+                    self.stdout.write(f"{n} job(s) processed")
+                close_old_connections()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Stopped"))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from suv_tashish_crm.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbound messages (Telegram) from the OutboundMessage outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="navbatni bir marta bo'shatib chiqish")
+
+    def handle(self, *args, **options):
+        if options.get("once"):
+            stats = drain()
+            self.stdout.write(self.style.SUCCESS(f"Done. {stats}"))
+            return
+
+        interval = float(getattr(settings, "OUTBOX_POLL_SECONDS", 5))
+        self.stdout.write(f"Polling every {interval:g}s (Ctrl+C to stop)")
+        try:
+            while True:
+                stats = drain()
+                if stats["sent"] or stats["retry"] or stats["dead"]:
+                    self.stdout.write(str(stats))
+                close_old_connections()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Stopped"))
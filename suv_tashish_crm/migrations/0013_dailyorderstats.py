@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-17 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_daily_stats(apps, schema_editor):
+    from suv_tashish_crm.rollups import rebuild
+
+    rebuild(
+        order_model=apps.get_model('suv_tashish_crm', 'Order'),
+        stats_model=apps.get_model('suv_tashish_crm', 'DailyOrderStats'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suv_tashish_crm', '0012_business_client_business_courier_business_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('assigned_count', models.PositiveIntegerField(default=0)),
+                ('delivering_count', models.PositiveIntegerField(default=0)),
+                ('done_count', models.PositiveIntegerField(default=0)),
+                ('canceled_count', models.PositiveIntegerField(default=0)),
+                ('bottles_total', models.PositiveIntegerField(default=0)),
+                ('debt_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('delivered_count', models.PositiveIntegerField(default=0)),
+                ('delivered_bottles', models.PositiveIntegerField(default=0)),
+                ('payment_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('business', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='suv_tashish_crm.business')),
+                ('courier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='suv_tashish_crm.courier')),
+                ('region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='suv_tashish_crm.region')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'business', 'courier', 'region'], name='dailystats_bucket_idx'), models.Index(fields=['business', 'date'], name='dailystats_business_date_idx'), models.Index(fields=['courier', 'date'], name='dailystats_courier_date_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-17 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suv_tashish_crm', '0013_dailyorderstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['debt'], name='client_debt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['last_order'], name='client_last_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['business', 'created_at'], name='order_business_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['courier', 'status', 'delivered_at'], name='order_courier_status_dlv_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'courier'], name='order_status_courier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('courier__isnull', True), ('status', 'pending')), fields=['-created_at'], name='order_pending_unassigned_idx'),
+        ),
+    ]
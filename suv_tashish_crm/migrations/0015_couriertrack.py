@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-17 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suv_tashish_crm', '0014_order_client_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('points', models.BinaryField(default=b'')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('first_ts', models.DateTimeField(blank=True, null=True)),
+                ('last_ts', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='suv_tashish_crm.courier')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('courier', 'day'), name='courier_track_day_uniq')],
+            },
+        ),
+    ]
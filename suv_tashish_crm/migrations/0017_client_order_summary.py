@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-17 17:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_client_summary(apps, schema_editor):
+    from suv_tashish_crm.client_summary import rebuild
+
+    rebuild(
+        client_model=apps.get_model('suv_tashish_crm', 'Client'),
+        order_model=apps.get_model('suv_tashish_crm', 'Order'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suv_tashish_crm', '0016_outboundmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='last_courier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='suv_tashish_crm.courier'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='latest_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='suv_tashish_crm.order'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='orders_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_client_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-17 18:24
+
+import django.db.models.deletion
+import suv_tashish_crm.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suv_tashish_crm', '0017_client_order_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('clients', 'Mijozlar'), ('couriers', 'Kuryerlar')], max_length=10)),
+                ('mode', models.CharField(default='upsert', max_length=12)),
+                ('status', models.CharField(choices=[('queued', 'Navbatda'), ('running', 'Bajarilmoqda'), ('done', 'Tugadi'), ('failed', 'Xato')], default='queued', max_length=10)),
+                ('file', models.FileField(storage=suv_tashish_crm.models.import_files_storage, upload_to='uploads/%Y/%m/')),
+                ('file_type', models.CharField(max_length=8)),
+                ('original_name', models.CharField(blank=True, default='', max_length=255)),
+                ('password_hash', models.CharField(blank=True, default='', max_length=128)),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('created', models.PositiveIntegerField(default=0)),
+                ('updated', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('error_report', models.FileField(blank=True, storage=suv_tashish_crm.models.import_files_storage, upload_to='reports/%Y/%m/')),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('claim', models.CharField(blank=True, default='', max_length=32)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='importjob_status_idx')],
+            },
+        ),
+    ]
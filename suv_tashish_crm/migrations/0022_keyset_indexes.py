@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-17 20:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suv_tashish_crm', '0021_usertokenversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_business_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_courier_status_dlv_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at', 'id'], name='notification_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['business', 'created_at', 'id'], name='order_business_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['courier', 'status', 'delivered_at', 'id'], name='order_courier_status_dlv_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['client', 'created_at', 'id'], name='order_client_created_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-17 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suv_tashish_crm', '0022_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='couriertrack',
+            name='courier_track_day_uniq',
+        ),
+        migrations.AddIndex(
+            model_name='couriertrack',
+            index=models.Index(fields=['courier', 'day', 'first_ts'], name='courier_track_day_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-17 22:40
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+def rebuild_daily_stats(apps, schema_editor):
+    # parallel qayta hisoblashdan qolgan dublikat bucketlar constraint'ga to'sqinlik qilmasin
+    from suv_tashish_crm.rollups import rebuild
+
+    rebuild(
+        order_model=apps.get_model('suv_tashish_crm', 'Order'),
+        stats_model=apps.get_model('suv_tashish_crm', 'DailyOrderStats'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suv_tashish_crm', '0023_courier_track_chunks'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_daily_stats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyorderstats',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('business', models.Value(0)), models.F('date'), django.db.models.functions.comparison.Coalesce('courier', models.Value(0)), django.db.models.functions.comparison.Coalesce('region', models.Value(0)), name='dailystats_bucket_uniq'),
+        ),
+    ]
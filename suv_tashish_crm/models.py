@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 
@@ -105,9 +107,44 @@ class Client(models.Model):
     # agar "default bottles" kerak bo'lsa — qoldir
     bottles_count = models.PositiveIntegerField(default=1)
 
+    # ✅ denormalizatsiya (suv_tashish_crm.client_summary): ro'yxatlarda har bir mijoz
+    # uchun alohida Order so'rovi bo'lmasin. `last_order` (vaqt) band — shuning uchun `latest_order`.
+    latest_order = models.ForeignKey(
+        "Order", on_delete=models.SET_NULL, null=True, blank=True, related_name="+",
+    )
+    last_courier = models.ForeignKey(
+        "Courier", on_delete=models.SET_NULL, null=True, blank=True, related_name="+",
+    )
+    orders_count = models.PositiveIntegerField(default=0)
+
+    # faqat client_summary yozadi (UPDATE bilan); oddiy save() ularni qayta yozmaydi
+    SUMMARY_FIELDS = frozenset({"latest_order", "last_courier", "orders_count"})
+
+    def save(self, *args, **kwargs):
+        # ✅ eski nusxa (masalan order yaratilishidan oldin o'qilgan) saqlanganda
+        # orders_count/latest_order/last_courier 0/None ga qaytib qolmasin
+        if not self._state.adding and not args and kwargs.get("update_fields") is None \
+                and not kwargs.get("force_insert"):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.SUMMARY_FIELDS and f.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.full_name
 
+    class Meta:
+        indexes = [
+            # qarzdorlar ro'yxati / sidebar: debt > 0
+            models.Index(fields=["debt"], name="client_debt_idx"),
+            # faol bo'lmagan mijozlar: last_order bo'yicha
+            models.Index(fields=["last_order"], name="client_last_order_idx"),
+            # admin xaritasi: bbox (tile) bo'yicha filtr (suv_tashish_crm.client_map)
+            models.Index(fields=["location_lat", "location_lon"], name="client_latlon_idx"),
+        ]
+
 
 # ================= NOTIFICATION =================
 class Notification(models.Model):
@@ -118,11 +155,122 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # keyset sahifalash: ORDER BY created_at DESC, id DESC
+            models.Index(fields=["created_at", "id"], name="notification_created_id_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
 
+# ================= OUTBOX =================
+class OutboundMessage(models.Model):
+    """Tashqi xabarlar navbati (Telegram). Yozuv chaqiruvchi tranzaksiyasida qo'shiladi,
+    yuborish esa ``suv_tashish_crm.outbox`` worker'larida (retry/backoff, dead-letter)."""
+    STATUS_CHOICES = [
+        ("pending", "Kutilmoqda"),
+        ("sending", "Yuborilmoqda"),
+        ("sent", "Yuborildi"),
+        ("dead", "Yuborilmadi"),
+    ]
+
+    channel = models.CharField(max_length=20, default="telegram")
+    chat_id = models.CharField(max_length=64)
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.channel}:{self.chat_id} [{self.status}]"
+
+
+def import_files_storage():
+    from django.core.files.storage import FileSystemStorage
+    return FileSystemStorage(location=str(getattr(settings, "IMPORT_FILES_DIR", "data/imports")))
+
+
+class ImportJob(models.Model):
+    """Fon rejimidagi CSV/XLSX import (``suv_tashish_crm.imports``).
+
+    Fayl saqlanadi, worker uni partiyalab (har biri alohida tranzaksiya) import
+    qiladi va hisoblagichlarni shu qatorda yangilab boradi."""
+    KIND_CHOICES = [
+        ("clients", "Mijozlar"),
+        ("couriers", "Kuryerlar"),
+    ]
+    STATUS_CHOICES = [
+        ("queued", "Navbatda"),
+        ("running", "Bajarilmoqda"),
+        ("done", "Tugadi"),
+        ("failed", "Xato"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    mode = models.CharField(max_length=12, default="upsert")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    file = models.FileField(upload_to="uploads/%Y/%m/", storage=import_files_storage)
+    file_type = models.CharField(max_length=8)
+    original_name = models.CharField(max_length=255, blank=True, default="")
+    # ochiq parol saqlanmaydi — import tugagach tozalanadi
+    password_hash = models.CharField(max_length=128, blank=True, default="")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+
+    total_rows = models.PositiveIntegerField(null=True, blank=True)  # taxminiy
+    processed_rows = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    error_report = models.FileField(upload_to="reports/%Y/%m/", storage=import_files_storage, blank=True)
+    last_error = models.TextField(blank=True, default="")
+
+    claim = models.CharField(max_length=32, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="importjob_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} import #{self.pk} [{self.status}]"
+
+
+class GeocodeCache(models.Model):
+    """Manzil -> koordinata keshi (``suv_tashish_crm.geocoding``).
+
+    ``key`` — normallashtirilgan manzil matnining sha1'i; topilmagan manzillar ham
+    (``lat``/``lon`` bo'sh) saqlanadi, qayta so'ralmasin."""
+    key = models.CharField(max_length=40, unique=True)
+    address = models.TextField()
+    provider = models.CharField(max_length=20)
+    lat = models.FloatField(null=True, blank=True)
+    lon = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.address[:40]} -> {self.lat},{self.lon}"
+
+
 # ================= ORDER =================
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -190,6 +338,108 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # biznes dashboardi / ro'yxatlar: business=?, created_at oralig'i;
+            # ``id`` — keyset sahifalash (``created_at, id``) uchun
+            models.Index(fields=["business", "created_at", "id"], name="order_business_created_idx"),
+            # kuryer tarixi va yetkazilganlar: courier=?, status=?, (delivered_at, id) bo'yicha tartib
+            models.Index(fields=["courier", "status", "delivered_at", "id"], name="order_courier_status_dlv_idx"),
+            # mijoz buyurtmalari ro'yxati (keyset: created_at, id). Kuryer/filtrsiz ro'yxatlar uchun
+            # alohida (..., created_at) indeks qo'yilmadi: SQLite planner ``courier IS NULL`` va
+            # ``status IN`` so'rovlarida ham shuni tanlab, yuqoridagi hot-path indekslarni chetlatadi
+            models.Index(fields=["client", "created_at", "id"], name="order_client_created_idx"),
+            # status bo'yicha filtrlar (assigned/delivering kuryer kesimida)
+            models.Index(fields=["status", "courier"], name="order_status_courier_idx"),
+            # biriktirilmagan yangi buyurtmalar navbati — kichik partial index
+            models.Index(
+                fields=["-created_at"],
+                name="order_pending_unassigned_idx",
+                condition=models.Q(status="pending", courier__isnull=True),
+            ),
+        ]
+
+
+# ================= DAILY ROLLUP =================
+class DailyOrderStats(models.Model):
+    """Kunlik yig'ma statistika: (business, date, courier, region) kesimida.
+
+    ``date`` bo'yicha ikki xil hisob saqlanadi:
+    - ``*_count`` / ``bottles_total`` / ``debt_total`` — shu kuni YARATILGAN buyurtmalar;
+    - ``delivered_*`` / ``payment_total`` — shu kuni YETKAZILGAN buyurtmalar
+      (``delivered_at``, bo'lmasa ``done`` bo'lgan buyurtmaning ``created_at`` kuni).
+
+    Order saqlanganda ``suv_tashish_crm.rollups`` orqali yangilanadi,
+    ``manage.py rebuild_daily_stats`` esa to'liq qayta hisoblaydi.
+    """
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name="daily_stats", null=True, blank=True)
+    date = models.DateField()
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, related_name="daily_stats", null=True, blank=True)
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name="daily_stats", null=True, blank=True)
+
+    orders_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+    assigned_count = models.PositiveIntegerField(default=0)
+    delivering_count = models.PositiveIntegerField(default=0)
+    done_count = models.PositiveIntegerField(default=0)
+    canceled_count = models.PositiveIntegerField(default=0)
+    bottles_total = models.PositiveIntegerField(default=0)
+    debt_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    delivered_count = models.PositiveIntegerField(default=0)
+    delivered_bottles = models.PositiveIntegerField(default=0)
+    payment_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-date"]
+        indexes = [
+            models.Index(fields=["date", "business", "courier", "region"], name="dailystats_bucket_idx"),
+            models.Index(fields=["business", "date"], name="dailystats_business_date_idx"),
+            models.Index(fields=["courier", "date"], name="dailystats_courier_date_idx"),
+        ]
+        constraints = [
+            # bitta bucket — bitta yozuv. NULL FK'lar ham teng hisoblanishi kerak;
+            # ``nulls_distinct=False`` faqat PostgreSQL 15+ da ishlaydi (SQLite uni
+            # e'tiborsiz qoldiradi), shuning uchun NULL'lar 0 ga almashtiriladi.
+            models.UniqueConstraint(
+                Coalesce("business", models.Value(0)),
+                "date",
+                Coalesce("courier", models.Value(0)),
+                Coalesce("region", models.Value(0)),
+                name="dailystats_bucket_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} b={self.business_id} c={self.courier_id} r={self.region_id}: {self.orders_count}"
+
+
+# ================= GPS TRACK =================
+class CourierTrack(models.Model):
+    """Kuryer GPS izi chunk'i: bitta kuryer + bitta (UTC) kun + bitta flush = bitta qator.
+
+    Nuqtalar ``points`` ichida ketma-ket 16 baytlik yozuvlar sifatida saqlanadi
+    (int32: kun boshidan sekund, lat*1e6, lon*1e6, order_id) — har bir ping uchun
+    alohida ORM qatori yo'q. Flush har safar yangi qator qo'shadi (append-only).
+    Kodlash/o'qish ``suv_tashish_crm.tracks`` da.
+    """
+    courier = models.ForeignKey(Courier, on_delete=models.CASCADE, related_name="tracks")
+    day = models.DateField()
+    points = models.BinaryField(default=b"")
+    point_count = models.PositiveIntegerField(default=0)
+    first_ts = models.DateTimeField(null=True, blank=True)
+    last_ts = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-day"]
+        indexes = [
+            models.Index(fields=["courier", "day", "first_ts"], name="courier_track_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.courier_id} {self.day}: {self.point_count} nuqta"
 
 
 # ================= HISTORY =================
@@ -255,4 +505,21 @@ class PushToken(models.Model):
 
     def __str__(self):
         t = self.token[:24] + "..." if self.token else ""
-        return f"{self.platform or 'device'} - {t}"
\ No newline at end of file
+        return f"{self.platform or 'device'} - {t}"
+
+# ================= JWT TOKEN VERSION =================
+class UserTokenVersion(models.Model):
+    """JWT claim'lari (rol, biznes, profil id'lari) versiyasi (``suv_tashish_crm.jwt_claims``).
+
+    Rol yoki profil o'zgarsa ``version`` oshiriladi — eski ``tv`` claim'li access
+    token'lar rad etiladi va refresh yangi claim'lar bilan beriladi."""
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="token_version",
+    )
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: v{self.version}"
@@ -0,0 +1,199 @@
+"""
+Buyurtma holati o'tishlari (accept / start / confirm / cancel) — bitta shartli UPDATE bilan.
+
+Oldin ``courier_accept_order_view`` orderni o'qib, hali pending ekanini tekshirmasdan
+``courier``/``status`` ni yozib yuborardi — ikki kuryer ikkalasi ham "yutardi".
+``courier_panel.api_accept_order`` esa ``select_for_update`` qilardi: yozuvchilarni
+navbatga qo'yadi, SQLite'da umuman ishlamaydi.
+
+Endi har bir o'tish compare-and-swap:
+
+    UPDATE order SET status=<yangi>, ... WHERE id=%s AND status=<o'qilgan> AND courier_id=<o'qilgan>
+
+(accept uchun bu aynan ``status='pending' AND courier_id IS NULL``). ``rowcount == 0`` —
+kimdir oldinroq o'zgartirgan: holat qayta o'qiladi va qoida yana tekshiriladi
+(``MAX_ATTEMPTS`` marta), natija ``TransitionResult(ok=False, reason=...)``. Qulf yo'q.
+
+G'olib uchun ``save()`` chaqirilmaydi (ikkinchi yozuv bo'lmasin): ``client_summary``
+(kuryer o'zgarsa), ``rollups`` (commit'dan keyin) va bitta ``events.order_event``
+shu yerning o'zida bajariladi.
+"""
+import copy
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import client_summary, events, rollups
+from .models import Order
+
+ACCEPT = "accept"
+START = "start"
+CONFIRM = "confirm"
+CANCEL = "cancel"
+
+# amal -> (qaysi holatlardan, qaysi holatga)
+TRANSITIONS = {
+    ACCEPT: (("pending",), "assigned"),
+    START: (("assigned",), "delivering"),
+    CONFIRM: (("assigned", "delivering"), "done"),
+    CANCEL: (("pending", "assigned", "delivering"), "canceled"),
+}
+
+NOT_FOUND = "NOT_FOUND"
+NOT_YOUR_ORDER = "NOT_YOUR_ORDER"
+ALREADY_TAKEN = "ALREADY_TAKEN"
+INVALID_STATUS = "INVALID_STATUS"
+CONFLICT = "CONFLICT"
+
+HTTP_STATUS = {
+    NOT_FOUND: 404,
+    NOT_YOUR_ORDER: 403,
+    ALREADY_TAKEN: 409,
+    INVALID_STATUS: 409,
+    CONFLICT: 409,
+}
+
+# shuncha marta qayta o'qib urinadi (masalan confirm: assigned -> delivering poygasi)
+MAX_ATTEMPTS = 3
+
+
+@dataclass
+class TransitionResult:
+    action: str
+    order_id: Optional[int]
+    ok: bool
+    # False — order allaqachon shu holatda edi (takroriy so'rov), hech narsa yozilmadi
+    changed: bool = False
+    status: Optional[str] = None
+    previous_status: Optional[str] = None
+    courier_id: Optional[int] = None
+    reason: Optional[str] = None
+    order: Optional[Order] = field(default=None, repr=False, compare=False)
+
+    @property
+    def http_status(self) -> int:
+        return 200 if self.ok else HTTP_STATUS.get(self.reason, 409)
+
+    @property
+    def detail(self) -> Optional[str]:
+        if self.reason == INVALID_STATUS:
+            return f"{INVALID_STATUS}:{self.status}"
+        return self.reason
+
+    def as_dict(self) -> Dict:
+        d = {
+            "ok": self.ok,
+            "action": self.action,
+            "order_id": self.order_id,
+            "order_status": self.status,
+            "changed": self.changed,
+        }
+        if not self.ok:
+            d["detail"] = self.detail
+        return d
+
+
+def _load(order) -> Optional[Order]:
+    if isinstance(order, Order):
+        return order
+    try:
+        return Order.objects.filter(pk=int(order)).first()
+    except (TypeError, ValueError):
+        return None
+
+
+def _check(action: str, order: Order, courier_id, client_id) -> Tuple[Optional[str], bool]:
+    """``(reason, already_done)``: rad etish sababi yoki o'tish allaqachon bo'lganmi."""
+    sources, target = TRANSITIONS[action]
+    if client_id is not None and order.client_id != client_id:
+        return NOT_FOUND, False
+    if action == ACCEPT:
+        if order.courier_id is not None:
+            if order.courier_id == courier_id and order.status == target:
+                return None, True
+            return ALREADY_TAKEN, False
+    elif courier_id is not None and order.courier_id != courier_id:
+        return NOT_YOUR_ORDER, False
+    if order.status == target:
+        return None, True
+    if order.status not in sources:
+        return INVALID_STATUS, False
+    return None, False
+
+
+def _after_update(before: Order, order: Order) -> None:
+    """``post_save`` qabul qiluvchilari qiladigan ishlar (``QuerySet.update()`` signal yubormaydi)."""
+    if before.courier_id != order.courier_id:
+        client_summary.order_courier_changed(order)
+    snapshots = [before, copy.copy(order)]
+    transaction.on_commit(lambda: rollups.refresh_orders(snapshots))
+    events.order_event(order, previous_status=before.status, previous_courier_id=before.courier_id)
+    # yangi holat eslab qolinsin — keyinroq ``order.save()`` qilinsa ish ikkinchi marta bajarilmasin
+    rollups.remember(order)
+    client_summary.remember(order)
+    events.remember(order)
+
+
+def _transition(action: str, order, courier_id=None, client_id=None, values=None) -> TransitionResult:
+    _sources, target = TRANSITIONS[action]
+    order = _load(order)
+    for _ in range(MAX_ATTEMPTS):
+        if order is None:
+            return TransitionResult(action, None, ok=False, reason=NOT_FOUND)
+        reason, done = _check(action, order, courier_id, client_id)
+        if reason or done:
+            return TransitionResult(
+                action, order.pk, ok=not reason, status=order.status, previous_status=order.status,
+                courier_id=order.courier_id, reason=reason, order=order,
+            )
+
+        updates = {"status": target, "updated_at": timezone.now(), **(values or {})}
+        if action == ACCEPT:
+            updates["courier_id"] = courier_id
+        with transaction.atomic():
+            n = Order.objects.filter(
+                pk=order.pk, status=order.status, courier_id=order.courier_id,
+            ).update(**updates)
+            if n:
+                before = copy.copy(order)
+                for name, value in updates.items():
+                    setattr(order, name, value)
+                _after_update(before, order)
+                return TransitionResult(
+                    action, order.pk, ok=True, changed=True, status=order.status,
+                    previous_status=before.status, courier_id=order.courier_id, order=order,
+                )
+        # boshqa so'rov oldinroq o'zgartirdi — joriy holatni qayta o'qiymiz
+        order = Order.objects.filter(pk=order.pk).first()
+
+    return TransitionResult(
+        action, order.pk if order else None, ok=False, reason=CONFLICT,
+        status=order.status if order else None, order=order,
+    )
+
+
+def accept(order, courier_id) -> TransitionResult:
+    """pending va kuryersiz order -> ``assigned`` (shu kuryerga)."""
+    return _transition(ACCEPT, order, courier_id=courier_id)
+
+
+def start(order, courier_id=None) -> TransitionResult:
+    """``assigned`` -> ``delivering``; ``courier_id`` berilsa faqat o'z orderi."""
+    return _transition(START, order, courier_id=courier_id)
+
+
+def confirm(order, courier_id=None, payment_type=None, payment_amount=None) -> TransitionResult:
+    """``assigned``/``delivering`` -> ``done`` (``delivered_at`` va to'lov bilan)."""
+    values = {"delivered_at": timezone.now()}
+    if payment_type is not None:
+        values["payment_type"] = payment_type
+    if payment_amount is not None:
+        values["payment_amount"] = payment_amount
+    return _transition(CONFIRM, order, courier_id=courier_id, values=values)
+
+
+def cancel(order, courier_id=None, client_id=None) -> TransitionResult:
+    """Yakunlanmagan order -> ``canceled``; ``courier_id``/``client_id`` — kimning nomidan."""
+    return _transition(CANCEL, order, courier_id=courier_id, client_id=client_id)
@@ -0,0 +1,301 @@
+"""
+Tashqi xabarlar (Telegram) uchun outbox.
+
+Oldin ``signals.send_telegram_message`` ``post_save`` ichida ``requests.post`` ni
+timeout'siz sinxron chaqirardi, ``telegram.send_telegram`` esa har bir xabar uchun
+yangi thread ochardi, buyurtma yaratilganda esa har bir kuryer/admin uchun alohida
+xabar yuborilardi.
+
+Endi:
+- ``enqueue_telegram()`` / ``notify_staff()`` ``OutboundMessage`` qatorlarini chaqiruvchi
+  tranzaksiyasida ``bulk_create`` qiladi (buyurtma bilan birga commit bo'ladi);
+- commit'dan keyin cheklangan worker pool (``OUTBOX_WORKERS`` ta thread) uyg'otiladi
+  yoki alohida jarayon: ``manage.py run_outbox``;
+- worker'lar navbatdan partiya bo'lib oladi (claim), bitta chatga ketma-ket xabarlarni
+  birlashtiradi, umumiy ``requests.Session`` bilan yuboradi, chat bo'yicha tezlikni
+  cheklaydi, xatoda exponential backoff bilan qayta urinadi va oxirida ``dead`` qiladi.
+"""
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_TEXT = 4096
+# 'sending' holatida shuncha vaqt qolgan xabar (worker o'lgan) qayta olinadi
+STALE_CLAIM = timedelta(minutes=5)
+
+
+def _conf(name, default):
+    return getattr(settings, name, default)
+
+
+def _telegram_token() -> str:
+    return os.environ.get("TELEGRAM_BOT_TOKEN") or _conf("TELEGRAM_BOT_TOKEN", "") or ""
+
+
+def _default_chat() -> str:
+    return os.environ.get("TELEGRAM_CHAT_ID") or _conf("TELEGRAM_CHAT_ID", "") or ""
+
+
+# ---------------- navbatga qo'yish ----------------
+def enqueue_telegram(text: str, chat_ids: Optional[Iterable] = None) -> int:
+    """Telegram xabar(lar)ini outbox'ga qo'shadi. ``chat_ids`` berilmasa — asosiy chat.
+
+    Qaytaradi: qo'shilgan qatorlar soni (Telegram sozlanmagan bo'lsa 0).
+    """
+    if not text:
+        return 0
+    if chat_ids is None:
+        chat_ids = [_default_chat()]
+    chats = []
+    for cid in chat_ids:
+        cid = str(cid or "").strip()
+        if cid and cid not in chats:
+            chats.append(cid)
+    if not _telegram_token() or not chats:
+        logger.info("[telegram] not configured, message skipped: %s", text[:80])
+        return 0
+
+    OutboundMessage.objects.bulk_create([
+        OutboundMessage(channel="telegram", chat_id=cid, text=text[:TELEGRAM_MAX_TEXT]) for cid in chats
+    ])
+    transaction.on_commit(wake)
+    return len(chats)
+
+
+def notify_staff(text: str, main_chat: bool = True, couriers: bool = False, admins: bool = True,
+                 courier_qs=None) -> int:
+    """Asosiy chat + telegram_id'si bor adminlar/kuryerlar — bitta ``bulk_create`` bilan."""
+    from .models import Admin, Courier
+
+    chats = []
+    if main_chat:
+        chats.append(_default_chat())
+    if admins:
+        chats += list(Admin.objects.exclude(telegram_id__isnull=True).exclude(telegram_id="")
+                      .values_list("telegram_id", flat=True))
+    if couriers:
+        qs = courier_qs if courier_qs is not None else Courier.objects.filter(is_active=True)
+        chats += list(qs.exclude(telegram_id__isnull=True).exclude(telegram_id="")
+                      .values_list("telegram_id", flat=True))
+    return enqueue_telegram(text, chats)
+
+
+# ---------------- yuborish ----------------
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _http() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                pool = max(int(_conf("OUTBOX_WORKERS", 2)), 1) * 2
+                adapter = requests.adapters.HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+                s.mount("https://", adapter)
+                _session = s
+    return _session
+
+
+class SendError(Exception):
+    def __init__(self, message, retry_after: Optional[float] = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+def send_telegram_now(chat_id: str, text: str) -> None:
+    """Bitta so'rov. Xatoda ``SendError`` (``permanent`` — qayta urinish ma'nosiz)."""
+    url = f"https://api.telegram.org/bot{_telegram_token()}/sendMessage"
+    try:
+        resp = _http().post(url, json={"chat_id": chat_id, "text": text}, timeout=(3, 10))
+    except requests.RequestException as e:
+        raise SendError(f"network: {e}")
+    if resp.status_code == 200:
+        return
+    try:
+        body = resp.json()
+    except ValueError:
+        body = {}
+    desc = body.get("description") or resp.text[:200]
+    if resp.status_code == 429:
+        retry_after = (body.get("parameters") or {}).get("retry_after")
+        raise SendError(f"429: {desc}", retry_after=float(retry_after or 5))
+    if 400 <= resp.status_code < 500:
+        # chat topilmadi / bot bloklangan / noto'g'ri so'rov
+        raise SendError(f"{resp.status_code}: {desc}", permanent=True)
+    raise SendError(f"{resp.status_code}: {desc}")
+
+
+class RateLimiter:
+    """Chat bo'yicha (Telegram ~1 xabar/sek) va umumiy (~30/sek) cheklov."""
+
+    def __init__(self, per_chat_interval: float = 1.0, global_per_second: float = 25.0):
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = 1.0 / global_per_second if global_per_second else 0.0
+        self._next_chat: Dict[str, float] = {}
+        self._next_global = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, chat_id: str) -> float:
+        """0 — hozir yuborish mumkin (slot band qilindi), aks holda necha sekund kutish kerak."""
+        now = time.monotonic()
+        with self._lock:
+            wait = max(self._next_chat.get(chat_id, 0.0) - now, 0.0)
+            if wait > 0:
+                return wait
+            gwait = max(self._next_global - now, 0.0)
+            if gwait > 0.5:
+                return gwait
+            start = now + gwait
+            self._next_chat[chat_id] = start + self.per_chat_interval
+            self._next_global = start + self.global_interval
+            if len(self._next_chat) > 10000:
+                self._next_chat = {k: v for k, v in self._next_chat.items() if v > now}
+        if gwait:
+            time.sleep(gwait)
+        return 0.0
+
+
+_limiter = RateLimiter()
+
+
+def _backoff(attempts: int) -> timedelta:
+    base = min(5 * (2 ** max(attempts - 1, 0)), 3600)
+    return timedelta(seconds=base * random.uniform(0.8, 1.2))
+
+
+def claim_batch(limit: int = 50) -> List[OutboundMessage]:
+    """Navbatdan ``limit`` ta xabarni shu worker'ga band qiladi (shartli UPDATE — boshqa
+    worker/jarayon bir xil qatorni ololmaydi)."""
+    now = timezone.now()
+    due = Q(status="pending", next_attempt_at__lte=now) | Q(status="sending", locked_at__lt=now - STALE_CLAIM)
+    ids = list(OutboundMessage.objects.filter(due).order_by("id").values_list("id", flat=True)[:limit])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutboundMessage.objects.filter(Q(id__in=ids) & due).update(status="sending", claim=token, locked_at=now)
+    return list(OutboundMessage.objects.filter(claim=token, status="sending").order_by("id"))
+
+
+def _coalesce(messages: List[OutboundMessage]) -> List[List[OutboundMessage]]:
+    """Bitta chatga ketma-ket xabarlarni 4096 belgigacha bitta xabarga birlashtiradi."""
+    groups: Dict[str, List[List[OutboundMessage]]] = {}
+    for m in messages:
+        chat_groups = groups.setdefault(m.chat_id, [[]])
+        cur = chat_groups[-1]
+        size = sum(len(x.text) + 2 for x in cur)
+        if cur and size + len(m.text) > TELEGRAM_MAX_TEXT:
+            cur = []
+            chat_groups.append(cur)
+        cur.append(m)
+    return [g for chat_groups in groups.values() for g in chat_groups if g]
+
+
+def _release(group: List[OutboundMessage], **fields) -> int:
+    """Partiyani yakunlaydi — faqat hali shu worker'ning claim'i ostida bo'lsa.
+
+    ``STALE_CLAIM`` o'tib boshqa worker qatorni qayta olgan bo'lsa, uning holatini
+    ustidan yozib yubormaymiz."""
+    return OutboundMessage.objects.filter(
+        id__in=[m.id for m in group], claim=group[0].claim, status="sending",
+    ).update(claim="", **fields)
+
+
+def process_batch(limit: int = 50, sender=None) -> Dict[str, int]:
+    sender = sender or send_telegram_now
+    stats = {"sent": 0, "retry": 0, "dead": 0, "deferred": 0}
+    messages = claim_batch(limit)
+    max_attempts = int(_conf("OUTBOX_MAX_ATTEMPTS", 8))
+    for group in _coalesce(messages):
+        ids = [m.id for m in group]
+        chat_id = group[0].chat_id
+        wait = _limiter.reserve(chat_id)
+        if wait:
+            # chat limiti: xabarni qaytaramiz, urinish sanalmaydi
+            stats["deferred"] += _release(
+                group, status="pending", next_attempt_at=timezone.now() + timedelta(seconds=wait),
+            )
+            continue
+        try:
+            sender(chat_id, "\n\n".join(m.text for m in group))
+        except Exception as e:
+            if not isinstance(e, SendError):
+                # kutilmagan xato ham urinish sanaladi — aks holda xabar abadiy aylanadi
+                logger.exception("outbox sender crashed chat=%s ids=%s", chat_id, ids)
+                e = SendError(f"{type(e).__name__}: {e}")
+            attempts = max(m.attempts for m in group) + 1
+            if e.permanent or attempts >= max_attempts:
+                stats["dead"] += _release(group, status="dead", attempts=attempts, last_error=str(e)[:1000])
+                logger.warning("outbox dead-letter chat=%s ids=%s: %s", chat_id, ids, e)
+            else:
+                delay = timedelta(seconds=e.retry_after) if e.retry_after else _backoff(attempts)
+                stats["retry"] += _release(
+                    group, status="pending", attempts=attempts, last_error=str(e)[:1000],
+                    next_attempt_at=timezone.now() + delay,
+                )
+            continue
+        stats["sent"] += _release(group, status="sent", sent_at=timezone.now(), last_error="")
+    return stats
+
+
+def drain(max_batches: int = 100, limit: Optional[int] = None) -> Dict[str, int]:
+    """Navbat bo'shaguncha (yoki ``max_batches``) partiyalarni qayta ishlaydi."""
+    limit = limit or int(_conf("OUTBOX_BATCH_SIZE", 50))
+    total = {"sent": 0, "retry": 0, "dead": 0, "deferred": 0}
+    for _ in range(max_batches):
+        stats = process_batch(limit)
+        for k, v in stats.items():
+            total[k] += v
+        # faqat qoldirilganlar bo'lsa — ular hali vaqti kelmagan, aylanmaymiz
+        if not (stats["sent"] or stats["retry"] or stats["dead"]):
+            break
+    return total
+
+
+# ---------------- jarayon ichidagi worker pool ----------------
+_wake_event = threading.Event()
+_workers: List[threading.Thread] = []
+_workers_lock = threading.Lock()
+
+
+def _worker_loop():
+    poll = float(_conf("OUTBOX_POLL_SECONDS", 5))
+    while True:
+        _wake_event.wait(poll)
+        _wake_event.clear()
+        try:
+            drain()
+        except Exception:
+            logger.exception("outbox worker error")
+        finally:
+            close_old_connections()
+
+
+def wake() -> None:
+    """Commit'dan keyin chaqiriladi: worker'lar ishga tushmagan bo'lsa — ishga tushiradi."""
+    n = int(_conf("OUTBOX_WORKERS", 2))
+    if n > 0 and not _workers:
+        with _workers_lock:
+            if not _workers:
+                for i in range(n):
+                    t = threading.Thread(target=_worker_loop, name=f"outbox-{i}", daemon=True)
+                    t.start()
+                    _workers.append(t)
+    _wake_event.set()
@@ -0,0 +1,247 @@
+"""
+Keyset (cursor) pagination — ro'yxat endpointlari uchun umumiy.
+
+Oldin ro'yxatlar qattiq kesilardi (``[:200]``, ``[:500]``, ``[:100]``) yoki umuman
+kesilmasdi: mijoz yo ma'lumotni ko'rmasdi, yo katta javob yuklardi. OFFSET bilan
+sahifalash esa chuqurlashgan sari sekinlashadi (o'tkazib yuborilgan qatorlar ham o'qiladi).
+
+Bu yerda sahifa oxirgi ko'rilgan qator kaliti bo'yicha olinadi, masalan
+``ORDER BY created_at DESC, id DESC`` uchun:
+
+    WHERE created_at < %s OR (created_at = %s AND id < %s)   LIMIT page_size + 1
+
+— har qanday chuqurlikda indeks (``(..., created_at, id)``) bo'ylab bitta diapazon.
+
+- kursor shaffof emas: ``django.core.signing`` bilan imzolangan (tartib nomi + kalit
+  qiymatlari + yo'nalish); boshqa endpoint kursori yoki buzilgan qiymat — ``InvalidCursor``;
+- ``nullable`` maydonlar (masalan ``delivered_at``) oldinga yo'nalishda oxirida (NULLS LAST);
+- ``?page_size=`` — ``KEYSET_MAX_PAGE_SIZE`` gacha; javobda ``next``/``prev`` havolalar.
+
+Function view'lar uchun ``paginate_request(request, qs, keyset)``, DRF ViewSet'lar
+uchun ``KeysetPagination``.
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+CURSOR_PARAM = "cursor"
+PAGE_SIZE_PARAM = "page_size"
+_SALT = "suv_tashish_crm.pagination"
+
+NEXT = "n"
+PREV = "p"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _conf(name, default):
+    return getattr(settings, name, default)
+
+
+@dataclass(frozen=True)
+class Keyset:
+    """Tartib: ``("-created_at", "-id")``; oxirgi maydon yagona bo'lishi kerak (odatda ``id``)."""
+    ordering: Tuple[str, ...]
+    nullable: Tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return ",".join(self.ordering)
+
+    def fields(self) -> List[Tuple[str, bool]]:
+        """``[(maydon, desc), ...]``"""
+        return [(o.lstrip("-"), o.startswith("-")) for o in self.ordering]
+
+    def order_by(self, reverse: bool = False) -> list:
+        exprs = []
+        for name, desc in self.fields():
+            if reverse:
+                desc = not desc
+            nulls = {}
+            if name in self.nullable:
+                # oldinga yo'nalishda NULL'lar oxirida, orqaga — boshida
+                nulls = {"nulls_first": True} if reverse else {"nulls_last": True}
+            exprs.append(F(name).desc(**nulls) if desc else F(name).asc(**nulls))
+        return exprs
+
+    def _beyond(self, name: str, desc: bool, value, reverse: bool) -> Q:
+        """``name`` bo'yicha ``value`` dan keyin keladigan qatorlar."""
+        nullable = name in self.nullable
+        if value is None:
+            # NULL oldinga yo'nalishda eng oxirida: undan keyin hech narsa yo'q,
+            # orqaga yo'nalishda esa barcha NULL bo'lmaganlar
+            return Q(**{f"{name}__isnull": False}) if reverse else Q(pk__in=[])
+        lookup = "lt" if desc != reverse else "gt"
+        q = Q(**{f"{name}__{lookup}": value})
+        if nullable and not reverse:
+            q |= Q(**{f"{name}__isnull": True})
+        return q
+
+    def after(self, values: Sequence, reverse: bool = False) -> Q:
+        """Leksikografik ``(k1, k2, ...) > (v1, v2, ...)`` (tartib yo'nalishida)."""
+        q = Q(pk__in=[])
+        equal = Q()
+        for (name, desc), value in zip(self.fields(), values):
+            q |= equal & self._beyond(name, desc, value, reverse)
+            equal &= Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+        return q
+
+    def key(self, obj) -> list:
+        if isinstance(obj, dict):
+            return [obj[name] for name, _ in self.fields()]
+        return [getattr(obj, name) for name, _ in self.fields()]
+
+
+# umumiy tartiblar (indekslar: Order/Notification Meta'dagi ``(..., created_at, id)``)
+BY_CREATED = Keyset(("-created_at", "-id"))
+BY_DELIVERED = Keyset(("-delivered_at", "-id"), nullable=("delivered_at",))
+BY_ID = Keyset(("-id",))
+
+
+def encode_cursor(keyset: Keyset, values: Sequence, direction: str) -> str:
+    # isoformat — mikrosekundlar bilan (DjangoJSONEncoder millisekundgacha qisqartiradi,
+    # keyin ``created_at = %s`` tengligi ishlamay qoladi)
+    values = [v.isoformat() if hasattr(v, "isoformat") else v for v in values]
+    return signing.dumps(
+        {"o": keyset.name, "v": values, "d": direction},
+        salt=_SALT, compress=True, serializer=_JSONSerializer,
+    )
+
+
+def decode_cursor(keyset: Keyset, raw: str, model) -> Tuple[list, str]:
+    try:
+        data = signing.loads(raw, salt=_SALT, serializer=_JSONSerializer)
+    except signing.BadSignature:
+        raise InvalidCursor("BAD_CURSOR")
+    if not isinstance(data, dict) or data.get("o") != keyset.name or data.get("d") not in (NEXT, PREV):
+        raise InvalidCursor("BAD_CURSOR")
+    raw_values = data.get("v")
+    if not isinstance(raw_values, list) or len(raw_values) != len(keyset.ordering):
+        raise InvalidCursor("BAD_CURSOR")
+    values = []
+    for (name, _), v in zip(keyset.fields(), raw_values):
+        try:
+            values.append(None if v is None else model._meta.get_field(name).to_python(v))
+        except Exception:
+            raise InvalidCursor("BAD_CURSOR")
+    return values, data["d"]
+
+
+class _JSONSerializer:
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":")).encode("latin-1")
+
+    def loads(self, data):
+        return json.loads(data.decode("latin-1"))
+
+
+@dataclass
+class Page:
+    items: List[Any]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    page_size: int = 0
+    links: Dict[str, Optional[str]] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict:
+        return {
+            "next": self.links.get("next"),
+            "prev": self.links.get("prev"),
+            "page_size": self.page_size,
+        }
+
+
+def paginate(qs, keyset: Keyset, cursor: Optional[str] = None, page_size: int = 50, key=None) -> Page:
+    """``qs`` (filtrlangan, tartiblanmagan bo'lishi ham mumkin) dan bitta sahifa.
+
+    ``key`` — qatordan kalit qiymatlari (``values_list`` tuple'lari uchun, ``projection``).
+    """
+    key = key or keyset.key
+    values, direction = (None, NEXT)
+    if cursor:
+        values, direction = decode_cursor(keyset, cursor, qs.model)
+    reverse = direction == PREV
+
+    qs = qs.order_by(*keyset.order_by(reverse=reverse))
+    if values is not None:
+        qs = qs.filter(keyset.after(values, reverse=reverse))
+    rows = list(qs[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    # oldinga: keyingisi bormi — ortiqcha qator bo'yicha; orqaga: kursor bor — demak keyingisi bor
+    has_next = has_more if not reverse else True
+    has_prev = (values is not None) if not reverse else has_more
+    page = Page(items=rows, page_size=page_size)
+    if rows and has_next:
+        page.next_cursor = encode_cursor(keyset, key(rows[-1]), NEXT)
+    if rows and has_prev:
+        page.prev_cursor = encode_cursor(keyset, key(rows[0]), PREV)
+    return page
+
+
+def page_size_from(request, default: Optional[int] = None) -> int:
+    default = default or int(_conf("KEYSET_PAGE_SIZE", 50))
+    max_size = int(_conf("KEYSET_MAX_PAGE_SIZE", 500))
+    try:
+        size = int(request.GET.get(PAGE_SIZE_PARAM) or default)
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, max_size))
+
+
+def _link(request, cursor: Optional[str]) -> Optional[str]:
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params[CURSOR_PARAM] = cursor
+    return request.build_absolute_uri(request.path) + "?" + params.urlencode()
+
+
+def paginate_request(request, qs, keyset: Keyset, default_page_size: Optional[int] = None, key=None) -> Page:
+    """``?cursor=`` / ``?page_size=`` bo'yicha sahifa; xato kursor — ``InvalidCursor``."""
+    page = paginate(qs, keyset, request.GET.get(CURSOR_PARAM), page_size_from(request, default_page_size), key=key)
+    page.links = {"next": _link(request, page.next_cursor), "prev": _link(request, page.prev_cursor)}
+    return page
+
+
+class KeysetPagination(BasePagination):
+    """DRF uchun: view'da ``keyset`` (yoki default ``-created_at, -id``) va ``page_size``.
+
+    View'da ``projection`` bo'lsa sahifa ``values_list`` orqali olinadi va elementlar
+    tayyor dict'lar (serializer kerak emas).
+    """
+
+    keyset = Keyset(("-created_at", "-id"))
+    page_size = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keyset = getattr(view, "keyset", None) or self.keyset
+        default = getattr(view, "page_size", None) or self.page_size
+        projection = getattr(view, "projection", None)
+        try:
+            if projection is not None:
+                self.page = projection.paginate_request(request, queryset, keyset, default)
+            else:
+                self.page = paginate_request(request, queryset, keyset, default)
+        except InvalidCursor:
+            raise NotFound("BAD_CURSOR")
+        return self.page.items
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.page.links.get("next"),
+            "previous": self.page.links.get("prev"),
+            "results": data,
+        })
@@ -0,0 +1,603 @@
+"""
+Kuryerlarning jonli joylashuvi (live position) uchun umumiy store.
+
+Oldin pozitsiyalar ``courier_panel.views.COURIER_POSITIONS`` dict'ida saqlanardi —
+bitta gunicorn worker'ga yozilgan nuqtani boshqalari ko'rmasdi va restartda
+hammasi yo'qolardi. API esa har bir GPS ping uchun ``Courier`` jadvaliga UPDATE
+yuborardi.
+
+Endi har bir ping faqat store'ga yoziladi (tez, bazaga tegmaydi), ``Courier.lat/lon``
+esa ``COURIER_POSITION_FLUSH_SECONDS`` da bir marta ``bulk_update`` bilan yangilanadi.
+Ping'lar iz (track) buferiga ham tushadi va flush paytida ``tracks`` moduli orqali
+``CourierTrack`` ga qo'shiladi.
+
+Backendlar (``settings.COURIER_POSITION_STORE``):
+- ``locmem``  — jarayon ichidagi LRU (dev/test, bitta worker);
+- ``sqlite``  — WAL rejimidagi alohida SQLite fayl: bitta serverdagi barcha worker'lar uchun umumiy;
+- ``redis``   — Redis-mos server (``redis`` paketi kerak), bir nechta server uchun.
+"""
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import InterfaceError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+# ``CourierTrack`` yozuvlari int32 (``tracks.RECORD``)
+INT32_MAX = 2 ** 31 - 1
+COURIER_EXISTS_KEY = "courier_exists:{}"
+COURIER_EXISTS_TTL = 300
+
+
+class UnknownCourier(ValueError):
+    """Ping bazada yo'q kuryer nomidan (masalan eskirgan session ``courier_id``)."""
+
+
+class InvalidPosition(ValueError):
+    """Koordinata son emas (NaN/inf) yoki lat/lon oralig'idan tashqarida."""
+
+
+def valid_latlon(lat, lon) -> bool:
+    return math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def clean_order_id(value) -> Optional[int]:
+    """Mijozdan kelgan ``order_id``: musbat int32, aks holda ``None``."""
+    if value in (None, "") or isinstance(value, bool):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return value if 0 < value <= INT32_MAX else None
+
+
+def check_courier(courier_id) -> int:
+    """``courier_id`` ni int qiladi va kuryer mavjudligini tekshiradi (ijobiy natija keshlanadi)."""
+    try:
+        courier_id = int(courier_id)
+    except (TypeError, ValueError, OverflowError):
+        raise UnknownCourier(courier_id)
+    key = COURIER_EXISTS_KEY.format(courier_id)
+    if cache.get(key):
+        return courier_id
+    from .models import Courier
+    if not (0 < courier_id <= INT32_MAX and Courier.objects.filter(pk=courier_id).exists()):
+        raise UnknownCourier(courier_id)
+    cache.set(key, True, COURIER_EXISTS_TTL)
+    return courier_id
+
+
+@dataclass
+class Position:
+    courier_id: int
+    lat: float
+    lon: float
+    ts: float  # unix vaqt (sekund)
+    order_id: Optional[int] = None
+
+    def as_dict(self) -> Dict:
+        # eski COURIER_POSITIONS formatiga mos
+        return {
+            "lat": self.lat,
+            "lon": self.lon,
+            "order_id": self.order_id,
+            "ts": datetime.fromtimestamp(self.ts, tz=dt_timezone.utc).isoformat(),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps([self.lat, self.lon, self.ts, self.order_id])
+
+    @classmethod
+    def from_json(cls, courier_id: int, raw) -> "Position":
+        lat, lon, ts, order_id = json.loads(raw)
+        return cls(int(courier_id), lat, lon, ts, order_id)
+
+
+class BasePositionStore:
+    """Har bir kuryer uchun oxirgi nuqta + "dirty" belgisi (bazaga hali yozilmagan)."""
+
+    def set(self, courier_id: int, lat: float, lon: float, order_id=None, ts: Optional[float] = None) -> Position:
+        pos = Position(
+            int(courier_id), float(lat), float(lon), ts if ts is not None else time.time(), clean_order_id(order_id),
+        )
+        self._set(pos)
+        return pos
+
+    def _set(self, pos: Position) -> None:
+        raise NotImplementedError
+
+    def get(self, courier_id) -> Optional[Position]:
+        found = self.get_many([courier_id])
+        return found.get(int(courier_id))
+
+    def get_many(self, courier_ids: Iterable) -> Dict[int, Position]:
+        raise NotImplementedError
+
+    def pop_dirty(self) -> List[Position]:
+        """Oxirgi flush'dan beri o'zgargan pozitsiyalarni qaytaradi va belgini tozalaydi."""
+        raise NotImplementedError
+
+    def append_track(self, positions: Iterable[Position]) -> None:
+        """Izga (track history) yoziladigan nuqtalarni buferga qo'shadi."""
+        raise NotImplementedError
+
+    def pop_track(self) -> List[Position]:
+        """Buferdagi barcha izlarni qaytaradi va buferni bo'shatadi."""
+        raise NotImplementedError
+
+    def ingest(self, points: List[Position]) -> None:
+        """Bir kuryerning vaqt bo'yicha tartiblangan nuqtalari: hammasi izga,
+        oxirgisi joriy pozitsiyaga. Backendlar buni bitta tranzaksiya/pipeline qiladi."""
+        if points:
+            self.append_track(points)
+            self._set(points[-1])
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class LocMemPositionStore(BasePositionStore):
+    def __init__(self, max_entries: int = 10000, **kwargs):
+        self.max_entries = int(max_entries)
+        self._data: "OrderedDict[int, Position]" = OrderedDict()
+        self._dirty = set()
+        self._track: List[Position] = []
+        self._lock = threading.Lock()
+
+    def _set(self, pos: Position) -> None:
+        with self._lock:
+            self._data[pos.courier_id] = pos
+            self._data.move_to_end(pos.courier_id)
+            self._dirty.add(pos.courier_id)
+            while len(self._data) > self.max_entries:
+                old_id, _ = self._data.popitem(last=False)
+                self._dirty.discard(old_id)
+
+    def get_many(self, courier_ids: Iterable) -> Dict[int, Position]:
+        out = {}
+        with self._lock:
+            for cid in courier_ids:
+                try:
+                    cid = int(cid)
+                except (TypeError, ValueError):
+                    continue
+                pos = self._data.get(cid)
+                if pos is not None:
+                    out[cid] = pos
+        return out
+
+    def pop_dirty(self) -> List[Position]:
+        with self._lock:
+            out = [self._data[cid] for cid in self._dirty if cid in self._data]
+            self._dirty.clear()
+        return out
+
+    def append_track(self, positions: Iterable[Position]) -> None:
+        with self._lock:
+            self._track.extend(positions)
+
+    def pop_track(self) -> List[Position]:
+        with self._lock:
+            out, self._track = self._track, []
+        return out
+
+    def ingest(self, points: List[Position]) -> None:
+        if not points:
+            return
+        with self._lock:
+            self._track.extend(points)
+        self._set(points[-1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._dirty.clear()
+            self._track.clear()
+
+
+class SQLitePositionStore(BasePositionStore):
+    """Alohida SQLite fayl (WAL): bir nechta jarayon bir vaqtda o'qiydi/yozadi.
+
+    Asosiy Django bazasidan ajratilgan — GPS oqimi asosiy jadvallarni qulflamasin.
+    """
+
+    def __init__(self, path=None, **kwargs):
+        self.path = str(path or (settings.BASE_DIR / "data" / "courier_positions.sqlite3"))
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS courier_position ("
+            " courier_id INTEGER PRIMARY KEY,"
+            " lat REAL NOT NULL, lon REAL NOT NULL, ts REAL NOT NULL,"
+            " order_id INTEGER, dirty INTEGER NOT NULL DEFAULT 1)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS courier_position_dirty ON courier_position (dirty) WHERE dirty = 1")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS courier_track_buffer ("
+            " courier_id INTEGER NOT NULL, lat REAL NOT NULL, lon REAL NOT NULL, ts REAL NOT NULL, order_id INTEGER)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None — autocommit; tranzaksiyalarni o'zimiz boshqaramiz
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _set(self, pos: Position) -> None:
+        self._conn().execute(
+            "INSERT INTO courier_position (courier_id, lat, lon, ts, order_id, dirty) VALUES (?, ?, ?, ?, ?, 1)"
+            " ON CONFLICT(courier_id) DO UPDATE SET"
+            " lat=excluded.lat, lon=excluded.lon, ts=excluded.ts, order_id=excluded.order_id, dirty=1",
+            (pos.courier_id, pos.lat, pos.lon, pos.ts, pos.order_id),
+        )
+
+    def get_many(self, courier_ids: Iterable) -> Dict[int, Position]:
+        ids = []
+        for cid in courier_ids:
+            try:
+                ids.append(int(cid))
+            except (TypeError, ValueError):
+                continue
+        if not ids:
+            return {}
+        marks = ",".join("?" * len(ids))
+        rows = self._conn().execute(
+            f"SELECT courier_id, lat, lon, ts, order_id FROM courier_position WHERE courier_id IN ({marks})", ids
+        ).fetchall()
+        return {r[0]: Position(r[0], r[1], r[2], r[3], r[4]) for r in rows}
+
+    def pop_dirty(self) -> List[Position]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT courier_id, lat, lon, ts, order_id FROM courier_position WHERE dirty = 1"
+            ).fetchall()
+            conn.execute("UPDATE courier_position SET dirty = 0 WHERE dirty = 1")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [Position(r[0], r[1], r[2], r[3], r[4]) for r in rows]
+
+    def append_track(self, positions: Iterable[Position]) -> None:
+        rows = [(p.courier_id, p.lat, p.lon, p.ts, p.order_id) for p in positions]
+        if rows:
+            self._conn().executemany(
+                "INSERT INTO courier_track_buffer (courier_id, lat, lon, ts, order_id) VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def pop_track(self) -> List[Position]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT courier_id, lat, lon, ts, order_id FROM courier_track_buffer").fetchall()
+            conn.execute("DELETE FROM courier_track_buffer")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [Position(r[0], r[1], r[2], r[3], r[4]) for r in rows]
+
+    def ingest(self, points: List[Position]) -> None:
+        if not points:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.append_track(points)
+            self._set(points[-1])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM courier_position")
+        conn.execute("DELETE FROM courier_track_buffer")
+
+
+class RedisPositionStore(BasePositionStore):
+    """Redis-mos backend: bitta hash (id -> json) + dirty to'plami."""
+
+    def __init__(self, url=None, prefix: str = "suv:courier_pos", **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("COURIER_POSITION_STORE='redis' uchun `redis` paketi o'rnatilmagan")
+        self.client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self.key = prefix
+        self.dirty_key = f"{prefix}:dirty"
+        self.track_key = f"{prefix}:track"
+
+    def _set(self, pos: Position) -> None:
+        pipe = self.client.pipeline()
+        pipe.hset(self.key, pos.courier_id, pos.to_json())
+        pipe.sadd(self.dirty_key, pos.courier_id)
+        pipe.execute()
+
+    def get_many(self, courier_ids: Iterable) -> Dict[int, Position]:
+        ids = []
+        for cid in courier_ids:
+            try:
+                ids.append(int(cid))
+            except (TypeError, ValueError):
+                continue
+        if not ids:
+            return {}
+        values = self.client.hmget(self.key, ids)
+        return {cid: Position.from_json(cid, raw) for cid, raw in zip(ids, values) if raw}
+
+    def pop_dirty(self) -> List[Position]:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.smembers(self.dirty_key)
+        pipe.delete(self.dirty_key)
+        ids, _ = pipe.execute()
+        return list(self.get_many(int(x) for x in ids).values())
+
+    def append_track(self, positions: Iterable[Position]) -> None:
+        items = [json.dumps([p.courier_id, p.lat, p.lon, p.ts, p.order_id]) for p in positions]
+        if items:
+            self.client.rpush(self.track_key, *items)
+
+    def ingest(self, points: List[Position]) -> None:
+        if not points:
+            return
+        last = points[-1]
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(self.track_key, *[json.dumps([p.courier_id, p.lat, p.lon, p.ts, p.order_id]) for p in points])
+        pipe.hset(self.key, last.courier_id, last.to_json())
+        pipe.sadd(self.dirty_key, last.courier_id)
+        pipe.execute()
+
+    def pop_track(self) -> List[Position]:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.lrange(self.track_key, 0, -1)
+        pipe.delete(self.track_key)
+        items, _ = pipe.execute()
+        out = []
+        for raw in items:
+            cid, lat, lon, ts, order_id = json.loads(raw)
+            out.append(Position(int(cid), lat, lon, ts, order_id))
+        return out
+
+    def clear(self) -> None:
+        self.client.delete(self.key, self.dirty_key, self.track_key)
+
+
+BACKENDS = {
+    "locmem": LocMemPositionStore,
+    "sqlite": SQLitePositionStore,
+    "redis": RedisPositionStore,
+}
+
+_store: Optional[BasePositionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_position_store() -> BasePositionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                name = getattr(settings, "COURIER_POSITION_STORE", "sqlite") or "sqlite"
+                cls = BACKENDS.get(name)
+                if cls is None:
+                    raise ImproperlyConfigured(f"Noma'lum COURIER_POSITION_STORE: {name!r}")
+                _store = cls(**getattr(settings, "COURIER_POSITION_STORE_OPTIONS", {}))
+    return _store
+
+
+# ---------------- bazaga flush ----------------
+_last_flush = time.monotonic()
+_flush_lock = threading.Lock()
+
+
+def flush_track(store: Optional[BasePositionStore] = None) -> int:
+    """Buferdagi izlarni ``CourierTrack`` chunk'lariga qo'shadi.
+
+    Faqat vaqtinchalik baza xatolarida (lock, ulanish) paket buferga qaytadi; yaroqsiz
+    nuqtalarni ``append_positions`` o'zi tashlab yuboradi, boshqa xatoda esa paket
+    log bilan tashlanadi — bitta buzuq nuqta butun iz tarixini to'xtatib qo'ymasin.
+    """
+    from .tracks import append_positions
+
+    store = store or get_position_store()
+    points = store.pop_track()
+    if not points:
+        return 0
+    try:
+        return append_positions(points)
+    except (OperationalError, InterfaceError):
+        logger.exception("courier track flush failed, will retry")
+        store.append_track(points)
+    except Exception:
+        logger.exception("courier track flush failed, dropping %d points", len(points))
+    return 0
+
+
+def flush_positions(store: Optional[BasePositionStore] = None) -> int:
+    """Dirty pozitsiyalarni ``Courier.lat/lon`` ga bitta ``bulk_update`` bilan yozadi
+    (izlar buferi ham shu yerda ``CourierTrack`` ga tushadi)."""
+    from .models import Courier
+
+    store = store or get_position_store()
+    flush_track(store)
+    positions = store.pop_dirty()
+    if not positions:
+        return 0
+    try:
+        Courier.objects.bulk_update(
+            [Courier(pk=p.courier_id, lat=p.lat, lon=p.lon) for p in positions],
+            ["lat", "lon"],
+            batch_size=500,
+        )
+    except Exception:
+        # keyingi flush'da qayta urinish uchun dirty qilib qaytaramiz (yangiroq nuqta bo'lsa o'sha qoladi)
+        logger.exception("courier position flush failed")
+        current = store.get_many(p.courier_id for p in positions)
+        for p in positions:
+            cur = current.get(p.courier_id)
+            if cur is None or cur.ts <= p.ts:
+                store._set(p)
+        return 0
+    return len(positions)
+
+
+def maybe_flush(store: Optional[BasePositionStore] = None) -> int:
+    """Oxirgi flush'dan ``COURIER_POSITION_FLUSH_SECONDS`` o'tgan bo'lsa flush qiladi."""
+    global _last_flush
+    interval = float(getattr(settings, "COURIER_POSITION_FLUSH_SECONDS", 30))
+    now = time.monotonic()
+    if now - _last_flush < interval:
+        return 0
+    if not _flush_lock.acquire(blocking=False):
+        return 0
+    try:
+        _last_flush = now
+        return flush_positions(store)
+    finally:
+        _flush_lock.release()
+
+
+def record_position(courier_id, lat, lon, order_id=None) -> Position:
+    """GPS ping: store'ga yozadi, bazaga esa faqat vaqti-vaqti bilan (batch).
+
+    Noma'lum kuryer — ``UnknownCourier``, yaroqsiz koordinata — ``InvalidPosition``.
+    """
+    if not valid_latlon(lat, lon):
+        raise InvalidPosition(f"invalid lat/lon: {lat!r}, {lon!r}")
+    courier_id = check_courier(courier_id)
+    store = get_position_store()
+    pos = store.set(courier_id, lat, lon, order_id=order_id)
+    store.append_track([pos])
+    _publish(pos)
+    try:
+        maybe_flush(store)
+    except Exception:
+        logger.exception("courier position flush failed")
+    return pos
+
+
+def _publish(pos: Position) -> None:
+    from .events import publish_position
+    publish_position(pos)
+
+
+# bitta so'rovda qabul qilinadigan maksimal nuqtalar
+MAX_BATCH_FIXES = 1000
+# qurilma soati biroz oldinda bo'lishi mumkin; undan ko'pi — xato vaqt
+MAX_CLOCK_SKEW_SECONDS = 120
+
+
+def _parse_fix_ts(value, now: float) -> Optional[float]:
+    if value in (None, ""):
+        return now
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace(".", "", 1).isdigit()):
+        ts = float(value)
+        return ts / 1000.0 if ts > 1e11 else ts  # millisekund bo'lsa
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        from django.utils import timezone
+        dt = timezone.make_aware(dt)
+    return dt.timestamp()
+
+
+def record_positions(courier_id, fixes, now: Optional[float] = None) -> Dict:
+    """Offline buferlangan GPS nuqtalar to'plamini qabul qiladi.
+
+    ``fixes`` — ``{"lat", "lon", "ts", "order_id"}`` ro'yxati (``ts``: unix sekund/ms yoki ISO).
+    Nuqtalar vaqt bo'yicha tartiblanadi, bir xil ``ts`` lar birlashtiriladi, serverdagi
+    high-water mark (oxirgi qabul qilingan ``ts``) dan eski yoki teng bo'lganlari tashlab
+    yuboriladi — ilova bir xil paketni qayta yuborsa dublikat bo'lmaydi. Hammasi
+    store'ga bitta ``ingest`` chaqiruvi bilan yoziladi. Noma'lum kuryer — ``UnknownCourier``.
+    """
+    now = time.time() if now is None else now
+    courier_id = check_courier(courier_id)
+    store = get_position_store()
+    current = store.get(courier_id)
+    high_water = current.ts if current else 0.0
+
+    by_ts: Dict[float, Position] = {}
+    rejected = duplicates = 0
+    for fix in list(fixes or [])[:MAX_BATCH_FIXES]:
+        try:
+            lat = float(fix.get("lat"))
+            lon = float(fix.get("lon"))
+            ts = _parse_fix_ts(fix.get("ts"), now)
+        except (AttributeError, TypeError, ValueError):
+            rejected += 1
+            continue
+        if ts is None or not math.isfinite(ts) or ts <= 0 or not valid_latlon(lat, lon) \
+                or ts > now + MAX_CLOCK_SKEW_SECONDS:
+            rejected += 1
+            continue
+        if ts <= high_water or ts in by_ts:
+            duplicates += 1
+        by_ts[ts] = Position(courier_id, lat, lon, ts, clean_order_id(fix.get("order_id")))
+    truncated = max(len(fixes or []) - MAX_BATCH_FIXES, 0)
+
+    points = [by_ts[ts] for ts in sorted(by_ts) if ts > high_water]
+    if points:
+        store.ingest(points)
+        high_water = points[-1].ts
+        _publish(points[-1])
+        try:
+            maybe_flush(store)
+        except Exception:
+            logger.exception("courier position flush failed")
+
+    return {
+        "accepted": len(points),
+        "duplicates": duplicates,
+        "rejected": rejected,
+        "truncated": truncated,
+        "high_water": high_water,
+    }
+
+
+def live_latlon(courier):
+    """Kuryerning eng so'nggi koordinatasi: store'dan, bo'lmasa ``Courier.lat/lon``."""
+    if courier is None:
+        return None, None
+    try:
+        pos = get_position_store().get(courier.pk)
+    except Exception:
+        pos = None
+    if pos is not None:
+        return pos.lat, pos.lon
+    return getattr(courier, "lat", None), getattr(courier, "lon", None)
+
+
+def live_latlon_many(couriers) -> Dict[int, Tuple]:
+    """``live_latlon`` ning ko'p kuryerli varianti: store'ga bitta ``get_many`` so'rovi."""
+    couriers = [c for c in couriers if c is not None]
+    try:
+        live = get_position_store().get_many([c.pk for c in couriers])
+    except Exception:
+        live = {}
+    out = {}
+    for c in couriers:
+        pos = live.get(c.pk)
+        out[c.pk] = (pos.lat, pos.lon) if pos is not None else (getattr(c, "lat", None), getattr(c, "lon", None))
+    return out
@@ -0,0 +1,249 @@
+"""
+Statik ma'lumotnoma fayllari (``Volidam.csv``, ``couriers.xlsx``) uchun registry.
+
+Oldin ``admin_panel.views.read_csv_data`` har bir so'rovda CSV'ni qayta o'qirdi,
+dashboard/qarzdorlar sahifalari esa har safar ``csv_phone_map`` /
+``csv_phone_by_last6`` lug'atlarini qaytadan qurardi; ``couriers.xlsx`` har
+chaqiruvda openpyxl bilan ochilardi.
+
+Endi fayl bir marta o'qiladi va indekslar bilan birga o'zgarmas snapshot
+sifatida saqlanadi. Fayl ``mtime``/hajmi o'zgarsa (masalan client_panel yangi
+hudud qo'shganda) snapshot qayta quriladi va bitta atribut almashtirish bilan
+(atomar) yangilanadi — o'quvchilar hech qachon yarim qurilgan indeksni ko'rmaydi.
+
+``Volidam.csv`` amalda tab bilan ajratilgan, client_panel esa vergul bilan qator
+qo'shadi — shuning uchun ajratuvchi har bir qator uchun aniqlanadi.
+"""
+import csv
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Callable, Dict, Generic, List, Mapping, Optional, Tuple, TypeVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# stat() ni har so'rovda emas, shuncha sekundda bir marta tekshiramiz
+RELOAD_CHECK_SECONDS = 2.0
+
+T = TypeVar("T")
+
+
+def normalize_to_998(raw) -> Optional[str]:
+    """Istalgan telefon -> '998' + oxirgi 9 raqam (12 raqam), bo'lmasa None."""
+    if not raw:
+        return None
+    d = "".join(ch for ch in str(raw) if ch.isdigit())
+    if len(d) < 9:
+        return None
+    return "998" + d[-9:]
+
+
+def _last6(raw) -> Optional[str]:
+    d = "".join(ch for ch in str(raw or "") if ch.isdigit())
+    return d[-6:] if len(d) >= 6 else None
+
+
+def _unique(values) -> Tuple[str, ...]:
+    seen = set()
+    out = []
+    for v in values:
+        v = (v or "").strip()
+        if v and v not in seen:
+            seen.add(v)
+            out.append(v)
+    return tuple(out)
+
+
+# ---------------- fayl keshi ----------------
+class ReferenceFile(Generic[T]):
+    """Faylni parse qilib, ``mtime`` o'zgarguncha natijani ushlab turadi."""
+
+    def __init__(self, path: Callable[[], str], loader: Callable[[str], T], empty: Callable[[], T]):
+        self._path = path
+        self._loader = loader
+        self._empty = empty
+        self._state: Optional[Tuple[Tuple[float, int], T]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return self._path()
+
+    def _signature(self) -> Tuple[float, int]:
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime, st.st_size
+        except OSError:
+            return -1.0, -1
+
+    def get(self) -> T:
+        state = self._state
+        now = time.monotonic()
+        if state is not None and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return state[1]
+        sig = self._signature()
+        self._checked_at = now
+        if state is not None and state[0] == sig:
+            return state[1]
+        with self._lock:
+            state = self._state
+            if state is None or state[0] != sig:
+                data = self._load(sig)
+                state = (sig, data)
+                self._state = state
+            return state[1]
+
+    def _load(self, sig) -> T:
+        if sig[0] < 0:
+            return self._empty()
+        try:
+            return self._loader(self.path)
+        except Exception:
+            # buzilgan fayl har so'rovda qayta parse qilinmasin — shu imzo uchun bo'sh natija
+            logger.exception("reference file could not be parsed: %s", self.path)
+            return self._empty()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._state = None
+
+
+# ---------------- Volidam.csv ----------------
+@dataclass(frozen=True)
+class VolidamData:
+    rows: Tuple[Mapping[str, str], ...] = ()
+    by_phone: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    by_last6: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    location_by_name: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    locations: Tuple[str, ...] = ()
+    names: frozenset = frozenset()
+
+
+def _split_row(line: str) -> List[str]:
+    if "\t" in line:
+        return line.split("\t")
+    return next(csv.reader([line]), [])
+
+
+def load_volidam(path: str) -> VolidamData:
+    rows = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        lines = (ln.rstrip("\r\n") for ln in f)
+        next(lines, None)  # header skip (read_csv_data bilan bir xil)
+        for line in lines:
+            if not line.strip():
+                continue
+            row = _split_row(line)
+            rows.append(MappingProxyType({
+                "name": (row[0] if len(row) > 0 else "").strip(),
+                "bottle": (row[1] if len(row) > 1 else "").strip(),
+                "location": (row[2] if len(row) > 2 else "").strip(),
+                "phone": (row[3] if len(row) > 3 else "").strip(),
+            }))
+
+    by_phone: Dict[str, str] = {}
+    by_last6: Dict[str, str] = {}
+    location_by_name: Dict[str, str] = {}
+    for r in rows:
+        norm = normalize_to_998(r["phone"])
+        if norm:
+            by_phone[norm] = r["name"]
+        last6 = _last6(r["phone"])
+        if last6:
+            by_last6[last6] = r["name"]
+        location_by_name[r["name"]] = r["location"]
+
+    return VolidamData(
+        rows=tuple(rows),
+        by_phone=MappingProxyType(by_phone),
+        by_last6=MappingProxyType(by_last6),
+        location_by_name=MappingProxyType(location_by_name),
+        locations=_unique(r["location"] for r in rows),
+        names=frozenset(r["name"].strip() for r in rows if r["name"].strip()),
+    )
+
+
+def volidam_path() -> str:
+    return str(getattr(settings, "VOLIDAM_CSV_PATH", os.path.join(settings.BASE_DIR, "Volidam.csv")))
+
+
+_volidam = ReferenceFile(volidam_path, load_volidam, VolidamData)
+
+
+def volidam() -> VolidamData:
+    return _volidam.get()
+
+
+def volidam_rows() -> List[Dict[str, str]]:
+    """``read_csv_data()`` bilan mos: yangi list va dict nusxalari (chaqiruvchi o'zgartirishi mumkin)."""
+    return [dict(r) for r in volidam().rows]
+
+
+def name_for_phone(phone) -> Optional[str]:
+    """CSV'dagi ism: avval to'liq 998XXXXXXXXX, keyin oxirgi 6 raqam bo'yicha. O(1)."""
+    data = volidam()
+    norm = normalize_to_998(phone)
+    if norm and norm in data.by_phone:
+        return data.by_phone[norm]
+    last6 = _last6(phone)
+    if last6:
+        return data.by_last6.get(last6)
+    return None
+
+
+def location_for_name(name) -> Optional[str]:
+    return volidam().location_by_name.get(name)
+
+
+def csv_locations() -> Tuple[str, ...]:
+    """CSV'dagi noyob ``location`` qiymatlari (fayldagi tartibda)."""
+    return volidam().locations
+
+
+# ---------------- couriers.xlsx ----------------
+def load_courier_locations(path: str) -> Tuple[str, ...]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        headers = [(str(v).strip().lower() if v else "") for v in header]
+
+        candidates = ["hudud", "manzil", "location", "region", "address"]
+        col = 0  # header topilmasa -> 1-ustun
+        for i, h in enumerate(headers):
+            if any(k in h for k in candidates):
+                col = i
+                break
+
+        return _unique(
+            str(row[col]).strip() if len(row) > col and row[col] is not None else ""
+            for row in rows
+        )
+    finally:
+        wb.close()
+
+
+def _couriers_xlsx_path() -> str:
+    return str(getattr(settings, "COURIERS_XLSX_PATH", os.path.join(settings.BASE_DIR, "couriers.xlsx")))
+
+
+_courier_locations = ReferenceFile(_couriers_xlsx_path, load_courier_locations, tuple)
+
+
+def courier_locations() -> Tuple[str, ...]:
+    return _courier_locations.get()
+
+
+def invalidate() -> None:
+    """Fayl tashqaridan yozilgandan keyin (masalan shu jarayonda append) darhol qayta o'qish uchun."""
+    _volidam.invalidate()
+    _courier_locations.invalidate()
@@ -0,0 +1,71 @@
+"""
+Tezkor JSON: ``orjson`` (o'rnatilgan bo'lsa), aks holda standart ``json``.
+
+- ``FastJSONRenderer`` — DRF ``JSONRenderer`` o'rniga (``REST_FRAMEWORK.DEFAULT_RENDERER_CLASSES``);
+- ``FastJsonResponse`` — ``django.http.JsonResponse`` o'rniga (session endpointlar).
+
+``orjson`` tanimaydigan turlar (``Decimal``, ``datetime``, lazy matnlar, ...) eski encoder'ning
+``default`` metodiga beriladi (``OPT_PASSTHROUGH_DATETIME``) — chiqish bir xil bo'lib qoladi.
+``indent`` so'ralsa (browsable API) yoki ``orjson`` xato bersa (masalan 64-bitdan katta int),
+oddiy yo'lga qaytiladi.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # ixtiyoriy paket
+    orjson = None
+
+_OPTIONS = 0
+if orjson is not None:
+    _OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data, default=None) -> bytes:
+    """``orjson.dumps`` (yoki ``json.dumps``) -> UTF-8 bayt."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=default, option=_OPTIONS)
+        except TypeError:
+            pass
+    return json.dumps(data, default=default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    _default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self._default, option=_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer kabi: \u2028/\u2029 — JavaScript uchun xavfsiz
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class FastJsonResponse(HttpResponse):
+    """``JsonResponse`` bilan bir xil imzo va xulq, ``orjson`` bilan."""
+
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, json_dumps_params=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        if json_dumps_params:
+            content = json.dumps(data, cls=encoder, **json_dumps_params)
+        else:
+            content = dumps(data, default=encoder().default)
+        super().__init__(content=content, **kwargs)
@@ -0,0 +1,326 @@
+"""
+DailyOrderStats rollupini yangilab turish.
+
+Har bir Order saqlanganda/o'chirilganda u tegishli bo'lgan (va oldin tegishli
+bo'lgan) kunlik "bucket"lar xom Order jadvalidan qayta hisoblanadi. Bitta
+bucket — bitta (business, date, courier, region) kombinatsiyasi, shuning uchun
+qayta hisoblash kichik va indeksli so'rov bo'ladi; delta arifmetikasi yo'q,
+demak rollup o'z-o'zidan "siljib" ketmaydi.
+
+Mijozning regioni o'zgarsa (``Client.save``) uning orderlari bucketlari ham qayta
+hisoblanadi (``refresh_client_region``).
+
+``QuerySet.update()`` signal yubormaydi — bunday joylarda ``refresh_orders()``
+(region uchun ``refresh_client_region()``) ni qo'lda chaqiring.
+"""
+import datetime
+from decimal import Decimal
+from typing import Iterable, Optional, Set, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Client, DailyOrderStats, Order
+
+
+STATUS_FIELDS = {
+    "pending": "pending_count",
+    "assigned": "assigned_count",
+    "delivering": "delivering_count",
+    "done": "done_count",
+    "canceled": "canceled_count",
+}
+
+# (business_id, date, courier_id, region_id)
+BucketKey = Tuple[Optional[int], datetime.date, Optional[int], Optional[int]]
+
+_SNAPSHOT_ATTR = "_rollup_snapshot"
+
+
+def _local_date(dt) -> Optional[datetime.date]:
+    if dt is None:
+        return None
+    if timezone.is_aware(dt):
+        dt = timezone.localtime(dt)
+    return dt.date()
+
+
+def _is_delivered(status, delivered_at) -> bool:
+    return status == "done" or delivered_at is not None
+
+
+def _snapshot(instance) -> tuple:
+    # __dict__ dan o'qiymiz: .only()/.defer() bilan yuklangan obyektda ortiqcha so'rov bo'lmasin
+    d = instance.__dict__
+    return (
+        d.get("business_id"),
+        d.get("courier_id"),
+        d.get("client_id"),
+        d.get("status"),
+        d.get("created_at"),
+        d.get("delivered_at"),
+    )
+
+
+def _bucket_keys(snapshot, region_id) -> Set[BucketKey]:
+    business_id, courier_id, _client_id, status, created_at, delivered_at = snapshot
+    keys: Set[BucketKey] = set()
+    created_day = _local_date(created_at)
+    if created_day:
+        keys.add((business_id, created_day, courier_id, region_id))
+    if _is_delivered(status, delivered_at):
+        delivered_day = _local_date(delivered_at) or created_day
+        if delivered_day:
+            keys.add((business_id, delivered_day, courier_id, region_id))
+    return keys
+
+
+def _delivered_q(day: datetime.date) -> Q:
+    # yetkazilgan kun: delivered_at, bo'lmasa (eski 'done' yozuvlar) created_at
+    return Q(delivered_at__date=day) | Q(delivered_at__isnull=True, status="done", created_at__date=day)
+
+
+def _bucket_values(base, day: datetime.date) -> dict:
+    created = base.filter(created_at__date=day).aggregate(
+        orders_count=Count("id"),
+        bottles_total=Coalesce(Sum("bottles"), 0),
+        debt_total=Sum("debt_change"),
+        **{field: Count("id", filter=Q(status=st)) for st, field in STATUS_FIELDS.items()},
+    )
+    delivered = base.filter(_delivered_q(day)).aggregate(
+        delivered_count=Count("id"),
+        delivered_bottles=Coalesce(Sum("bottles"), 0),
+        payment_total=Sum("payment_amount"),
+    )
+
+    values = dict(created)
+    values.update(delivered)
+    values["debt_total"] = values.get("debt_total") or Decimal("0")
+    values["payment_total"] = values.get("payment_total") or Decimal("0")
+    return values
+
+
+def recompute_bucket(key: BucketKey) -> None:
+    """Bitta bucketni xom Order jadvalidan qayta hisoblaydi."""
+    business_id, day, courier_id, region_id = key
+    base = Order.objects.filter(
+        business_id=business_id,
+        courier_id=courier_id,
+        client__region_id=region_id,
+    )
+    rows = DailyOrderStats.objects.filter(
+        business_id=business_id, date=day, courier_id=courier_id, region_id=region_id,
+    )
+
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                # avval yozuv (qulf), keyin agregatlar: parallel qayta hisoblashda eskiroq natija
+                # oxirgi bo'lib yozilmasin. SQLite'da SELECT bilan boshlangan tranzaksiya yozishga
+                # o'tishda darhol "database is locked" beradi, UPDATE esa busy timeout'gacha kutadi.
+                n = rows.update(updated_at=timezone.now())
+                values = _bucket_values(base, day)
+                if not values["orders_count"] and not values["delivered_count"]:
+                    if n:
+                        rows.delete()
+                elif n:
+                    rows.update(**values)
+                else:
+                    DailyOrderStats.objects.create(
+                        business_id=business_id, date=day, courier_id=courier_id, region_id=region_id,
+                        **values,
+                    )
+            return
+        except IntegrityError:
+            # parallel jarayon shu bucketni bizdan oldin yaratdi (dailystats_bucket_uniq) —
+            # endi yozuv bor, qayta urinishda u qulflanib yangilanadi
+            if attempt:
+                raise
+
+
+def refresh_orders(orders: Iterable[Order]) -> None:
+    """Berilgan orderlar hozir tushadigan bucketlarni qayta hisoblaydi
+    (masalan ``QuerySet.update()`` dan keyin)."""
+    keys: Set[BucketKey] = set()
+    client_ids = set()
+    orders = list(orders)
+    for o in orders:
+        client_ids.add(o.client_id)
+    regions = dict(Client.objects.filter(id__in=client_ids).values_list("id", "region_id"))
+    for o in orders:
+        keys |= _bucket_keys(_snapshot(o), regions.get(o.client_id))
+    for key in keys:
+        recompute_bucket(key)
+
+
+def _region_for_client(client_id) -> Optional[int]:
+    if not client_id:
+        return None
+    return Client.objects.filter(pk=client_id).values_list("region_id", flat=True).first()
+
+
+def remember(order: Order) -> None:
+    """Orderning joriy holatini eslab qoladi — ``QuerySet.update()`` dan keyin
+    keyingi ``save()`` o'zgarishni qayta hisoblamasligi uchun."""
+    setattr(order, _SNAPSHOT_ATTR, _snapshot(order))
+
+
+@receiver(post_init, sender=Order)
+def _remember_order_state(sender, instance, **kwargs):
+    remember(instance)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, _SNAPSHOT_ATTR, None)
+    after = _snapshot(instance)
+    setattr(instance, _SNAPSHOT_ATTR, after)
+    if not created and before == after:
+        # rollupga ta'sir qiladigan hech narsa o'zgarmagan (masalan faqat lat/lon)
+        if not _amounts_touched(kwargs.get("update_fields")):
+            return
+
+    region_id = _region_for_client(instance.client_id)
+    keys = _bucket_keys(after, region_id)
+    if before and not created:
+        old_region = region_id if before[2] == after[2] else _region_for_client(before[2])
+        keys |= _bucket_keys(before, old_region)
+
+    def _apply():
+        for key in keys:
+            recompute_bucket(key)
+
+    transaction.on_commit(_apply)
+
+
+def _amounts_touched(update_fields) -> bool:
+    # snapshot summalarni kuzatmaydi: update_fields noma'lum bo'lsa ehtiyotkorlik bilan qayta hisoblaymiz
+    if update_fields is None:
+        return True
+    return bool(set(update_fields) & {"bottles", "payment_amount", "debt_change", "client"})
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    keys = _bucket_keys(_snapshot(instance), _region_for_client(instance.client_id))
+
+    def _apply():
+        for key in keys:
+            recompute_bucket(key)
+
+    transaction.on_commit(_apply)
+
+
+# ---------------- mijoz regioni o'zgarishi ----------------
+# bucket kaliti ``client__region_id`` bo'yicha: mijoz boshqa regionga o'tsa uning barcha
+# orderlari eski bucketlardan yangisiga ko'chadi
+_CLIENT_REGION_ATTR = "_rollup_region"
+
+
+@receiver(post_init, sender=Client)
+def _remember_client_region(sender, instance, **kwargs):
+    setattr(instance, _CLIENT_REGION_ATTR, instance.__dict__.get("region_id"))
+
+
+def refresh_client_region(client_id, old_region_id, new_region_id) -> None:
+    """Mijozning orderlari tushadigan bucketlarni eski va yangi region bo'yicha qayta hisoblaydi."""
+    keys: Set[BucketKey] = set()
+    snapshots = Order.objects.filter(client_id=client_id).values_list(
+        "business_id", "courier_id", "client_id", "status", "created_at", "delivered_at",
+    )
+    for snapshot in snapshots:
+        keys |= _bucket_keys(snapshot, old_region_id)
+        keys |= _bucket_keys(snapshot, new_region_id)
+    for key in keys:
+        recompute_bucket(key)
+
+
+@receiver(post_save, sender=Client)
+def client_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    old_region_id = getattr(instance, _CLIENT_REGION_ATTR, None)
+    new_region_id = instance.region_id
+    setattr(instance, _CLIENT_REGION_ATTR, new_region_id)
+    if raw or created or old_region_id == new_region_id:
+        return
+    if update_fields is not None and "region" not in update_fields:
+        return
+    transaction.on_commit(lambda: refresh_client_region(instance.pk, old_region_id, new_region_id))
+
+
+def rebuild(order_model=Order, stats_model=DailyOrderStats, since: Optional[datetime.date] = None,
+            batch_size: int = 1000) -> int:
+    """Rollupni to'liq (yoki ``since`` kunidan boshlab) ikki GROUP BY so'rov bilan qayta quradi.
+
+    Migratsiyadan ham chaqiriladi, shuning uchun modellar parametr sifatida beriladi.
+    Qaytaradi: yozilgan qatorlar soni.
+    """
+    orders = order_model.objects.all()
+    if since is not None:
+        orders = orders.filter(Q(created_at__date__gte=since) | Q(delivered_at__date__gte=since))
+
+    dims = ("business_id", "day", "courier_id", "client__region_id")
+    buckets = {}
+
+    def _row(r):
+        key = (r["business_id"], r["day"], r["courier_id"], r["client__region_id"])
+        return buckets.setdefault(key, {
+            "orders_count": 0, "bottles_total": 0, "debt_total": Decimal("0"),
+            "delivered_count": 0, "delivered_bottles": 0, "payment_total": Decimal("0"),
+            **{f: 0 for f in STATUS_FIELDS.values()},
+        })
+
+    created_rows = (
+        orders.annotate(day=TruncDate("created_at"))
+        .values(*dims)
+        .annotate(
+            orders_count=Count("id"),
+            bottles_total=Coalesce(Sum("bottles"), 0),
+            debt_total=Sum("debt_change"),
+            **{field: Count("id", filter=Q(status=st)) for st, field in STATUS_FIELDS.items()},
+        )
+        .order_by()
+    )
+    for r in created_rows:
+        if since is not None and r["day"] < since:
+            continue
+        row = _row(r)
+        for f in ["orders_count", "bottles_total", *STATUS_FIELDS.values()]:
+            row[f] = r[f] or 0
+        row["debt_total"] = r["debt_total"] or Decimal("0")
+
+    delivered_rows = (
+        orders.filter(Q(status="done") | Q(delivered_at__isnull=False))
+        .annotate(day=Coalesce(TruncDate("delivered_at"), TruncDate("created_at")))
+        .values(*dims)
+        .annotate(
+            delivered_count=Count("id"),
+            delivered_bottles=Coalesce(Sum("bottles"), 0),
+            payment_total=Sum("payment_amount"),
+        )
+        .order_by()
+    )
+    for r in delivered_rows:
+        if since is not None and r["day"] < since:
+            continue
+        row = _row(r)
+        row["delivered_count"] = r["delivered_count"] or 0
+        row["delivered_bottles"] = r["delivered_bottles"] or 0
+        row["payment_total"] = r["payment_total"] or Decimal("0")
+
+    objs = [
+        stats_model(business_id=b, date=day, courier_id=c, region_id=rg, **vals)
+        for (b, day, c, rg), vals in buckets.items()
+    ]
+    with transaction.atomic():
+        old = stats_model.objects.all()
+        if since is not None:
+            old = old.filter(date__gte=since)
+        old.delete()
+        stats_model.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
@@ -0,0 +1,198 @@
+"""
+Kuryerning kunlik yetkazish marshruti.
+
+``courier_today_orders_view`` buyurtmalarni ``-created_at`` tartibida berardi —
+kuryer shahar bo'ylab aylanib yurardi. Bu yerda kuryerning ``assigned``/``delivering``
+buyurtmalari uchun tashrif tartibi hisoblanadi:
+
+1. numpy haversine bilan to'liq masofalar matritsasi (kuryer pozitsiyasi — 0-nuqta);
+2. nearest-neighbour — boshlang'ich yo'l;
+3. 2-opt — har iteratsiyada barcha (i, j) almashtirishlar foydasi bitta vektor
+   amal bilan hisoblanadi va eng foydalisi qo'llanadi.
+
+Yo'l ochiq (kuryer oxirgi manzildan qaytmaydi). 100 ta nuqta — bir necha ms.
+ETA — ``geo.eta_seconds`` (o'rtacha tezlik, yig'ma masofa bo'yicha).
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import geo
+from .dispatch import order_point
+from .models import Order
+
+ROUTE_STATUSES = ("assigned", "delivering")
+# 2-opt iteratsiyalari chegarasi (har biri bitta almashtirish)
+MAX_2OPT_STEPS = 2000
+
+
+def distance_matrix(lat, lon) -> np.ndarray:
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return geo.haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def nearest_neighbour(dist: np.ndarray, start: int = 0) -> np.ndarray:
+    n = len(dist)
+    tour = np.empty(n, dtype=np.int64)
+    visited = np.zeros(n, dtype=bool)
+    cur = start
+    for i in range(n):
+        tour[i] = cur
+        visited[cur] = True
+        if i == n - 1:
+            break
+        row = np.where(visited, np.inf, dist[cur])
+        cur = int(np.argmin(row))
+    return tour
+
+
+def two_opt(dist: np.ndarray, tour: np.ndarray, max_steps: int = MAX_2OPT_STEPS) -> np.ndarray:
+    """Ochiq yo'l uchun 2-opt; ``tour[0]`` (start) joyida qoladi.
+
+    Yo'l oxiriga hamma nuqtadan masofasi 0 bo'lgan soxta nuqta qo'shiladi — shunda
+    ochiq yo'l yopiq yo'lning formulasi bilan hisoblanadi.
+    """
+    n = len(tour)
+    if n < 4:
+        return tour
+    ext = np.zeros((n + 1, n + 1))
+    ext[:n, :n] = dist
+    t = np.append(tour, n)
+
+    # i — teskari aylantiriladigan bo'lakning boshi, j — oxiri (1 <= i < j <= n-1)
+    ii, jj = np.triu_indices(n, k=1)
+    keep = ii >= 1
+    ii, jj = ii[keep], jj[keep]
+    for _ in range(max_steps):
+        a, b, c, d = t[ii - 1], t[ii], t[jj], t[jj + 1]
+        delta = ext[a, c] + ext[b, d] - ext[a, b] - ext[c, d]
+        k = int(np.argmin(delta))
+        if delta[k] >= -1e-9:
+            break
+        i, j = ii[k], jj[k]
+        t[i:j + 1] = t[i:j + 1][::-1].copy()
+    return t[:-1]
+
+
+def solve(lat: Sequence[float], lon: Sequence[float], start: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """Nuqtalar tashrif tartibi (indekslar). ``start`` — kuryer pozitsiyasi (bo'lsa)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    n = len(lat)
+    if n <= 1:
+        return np.arange(n)
+    if start is not None:
+        lat = np.concatenate([[start[0]], lat])
+        lon = np.concatenate([[start[1]], lon])
+    dist = distance_matrix(lat, lon)
+    if start is None:
+        # start yo'q — eng "chetdagi" nuqtadan (markazdan eng uzog'i) boshlaymiz
+        first = int(np.argmax(dist.sum(axis=1)))
+        return two_opt(dist, nearest_neighbour(dist, first))
+    tour = two_opt(dist, nearest_neighbour(dist, 0))
+    return tour[1:] - 1
+
+
+@dataclass
+class Stop:
+    order_id: int
+    lat: float
+    lon: float
+    leg_km: float
+    cumulative_km: float
+    eta_seconds: int
+
+    def as_dict(self) -> Dict:
+        d = asdict(self)
+        d["leg_km"] = round(self.leg_km, 3)
+        d["cumulative_km"] = round(self.cumulative_km, 3)
+        return d
+
+
+@dataclass
+class RoutePlan:
+    start: Optional[Tuple[float, float]]
+    stops: List[Stop] = field(default_factory=list)
+    # koordinatasi yo'q buyurtmalar — marshrut oxirida, tartibsiz
+    unlocated: List[int] = field(default_factory=list)
+
+    @property
+    def total_km(self) -> float:
+        return self.stops[-1].cumulative_km if self.stops else 0.0
+
+    @property
+    def total_eta_seconds(self) -> int:
+        return self.stops[-1].eta_seconds if self.stops else 0
+
+    def sequence(self) -> Dict[int, int]:
+        """order_id -> tartib raqami (1 dan)."""
+        ids = [s.order_id for s in self.stops] + list(self.unlocated)
+        return {oid: i for i, oid in enumerate(ids, start=1)}
+
+    def as_dict(self) -> Dict:
+        return {
+            "start": {"lat": self.start[0], "lon": self.start[1]} if self.start else None,
+            "stops": [s.as_dict() for s in self.stops],
+            "unlocated": self.unlocated,
+            "total_km": round(self.total_km, 3),
+            "total_eta_seconds": self.total_eta_seconds,
+        }
+
+
+def plan_orders(orders: Iterable[Order], start: Optional[Tuple[float, float]] = None) -> RoutePlan:
+    """Buyurtmalar (``client`` select_related bo'lgani ma'qul) uchun marshrut."""
+    return plan_points(((o.pk, *order_point(o)) for o in orders), start=start)
+
+
+def plan_points(points: Iterable[Tuple[int, Optional[float], Optional[float]]],
+                start: Optional[Tuple[float, float]] = None) -> RoutePlan:
+    """``(order_id, lat, lon)`` nuqtalari uchun marshrut; ``lat`` yo'q — ``unlocated``."""
+    if start is not None and (start[0] is None or start[1] is None):
+        start = None
+    if start is not None:
+        start = (float(start[0]), float(start[1]))
+
+    ids, lats, lons, unlocated = [], [], [], []
+    for pk, lat, lon in points:
+        if lat is None:
+            unlocated.append(pk)
+            continue
+        ids.append(pk)
+        lats.append(lat)
+        lons.append(lon)
+
+    plan = RoutePlan(start=start, unlocated=unlocated)
+    if not ids:
+        return plan
+
+    idx = solve(lats, lons, start)
+    lat = np.asarray(lats)[idx]
+    lon = np.asarray(lons)[idx]
+    if start is not None:
+        prev_lat = np.concatenate([[start[0]], lat[:-1]])
+        prev_lon = np.concatenate([[start[1]], lon[:-1]])
+        legs = geo.haversine_km(prev_lat, prev_lon, lat, lon)
+    else:
+        legs = np.concatenate([[0.0], geo.haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])])
+    cum = np.cumsum(legs)
+    etas = geo.eta_seconds(cum)
+    plan.stops = [
+        Stop(ids[k], float(lat[n]), float(lon[n]), float(legs[n]), float(cum[n]), int(etas[n]))
+        for n, k in enumerate(idx.tolist())
+    ]
+    return plan
+
+
+def courier_route(courier, orders: Optional[Iterable[Order]] = None) -> RoutePlan:
+    """Kuryerning faol buyurtmalari uchun, uning so'nggi pozitsiyasidan boshlab."""
+    from .positions import live_latlon
+
+    if orders is None:
+        orders = (
+            Order.objects.select_related("client")
+            .filter(courier=courier, status__in=ROUTE_STATUSES)
+            .order_by("created_at")
+        )
+    return plan_orders(orders, start=live_latlon(courier))
@@ -76,6 +76,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "suv_tashish_crm.actors.ActorMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -111,6 +112,9 @@ DATABASES = {
     "default": {
         "ENGINE": os.getenv("DB_ENGINE", "django.db.backends.sqlite3"),
         "NAME": os.getenv("DB_NAME", str(BASE_DIR / "db.sqlite3")),
+        # test bazasi: SQLite'da default in-memory; ko'p threadli testlar uchun fayl bering
+        # (masalan DB_TEST_NAME=/tmp/suv_test.sqlite3)
+        "TEST": {"NAME": os.getenv("DB_TEST_NAME") or None},
     }
 }
 
@@ -152,13 +156,19 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # -----------------------------------------------------------------------------
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWTAuthentication + token claim'laridan rol/profil (suv_tashish_crm.jwt_claims)
+        "suv_tashish_crm.jwt_claims.ClaimsJWTAuthentication",
         "rest_framework.authentication.TokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    # orjson bilan (o'rnatilmagan bo'lsa — standart json); suv_tashish_crm.renderers
+    "DEFAULT_RENDERER_CLASSES": (
+        "suv_tashish_crm.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
 SIMPLE_JWT = {
@@ -168,6 +178,9 @@ SIMPLE_JWT = {
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    # login/refresh token'lariga rol, business_id, courier_id/client_id qo'shiladi
+    "TOKEN_OBTAIN_SERIALIZER": "suv_tashish_crm.jwt_claims.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "suv_tashish_crm.jwt_claims.ClaimsTokenRefreshSerializer",
 }
 
 # -----------------------------------------------------------------------------
@@ -221,6 +234,84 @@ FCM_ENABLED = bool(FCM_SERVER_KEY)
 
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 
+# -----------------------------------------------------------------------------
+# Courier live positions (suv_tashish_crm.positions)
+# -----------------------------------------------------------------------------
+# locmem | sqlite | redis
+COURIER_POSITION_STORE = os.getenv("COURIER_POSITION_STORE", "sqlite")
+COURIER_POSITION_STORE_OPTIONS = {
+    "sqlite": {"path": os.getenv("COURIER_POSITION_DB", str(BASE_DIR / "data" / "courier_positions.sqlite3"))},
+    "redis": {"url": os.getenv("COURIER_POSITION_REDIS_URL", "redis://localhost:6379/0")},
+}.get(COURIER_POSITION_STORE, {})
+# Courier.lat/lon ga necha sekundda bir marta yoziladi
+COURIER_POSITION_FLUSH_SECONDS = int(os.getenv("COURIER_POSITION_FLUSH_SECONDS", "30"))
+
+# -----------------------------------------------------------------------------
+# Real-time events / SSE (suv_tashish_crm.events)
+# -----------------------------------------------------------------------------
+# inprocess (single-node) | channels (CHANNEL_LAYERS kerak)
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "inprocess")
+SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# auto — SSE faqat ASGI (uvicorn/daphne) ostida; 1 — WSGI'da ham (har bir ochiq oqim
+# bitta worker thread'ni band qiladi, gunicorn sync worker'larda ishlatmang); 0 — o'chiq.
+# O'chiq bo'lsa stream endpointlari 204 qaytaradi, sahifalar polling'da qoladi.
+SSE_ENABLED = os.getenv("SSE_ENABLED", "auto").strip().lower()
+
+# -----------------------------------------------------------------------------
+# Outbound notifications outbox (suv_tashish_crm.outbox)
+# -----------------------------------------------------------------------------
+# jarayon ichidagi worker thread'lar soni; 0 — faqat `manage.py run_outbox`
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+
+# -----------------------------------------------------------------------------
+# Background imports (suv_tashish_crm.imports)
+# -----------------------------------------------------------------------------
+IMPORT_FILES_DIR = os.getenv("IMPORT_FILES_DIR", str(BASE_DIR / "data" / "imports"))
+# jarayon ichidagi import worker'lari; 0 — faqat `manage.py run_imports`
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+IMPORT_POLL_SECONDS = float(os.getenv("IMPORT_POLL_SECONDS", "5"))
+
+# -----------------------------------------------------------------------------
+# Nearest-courier dispatch (suv_tashish_crm.dispatch)
+# -----------------------------------------------------------------------------
+# 1 — yangi pending buyurtma commit'dan keyin eng yaqin bo'sh kuryerga biriktiriladi
+DISPATCH_AUTO_ASSIGN = os.getenv("DISPATCH_AUTO_ASSIGN", "0") == "1"
+# kuryerda shuncha assigned/delivering buyurtma bo'lsa — band; 0 — cheklovsiz
+DISPATCH_MAX_ACTIVE_ORDERS = int(os.getenv("DISPATCH_MAX_ACTIVE_ORDERS", "3"))
+DISPATCH_CANDIDATES = int(os.getenv("DISPATCH_CANDIDATES", "3"))
+# kuryerlar indeksi keshi va live pozitsiya eskirish chegarasi (sekund)
+DISPATCH_INDEX_TTL = float(os.getenv("DISPATCH_INDEX_TTL", "15"))
+DISPATCH_POSITION_MAX_AGE = float(os.getenv("DISPATCH_POSITION_MAX_AGE", "900"))
+
+# -----------------------------------------------------------------------------
+# Admin client map tiles (suv_tashish_crm.client_map)
+# -----------------------------------------------------------------------------
+# shu zoom'gacha (shu ham) nuqtalar tile ichida to'rga yig'iladi (klaster)
+CLIENT_MAP_CLUSTER_MAX_ZOOM = int(os.getenv("CLIENT_MAP_CLUSTER_MAX_ZOOM", "14"))
+# yuqori zoom'da ham tile'da bundan ko'p nuqta bo'lsa — klaster
+CLIENT_MAP_MAX_POINTS_PER_TILE = int(os.getenv("CLIENT_MAP_MAX_POINTS_PER_TILE", "500"))
+# tile keshi va versiya kaliti umumiy keshda bo'lishi kerak (bir nechta worker): CACHES
+# sozlanmagan (locmem) bo'lsa boshqa worker'dagi invalidate() ko'rinmaydi — shuning uchun
+# locmem'da TTL CLIENT_MAP_LOCAL_TILE_TTL gacha qisqartiriladi
+CLIENT_MAP_TILE_TTL = int(os.getenv("CLIENT_MAP_TILE_TTL", "300"))
+CLIENT_MAP_LOCAL_TILE_TTL = int(os.getenv("CLIENT_MAP_LOCAL_TILE_TTL", "15"))
+
+# suv_tashish_crm.actors: user -> rol/profil/biznes keshi (sekund)
+ACTOR_CACHE_TTL = int(os.getenv("ACTOR_CACHE_TTL", "60"))
+# suv_tashish_crm.jwt_claims: token versiyasi keshi (sekund) — boshqa worker'larda
+# eski claim'li token shuncha vaqtgacha qabul qilinishi mumkin
+JWT_TOKEN_VERSION_TTL = int(os.getenv("JWT_TOKEN_VERSION_TTL", "30"))
+
+# suv_tashish_crm.pagination: keyset sahifa hajmi (``?page_size=`` bilan, maksimal chegaragacha)
+KEYSET_PAGE_SIZE = int(os.getenv("KEYSET_PAGE_SIZE", "50"))
+KEYSET_MAX_PAGE_SIZE = int(os.getenv("KEYSET_MAX_PAGE_SIZE", "500"))
+
+# admin_panel.context_processors.sidebar_debtors keshi (sekund)
+SIDEBAR_DEBTORS_TTL = int(os.getenv("SIDEBAR_DEBTORS_TTL", "60"))
+
 # -----------------------------------------------------------------------------
 # UNFOLD Admin UI
 # -----------------------------------------------------------------------------
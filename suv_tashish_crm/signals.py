@@ -1,37 +1,23 @@
-import os
-import requests
-from django.conf import settings
+import logging
+
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from .models import Admin, Courier, Client, Notification
 
-
-def _get_telegram_config():
-    # Prefer environment variables, fall back to Django settings if present
-    token = os.environ.get('TELEGRAM_BOT_TOKEN') or getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-    chat = os.environ.get('TELEGRAM_CHAT_ID') or getattr(settings, 'TELEGRAM_CHAT_ID', None)
-    return token, chat
+logger = logging.getLogger(__name__)
 
 
 def send_telegram_message(text):
-    token, chat = _get_telegram_config()
-    if not token or not chat:
-        # Telegram not configured — do nothing (or print for dev)
-        try:
-            print('[telegram] not configured, message skipped:', text)
-        except Exception:
-            pass
-        return
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
+    """Xabarni outbox'ga qo'yadi (post_save ichida tarmoqqa chiqmaymiz).
+
+    Yozuv shu tranzaksiya bilan birga commit bo'ladi, yuborishni ``outbox`` worker'lari qiladi.
+    """
     try:
-        resp = requests.post(url, data={'chat_id': chat, 'text': text})
-        resp.raise_for_status()
-    except Exception as e:
-        try:
-            print('Failed to send telegram message:', e)
-        except Exception:
-            pass
+        from .outbox import enqueue_telegram
+        enqueue_telegram(text)
+    except Exception:
+        logger.exception("Failed to enqueue telegram message")
 
 
 @receiver(post_save, sender=Admin)
@@ -71,10 +57,7 @@ def client_created(sender, instance, created, **kwargs):
     try:
         Notification.objects.create(title='Yangi mijoz', message=text)
     except Exception:
-        try:
-            print('Failed to create in-app notification for new client')
-        except Exception:
-            pass
+        logger.exception("Failed to create in-app notification for new client")
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
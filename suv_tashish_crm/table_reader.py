@@ -0,0 +1,100 @@
+"""
+Yuklangan CSV/XLSX fayllarni oqim (stream) bilan o'qish.
+
+Oldin import view'lari ``uploaded_file.read()`` bilan butun faylni xotiraga
+olib, har bir qatorni dict qilib ro'yxatga yig'ardi — xotira fayl hajmiga
+(va dict overhead'iga) proporsional edi. Bu yerdagi generatorlar:
+
+- CSV: ``uploaded_file.chunks()`` bo'yicha incremental decode, qator-qator;
+- XLSX: openpyxl ``read_only`` rejimi (sheet XML'i ham oqim bilan o'qiladi);
+
+shuning uchun bir vaqtda xotirada faqat bitta chunk / partiya turadi.
+"""
+import codecs
+import csv
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+CSV_EXTENSIONS = (".csv",)
+XLSX_EXTENSIONS = (".xlsx", ".xlsm", ".xltx")
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def iter_text_lines(uploaded_file, encoding: str = "utf-8-sig", errors: str = "ignore") -> Iterator[str]:
+    """Faylni bo'laklab o'qib, ``\\n`` bilan tugaydigan satrlarni beradi.
+
+    Satr oxiri saqlanadi — ``csv.reader`` qo'shtirnoq ichidagi yangi qatorni to'g'ri yig'adi.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    chunks = uploaded_file.chunks() if hasattr(uploaded_file, "chunks") else iter(
+        lambda: uploaded_file.read(64 * 1024), b""
+    )
+    tail = ""
+    for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        parts = text.split("\n")
+        tail = parts.pop()
+        for line in parts:
+            yield line + "\n"
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_csv_rows(uploaded_file, **kwargs) -> Iterator[List[str]]:
+    return csv.reader(iter_text_lines(uploaded_file), **kwargs)
+
+
+def iter_xlsx_rows(uploaded_file) -> Iterator[tuple]:
+    """Faol sheet qatorlari (``values_only``). Workbook generator tugaganda yopiladi.
+
+    Fayl ochilishi (buzilgan zip va h.k.) birinchi ``next()`` da emas, shu yerda xato beradi.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
+
+    def rows():
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()
+
+    return rows()
+
+
+def _cell(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def iter_dict_rows(rows: Iterable[Sequence]) -> Iterator[Dict[str, str]]:
+    """Birinchi qator — header (kichik harf); qolganlari ``{header: qiymat}``."""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    keys = [_cell(h).lower() for h in header]
+    for row in rows:
+        n = len(row)
+        if not n:
+            continue  # csv'dagi bo'sh qator (DictReader ham tashlab ketadi)
+        yield {key: (_cell(row[i]) if i < n else "") for i, key in enumerate(keys) if key}
+
+
+def table_kind(name: Optional[str]) -> Optional[str]:
+    name = (name or "").lower()
+    if name.endswith(CSV_EXTENSIONS):
+        return "csv"
+    if name.endswith(XLSX_EXTENSIONS):
+        return "xlsx"
+    return None
+
+
+def batched(iterable: Iterable, size: int = DEFAULT_BATCH_SIZE) -> Iterator[list]:
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,243 @@
+"""
+Kuryer GPS izlari (track history): ixcham saqlash va o'qishda soddalashtirish.
+
+Saqlash: ``CourierTrack`` chunk'lari — har bir flush'da kuryer + UTC kun uchun yangi
+qator (append-only: mavjud blob o'qilmaydi va qayta yozilmaydi), nuqtalar esa
+``points`` BinaryField ichida 16 baytlik yozuvlar (``<iiii``):
+
+    kun boshidan sekund | lat * 1e6 | lon * 1e6 | order_id (0 — yo'q)
+
+1e6 fixed-point ~11 sm aniqlik beradi. Ping'lar ``positions`` store'ida buferlanadi
+va flush paytida ``append_positions()`` orqali bitta ``bulk_create`` bilan qo'shiladi.
+Yaroqsiz nuqtalar (kodlab bo'lmaydigan qiymat, bazada yo'q kuryer) log bilan tashlanadi.
+
+O'qish: ``order_route()`` buyurtma yo'lini qaytaradi va uzun izlarni
+Douglas–Peucker bilan soddalashtiradi, xarita klientlari minglab nuqta tortmasin.
+"""
+import datetime
+import logging
+import math
+import struct
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Courier, CourierTrack
+
+logger = logging.getLogger(__name__)
+
+RECORD = struct.Struct("<iiii")
+SCALE = 1_000_000
+
+# (ts, lat, lon, order_id)
+TrackPoint = Tuple[float, float, float, Optional[int]]
+
+
+def _day_start(day: datetime.date) -> float:
+    return datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _utc_day(ts: float) -> datetime.date:
+    return datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc).date()
+
+
+def _order_int(order_id) -> int:
+    try:
+        value = int(order_id or 0)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+    return value if 0 < value < 2 ** 31 else 0
+
+
+def encode_points(day: datetime.date, points: Iterable[TrackPoint]) -> bytes:
+    base = _day_start(day)
+    return b"".join(
+        RECORD.pack(int(ts - base), round(lat * SCALE), round(lon * SCALE), _order_int(order_id))
+        for ts, lat, lon, order_id in points
+    )
+
+
+def decode_points(day: datetime.date, blob) -> List[TrackPoint]:
+    base = _day_start(day)
+    blob = bytes(blob or b"")
+    usable = len(blob) - len(blob) % RECORD.size
+    return [
+        (base + sec, lat / SCALE, lon / SCALE, order_id or None)
+        for sec, lat, lon, order_id in RECORD.iter_unpack(blob[:usable])
+    ]
+
+
+def _chunk(courier_id: int, day: datetime.date, points: List[TrackPoint]) -> Optional[CourierTrack]:
+    points.sort(key=lambda x: x[0])
+    good, blob = [], []
+    for pt in points:
+        try:
+            blob.append(encode_points(day, [pt]))
+        except (struct.error, TypeError, ValueError, OverflowError):
+            logger.warning("dropping invalid track point for courier %s: %r", courier_id, pt)
+            continue
+        good.append(pt)
+    if not good:
+        return None
+    return CourierTrack(
+        courier_id=courier_id, day=day, points=b"".join(blob), point_count=len(good),
+        first_ts=datetime.datetime.fromtimestamp(good[0][0], tz=datetime.timezone.utc),
+        last_ts=datetime.datetime.fromtimestamp(good[-1][0], tz=datetime.timezone.utc),
+    )
+
+
+def append_positions(positions: Iterable) -> int:
+    """``positions.Position`` ro'yxatini yangi chunk'lar sifatida qo'shadi. Qaytaradi: nuqtalar soni."""
+    grouped: Dict[Tuple[int, datetime.date], List[TrackPoint]] = defaultdict(list)
+    for p in positions:
+        try:
+            key = (int(p.courier_id), _utc_day(p.ts))
+        except (TypeError, ValueError, OverflowError, OSError):
+            logger.warning("dropping invalid track point: %r", p)
+            continue
+        grouped[key].append((p.ts, p.lat, p.lon, p.order_id))
+    if not grouped:
+        return 0
+
+    known = set(Courier.objects.filter(pk__in={c for c, _ in grouped}).values_list("pk", flat=True))
+    chunks = []
+    for (courier_id, day), points in grouped.items():
+        if courier_id not in known:
+            logger.warning("dropping %d track points of unknown courier %s", len(points), courier_id)
+            continue
+        chunk = _chunk(courier_id, day, points)
+        if chunk is not None:
+            chunks.append(chunk)
+    if not chunks:
+        return 0
+
+    try:
+        with transaction.atomic():
+            CourierTrack.objects.bulk_create(chunks)
+    except IntegrityError:
+        # kuryer shu orada o'chirilgan bo'lishi mumkin (FK commit'da tekshiriladi):
+        # har bir chunk alohida, xatolisi tashlanadi
+        saved = []
+        for chunk in chunks:
+            chunk.pk = None
+            try:
+                with transaction.atomic():
+                    chunk.save(force_insert=True)
+            except IntegrityError:
+                logger.warning("dropping %d track points of courier %s", chunk.point_count, chunk.courier_id)
+                continue
+            saved.append(chunk)
+        chunks = saved
+    return sum(c.point_count for c in chunks)
+
+
+def load_track(courier_id, start: datetime.datetime, end: datetime.datetime,
+               order_id: Optional[int] = None) -> List[TrackPoint]:
+    """``start``..``end`` oralig'idagi nuqtalar (vaqt bo'yicha tartiblangan)."""
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    chunks = CourierTrack.objects.filter(
+        courier_id=courier_id, day__gte=_utc_day(start_ts), day__lte=_utc_day(end_ts),
+        last_ts__gte=start, first_ts__lte=end,
+    ).only("day", "points")
+    out = []
+    for chunk in chunks:
+        for pt in decode_points(chunk.day, chunk.points):
+            if start_ts <= pt[0] <= end_ts and (order_id is None or pt[3] == order_id):
+                out.append(pt)
+    out.sort(key=lambda x: x[0])
+    return out
+
+
+# ---------------- soddalashtirish ----------------
+def douglas_peucker(points: List[TrackPoint], tolerance_m: float) -> List[TrackPoint]:
+    """Douglas–Peucker (iterativ). Masofa — mahalliy ekvirektangulyar proyeksiyada metr."""
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return list(points)
+
+    lat0 = math.radians(sum(p[1] for p in points) / n)
+    kx = 111_320.0 * math.cos(lat0)
+    ky = 110_540.0
+    xy = [(p[2] * kx, p[1] * ky) for p in points]
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        ax, ay = xy[a]
+        bx, by = xy[b]
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+        best_i, best_d = -1, -1.0
+        for i in range(a + 1, b):
+            px, py = xy[i]
+            if seg2 == 0:
+                d = math.hypot(px - ax, py - ay)
+            else:
+                d = abs(dy * px - dx * py + bx * ay - by * ax) / math.sqrt(seg2)
+            if d > best_d:
+                best_i, best_d = i, d
+        if best_d > tolerance_m:
+            keep[best_i] = True
+            stack.append((a, best_i))
+            stack.append((best_i, b))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def simplify(points: List[TrackPoint], tolerance_m: float = 10.0, max_points: int = 500) -> List[TrackPoint]:
+    """DP; natija ``max_points`` dan oshsa tolerance ikki barobar oshiriladi."""
+    out = douglas_peucker(points, tolerance_m)
+    tol = max(tolerance_m, 1.0)
+    while max_points and len(out) > max_points:
+        tol *= 2
+        out = douglas_peucker(out, tol)
+    return out
+
+
+def encode_polyline(points: Iterable[TrackPoint], precision: int = 5) -> str:
+    """Google "encoded polyline" formati (Leaflet/Google Maps to'g'ridan-to'g'ri o'qiydi)."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for _ts, lat, lon, _oid in points:
+        ilat, ilon = round(lat * factor), round(lon * factor)
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            v = ~(delta << 1) if delta < 0 else (delta << 1)
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1F)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def order_route(order, tolerance_m: float = 10.0, max_points: int = 500) -> Dict:
+    """Buyurtma yo'li: avval shu order_id bilan kelgan nuqtalar, bo'lmasa
+    kuryerning ``created_at``..``delivered_at`` (yoki hozir) oralig'idagi izi.
+
+    Faqat bazaga flush qilingan nuqtalar o'qiladi (GET so'rovi yozmaydi): so'nggi
+    ``COURIER_POSITION_FLUSH_SECONDS`` ichidagilar keyingi flush'dan keyin ko'rinadi.
+    """
+    raw: List[TrackPoint] = []
+    if order.courier_id:
+        end = order.delivered_at or timezone.now()
+        start = order.created_at or (end - datetime.timedelta(days=1))
+        raw = load_track(order.courier_id, start, end, order_id=order.id)
+        if not raw:
+            raw = load_track(order.courier_id, start, end)
+
+    points = simplify(raw, tolerance_m=tolerance_m, max_points=max_points)
+    return {
+        "order_id": order.id,
+        "courier_id": order.courier_id,
+        "raw_count": len(raw),
+        "count": len(points),
+        "points": [[round(p[1], 6), round(p[2], 6)] for p in points],
+        "timestamps": [int(p[0]) for p in points],
+        "polyline": encode_polyline(points),
+    }
@@ -0,0 +1,116 @@
+"""
+``locale/<lang>.json`` tarjima kataloglari uchun jarayon ichidagi kesh.
+
+Oldin ``language_context`` har bir template render'da faylni ochib ``json.load``
+qilardi. Endi to'rtala katalog birinchi murojaatda bir marta o'qiladi va o'zgarmas
+``MappingProxyType`` sifatida saqlanadi. ``DEBUG`` rejimida fayl ``mtime`` si
+tekshiriladi — tahrirlangan katalog server qayta ishga tushmasdan yangilanadi.
+"""
+import json
+import os
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+LANGUAGES = ("uz_lat", "uz_cyrl", "ru", "en")
+DEFAULT_LANGUAGE = "uz_lat"
+
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "locale")
+
+EMPTY: Mapping[str, str] = MappingProxyType({})
+
+# lang -> (mtime, catalog)
+_cache: Dict[str, Tuple[float, Mapping[str, str]]] = {}
+_lock = threading.Lock()
+
+
+def _path(lang: str) -> str:
+    return os.path.join(LOCALE_DIR, f"{lang}.json")
+
+
+def _mtime(lang: str) -> float:
+    try:
+        return os.stat(_path(lang)).st_mtime
+    except OSError:
+        return -1.0
+
+
+def _load(lang: str) -> Tuple[float, Mapping[str, str]]:
+    mtime = _mtime(lang)
+    try:
+        with open(_path(lang), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            data = {}
+    except Exception:
+        data = {}
+    return mtime, MappingProxyType(data)
+
+
+def normalize_language(lang) -> str:
+    return lang if lang in LANGUAGES else DEFAULT_LANGUAGE
+
+
+def get_catalog(lang: str) -> Mapping[str, str]:
+    """``lang`` katalogi (o'qish uchun). Noma'lum til — ``uz_lat``."""
+    lang = normalize_language(lang)
+    entry = _cache.get(lang)
+    if entry is not None and not (getattr(settings, "DEBUG", False) and entry[0] != _mtime(lang)):
+        return entry[1]
+    with _lock:
+        if not _cache:
+            # birinchi murojaat — hammasini birdan yuklaymiz
+            for code in LANGUAGES:
+                _cache[code] = _load(code)
+        else:
+            _cache[lang] = _load(lang)
+        return _cache[lang][1]
+
+
+class LazyCatalog(Mapping):
+    """Template uchun ``T``: katalog (va sessiyadagi til) birinchi kalit so'ralganda olinadi.
+
+    ``SimpleLazyObject`` har bir murojaatni proxy qiladi; bu yerda hal qilingandan keyin
+    ``T.key`` to'g'ridan-to'g'ri ``MappingProxyType`` ga boradi.
+    """
+    __slots__ = ("_get_lang", "_catalog")
+
+    def __init__(self, get_lang: Callable[[], str]):
+        self._get_lang = get_lang
+        self._catalog: Optional[Mapping[str, str]] = None
+
+    def _resolve(self) -> Mapping[str, str]:
+        catalog = self._catalog
+        if catalog is None:
+            try:
+                catalog = get_catalog(self._get_lang())
+            except Exception:
+                catalog = EMPTY
+            self._catalog = catalog
+        return catalog
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def get(self, key, default=None):
+        return self._resolve().get(key, default)
+
+    def __contains__(self, key):
+        return key in self._resolve()
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def __repr__(self):
+        return "<LazyCatalog %s>" % ("unresolved" if self._catalog is None else len(self._catalog))
+
+
+def clear_cache() -> None:
+    with _lock:
+        _cache.clear()
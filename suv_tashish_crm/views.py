@@ -34,15 +34,8 @@ def login_view(request):
         pass
     # load CSV locations for client region select
     try:
-        from admin_panel.views import read_csv_data
-        static_regions = read_csv_data()
-        locations = []
-        seen = set()
-        for r in static_regions:
-            loc = (r.get('location') or '').strip()
-            if loc and loc not in seen:
-                seen.add(loc)
-                locations.append(loc)
+        from suv_tashish_crm.reference_data import csv_locations
+        locations = list(csv_locations())
     except Exception:
         locations = []
 